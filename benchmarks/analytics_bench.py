@@ -0,0 +1,70 @@
+"""Агрегаты активности: потоковая запись, пересчет истории и запросы дашбордов
+
+Запуск: python -m benchmarks.analytics_bench [messages] [chats] [users]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from src.domain.messages.analytics import ActivityRollup
+from src.domain.messages.entities import Message, SourceType
+
+
+def history(messages: int, chats: int, users: int):
+    rnd = random.Random(0)
+    chat_ids = [UUID(int=rnd.getrandbits(128)) for _ in range(chats)]
+    user_ids = [UUID(int=rnd.getrandbits(128)) for _ in range(users)]
+    now = datetime(2024, 5, 10)
+    # Степенное распределение: несколько чатов получают большую часть
+    sources = rnd.choices(
+        chat_ids, [1 / rank for rank in range(1, chats + 1)], k=messages
+    )
+    return [
+        Message(
+            id=UUID(int=rnd.getrandbits(128)),
+            source_id=source_id,
+            source_type=SourceType.GROUP,
+            sender_id=rnd.choice(user_ids),
+            text_content="",
+            created_at=now - timedelta(seconds=rnd.randrange(30 * 24 * 3600)),
+        )
+        for source_id in sources
+    ], now
+
+
+def main(messages: int, chats: int, users: int):
+    items, now = history(messages, chats, users)
+
+    rollup = ActivityRollup()
+    started = time.perf_counter()
+    for message in items:
+        rollup.record(message)
+    elapsed = time.perf_counter() - started
+    print(f"record: {messages / elapsed:.0f} messages/s")
+
+    for vectorized in (False, True):
+        started = time.perf_counter()
+        rollup.rebuild(items, vectorized=vectorized)
+        elapsed = time.perf_counter() - started
+        name = "numpy" if vectorized else "python"
+        print(f"rebuild ({name}): {elapsed:.2f} s, {messages / elapsed:.0f} messages/s")
+    print(f"{len(rollup)} chats, {rollup.memory_bytes / 2**20:.1f} MiB of buckets")
+
+    started = time.perf_counter()
+    top = rollup.top_groups(hours=24, now=now)
+    print(f"top_groups: {(time.perf_counter() - started) * 1000:.1f} ms")
+    started = time.perf_counter()
+    for days in range(30):
+        rollup.active_users(now.date() - timedelta(days=days))
+    print(f"active_users: {(time.perf_counter() - started) / 30 * 1000:.2f} ms/day")
+    started = time.perf_counter()
+    rollup.messages_per_hour(top[0][0], now - timedelta(days=7), now)
+    print(f"messages_per_hour: {(time.perf_counter() - started) * 1000:.2f} ms/week")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args or [1_000_000, 100_000, 200_000]))
@@ -0,0 +1,59 @@
+"""Скорость пакетной загрузки и выгрузки сообщений в SQLite
+
+Запуск: python -m benchmarks.bulk_bench [rows]
+"""
+
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+from src.infrastructure.sqlite.bulk import (
+    ImportJob,
+    connect,
+    export_table,
+    import_files,
+)
+
+
+def generate(path: Path, rows: int) -> None:
+    chats = [str(uuid4()) for _ in range(100)]
+    users = [str(uuid4()) for _ in range(1000)]
+    created_at = datetime.now().isoformat()
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            record = {
+                "id": str(uuid4()),
+                "source_id": chats[i % len(chats)],
+                "source_type": "chat",
+                "sender_id": users[i % len(users)],
+                "text_content": f"message number {i}",
+                "created_at": created_at,
+            }
+            f.write(json.dumps(record) + "\n")
+
+
+def main(rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "messages.ndjson"
+        generate(source, rows)
+        connection = connect(str(Path(tmp) / "bench.db"))
+
+        started = time.perf_counter()
+        import_files(connection, [ImportJob("messages", source)], batch_size=20_000)
+        elapsed = time.perf_counter() - started
+        print(f"import: {rows / elapsed * 60 / 1e6:.2f}M rows/min ({elapsed:.1f}s)")
+
+        started = time.perf_counter()
+        with open(Path(tmp) / "out.ndjson", "w", encoding="utf-8") as out:
+            export_table(connection, "messages", out, batch_size=20_000)
+        elapsed = time.perf_counter() - started
+        print(f"export: {rows / elapsed * 60 / 1e6:.2f}M rows/min ({elapsed:.1f}s)")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000)
@@ -0,0 +1,90 @@
+"""Степень сжатия и стоимость CPU для текста сообщений и страниц истории
+
+Запуск: python -m benchmarks.compression_bench
+"""
+
+import time
+from datetime import datetime
+from uuid import uuid4
+
+from src.domain.messages import compression
+from src.domain.messages.entities import Message, SourceType
+
+from .corpus import chats
+
+CHATS = 20
+MESSAGES_PER_CHAT = 2_000
+TRAIN_SAMPLES = 500
+
+
+def bench_storage(name: str, compressor: compression.PayloadCompressor, train: bool):
+    raw = stored = 0
+    encode_ns = decode_ns = 0
+    count = 0
+    for history in chats(CHATS, MESSAGES_PER_CHAT):
+        chat_id = uuid4()
+        if train:
+            compressor.train(chat_id, history[:TRAIN_SAMPLES])
+        for text in history[TRAIN_SAMPLES:]:
+            started = time.perf_counter_ns()
+            payload = compressor.encode(chat_id, text)
+            encode_ns += time.perf_counter_ns() - started
+            started = time.perf_counter_ns()
+            compressor.decode(payload)
+            decode_ns += time.perf_counter_ns() - started
+            raw += len(text.encode())
+            stored += len(payload)
+            count += 1
+    print(
+        f"{name:<24} ratio={raw / stored:5.2f} "
+        f"encode={encode_ns / count / 1000:6.2f}us decode={decode_ns / count / 1000:6.2f}us"
+    )
+
+
+def bench_pages(encoding: str, page_size: int = 50):
+    raw = sent = 0
+    elapsed_ns = 0
+    pages = 0
+    for history in chats(CHATS, MESSAGES_PER_CHAT):
+        source_id = uuid4()
+        messages = [
+            Message(
+                id=uuid4(),
+                source_id=source_id,
+                source_type=SourceType.GROUP,
+                sender_id=uuid4(),
+                text_content=text,
+                created_at=datetime(2025, 1, 1),
+            )
+            for text in history
+        ]
+        for offset in range(0, len(messages), page_size):
+            page = messages[offset : offset + page_size]
+            _, identity = compression.encode_history_page(page, None)
+            started = time.perf_counter_ns()
+            _, body = compression.encode_history_page(page, encoding)
+            elapsed_ns += time.perf_counter_ns() - started
+            raw += len(identity)
+            sent += len(body)
+            pages += 1
+    print(
+        f"page {encoding:<19} ratio={raw / sent:5.2f} "
+        f"encode={elapsed_ns / pages / 1000:8.2f}us/page"
+    )
+
+
+def main():
+    print(f"corpus: {CHATS} chats x {MESSAGES_PER_CHAT} messages")
+    bench_storage("zlib", compression.PayloadCompressor(prefer_zstd=False), False)
+    bench_storage(
+        "zlib+dictionary", compression.PayloadCompressor(prefer_zstd=False), True
+    )
+    if compression.supported_encodings()[0] == "zstd":
+        bench_storage("zstd", compression.PayloadCompressor(), False)
+        bench_storage("zstd+dictionary", compression.PayloadCompressor(), True)
+    for encoding in compression.supported_encodings():
+        bench_pages(encoding)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import random
+from typing import Iterator, List
+
+GREETINGS = ["Привет", "Hi", "Здравствуйте", "Добрый день", "hey", "Хай"]
+WORDS = (
+    "да нет ок спасибо сейчас завтра вечером утром созвон встреча задача ревью "
+    "деплой релиз баг фикс тест прод стейдж логи метрики дашборд ссылка файл "
+    "документ отчет бюджет проект клиент договор счет оплата доставка заказ "
+    "please check merge request pipeline failed again looks good thanks will do "
+    "tomorrow today meeting call deadline update status blocked done"
+).split()
+EMOJI = ["👍", "🙂", "🔥", "😂", "🙏", "✅", "❤️"]
+LINKS = [
+    "https://git.example.com/team/backend/-/merge_requests/{}",
+    "https://tracker.example.com/browse/MSG-{}",
+    "https://docs.example.com/d/{}/edit",
+]
+
+
+def _sentence(rnd: random.Random) -> str:
+    words = [WORDS[min(int(rnd.paretovariate(1.2)) - 1, len(WORDS) - 1)]]
+    words += rnd.choices(WORDS, k=rnd.randint(2, 14))
+    return " ".join(words).capitalize()
+
+
+def message(rnd: random.Random) -> str:
+    kind = rnd.random()
+    if kind < 0.35:
+        return rnd.choice(["ок", "да", "+", "👍", "спасибо!", "ok", "ага"])
+    parts = []
+    if rnd.random() < 0.2:
+        parts.append(rnd.choice(GREETINGS) + "!")
+    parts.extend(
+        _sentence(rnd) + rnd.choice([".", "?", "!", ""])
+        for _ in range(1 if kind < 0.8 else rnd.randint(2, 12))
+    )
+    if rnd.random() < 0.15:
+        parts.append(rnd.choice(LINKS).format(rnd.randint(100, 9999)))
+    if rnd.random() < 0.25:
+        parts.append(rnd.choice(EMOJI))
+    return " ".join(parts)
+
+
+def chat_history(seed: int, size: int) -> List[str]:
+    rnd = random.Random(seed)
+    return [message(rnd) for _ in range(size)]
+
+
+def chats(count: int, size: int) -> Iterator[List[str]]:
+    for seed in range(count):
+        yield chat_history(seed, size)
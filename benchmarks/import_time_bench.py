@@ -0,0 +1,62 @@
+"""Время холодного импорта доменного слоя
+
+Запускает `python -X importtime` в новом процессе для каждого модуля и
+сравнивает медиану с бюджетом. Код возврата 1, если бюджет превышен.
+Запуск: python -m benchmarks.import_time_bench [budget_ms]
+"""
+
+import pkgutil
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RUNS = 5
+BUDGET_MS = 150.0
+HEAVY_MODULES = ("sqlalchemy", "fastapi", "pydantic", "multiprocessing")
+
+
+def domain_modules() -> list:
+    import src.domain
+
+    return sorted(
+        info.name
+        for info in pkgutil.walk_packages(src.domain.__path__, "src.domain.")
+        if not info.ispkg
+    )
+
+
+def import_time(statement: str) -> tuple:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    loaded = set()
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, raw_name = line.split("|")
+        name = raw_name.strip()
+        loaded.add(name.split(".")[0])
+        if name.startswith("src") and raw_name == f" {name}":
+            total += int(cumulative)
+    return total / 1000, loaded
+
+
+def main(budget_ms: float) -> int:
+    modules = domain_modules()
+    statement = "; ".join(f"import {module}" for module in modules)
+    runs = [import_time(statement) for _ in range(RUNS)]
+    median = statistics.median(ms for ms, _ in runs)
+    heavy = sorted(set(HEAVY_MODULES) & runs[0][1])
+
+    print(f"{len(modules)} domain modules, cold import median={median:.1f}ms")
+    print(f"budget={budget_ms:.0f}ms heavy modules loaded: {heavy or 'none'}")
+    return 0 if median <= budget_ms and not heavy else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS))
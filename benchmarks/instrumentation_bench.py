@@ -0,0 +1,48 @@
+"""Накладные расходы инструментирования на вызов метода сервиса
+
+Запуск: python -m benchmarks.instrumentation_bench
+"""
+
+import asyncio
+import time
+
+from src.common.instrumentation import MetricsRegistry
+
+CALLS = 200_000
+
+
+class NoopService:
+    async def get(self, _id: int) -> int:
+        return _id
+
+
+class PassthroughService(NoopService):
+    # Обертка без замера: нижняя граница стоимости любой обертки метода
+    async def get(self, *args, **kwargs) -> int:
+        return await super().get(*args, **kwargs)
+
+
+async def measure(service: NoopService) -> float:
+    get = service.get
+    started = time.perf_counter_ns()
+    for i in range(CALLS):
+        await get(i)
+    return (time.perf_counter_ns() - started) / CALLS
+
+
+async def main():
+    plain = NoopService()
+    wrapped = PassthroughService()
+    instrumented = MetricsRegistry().instrument_service(NoopService(), "noop")
+    for _ in range(3):
+        baseline = await measure(plain)
+        floor = await measure(wrapped)
+        timed = await measure(instrumented)
+    print(
+        f"plain={baseline:.0f}ns passthrough={floor:.0f}ns instrumented={timed:.0f}ns "
+        f"overhead={timed - baseline:.0f}ns/call (timing itself {timed - floor:.0f}ns)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,481 @@
+"""Генератор нагрузки с моделью трафика мессенджера
+
+Строит синтетических пользователей и группы со степенным распределением
+размера групп и активности пользователей, затем параллельные клиенты
+выполняют смесь операций: отправка, чтение ленты, добавление участника,
+чтение упоминаний. Каждый интервал печатается пропускная способность,
+p50/p99/p999 задержки по операциям и RSS процесса вместе с воркерами пула.
+Работает без сети поверх репозиториев в памяти, SQLite или пула воркеров.
+
+Запуск: python -m benchmarks.loadgen --backend memory --users 10000 \\
+    --groups 2000 --clients 200 --duration 30 [--json report.json]
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from benchmarks import corpus
+from src.domain.chats.cache import ChatSnapshotCache
+from src.domain.chats.services import AbstractChatService, ChatService
+from src.domain.messages.entities import SourceType
+from src.domain.messages.services import AbstractMessageService, MessageService
+from src.infrastructure.memory import (
+    MemoryChatMemberRepository,
+    MemoryChatRepository,
+)
+from src.infrastructure.workers import (
+    ShardedChatService,
+    ShardedMessageService,
+    WorkerPool,
+    memory_services,
+)
+
+OPERATIONS = ("send", "get_list", "member_add", "inbox")
+
+
+@dataclass
+class Workload:
+    users: int = 10_000
+    groups: int = 2_000
+    # Показатели степени: размер группы ~ Pareto(group_alpha),
+    # активность пользователя ~ Zipf(activity_alpha)
+    group_alpha: float = 1.3
+    max_group: int = 5_000
+    activity_alpha: float = 1.1
+    mix: Dict[str, float] = field(
+        default_factory=lambda: {
+            "send": 0.55,
+            "get_list": 0.35,
+            "member_add": 0.02,
+            "inbox": 0.08,
+        }
+    )
+    mention_rate: float = 0.1
+    seed: int = 0
+
+
+class _Weighted:
+    __slots__ = ("items", "cumulative")
+
+    def __init__(self, items: Sequence[Any], weights: Sequence[float]):
+        self.items = items
+        self.cumulative = list(itertools.accumulate(weights))
+
+    def pick(self, rnd: random.Random) -> Any:
+        point = rnd.random() * self.cumulative[-1]
+        return self.items[bisect.bisect_right(self.cumulative, point)]
+
+
+@dataclass
+class Population:
+    user_ids: List[UUID]
+    active_users: _Weighted
+    groups: _Weighted
+    members: Dict[UUID, List[UUID]]
+    owners: Dict[UUID, UUID]
+
+
+async def populate(
+    workload: Workload,
+    chat_service: AbstractChatService,
+    report: Callable[[str], None],
+) -> Population:
+    """Создать пользователей и группы со степенными распределениями"""
+    rnd = random.Random(workload.seed)
+    user_ids = [uuid4() for _ in range(workload.users)]
+    activity = [
+        1 / (rank + 1) ** workload.activity_alpha for rank in range(len(user_ids))
+    ]
+    active_users = _Weighted(user_ids, activity)
+
+    started = time.perf_counter()
+    members: Dict[UUID, List[UUID]] = {}
+    owners: Dict[UUID, UUID] = {}
+    for _ in range(workload.groups):
+        size = min(
+            int(2 * rnd.paretovariate(workload.group_alpha)),
+            workload.max_group,
+            workload.users,
+        )
+        # Активные пользователи чаще состоят в группах
+        group_members = list({active_users.pick(rnd): None for _ in range(size)})
+        owner_id = group_members[0]
+        chat = await chat_service.create_group("group", owner_id)
+        await asyncio.gather(
+            *(
+                chat_service.member_add(chat.id, user_id, owner_id)
+                for user_id in group_members[1:]
+            )
+        )
+        members[chat.id] = group_members
+        owners[chat.id] = owner_id
+
+    # Трафик группы пропорционален ее размеру
+    chat_ids = list(members)
+    groups = _Weighted(chat_ids, [len(members[c]) for c in chat_ids])
+    sizes = sorted((len(m) for m in members.values()), reverse=True)
+    report(
+        f"populated {workload.users} users, {len(chat_ids)} groups, "
+        f"{sum(sizes)} memberships in {time.perf_counter() - started:.1f}s; "
+        f"group size max={sizes[0]} p50={sizes[len(sizes) // 2]}"
+    )
+    return Population(user_ids, active_users, groups, members, owners)
+
+
+class Recorder:
+    """Задержки по операциям в окне и итоговые по всему прогону
+
+    Память (`rss_mib`) — сумма RSS текущего процесса и процессов `pids`,
+    например воркеров пула.
+    """
+
+    def __init__(self, pids: Sequence[int] = ()):
+        self.pids = pids
+        self.window: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.total: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.errors: Dict[str, int] = {op: 0 for op in OPERATIONS}
+        self.timeline: List[Dict[str, Any]] = []
+
+    def record(self, operation: str, latency: float) -> None:
+        self.window[operation].append(latency)
+
+    def flush(self, elapsed: float, interval: float) -> Dict[str, Any]:
+        point: Dict[str, Any] = {
+            "t": round(elapsed, 3),
+            "rss_mib": round(_rss_bytes(self.pids) / 2**20, 1),
+            "ops": {},
+        }
+        for operation, latencies in self.window.items():
+            if latencies:
+                point["ops"][operation] = _summary(latencies, interval)
+                self.total[operation].extend(latencies)
+            self.window[operation] = []
+        self.timeline.append(point)
+        return point
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            operation: {
+                **_summary(latencies, elapsed),
+                "errors": self.errors[operation],
+            }
+            for operation, latencies in self.total.items()
+            if latencies or self.errors[operation]
+        }
+
+
+def _summary(latencies: List[float], seconds: float) -> Dict[str, float]:
+    if not latencies:
+        return {"count": 0, "rate": 0.0}
+    latencies.sort()
+
+    def quantile(q: float) -> float:
+        return round(
+            latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1e3, 3
+        )
+
+    return {
+        "count": len(latencies),
+        "rate": round(len(latencies) / seconds, 1),
+        "p50_ms": quantile(0.5),
+        "p99_ms": quantile(0.99),
+        "p999_ms": quantile(0.999),
+        "max_ms": round(latencies[-1] * 1e3, 3),
+    }
+
+
+def _rss_bytes(pids: Sequence[int] = ()) -> int:
+    try:
+        pages = 0
+        for pid in ("self", *pids):
+            with open(f"/proc/{pid}/statm") as f:
+                pages += int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Пиковое значение: ru_maxrss в КиБ на Linux; для дочерних процессов —
+        # максимум по ним, а не сумма
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if pids:
+            rss += resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return rss * 1024
+
+
+class Client:
+    def __init__(
+        self,
+        workload: Workload,
+        population: Population,
+        chat_service: AbstractChatService,
+        message_service: AbstractMessageService,
+        recorder: Recorder,
+        seed: int,
+    ):
+        self.__workload = workload
+        self.__population = population
+        self.__chats = chat_service
+        self.__messages = message_service
+        self.__recorder = recorder
+        self.__rnd = random.Random(seed)
+        self.__operations = _Weighted(
+            list(workload.mix), [workload.mix[op] for op in workload.mix]
+        )
+        self.__handlers: Dict[str, Callable[[], Awaitable[Any]]] = {
+            "send": self.__send,
+            "get_list": self.__get_list,
+            "member_add": self.__member_add,
+            "inbox": self.__inbox,
+        }
+
+    async def run(self, deadline: float, pace: float) -> None:
+        while time.perf_counter() < deadline:
+            operation = self.__operations.pick(self.__rnd)
+            started = time.perf_counter()
+            try:
+                await self.__handlers[operation]()
+            except Exception:
+                self.__recorder.errors[operation] += 1
+            else:
+                self.__recorder.record(operation, time.perf_counter() - started)
+            if pace:
+                await asyncio.sleep(max(pace - (time.perf_counter() - started), 0))
+            else:
+                # Отдать управление: иначе быстрый бэкенд без реального
+                # ожидания держит цикл событий одним клиентом
+                await asyncio.sleep(0)
+
+    async def __send(self) -> None:
+        chat_id = self.__population.groups.pick(self.__rnd)
+        members = self.__population.members[chat_id]
+        text = corpus.message(self.__rnd)
+        if self.__rnd.random() < self.__workload.mention_rate:
+            text = f"@{self.__rnd.choice(members)} {text}"
+        await self.__messages.send(
+            chat_id, SourceType.GROUP, self.__rnd.choice(members), text
+        )
+
+    async def __get_list(self) -> None:
+        chat_id = self.__population.groups.pick(self.__rnd)
+        await self.__messages.get_list(chat_id, SourceType.GROUP, limit=50)
+
+    async def __member_add(self) -> None:
+        chat_id = self.__population.groups.pick(self.__rnd)
+        user_id = self.__population.active_users.pick(self.__rnd)
+        await self.__chats.member_add(
+            chat_id, user_id, self.__population.owners[chat_id]
+        )
+
+    async def __inbox(self) -> None:
+        user_id = self.__population.active_users.pick(self.__rnd)
+        await self.__messages.list_mentions(user_id, limit=20)
+
+
+async def run(
+    workload: Workload,
+    chat_service: AbstractChatService,
+    message_service: AbstractMessageService,
+    clients: int,
+    duration: float,
+    rate: float | None = None,
+    interval: float = 1.0,
+    report: Callable[[str], None] = print,
+    pids: Sequence[int] = (),
+) -> Tuple[Recorder, Dict[str, Any]]:
+    """Заселить бэкенд и прогнать нагрузку
+
+    Args:
+        workload (Workload): Модель трафика
+        chat_service (AbstractChatService): Сервис чатов
+        message_service (AbstractMessageService): Сервис сообщений
+        clients (int): Количество параллельных клиентов
+        duration (float): Длительность прогона в секундах
+        rate (float | None, optional): Целевая суммарная частота операций в
+            секунду. По умолчанию без ограничения (замкнутый цикл).
+        interval (float, optional): Период отчета в секундах
+        report (Callable[[str], None], optional): Вывод строк отчета
+        pids (Sequence[int], optional): Процессы бэкенда, чья память
+            учитывается вместе с текущим
+
+    Returns:
+        Tuple[Recorder, Dict[str, Any]]: Записанные метрики и итоговая сводка
+    """
+    population = await populate(workload, chat_service, report)
+    recorder = Recorder(pids)
+    pace = clients / rate if rate else 0.0
+    started = time.perf_counter()
+    deadline = started + duration
+    tasks = [
+        asyncio.create_task(
+            Client(
+                workload,
+                population,
+                chat_service,
+                message_service,
+                recorder,
+                seed=workload.seed * 1_000_003 + i,
+            ).run(deadline, pace)
+        )
+        for i in range(clients)
+    ]
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(min(interval, max(deadline - time.perf_counter(), 0)))
+        point = recorder.flush(time.perf_counter() - started, interval)
+        report(_format_point(point))
+    await asyncio.gather(*tasks)
+    recorder.flush(time.perf_counter() - started, interval)
+    summary = recorder.summary(time.perf_counter() - started)
+    for operation, values in summary.items():
+        report(
+            f"total {operation:<10} " + " ".join(f"{k}={v}" for k, v in values.items())
+        )
+    return recorder, summary
+
+
+def _format_point(point: Dict[str, Any]) -> str:
+    total = sum(values["count"] for values in point["ops"].values())
+    parts = [
+        f"{operation}:p50={values['p50_ms']}ms/p99={values['p99_ms']}ms"
+        for operation, values in point["ops"].items()
+    ]
+    return f"t={point['t']:6.1f}s ops={total:<7} rss={point['rss_mib']}MiB " + " ".join(
+        parts
+    )
+
+
+class _Backend:
+    def __init__(self, name: str, workers: int | None, path: str | None):
+        self.name = name
+        self.__workers = workers
+        self.__path = path
+        self.__closers: List[Callable[[], Awaitable[None]]] = []
+        self.pids: List[int] = []
+
+    async def open(self) -> Tuple[AbstractChatService, AbstractMessageService]:
+        if self.name == "memory":
+            services = memory_services(0, 1)
+            return services["chats"], services["messages"]
+        if self.name == "workers":
+            pool = WorkerPool(workers=self.__workers)
+            await pool.start()
+            self.__closers.append(pool.close)
+            self.pids = pool.pids
+            return ShardedChatService(pool), ShardedMessageService(pool)
+        if self.name == "sqlite":
+            from src.infrastructure.sqlite import (
+                SQLiteDatabase,
+                SQLiteMessageRepository,
+            )
+
+            path = self.__path
+            if path is None:
+                directory = tempfile.TemporaryDirectory()
+                path = os.path.join(directory.name, "loadgen.db")
+
+                async def cleanup() -> None:
+                    directory.cleanup()
+
+                self.__closers.append(cleanup)
+            database = SQLiteDatabase(path)
+            await database.migrate()
+
+            async def close() -> None:
+                database.close()
+
+            self.__closers.insert(0, close)
+            # Чаты в памяти: SQLite-репозиториев чатов в проекте нет
+            chat_repository = MemoryChatRepository()
+            member_repository = MemoryChatMemberRepository()
+            snapshot_cache = ChatSnapshotCache(chat_repository, member_repository)
+            return ChatService(
+                chat_repository, member_repository, snapshot_cache
+            ), MessageService(
+                SQLiteMessageRepository(database),
+                chat_member_repository=member_repository,
+                chat_snapshot_cache=snapshot_cache,
+            )
+        raise ValueError(f"Unknown backend {self.name!r}")
+
+    async def close(self) -> None:
+        for close in self.__closers:
+            await close()
+
+
+async def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadgen")
+    parser.add_argument(
+        "--backend", choices=("memory", "sqlite", "workers"), default="memory"
+    )
+    parser.add_argument("--workers", type=int, help="Воркеров для --backend workers")
+    parser.add_argument("--database", help="Файл SQLite, по умолчанию временный")
+    parser.add_argument("--users", type=int, default=Workload.users)
+    parser.add_argument("--groups", type=int, default=Workload.groups)
+    parser.add_argument("--max-group", type=int, default=Workload.max_group)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--rate", type=float, help="Целевая частота операций в секунду")
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument(
+        "--mix",
+        help="Доли операций, например send=0.6,get_list=0.3,member_add=0.02,inbox=0.08",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Сохранить сводку и динамику в JSON")
+    args = parser.parse_args(argv)
+
+    workload = Workload(
+        users=args.users, groups=args.groups, max_group=args.max_group, seed=args.seed
+    )
+    if args.mix:
+        mix = {}
+        for part in args.mix.split(","):
+            operation, _, share = part.partition("=")
+            if operation not in OPERATIONS:
+                parser.error(f"Unknown operation {operation!r}")
+            mix[operation] = float(share)
+        workload.mix = mix
+
+    random.seed(args.seed)
+    backend = _Backend(args.backend, args.workers, args.database)
+    chat_service, message_service = await backend.open()
+    try:
+        recorder, summary = await run(
+            workload,
+            chat_service,
+            message_service,
+            clients=args.clients,
+            duration=args.duration,
+            rate=args.rate,
+            interval=args.interval,
+            report=lambda line: print(line, file=sys.stderr),
+            pids=backend.pids,
+        )
+    finally:
+        await backend.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {
+                    "backend": args.backend,
+                    "workload": vars(args),
+                    "summary": summary,
+                    "timeline": recorder.timeline,
+                },
+                f,
+                indent=2,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
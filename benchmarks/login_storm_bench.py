@@ -0,0 +1,69 @@
+"""Задержка цикла событий во время волны логинов
+
+Сравнивает хэширование прямо в цикле событий и через HashingPool.
+Запуск: python -m benchmarks.login_storm_bench [logins]
+"""
+
+import asyncio
+import sys
+import time
+
+from src.domain.auth import hashing
+from src.domain.auth.services import AuthService
+from src.domain.users.services import UserService
+from src.infrastructure.memory import MemoryUserRepository
+
+PARAMS = hashing.ScryptParams(n=2**14)
+
+
+class InlinePool(hashing.HashingPool):
+    async def hash(self, password: str) -> str:
+        return hashing.hash_password(password, self.params)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return hashing.verify_password(password, hashed_password)
+
+
+async def monitor_lag(stop: asyncio.Event, lags: list, interval: float = 0.001):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def storm(pool: hashing.HashingPool, logins: int) -> None:
+    users = UserService(MemoryUserRepository())
+    hashed = hashing.hash_password("secret", PARAMS)
+    for i in range(logins):
+        await users.create(f"user{i}", f"user{i}@example.com", hashed)
+    auth = AuthService(users, pool)
+
+    stop = asyncio.Event()
+    lags: list = []
+    monitor = asyncio.create_task(monitor_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(auth.authenticate(f"user{i}@example.com", "secret") for i in range(logins))
+    )
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+    print(
+        f"{type(pool).__name__:<12} logins/s={logins / elapsed:7.1f} "
+        f"loop lag p99={p99 * 1000:7.2f}ms max={(lags[-1] if lags else 0) * 1000:7.2f}ms"
+    )
+
+
+async def main(logins: int):
+    await storm(InlinePool(PARAMS), logins)
+    pool = hashing.HashingPool(PARAMS)
+    await storm(pool, logins)
+    print(f"pool metrics: {pool.metrics}")
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
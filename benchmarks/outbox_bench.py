@@ -0,0 +1,76 @@
+"""Пропускная способность outbox: запись с fan-out и доставка пачками
+
+Запуск: python -m benchmarks.outbox_bench [messages] [recipients]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from src.domain.messages.delivery import OutboxDispatcher
+from src.domain.messages.entities import SourceType
+from src.infrastructure.sqlite import (
+    SQLiteDatabase,
+    SQLiteMessageRepository,
+    SQLiteOutboxRepository,
+)
+
+
+class AckingTransport:
+    def __init__(self):
+        self.dispatcher: OutboxDispatcher | None = None
+
+    async def deliver(self, recipient_id, messages) -> None:
+        assert self.dispatcher is not None
+        self.dispatcher.ack(recipient_id, [message.id for message in messages])
+
+
+async def main(messages: int, recipients: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        database = SQLiteDatabase(str(Path(tmp) / "bench.db"))
+        await database.migrate()
+        message_repository = SQLiteMessageRepository(database)
+        outbox_repository = SQLiteOutboxRepository(database)
+        transport = AckingTransport()
+        dispatcher = OutboxDispatcher(outbox_repository, transport, batch_size=1000)
+        transport.dispatcher = dispatcher
+
+        chat_id = uuid4()
+        recipient_ids = [uuid4() for _ in range(recipients)]
+        started = time.perf_counter()
+        for i in range(messages):
+            await message_repository.create(
+                chat_id,
+                SourceType.CHAT,
+                uuid4(),
+                f"message {i}",
+                recipient_ids=recipient_ids,
+            )
+        elapsed = time.perf_counter() - started
+        print(
+            f"send: {messages / elapsed:.0f} msg/s, "
+            f"{messages * recipients / elapsed:.0f} outbox rows/s"
+        )
+
+        started = time.perf_counter()
+        while await dispatcher.drain_once():
+            pass
+        await dispatcher.flush_acks()
+        elapsed = time.perf_counter() - started
+        print(
+            f"drain+ack: {dispatcher.metrics.sent / elapsed:.0f} deliveries/s, "
+            f"pending={await outbox_repository.count_pending()}"
+        )
+        database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 5_000,
+            int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+        )
+    )
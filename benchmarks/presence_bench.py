@@ -0,0 +1,63 @@
+"""Память и стоимость тика при отслеживании большого числа пользователей
+
+Запуск: python -m benchmarks.presence_bench [users]
+"""
+
+import asyncio
+import sys
+import time
+import tracemalloc
+from uuid import uuid4
+
+from src.domain.chats.services import ChatService
+from src.domain.presence.services import PresenceService
+from src.infrastructure.memory import MemoryChatMemberRepository, MemoryChatRepository
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def main(users: int):
+    clock = Clock()
+    # Чаты в замере не участвуют: хватает пустого сервиса в памяти
+    chat_service = ChatService(MemoryChatRepository(), MemoryChatMemberRepository())
+    presence = PresenceService(chat_service, online_ttl=60, clock=clock)
+    user_ids = [uuid4() for _ in range(users)]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i, user_id in enumerate(user_ids):
+        if i % (users // 60 or 1) == 0:
+            clock.now += 1
+        await presence.heartbeat(user_id)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{users} users online: heartbeat={elapsed / users * 1e6:.2f}us "
+        f"state={current / users:.0f}B/user ({current / 2**20:.0f}MiB)"
+    )
+
+    started = time.perf_counter()
+    await presence.heartbeat(user_ids[0])
+    print(f"repeat heartbeat: {(time.perf_counter() - started) * 1e6:.2f}us")
+
+    ticks = []
+    for _ in range(70):
+        clock.now += 1
+        started = time.perf_counter()
+        await presence.tick()
+        ticks.append(time.perf_counter() - started)
+    print(
+        f"tick: max={max(ticks) * 1000:.1f}ms "
+        f"mean={sum(ticks) / len(ticks) * 1000:.1f}ms online={presence.online_count}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
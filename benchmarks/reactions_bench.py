@@ -0,0 +1,85 @@
+"""Реакции на популярное сообщение: запись по одной и пачками
+
+Запуск: python -m benchmarks.reactions_bench [reactions] [messages]
+"""
+
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from src.domain.chats.entities import ChatMember, ChatMemberPermissions
+from src.domain.messages.entities import ReactionChange, SourceType
+from src.domain.messages.reactions import ReactionService
+from src.infrastructure.memory import MemoryChatMemberRepository
+from src.infrastructure.sqlite import (
+    SQLiteDatabase,
+    SQLiteMessageRepository,
+    SQLiteReactionRepository,
+)
+
+EMOJI = ("👍", "🔥", "😂", "❤️")
+
+
+async def main(reactions: int, messages: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        database = SQLiteDatabase(str(Path(tmp) / "bench.db"))
+        await database.migrate()
+        message_repository = SQLiteMessageRepository(database)
+        reaction_repository = SQLiteReactionRepository(database)
+
+        chat_id = uuid4()
+        ids = [
+            (
+                await message_repository.create(chat_id, SourceType.CHAT, uuid4(), "hi")
+            ).id
+            for _ in range(messages)
+        ]
+        # Половина реакций приходится на одно сообщение
+        workload = [
+            (ids[0] if random.random() < 0.5 else random.choice(ids), uuid4())
+            for _ in range(reactions)
+        ]
+
+        started = time.perf_counter()
+        for message_id, user_id in workload[: reactions // 10]:
+            change = ReactionChange(message_id, user_id, random.choice(EMOJI), True)
+            await reaction_repository.apply([change], {})
+        elapsed = time.perf_counter() - started
+        print(f"one by one: {reactions // 10 / elapsed:.0f} reactions/s")
+
+        member_repository = MemoryChatMemberRepository()
+        for _, user_id in workload:
+            await member_repository.create(
+                ChatMember(chat_id, user_id, ChatMemberPermissions.ROLE_DEFAULT)
+            )
+        service = ReactionService(
+            reaction_repository,
+            message_repository,
+            member_repository,
+            hot_threshold=100,
+        )
+        started = time.perf_counter()
+        for message_id, user_id in workload:
+            await service.react(message_id, user_id, random.choice(EMOJI))
+        await service.flush()
+        elapsed = time.perf_counter() - started
+        print(
+            f"batched: {reactions / elapsed:.0f} reactions/s, "
+            f"{service.metrics.flushes} flushes, {service.metrics.hot} hot"
+        )
+
+        started = time.perf_counter()
+        for _ in range(100):
+            await message_repository.get_list(chat_id, SourceType.CHAT, limit=50)
+        elapsed = time.perf_counter() - started
+        print(f"get_list with reactions: {elapsed / 100 * 1000:.2f} ms/page")
+        database.close()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args or [100_000, 1000])))
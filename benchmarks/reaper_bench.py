@@ -0,0 +1,78 @@
+"""Удаление большой группы: мягкое удаление и фоновая очистка пачками
+
+Запуск: python -m benchmarks.reaper_bench [messages] [members] [batch_size]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+from uuid import UUID, uuid4
+
+from src.domain.chats.reaper import ChatReaper
+from src.domain.chats.services import ChatService
+from src.domain.messages.entities import SourceType
+from src.infrastructure.memory import MemoryChatMemberRepository, MemoryChatRepository
+from src.infrastructure.sqlite import SQLiteDatabase, SQLiteMessageRepository
+
+
+class TimedMessageRepository(SQLiteMessageRepository):
+    """Замеряет каждую пачку: самая долгая — максимальная задержка для
+    соседних запросов"""
+
+    def __init__(self, database: SQLiteDatabase):
+        super().__init__(database)
+        self.stalls: List[float] = []
+
+    async def delete_by_source(self, source_id: UUID, limit: int = 1000) -> int:
+        started = time.perf_counter()
+        deleted = await super().delete_by_source(source_id, limit)
+        self.stalls.append(time.perf_counter() - started)
+        return deleted
+
+
+async def main(messages: int, members: int, batch_size: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        database = SQLiteDatabase(str(Path(tmp) / "bench.db"))
+        await database.migrate()
+        chat_repository = MemoryChatRepository()
+        member_repository = MemoryChatMemberRepository()
+        message_repository = TimedMessageRepository(database)
+        reaper = ChatReaper(
+            chat_repository,
+            member_repository,
+            message_repository,
+            batch_size=batch_size,
+            pause=0,
+        )
+        service = ChatService(chat_repository, member_repository, reaper=reaper)
+
+        owner_id = uuid4()
+        chat = await service.create_group("big", owner_id)
+        for _ in range(members - 1):
+            await service.member_add(chat.id, uuid4())
+        for i in range(messages):
+            await message_repository.create(
+                chat.id, SourceType.GROUP, owner_id, f"message {i}"
+            )
+
+        started = time.perf_counter()
+        await service.delete(chat.id, owner_id)
+        print(f"delete: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+        started = time.perf_counter()
+        await reaper.reap_pending()
+        elapsed = time.perf_counter() - started
+        print(
+            f"reap: {elapsed:.2f} s, {reaper.metrics.messages / elapsed:.0f} msg/s, "
+            f"{reaper.metrics.batches} batches, "
+            f"max batch {max(message_repository.stalls) * 1000:.1f} ms"
+        )
+        database.close()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args or [100_000, 10_000, 500])))
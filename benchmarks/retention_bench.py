@@ -0,0 +1,52 @@
+"""Очистка истории по политике хранения: удаление диапазонами пачками
+
+Запуск: python -m benchmarks.retention_bench [messages] [chats] [max_count]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+from src.domain.chats.entities import RetentionPolicy
+from src.domain.messages.entities import SourceType
+from src.domain.messages.retention import RetentionJob
+from src.domain.messages.services import MessageService
+from src.infrastructure.memory import MemoryChatRepository
+from src.infrastructure.sqlite import SQLiteDatabase, SQLiteMessageRepository
+
+
+async def main(messages: int, chats: int, max_count: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        database = SQLiteDatabase(str(path))
+        await database.migrate()
+        message_repository = SQLiteMessageRepository(database)
+        chat_ids = [uuid4() for _ in range(chats)]
+        for i in range(messages):
+            await message_repository.create(
+                chat_ids[i % chats], SourceType.GROUP, uuid4(), f"message {i} " * 10
+            )
+        await database.run(lambda c: c.execute("PRAGMA wal_checkpoint(TRUNCATE)"))
+        size = path.stat().st_size
+
+        service = MessageService(
+            message_repository, retention=RetentionPolicy(max_count=max_count)
+        )
+        job = RetentionJob(service, message_repository, MemoryChatRepository(), pause=0)
+        started = time.perf_counter()
+        stats = await job.purge_all()
+        elapsed = time.perf_counter() - started
+        print(
+            f"purge: {stats.messages} messages in {elapsed:.2f} s "
+            f"({stats.messages / elapsed:.0f} msg/s), "
+            f"reclaimed {stats.bytes / 2**20:.1f} MiB of {size / 2**20:.1f} MiB"
+        )
+        database.close()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    asyncio.run(main(*(args or [200_000, 100, 500])))
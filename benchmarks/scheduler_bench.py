@@ -0,0 +1,60 @@
+"""Стоимость тика иерархического колеса таймеров при большом числе таймеров
+
+Таймеры раскиданы на сутки вперед, замеряются пустые тики и тики со
+срабатыванием, а также время постановки таймера.
+
+Запуск: python -m benchmarks.scheduler_bench [timers]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from uuid import uuid4
+
+from src.common.timing_wheel import HierarchicalTimingWheel
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def main(timers: int):
+    clock = Clock()
+    wheel: HierarchicalTimingWheel = HierarchicalTimingWheel(tick=1.0, clock=clock)
+    keys = [uuid4() for _ in range(timers)]
+    deadlines = [clock.now + random.uniform(1, 86_400) for _ in range(timers)]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for key, deadline in zip(keys, deadlines):
+        wheel.schedule(key, deadline)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{timers} timers: schedule={elapsed / timers * 1e6:.2f}us "
+        f"state={current / timers:.0f}B/timer ({current / 2**20:.0f}MiB)"
+    )
+
+    ticks = []
+    fired = 0
+    for _ in range(3600):
+        clock.now += 1
+        started = time.perf_counter()
+        fired += len(wheel.advance())
+        ticks.append(time.perf_counter() - started)
+    ticks.sort()
+    print(
+        f"tick over 1h: p50={ticks[len(ticks) // 2] * 1e6:.0f}us "
+        f"p99={ticks[len(ticks) * 99 // 100] * 1e6:.0f}us "
+        f"max={ticks[-1] * 1000:.1f}ms fired={fired} pending={len(wheel)}"
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
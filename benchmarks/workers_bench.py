@@ -0,0 +1,94 @@
+"""Пропускная способность отправки сообщений: один процесс против пула воркеров
+
+Клиенты параллельно отправляют сообщения в случайные группы. Сравнивается
+обычный `MessageService` в текущем процессе и `ShardedMessageService` поверх
+пула из 1, 2, 4... воркеров (до числа ядер): по одному `send` и пачками
+`send_many`. Вызов воркера стоит сериализации и переключения процессов,
+поэтому по одному пул медленнее процесса, пока ядер меньше, чем нужно на
+эти расходы; пачка размывает их по `batch` сообщениям. На одном ядре пул
+выигрыша не дает: воркеры и фронт делят одно ядро.
+
+Запуск: python -m benchmarks.workers_bench [messages] [clients] [batch]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from uuid import uuid4
+
+from src.domain.messages.entities import SourceType
+from src.infrastructure.workers import (
+    SendRequest,
+    ShardedChatService,
+    ShardedMessageService,
+    WorkerPool,
+    memory_services,
+)
+
+
+async def load(
+    chat_service, message_service, messages: int, clients: int, batch: int = 1
+) -> float:
+    owner_id = uuid4()
+    chats = [await chat_service.create_group(str(i), owner_id) for i in range(256)]
+
+    async def client(count: int):
+        if batch > 1:
+            for _ in range(count // batch):
+                await message_service.send_many(
+                    [
+                        SendRequest(
+                            random.choice(chats).id, SourceType.GROUP, owner_id, "hello"
+                        )
+                        for _ in range(batch)
+                    ]
+                )
+            return
+        for _ in range(count):
+            chat = random.choice(chats)
+            await message_service.send(chat.id, SourceType.GROUP, owner_id, "hello")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(messages // clients) for _ in range(clients)))
+    return messages / (time.perf_counter() - started)
+
+
+async def main(messages: int, clients: int, batch: int):
+    services = memory_services(0, 1)
+    rate = await load(services["chats"], services["messages"], messages, clients)
+    print(f"in-process: {rate:.0f} msg/s")
+
+    cores = os.cpu_count() or 1
+    workers = 1
+    while True:
+        pool = WorkerPool(workers=workers)
+        await pool.start()
+        try:
+            chat_service = ShardedChatService(pool)
+            message_service = ShardedMessageService(pool)
+            rate = await load(chat_service, message_service, messages, clients)
+            batched = await load(
+                chat_service, message_service, messages, clients // batch or 1, batch
+            )
+        finally:
+            await pool.close()
+        print(
+            f"{workers} workers: {rate:.0f} msg/s, "
+            f"send_many({batch}): {batched:.0f} msg/s"
+        )
+        if workers >= max(cores, 2):
+            break
+        workers *= 2
+    print(f"cores: {cores}")
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+            int(sys.argv[2]) if len(sys.argv) > 2 else 256,
+            int(sys.argv[3]) if len(sys.argv) > 3 else 64,
+        )
+    )
@@ -0,0 +1,81 @@
+"""Пользователи, чаты и участники с уникальными индексами для upsert
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+from src.infrastructure.sqla.schema import BinaryUuid, IsoDateTime, Seconds
+
+revision: str = "0001"
+down_revision: str | None = None
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", BinaryUuid(), primary_key=True),
+        sa.Column("name", sa.String(255), nullable=False),
+        sa.Column("email", sa.String(320), nullable=False),
+        sa.Column("hashed_password", sa.String(255), nullable=False),
+        sa.Column("created_at", IsoDateTime(), nullable=False),
+        sa.Column("updated_at", IsoDateTime()),
+        sa.Column("token_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+    # Цель ON CONFLICT при создании пользователя
+    op.create_index("users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "chats",
+        sa.Column("id", BinaryUuid(), primary_key=True),
+        sa.Column("chat_type", sa.String(16), nullable=False),
+        sa.Column("title", sa.String(255), nullable=False),
+        sa.Column("created_at", IsoDateTime(), nullable=False),
+        sa.Column("updated_at", IsoDateTime(), nullable=False),
+        sa.Column("personal_key", sa.String(64)),
+        sa.Column("deleted_at", IsoDateTime()),
+        sa.Column("retention_max_age", Seconds()),
+        sa.Column("retention_max_count", sa.Integer()),
+    )
+    # Цель ON CONFLICT при создании личного чата
+    op.create_index("chats_personal_key", "chats", ["personal_key"], unique=True)
+    op.create_index(
+        "chats_deleted",
+        "chats",
+        ["deleted_at"],
+        sqlite_where=sa.text("deleted_at IS NOT NULL"),
+        postgresql_where=sa.text("deleted_at IS NOT NULL"),
+    )
+
+    # Цель ON CONFLICT при добавлении участника — первичный ключ
+    op.create_table(
+        "chat_members",
+        sa.Column(
+            "chat_id",
+            BinaryUuid(),
+            sa.ForeignKey("chats.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("user_id", BinaryUuid(), primary_key=True),
+        sa.Column("permissions", sa.Integer(), nullable=False),
+        sa.Column("invited_by", BinaryUuid()),
+        sa.Column("joined_at", IsoDateTime()),
+    )
+    op.create_index("chat_members_user", "chat_members", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("chat_members_user", table_name="chat_members")
+    op.drop_table("chat_members")
+    op.drop_index("chats_deleted", table_name="chats")
+    op.drop_index("chats_personal_key", table_name="chats")
+    op.drop_table("chats")
+    op.drop_index("users_email", table_name="users")
+    op.drop_table("users")
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from .exceptions import ObjectNotFoundExc
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    loads: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.negative_hits + self.misses
+        return (self.hits + self.negative_hits) / requests if requests else 0.0
+
+
+@dataclass
+class _Entry(Generic[V]):
+    value: V | None
+    expires_at: float
+    negative: bool = False
+
+
+class LoadingCache(Generic[K, V]):
+    """LRU-кэш с загрузкой по промаху
+
+    Одновременные промахи по одному ключу выполняют одну загрузку (single flight).
+    Отсутствие объекта (`ObjectNotFoundExc`) кэшируется на `negative_ttl` секунд.
+    Загрузка, начатая до `invalidate`, не попадает в кэш.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[K], Awaitable[V]],
+        max_size: int = 10_000,
+        ttl: float = 60.0,
+        negative_ttl: float = 5.0,
+        negative_exceptions: Tuple[Type[Exception], ...] = (ObjectNotFoundExc,),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__loader = loader
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__negative_ttl = negative_ttl
+        self.__negative_exceptions = negative_exceptions
+        self.__clock = clock
+        self.__entries: OrderedDict[K, _Entry[V]] = OrderedDict()
+        self.__inflight: Dict[K, asyncio.Task] = {}
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, key: K) -> bool:
+        entry = self.__entries.get(key)
+        return entry is not None and entry.expires_at > self.__clock()
+
+    async def get(self, key: K) -> V:
+        entry = self.__entries.get(key)
+        if entry is not None:
+            if entry.expires_at > self.__clock():
+                self.__entries.move_to_end(key)
+                if entry.negative:
+                    self.stats.negative_hits += 1
+                    raise ObjectNotFoundExc()
+                self.stats.hits += 1
+                return entry.value  # type: ignore[return-value]
+            del self.__entries[key]
+
+        self.stats.misses += 1
+        task = self.__inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.__load(key))
+            self.__inflight[key] = task
+        return await asyncio.shield(task)
+
+    def put(self, key: K, value: V) -> None:
+        self.__inflight.pop(key, None)
+        self.__store(key, _Entry(value, self.__clock() + self.__ttl))
+
+    def items(self) -> List[Tuple[K, V]]:
+        now = self.__clock()
+        return [
+            (key, entry.value)  # type: ignore[misc]
+            for key, entry in self.__entries.items()
+            if not entry.negative and entry.expires_at > now
+        ]
+
+    def invalidate(self, key: K) -> None:
+        self.__entries.pop(key, None)
+        self.__inflight.pop(key, None)
+
+    def clear(self) -> None:
+        self.__entries.clear()
+        self.__inflight.clear()
+
+    async def __load(self, key: K) -> V:
+        task = asyncio.current_task()
+        self.stats.loads += 1
+        try:
+            value = await self.__loader(key)
+        except self.__negative_exceptions:
+            if self.__inflight.get(key) is task:
+                self.__store(
+                    key, _Entry(None, self.__clock() + self.__negative_ttl, True)
+                )
+            raise
+        finally:
+            if self.__inflight.get(key) is task:
+                del self.__inflight[key]
+            else:
+                task = None
+        if task is not None:
+            self.__store(key, _Entry(value, self.__clock() + self.__ttl))
+        return value
+
+    def __store(self, key: K, entry: _Entry[V]) -> None:
+        self.__entries[key] = entry
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+            self.stats.evictions += 1
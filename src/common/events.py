@@ -0,0 +1,198 @@
+import asyncio
+import inspect
+import logging
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, List, Protocol, Type
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, kw_only=True)
+class DomainEvent:
+    occurred_at: datetime = field(default_factory=datetime.now)
+
+
+class AbstractEventPublisher(Protocol):
+    async def publish(self, event: DomainEvent) -> None:
+        """Опубликовать доменное событие
+
+        Не должен блокироваться на медленных обработчиках.
+
+        Args:
+            event (DomainEvent): Событие
+        """
+        ...
+
+
+class HandlerMode(str, Enum):
+    INLINE = "inline"
+    ASYNC = "async"
+    PROCESS = "process"
+
+
+@dataclass
+class HandlerMetrics:
+    received: int = 0
+    processed: int = 0
+    failed: int = 0
+    dropped: int = 0
+    batches: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+
+
+class _Subscription:
+    def __init__(
+        self,
+        name: str,
+        event_type: Type[DomainEvent],
+        handler: Callable[..., Any],
+        mode: HandlerMode,
+        batch_size: int,
+        max_queue: int,
+    ):
+        self.name = name
+        self.event_type = event_type
+        self.handler = handler
+        self.mode = mode
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.metrics = HandlerMetrics()
+        self.queue: Deque[DomainEvent] = deque()
+        self.ready = asyncio.Event()
+        self.worker: asyncio.Task | None = None
+
+
+class EventBus:
+    """Внутрипроцессная шина доменных событий
+
+    Режимы обработчиков:
+        INLINE: `handler(event)` вызывается внутри `publish`.
+        ASYNC: `async handler(events)` получает пачки событий в фоновой задаче.
+        PROCESS: `handler(events)` выполняется в пуле процессов;
+            обработчик и события должны сериализоваться через pickle.
+
+    Очереди ASYNC и PROCESS ограничены `max_queue`: при переполнении новые события
+    отбрасываются и учитываются в метрике `dropped`, `publish` никогда не ждет.
+    """
+
+    def __init__(self, executor: Executor | None = None):
+        self.__executor = executor
+        self.__subscriptions: List[_Subscription] = []
+        self.__routes: Dict[type, List[_Subscription]] = {}
+        self.__closed = False
+
+    def subscribe(
+        self,
+        event_type: Type[DomainEvent],
+        handler: Callable[..., Any],
+        mode: HandlerMode = HandlerMode.INLINE,
+        batch_size: int = 100,
+        max_queue: int = 10_000,
+        name: str | None = None,
+    ) -> None:
+        if mode == HandlerMode.PROCESS and self.__executor is None:
+            raise ValueError("PROCESS handlers require an executor")
+        self.__subscriptions.append(
+            _Subscription(
+                name=name or str(getattr(handler, "__qualname__", repr(handler))),
+                event_type=event_type,
+                handler=handler,
+                mode=mode,
+                batch_size=batch_size,
+                max_queue=max_queue,
+            )
+        )
+        self.__routes.clear()
+
+    def metrics(self) -> Dict[str, HandlerMetrics]:
+        return {sub.name: sub.metrics for sub in self.__subscriptions}
+
+    async def publish(self, event: DomainEvent) -> None:
+        if self.__closed:
+            return
+        for sub in self.__route(type(event)):
+            sub.metrics.received += 1
+            if sub.mode == HandlerMode.INLINE:
+                await self.__run_inline(sub, event)
+            elif len(sub.queue) >= sub.max_queue:
+                sub.metrics.dropped += 1
+            else:
+                sub.queue.append(event)
+                depth = len(sub.queue)
+                sub.metrics.queue_depth = depth
+                if depth > sub.metrics.max_queue_depth:
+                    sub.metrics.max_queue_depth = depth
+                if sub.worker is None:
+                    sub.worker = asyncio.create_task(self.__work(sub))
+                sub.ready.set()
+
+    async def close(self, drain: bool = True) -> None:
+        """Остановить фоновые обработчики
+
+        Args:
+            drain (bool, optional): Дождаться обработки уже принятых событий.
+                По умолчанию True.
+        """
+        self.__closed = True
+        workers = [sub.worker for sub in self.__subscriptions if sub.worker]
+        for sub in self.__subscriptions:
+            if not drain:
+                sub.metrics.dropped += len(sub.queue)
+                sub.queue.clear()
+            sub.ready.set()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for sub in self.__subscriptions:
+            sub.worker = None
+
+    def __route(self, event_type: type) -> List[_Subscription]:
+        subs = self.__routes.get(event_type)
+        if subs is None:
+            subs = [
+                sub
+                for sub in self.__subscriptions
+                if issubclass(event_type, sub.event_type)
+            ]
+            self.__routes[event_type] = subs
+        return subs
+
+    async def __run_inline(self, sub: _Subscription, event: DomainEvent) -> None:
+        try:
+            result = sub.handler(event)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            sub.metrics.failed += 1
+            logger.exception("Event handler %s failed", sub.name)
+        else:
+            sub.metrics.processed += 1
+
+    async def __work(self, sub: _Subscription) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not sub.queue:
+                if self.__closed:
+                    return
+                sub.ready.clear()
+                await sub.ready.wait()
+                continue
+
+            batch = [
+                sub.queue.popleft() for _ in range(min(sub.batch_size, len(sub.queue)))
+            ]
+            sub.metrics.queue_depth = len(sub.queue)
+            try:
+                if sub.mode == HandlerMode.PROCESS:
+                    await loop.run_in_executor(self.__executor, sub.handler, batch)
+                else:
+                    await sub.handler(batch)
+            except Exception:
+                sub.metrics.failed += len(batch)
+                logger.exception("Event handler %s failed", sub.name)
+            else:
+                sub.metrics.processed += len(batch)
+            sub.metrics.batches += 1
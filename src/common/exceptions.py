@@ -8,3 +8,23 @@ class ObjectNotFoundExc(Exception):
 
 class AccessDeniedExc(Exception):
     pass
+
+
+class PayloadTooLargeExc(Exception):
+    pass
+
+
+class QueryBudgetExceededExc(Exception):
+    pass
+
+
+class InvalidCredentialsExc(Exception):
+    pass
+
+
+class OverloadedExc(Exception):
+    pass
+
+
+class InvalidFormatExc(Exception):
+    pass
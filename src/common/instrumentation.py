@@ -0,0 +1,249 @@
+import inspect
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_SUB_BITS = 3
+_SUB_COUNT = 1 << _SUB_BITS
+_BUCKETS = (64 - _SUB_BITS + 1) * _SUB_COUNT
+
+
+def _bucket(value: int) -> int:
+    shift = value.bit_length() - _SUB_BITS - 1
+    return value if shift <= 0 else (shift << _SUB_BITS) + (value >> shift)
+
+
+def _bucket_upper(index: int) -> int:
+    if index < _SUB_COUNT:
+        return index + 1
+    shift = index // _SUB_COUNT - 1
+    return (index % _SUB_COUNT + _SUB_COUNT + 1) << shift
+
+
+class LatencyHistogram:
+    """Гистограмма задержек в наносекундах в стиле HDR
+
+    Корзины лог-линейные: 8 корзин на каждую степень двойки, относительная
+    погрешность не больше 12.5%. Запись стоит O(1) и не берет блокировок,
+    поэтому гистограмма должна обновляться из одного потока (цикла событий).
+    """
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * _BUCKETS))
+        self.total = 0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    @property
+    def max(self) -> int:
+        for index in range(_BUCKETS - 1, -1, -1):
+            if self.counts[index]:
+                return _bucket_upper(index) - 1
+        return 0
+
+    def record(self, value: int) -> None:
+        self.counts[_bucket(value)] += 1
+        self.total += value
+
+    def quantile(self, q: float) -> int:
+        total = self.count
+        if total == 0:
+            return 0
+        rank = max(1, int(q * total + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return _bucket_upper(index) - 1
+        return 0
+
+    def count_below(self, value: int) -> int:
+        return sum(self.counts[: _bucket(value)])
+
+
+_request_calls: ContextVar[Counter | None] = ContextVar("request_calls", default=None)
+
+_EXPOSITION_BOUNDS = tuple(1 << shift for shift in range(10, 35))
+_LABELS = {
+    "service": ("service", "method"),
+    "repository": ("repository", "method"),
+    "section": ("component", "section"),
+}
+
+
+def patch_methods(
+    obj: T, wrap: Callable[[str, Callable[..., Any]], Callable[..., Any]]
+) -> T:
+    """Заменить корутинные методы экземпляра обертками
+
+    Обертываются публичные методы и методы с одним подчеркиванием
+    (например `_can_execute`), чтобы внутренние вызовы тоже проходили через них.
+
+    Args:
+        obj (T): Экземпляр сервиса или репозитория
+        wrap (Callable): Фабрика обертки: (имя метода, метод) -> обертка
+
+    Returns:
+        T: Тот же экземпляр
+    """
+    for name, method in inspect.getmembers(obj, inspect.iscoroutinefunction):
+        if "__" in name:
+            continue
+        setattr(obj, name, wrap(name, method))
+    return obj
+
+
+class MetricsRegistry:
+    """Реестр метрик сервисного слоя
+
+    Собирает гистограммы задержек методов сервисов и репозиториев, счетчики
+    вызовов репозиториев и число вызовов репозиториев на запрос. Отключение
+    означает отсутствие оберток: неинструментированные объекты ничего не платят.
+    """
+
+    def __init__(self):
+        self.__latencies: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        self.__calls: Dict[Tuple[str, str], int] = {}
+        self.__per_request: Dict[str, LatencyHistogram] = {}
+
+    def histogram(self, kind: str, component: str, method: str) -> LatencyHistogram:
+        key = (kind, component, method)
+        histogram = self.__latencies.get(key)
+        if histogram is None:
+            histogram = self.__latencies[key] = LatencyHistogram()
+        return histogram
+
+    def repository_calls(self) -> Dict[Tuple[str, str], int]:
+        return dict(self.__calls)
+
+    def instrument_service(self, service: T, name: str) -> T:
+        def wrap(method_name: str, method: Callable[..., Any]):
+            histogram = self.histogram("service", name, method_name)
+            return _timed(method, histogram)
+
+        return patch_methods(service, wrap)
+
+    def instrument_repository(self, repository: T, name: str) -> T:
+        calls = self.__calls
+
+        def wrap(method_name: str, method: Callable[..., Any]):
+            histogram = self.histogram("repository", name, method_name)
+            key = (name, method_name)
+            calls.setdefault(key, 0)
+
+            @wraps(method)
+            async def wrapper(*args, **kwargs):
+                calls[key] += 1
+                request = _request_calls.get()
+                if request is not None:
+                    request[key] += 1
+                started = time.perf_counter_ns()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    histogram.record(time.perf_counter_ns() - started)
+
+            return wrapper
+
+        return patch_methods(repository, wrap)
+
+    @contextmanager
+    def request(self, name: str) -> Iterator[Counter]:
+        """Область запроса: считает вызовы репозиториев внутри нее
+
+        Args:
+            name (str): Название запроса (например, метод API)
+
+        Yields:
+            Counter: Число вызовов по (репозиторий, метод)
+        """
+        calls: Counter = Counter()
+        token = _request_calls.set(calls)
+        try:
+            yield calls
+        finally:
+            _request_calls.reset(token)
+            histogram = self.__per_request.get(name)
+            if histogram is None:
+                histogram = self.__per_request[name] = LatencyHistogram()
+            histogram.record(sum(calls.values()))
+
+    @contextmanager
+    def timer(self, component: str, section: str) -> Iterator[None]:
+        histogram = self.histogram("section", component, section)
+        started = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            histogram.record(time.perf_counter_ns() - started)
+
+    def render_prometheus(self, prefix: str = "messenger") -> str:
+        lines: List[str] = []
+        kinds: Dict[str, List[Tuple[str, str, LatencyHistogram]]] = {}
+        for (kind, component, method), histogram in sorted(self.__latencies.items()):
+            kinds.setdefault(kind, []).append((component, method, histogram))
+
+        for kind, items in kinds.items():
+            metric = f"{prefix}_{kind}_latency_seconds"
+            component_label, method_label = _LABELS[kind]
+            lines.append(f"# TYPE {metric} histogram")
+            for component, method, histogram in items:
+                labels = f'{component_label}="{component}",{method_label}="{method}"'
+                for bound in _EXPOSITION_BOUNDS:
+                    lines.append(
+                        f'{metric}_bucket{{{labels},le="{bound / 1e9:.9g}"}} '
+                        f"{histogram.count_below(bound)}"
+                    )
+                lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum{{{labels}}} {histogram.total / 1e9:.9g}")
+                lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+        if self.__calls:
+            metric = f"{prefix}_repository_calls_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (repository, method), count in sorted(self.__calls.items()):
+                lines.append(
+                    f'{metric}{{repository="{repository}",method="{method}"}} {count}'
+                )
+
+        if self.__per_request:
+            metric = f"{prefix}_request_repository_calls"
+            lines.append(f"# TYPE {metric} summary")
+            for name, histogram in sorted(self.__per_request.items()):
+                for q in (0.5, 0.99):
+                    lines.append(
+                        f'{metric}{{request="{name}",quantile="{q}"}} '
+                        f"{histogram.quantile(q)}"
+                    )
+                lines.append(f'{metric}_sum{{request="{name}"}} {histogram.total}')
+                lines.append(f'{metric}_count{{request="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+def _timed(method: Callable[..., Any], histogram: LatencyHistogram):
+    # LatencyHistogram.record вручную встроен: вызов метода заметен на горячем пути
+    counts = histogram.counts
+    clock = time.perf_counter_ns
+
+    @wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = clock()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            elapsed = clock() - started
+            shift = elapsed.bit_length() - 4
+            counts[elapsed if shift <= 0 else (shift << 3) + (elapsed >> shift)] += 1
+            histogram.total += elapsed
+
+    return wrapper
@@ -0,0 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class _Entry:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class KeyedLock(Generic[K]):
+    """Набор asyncio-блокировок по ключу
+
+    Блокировка создается при первом обращении и удаляется, когда ее никто не
+    держит и не ждет, поэтому память пропорциональна числу ключей в работе,
+    а не числу ключей вообще. Разные ключи не блокируют друг друга.
+    Блокировка не реентерабельна и действует только внутри процесса.
+    """
+
+    def __init__(self):
+        self.__entries: Dict[K, _Entry] = {}
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def locked(self, key: K) -> bool:
+        entry = self.__entries.get(key)
+        return entry is not None and entry.lock.locked()
+
+    @asynccontextmanager
+    async def __call__(self, key: K) -> AsyncIterator[None]:
+        entry = self.__entries.get(key)
+        if entry is None:
+            entry = self.__entries[key] = _Entry()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self.__entries[key]
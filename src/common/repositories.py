@@ -67,3 +67,16 @@ class AbstractDelete(Protocol[T_ID, T_OBJ]):
             ObjectNotFoundExc: Объект не найден
         """
         ...
+
+
+class AbstractChangeSequence(Protocol):
+    async def get_change_seq(self) -> int:
+        """Получить номер последнего изменения хранилища
+
+        Номер монотонно растет с каждой записью и позволяет проверить, что
+        данные, сохраненные вне хранилища, не устарели.
+
+        Returns:
+            int: Номер последнего изменения
+        """
+        ...
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Generator, Iterable, Iterator, List, Protocol, Sequence, Tuple
+
+from .repositories import AbstractChangeSequence
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MSNP"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHQII")
+_SECTION = struct.Struct("<HIQ")
+_RECORD = struct.Struct("<I")
+
+
+class Snapshottable(Protocol):
+    snapshot_name: str
+
+    def dump(self) -> Iterable[bytes]:
+        """Сериализовать состояние в записи
+
+        Returns:
+            Iterable[bytes]: Записи снимка
+        """
+        ...
+
+    def restore(self, records: Iterable[memoryview]) -> int:
+        """Восстановить состояние из записей
+
+        Args:
+            records (Iterable[memoryview]): Записи снимка, действительные только
+                во время вызова
+
+        Returns:
+            int: Количество восстановленных записей
+        """
+        ...
+
+
+def _encode(change_seq: int, sections: Sequence[Tuple[str, List[bytes]]]) -> bytes:
+    body = bytearray()
+    for name, records in sections:
+        encoded_name = name.encode()
+        size = sum(_RECORD.size + len(record) for record in records)
+        body += _SECTION.pack(len(encoded_name), len(records), size)
+        body += encoded_name
+        for record in records:
+            body += _RECORD.pack(len(record))
+            body += record
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, change_seq, len(sections), zlib.crc32(body)
+    )
+    return header + bytes(body)
+
+
+def _records(view: memoryview, count: int) -> Generator[memoryview, None, None]:
+    offset = 0
+    for _ in range(count):
+        (size,) = _RECORD.unpack_from(view, offset)
+        offset += _RECORD.size
+        with view[offset : offset + size] as record:
+            yield record
+        offset += size
+
+
+class SnapshotStore:
+    """Снимок состояния в памяти в компактном двоичном файле
+
+    Формат: заголовок (magic, версия формата, номер изменения хранилища,
+    число секций, crc32 тела) и секции с записями переменной длины.
+    Файл читается через mmap, записи передаются компонентам как memoryview.
+    Снимок, снятый при другом номере изменения, считается устаревшим.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.__path = Path(path)
+
+    async def save(
+        self,
+        components: Sequence[Snapshottable],
+        change_sequence: AbstractChangeSequence,
+    ) -> int:
+        """Сохранить снимок компонентов
+
+        Args:
+            components (Sequence[Snapshottable]): Компоненты
+            change_sequence (AbstractChangeSequence): Источник номера изменения
+
+        Returns:
+            int: Размер снимка в байтах
+        """
+        change_seq = await change_sequence.get_change_seq()
+        sections = [
+            (component.snapshot_name, list(component.dump()))
+            for component in components
+        ]
+        data = _encode(change_seq, sections)
+        await asyncio.to_thread(self.__write, data)
+        return len(data)
+
+    async def load(
+        self,
+        components: Sequence[Snapshottable],
+        change_sequence: AbstractChangeSequence,
+    ) -> bool:
+        """Восстановить компоненты из снимка, если он актуален
+
+        Args:
+            components (Sequence[Snapshottable]): Компоненты
+            change_sequence (AbstractChangeSequence): Источник номера изменения
+
+        Returns:
+            bool: Снимок был загружен
+        """
+        try:
+            f = open(self.__path, "rb")
+        except FileNotFoundError:
+            return False
+
+        by_name = {component.snapshot_name: component for component in components}
+        with f:
+            if os.fstat(f.fileno()).st_size < _HEADER.size:
+                logger.warning("Snapshot %s is truncated", self.__path)
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Все срезы должны быть освобождены до закрытия mmap
+                with memoryview(mm) as view, view[_HEADER.size :] as body:
+                    magic, version, change_seq, count, crc = _HEADER.unpack_from(view)
+                    if magic != MAGIC or version != FORMAT_VERSION:
+                        logger.warning("Snapshot %s has unknown format", self.__path)
+                        return False
+                    if zlib.crc32(body) != crc:
+                        logger.warning("Snapshot %s is corrupted", self.__path)
+                        return False
+                    current = await change_sequence.get_change_seq()
+                    if change_seq != current:
+                        logger.info(
+                            "Snapshot %s is stale: seq %s, repository at %s",
+                            self.__path,
+                            change_seq,
+                            current,
+                        )
+                        return False
+
+                    offset = 0
+                    for _ in range(count):
+                        name_size, records, size = _SECTION.unpack_from(body, offset)
+                        offset += _SECTION.size
+                        name = str(body[offset : offset + name_size], "utf-8")
+                        offset += name_size
+                        component = by_name.get(name)
+                        if component is not None:
+                            with body[offset : offset + size] as section:
+                                reader = _records(section, records)
+                                try:
+                                    component.restore(reader)
+                                finally:
+                                    reader.close()
+                        offset += size
+                    return True
+
+    def __write(self, data: bytes) -> None:
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.__path.with_suffix(self.__path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.__path)
@@ -0,0 +1,203 @@
+import math
+import time
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+
+
+class TimingWheel(Generic[K]):
+    """Хешированное колесо таймеров
+
+    Постановка и отмена таймера стоят O(1), продвижение колеса обходит только
+    слоты, чье время наступило. Для каждого ключа хранится единственный таймер:
+    повторная постановка переносит его.
+    """
+
+    def __init__(
+        self,
+        tick: float = 1.0,
+        slots: int = 512,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__tick = tick
+        self.__slots: List[Set[K]] = [set() for _ in range(slots)]
+        self.__deadlines: Dict[K, float] = {}
+        self.__clock = clock
+        self.__current = self.__tick_of(clock())
+
+    def __len__(self) -> int:
+        return len(self.__deadlines)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.__deadlines
+
+    def deadline(self, key: K) -> float | None:
+        return self.__deadlines.get(key)
+
+    def schedule(self, key: K, deadline: float) -> None:
+        previous = self.__deadlines.get(key)
+        if previous is not None:
+            self.__slot(previous).discard(key)
+        deadline = max(deadline, self.__current * self.__tick)
+        self.__deadlines[key] = deadline
+        self.__slot(deadline).add(key)
+
+    def cancel(self, key: K) -> bool:
+        deadline = self.__deadlines.pop(key, None)
+        if deadline is None:
+            return False
+        self.__slot(deadline).discard(key)
+        return True
+
+    def advance(self, now: float | None = None) -> List[K]:
+        """Продвинуть колесо и вернуть ключи с наступившим сроком
+
+        Args:
+            now (float | None, optional): Текущее время. По умолчанию по часам.
+
+        Returns:
+            List[K]: Истекшие ключи
+        """
+        if now is None:
+            now = self.__clock()
+        target = self.__tick_of(now)
+        steps = min(target - self.__current + 1, len(self.__slots))
+        expired: List[K] = []
+        for step in range(steps):
+            slot = self.__slots[(self.__current + step) % len(self.__slots)]
+            due = [key for key in slot if self.__deadlines[key] <= now]
+            for key in due:
+                slot.discard(key)
+                del self.__deadlines[key]
+            expired.extend(due)
+        self.__current = target
+        return expired
+
+    def __tick_of(self, moment: float) -> int:
+        return math.floor(moment / self.__tick)
+
+    def __slot(self, deadline: float) -> Set[K]:
+        return self.__slots[self.__tick_of(deadline) % len(self.__slots)]
+
+
+class HierarchicalTimingWheel(Generic[K]):
+    """Иерархическое колесо таймеров
+
+    Уровень `i` состоит из `levels[i]` слотов шириной в произведение размеров
+    младших уровней (в тиках). Таймер кладется на самый младший уровень, который
+    покрывает его срок, и спускается вниз, когда время доходит до его слота.
+    Постановка и отмена стоят O(1), продвижение на тик — O(1) амортизированно,
+    независимо от числа таймеров. Срок округляется вверх до тика: таймер
+    никогда не срабатывает раньше срока.
+    """
+
+    def __init__(
+        self,
+        tick: float = 1.0,
+        levels: Sequence[int] = (256, 64, 64, 64),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__tick = tick
+        self.__sizes = tuple(levels)
+        self.__spans = tuple(math.prod(self.__sizes[:i]) for i in range(len(levels)))
+        self.__horizon = self.__spans[-1] * self.__sizes[-1]
+        self.__wheels: List[List[Set[K]]] = [
+            [set() for _ in range(size)] for size in self.__sizes
+        ]
+        self.__overflow: Set[K] = set()
+        self.__due: Set[K] = set()
+        self.__timers: Dict[K, Tuple[float, int, Set[K]]] = {}
+        self.__clock = clock
+        self.__current = math.floor(clock() / tick)
+
+    def __len__(self) -> int:
+        return len(self.__timers)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.__timers
+
+    def deadline(self, key: K) -> float | None:
+        timer = self.__timers.get(key)
+        return timer[0] if timer is not None else None
+
+    def schedule(self, key: K, deadline: float) -> None:
+        self.cancel(key)
+        self.__place(key, deadline, math.ceil(deadline / self.__tick))
+
+    def cancel(self, key: K) -> bool:
+        timer = self.__timers.pop(key, None)
+        if timer is None:
+            return False
+        timer[2].discard(key)
+        return True
+
+    def advance(self, now: float | None = None) -> List[K]:
+        """Продвинуть колесо и вернуть ключи с наступившим сроком
+
+        Args:
+            now (float | None, optional): Текущее время. По умолчанию по часам.
+
+        Returns:
+            List[K]: Истекшие ключи
+        """
+        if now is None:
+            now = self.__clock()
+        target = math.floor(now / self.__tick)
+        expired = self.__take(self.__due)
+        while self.__current < target:
+            if not self.__timers:
+                self.__current = target
+                break
+            self.__current += 1
+            current = self.__current
+            if current % self.__horizon == 0:
+                self.__cascade(self.__overflow)
+            for level in range(len(self.__sizes) - 1, 0, -1):
+                span = self.__spans[level]
+                if current % span == 0:
+                    self.__cascade(
+                        self.__wheels[level][(current // span) % self.__sizes[level]]
+                    )
+            expired.extend(self.__take(self.__wheels[0][current % self.__sizes[0]]))
+            # Спущенные таймеры со сроком в текущем тике попадают в __due
+            expired.extend(self.__take(self.__due))
+        return expired
+
+    def __place(self, key: K, deadline: float, due: int) -> None:
+        current = self.__current
+        if due <= current:
+            bucket = self.__due
+        else:
+            bucket = self.__overflow
+            for size, span, wheel in zip(self.__sizes, self.__spans, self.__wheels):
+                if due // span - current // span < size:
+                    bucket = wheel[(due // span) % size]
+                    break
+        bucket.add(key)
+        self.__timers[key] = (deadline, due, bucket)
+
+    def __cascade(self, bucket: Set[K]) -> None:
+        keys = list(bucket)
+        bucket.clear()
+        for key in keys:
+            deadline, due, _ = self.__timers[key]
+            self.__place(key, deadline, due)
+
+    def __take(self, bucket: Set[K]) -> List[K]:
+        if not bucket:
+            return []
+        keys = list(bucket)
+        bucket.clear()
+        for key in keys:
+            del self.__timers[key]
+        return keys
@@ -0,0 +1,163 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Tuple, TypeVar
+
+from .exceptions import QueryBudgetExceededExc
+from .instrumentation import patch_methods
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RepositoryCall:
+    repository: str
+    method: str
+    shape: str
+    duration_ns: int
+
+
+@dataclass
+class QueryTrace:
+    name: str
+    calls: List[RepositoryCall] = field(default_factory=list)
+
+    def count(self, repository: str | None = None, method: str | None = None) -> int:
+        return sum(
+            1
+            for call in self.calls
+            if (repository is None or call.repository == repository)
+            and (method is None or call.method == method)
+        )
+
+    @property
+    def duration_ns(self) -> int:
+        return sum(call.duration_ns for call in self.calls)
+
+    def repeated(self, threshold: int) -> Dict[Tuple[str, str, str], int]:
+        """Найти вызовы одного метода с одинаковой формой аргументов (N+1)
+
+        Args:
+            threshold (int): Минимальное число повторов
+
+        Returns:
+            Dict[Tuple[str, str, str], int]: (репозиторий, метод, форма) -> повторы
+        """
+        counts = Counter((c.repository, c.method, c.shape) for c in self.calls)
+        return {key: count for key, count in counts.items() if count >= threshold}
+
+
+class BudgetMode(str, Enum):
+    RAISE = "raise"
+    LOG = "log"
+
+
+_active: ContextVar[Tuple[QueryTrace, ...]] = ContextVar("query_traces", default=())
+
+
+def _shape(value: Any) -> str:
+    if isinstance(value, tuple):
+        return "(" + ",".join(_shape(item) for item in value) + ")"
+    if isinstance(value, (list, set, frozenset)):
+        inner = _shape(next(iter(value))) if value else ""
+        return f"{type(value).__name__}[{inner}]"
+    return type(value).__name__
+
+
+def arguments_shape(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+    parts = [_shape(arg) for arg in args]
+    parts.extend(f"{key}={_shape(kwargs[key])}" for key in sorted(kwargs))
+    return ",".join(parts)
+
+
+def trace_repository(repository: T, name: str) -> T:
+    """Записывать вызовы репозитория в активные области `query_budget`
+
+    Вне областей обертка только проверяет контекстную переменную.
+
+    Args:
+        repository (T): Экземпляр репозитория
+        name (str): Название репозитория в трассе
+
+    Returns:
+        T: Тот же экземпляр
+    """
+
+    def wrap(method_name: str, method: Callable[..., Any]):
+        @wraps(method)
+        async def wrapper(*args, **kwargs):
+            traces = _active.get()
+            if not traces:
+                return await method(*args, **kwargs)
+            started = time.perf_counter_ns()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                call = RepositoryCall(
+                    repository=name,
+                    method=method_name,
+                    shape=arguments_shape(args, kwargs),
+                    duration_ns=time.perf_counter_ns() - started,
+                )
+                for trace in traces:
+                    trace.calls.append(call)
+
+        return wrapper
+
+    return patch_methods(repository, wrap)
+
+
+@contextmanager
+def query_budget(
+    name: str,
+    max_calls: int | None = None,
+    n_plus_one_threshold: int | None = None,
+    mode: BudgetMode = BudgetMode.RAISE,
+) -> Iterator[QueryTrace]:
+    """Область трассировки вызовов репозиториев с бюджетом
+
+    Бюджет проверяется при выходе из области, чтобы не прерывать операцию
+    на середине.
+
+    Args:
+        name (str): Название операции
+        max_calls (int | None, optional): Максимум вызовов репозиториев
+        n_plus_one_threshold (int | None, optional): Сколько одинаковых вызовов
+            считать N+1
+        mode (BudgetMode, optional): Бросить исключение или записать в лог
+
+    Yields:
+        QueryTrace: Трасса вызовов
+
+    Raises:
+        QueryBudgetExceededExc: Бюджет превышен (в режиме RAISE)
+    """
+    trace = QueryTrace(name=name)
+    token = _active.set(_active.get() + (trace,))
+    try:
+        yield trace
+    finally:
+        _active.reset(token)
+
+    problems = []
+    if max_calls is not None and len(trace.calls) > max_calls:
+        problems.append(f"{len(trace.calls)} repository calls > budget {max_calls}")
+    if n_plus_one_threshold is not None:
+        for (repository, method, shape), count in trace.repeated(
+            n_plus_one_threshold
+        ).items():
+            problems.append(f"N+1: {repository}.{method}({shape}) x{count}")
+    if not problems:
+        return
+
+    message = f"{name}: " + "; ".join(problems)
+    if mode == BudgetMode.RAISE:
+        raise QueryBudgetExceededExc(message)
+    logger.warning(message)
@@ -0,0 +1,190 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from ...common.exceptions import OverloadedExc
+
+_ALGORITHM = "scrypt"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _maxmem(n: int, r: int, p: int) -> int:
+    return 128 * r * (n + p + 2) + 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ScryptParams:
+    n: int = 2**14
+    r: int = 8
+    p: int = 1
+    salt_size: int = 16
+    key_size: int = 32
+
+
+def hash_password(password: str, params: ScryptParams) -> str:
+    """Вычислить хэш пароля
+
+    Функция чисто вычислительная и сериализуемая, чтобы выполняться в пуле процессов.
+
+    Args:
+        password (str): Пароль
+        params (ScryptParams): Параметры scrypt
+
+    Returns:
+        str: Хэш в формате `scrypt$n$r$p$salt$key`
+    """
+    salt = os.urandom(params.salt_size)
+    key = hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=params.n,
+        r=params.r,
+        p=params.p,
+        maxmem=_maxmem(params.n, params.r, params.p),
+        dklen=params.key_size,
+    )
+    return "$".join(
+        (
+            _ALGORITHM,
+            str(params.n),
+            str(params.r),
+            str(params.p),
+            _b64encode(salt),
+            _b64encode(key),
+        )
+    )
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """Проверить пароль по хэшу за постоянное время
+
+    Args:
+        password (str): Пароль
+        hashed_password (str): Хэш из `hash_password`
+
+    Returns:
+        bool: Пароль подходит
+    """
+    try:
+        algorithm, n, r, p, salt, key = hashed_password.split("$")
+        if algorithm != _ALGORITHM:
+            return False
+        expected = _b64decode(key)
+        actual = hashlib.scrypt(
+            password.encode(),
+            salt=_b64decode(salt),
+            n=int(n),
+            r=int(r),
+            p=int(p),
+            maxmem=_maxmem(int(n), int(r), int(p)),
+            dklen=len(expected),
+        )
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(hashed_password: str, params: ScryptParams) -> bool:
+    """Проверить, устарели ли параметры хэша
+
+    Args:
+        hashed_password (str): Хэш из `hash_password`
+        params (ScryptParams): Текущие параметры
+
+    Returns:
+        bool: Хэш нужно пересчитать
+    """
+    try:
+        algorithm, n, r, p, salt, key = hashed_password.split("$")
+        return (
+            algorithm != _ALGORITHM
+            or (int(n), int(r), int(p)) != (params.n, params.r, params.p)
+            or len(_b64decode(salt)) != params.salt_size
+            or len(_b64decode(key)) != params.key_size
+        )
+    except ValueError:
+        return True
+
+
+@dataclass
+class HashingPoolMetrics:
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    running: int = 0
+    completed: int = 0
+    rejected: int = 0
+
+
+class HashingPool:
+    """Ограниченный пул для хэширования паролей вне цикла событий
+
+    Одновременно выполняется не больше `max_workers` задач, остальные ждут в
+    очереди; при очереди длиннее `max_queue` запрос отклоняется с `OverloadedExc`.
+    """
+
+    def __init__(
+        self,
+        params: ScryptParams = ScryptParams(),
+        max_workers: int | None = None,
+        max_queue: int = 1024,
+        executor: Executor | None = None,
+    ):
+        self.params = params
+        self.__max_workers = max_workers or os.cpu_count() or 1
+        self.__max_queue = max_queue
+        self.__executor = executor
+        self.__slots = asyncio.Semaphore(self.__max_workers)
+        self.metrics = HashingPoolMetrics()
+
+    async def hash(self, password: str) -> str:
+        return await self.__submit(hash_password, password, self.params)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self.__submit(verify_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return needs_rehash(hashed_password, self.params)
+
+    def shutdown(self) -> None:
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+            self.__executor = None
+
+    async def __submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        metrics = self.metrics
+        if metrics.queue_depth >= self.__max_queue:
+            metrics.rejected += 1
+            raise OverloadedExc()
+
+        metrics.queue_depth += 1
+        metrics.max_queue_depth = max(metrics.max_queue_depth, metrics.queue_depth)
+        try:
+            await self.__slots.acquire()
+        finally:
+            metrics.queue_depth -= 1
+
+        metrics.running += 1
+        try:
+            if self.__executor is None:
+                # multiprocessing тяжел при импорте, пул нужен не каждому воркеру
+                from concurrent.futures import ProcessPoolExecutor
+
+                self.__executor = ProcessPoolExecutor(self.__max_workers)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.__executor, fn, *args)
+        finally:
+            metrics.running -= 1
+            metrics.completed += 1
+            self.__slots.release()
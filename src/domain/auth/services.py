@@ -0,0 +1,75 @@
+from typing import Protocol
+
+from ...common.exceptions import InvalidCredentialsExc, ObjectNotFoundExc
+from ..users.entities import User
+from ..users.services import AbstractUserService
+from .hashing import HashingPool
+
+
+class AbstractAuthService(Protocol):
+    async def register(self, name: str, email: str, password: str) -> User:
+        """Зарегистрировать пользователя
+
+        Args:
+            name (str): Имя
+            email (str): Электронный адрес
+            password (str): Пароль
+
+        Returns:
+            User: Объект пользователя
+
+        Raises:
+            AlreadyExistsExc: Пользователь с таким EMail уже существует
+            OverloadedExc: Очередь хэширования переполнена
+        """
+        ...
+
+    async def authenticate(self, email: str, password: str) -> User:
+        """Проверить учетные данные пользователя
+
+        Если параметры хэширования обновились, хэш пароля пересчитывается.
+
+        Args:
+            email (str): Электронный адрес
+            password (str): Пароль
+
+        Returns:
+            User: Объект пользователя
+
+        Raises:
+            InvalidCredentialsExc: Неверный EMail или пароль
+            OverloadedExc: Очередь хэширования переполнена
+        """
+        ...
+
+
+class AuthService:
+    def __init__(self, user_service: AbstractUserService, hashing_pool: HashingPool):
+        self.__user_service = user_service
+        self.__pool = hashing_pool
+        self.__dummy_hash: str | None = None
+
+    async def register(self, name: str, email: str, password: str) -> User:
+        hashed_password = await self.__pool.hash(password)
+        return await self.__user_service.create(
+            name=name, email=email, hashed_password=hashed_password
+        )
+
+    async def authenticate(self, email: str, password: str) -> User:
+        try:
+            user = await self.__user_service.get_by_email(email=email)
+        except ObjectNotFoundExc:
+            # Проверка по фиктивному хэшу выравнивает время ответа
+            if self.__dummy_hash is None:
+                self.__dummy_hash = await self.__pool.hash("")
+            await self.__pool.verify(password, self.__dummy_hash)
+            raise InvalidCredentialsExc()
+
+        if not await self.__pool.verify(password, user.hashed_password):
+            raise InvalidCredentialsExc()
+
+        if self.__pool.needs_rehash(user.hashed_password):
+            user = await self.__user_service.update(
+                user.id, hashed_password=await self.__pool.hash(password)
+            )
+        return user
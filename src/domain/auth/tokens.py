@@ -0,0 +1,218 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Protocol
+from uuid import UUID
+
+from ...common.cache import LoadingCache
+from ...common.exceptions import InvalidCredentialsExc, ObjectNotFoundExc
+from ..users.entities import User
+from ..users.services import AbstractUserService
+
+_FORMAT = 1
+_PAYLOAD = struct.Struct(">B16sIQQ")
+_VERSION_RECORD = struct.Struct("<16sI")
+
+
+@dataclass(frozen=True)
+class SessionClaims:
+    user_id: UUID
+    token_version: int
+    issued_at: int
+    expires_at: int
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SessionTokenCodec:
+    """Подписанные HMAC-SHA256 токены сессии без состояния на сервере
+
+    Токен: `base64url(payload).base64url(hmac)`, payload содержит ID пользователя,
+    версию токенов пользователя и время выпуска/истечения.
+    """
+
+    def __init__(
+        self,
+        secret: bytes,
+        ttl: int = 30 * 24 * 3600,
+        clock: Callable[[], float] = time.time,
+    ):
+        if len(secret) < 32:
+            raise ValueError("Session secret must be at least 32 bytes")
+        self.__secret = secret
+        self.__ttl = ttl
+        self.__clock = clock
+
+    def issue(self, user_id: UUID, token_version: int) -> str:
+        now = int(self.__clock())
+        payload = _PAYLOAD.pack(
+            _FORMAT, user_id.bytes, token_version, now, now + self.__ttl
+        )
+        return f"{_b64encode(payload)}.{_b64encode(self.__sign(payload))}"
+
+    def decode(self, token: str) -> SessionClaims:
+        """Проверить подпись и срок действия токена
+
+        Args:
+            token (str): Токен
+
+        Returns:
+            SessionClaims: Содержимое токена
+
+        Raises:
+            InvalidCredentialsExc: Токен поврежден, подделан или истек
+        """
+        try:
+            encoded_payload, encoded_signature = token.split(".")
+            payload = _b64decode(encoded_payload)
+            signature = _b64decode(encoded_signature)
+        except (ValueError, binascii.Error):
+            raise InvalidCredentialsExc()
+        if len(payload) != _PAYLOAD.size or not hmac.compare_digest(
+            signature, self.__sign(payload)
+        ):
+            raise InvalidCredentialsExc()
+
+        fmt, user_id, token_version, issued_at, expires_at = _PAYLOAD.unpack(payload)
+        if fmt != _FORMAT:
+            raise InvalidCredentialsExc()
+        claims = SessionClaims(
+            user_id=UUID(bytes=user_id),
+            token_version=token_version,
+            issued_at=issued_at,
+            expires_at=expires_at,
+        )
+        if claims.expires_at <= self.__clock():
+            raise InvalidCredentialsExc()
+        return claims
+
+    def __sign(self, payload: bytes) -> bytes:
+        return hmac.new(self.__secret, payload, hashlib.sha256).digest()
+
+
+class AbstractSessionService(Protocol):
+    async def issue(self, user: User) -> str:
+        """Выпустить токен сессии
+
+        Args:
+            user (User): Пользователь
+
+        Returns:
+            str: Токен
+        """
+        ...
+
+    async def authenticate(self, token: str) -> SessionClaims:
+        """Определить пользователя по токену
+
+        Args:
+            token (str): Токен
+
+        Returns:
+            SessionClaims: Содержимое действительного токена
+
+        Raises:
+            InvalidCredentialsExc: Токен недействителен или отозван
+        """
+        ...
+
+    async def revoke(self, user_id: UUID) -> None:
+        """Отозвать все токены пользователя
+
+        Args:
+            user_id (UUID): ID пользователя
+
+        Raises:
+            ObjectNotFoundExc: Пользователь не найден
+        """
+        ...
+
+
+class SessionService:
+    """Проверка токенов сессии без обращения к репозиторию на частом пути
+
+    Недавно проверенные токены хранятся в LRU, текущие версии токенов
+    пользователей кэшируются на `version_ttl` секунд. Отзыв в этом процессе
+    действует сразу, в остальных — не позже чем через `version_ttl`.
+    В снимок (`SnapshotStore`) попадают только версии токенов: проверенные
+    токены дешево проверить заново.
+    """
+
+    snapshot_name = "session_versions"
+
+    def __init__(
+        self,
+        user_service: AbstractUserService,
+        codec: SessionTokenCodec,
+        max_tokens: int = 100_000,
+        max_users: int = 100_000,
+        version_ttl: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.__user_service = user_service
+        self.__codec = codec
+        self.__clock = clock
+        self.__max_tokens = max_tokens
+        self.__verified: OrderedDict[str, SessionClaims] = OrderedDict()
+        self.__versions: LoadingCache[UUID, int] = LoadingCache(
+            self.__load_version, max_size=max_users, ttl=version_ttl
+        )
+
+    async def issue(self, user: User) -> str:
+        # Берется большая из версий: устаревший `user` не откатывает
+        # выполненный отзыв, а устаревший кэш — отзыв из другого процесса
+        version = max(user.token_version, await self.__versions.get(user.id))
+        self.__versions.put(user.id, version)
+        return self.__codec.issue(user.id, version)
+
+    async def authenticate(self, token: str) -> SessionClaims:
+        claims = self.__verified.get(token)
+        if claims is None:
+            claims = self.__codec.decode(token)
+            self.__verified[token] = claims
+            if len(self.__verified) > self.__max_tokens:
+                self.__verified.popitem(last=False)
+        else:
+            self.__verified.move_to_end(token)
+            if claims.expires_at <= self.__clock():
+                del self.__verified[token]
+                raise InvalidCredentialsExc()
+
+        try:
+            current_version = await self.__versions.get(claims.user_id)
+        except ObjectNotFoundExc:
+            raise InvalidCredentialsExc()
+        if claims.token_version != current_version:
+            self.__verified.pop(token, None)
+            raise InvalidCredentialsExc()
+        return claims
+
+    async def revoke(self, user_id: UUID) -> None:
+        user = await self.__user_service.revoke_sessions(user_id)
+        self.__versions.put(user.id, user.token_version)
+
+    def dump(self) -> Iterator[bytes]:
+        for user_id, version in self.__versions.items():
+            yield _VERSION_RECORD.pack(user_id.bytes, version)
+
+    def restore(self, records: Iterable[memoryview]) -> int:
+        restored = 0
+        for record in records:
+            user_id, version = _VERSION_RECORD.unpack(record)
+            self.__versions.put(UUID(bytes=user_id), version)
+            restored += 1
+        return restored
+
+    async def __load_version(self, user_id: UUID) -> int:
+        return (await self.__user_service.get(user_id)).token_version
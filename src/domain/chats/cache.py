@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import struct
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, Iterator, Tuple
+from uuid import UUID
+
+from ...common.cache import CacheStats, LoadingCache
+from .entities import Chat, ChatMemberPermissions, ChatType, RetentionPolicy
+from .repositories import AbstractChatMemberRepository, AbstractChatRepository
+
+_RECORD = struct.Struct("<16sBqqBIIqq")
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_CHAT_TYPES = tuple(ChatType)
+
+
+def _pack_datetime(value: datetime) -> Tuple[int, bool]:
+    if value.tzinfo is None:
+        return (value - _EPOCH) // _MICROSECOND, False
+    value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND, True
+
+
+def _unpack_datetime(value: int, aware: bool) -> datetime:
+    moment = _EPOCH + value * _MICROSECOND
+    return moment.replace(tzinfo=timezone.utc) if aware else moment
+
+
+@dataclass(frozen=True)
+class ChatSnapshot:
+    chat: Chat
+    member_count: int
+    owner_ids: Tuple[UUID, ...]
+    version: int
+
+
+class ChatSnapshotCache:
+    """Кэш снимков чата (чат, число участников, владельцы)
+
+    Каждая загрузка из репозиториев получает новую версию снимка.
+    Сервис чатов сбрасывает снимок после любого изменения чата или его участников.
+    Содержимое можно сохранить в `SnapshotStore` и восстановить при перезапуске;
+    номер изменения для проверки снимка дают сами репозитории (`get_change_seq`).
+    """
+
+    # Версия в имени: секции старого формата при восстановлении пропускаются
+    snapshot_name = "chat_snapshots_v2"
+
+    def __init__(
+        self,
+        chat_repository: AbstractChatRepository,
+        chat_member_repository: AbstractChatMemberRepository,
+        max_size: int = 10_000,
+        ttl: float = 60.0,
+        negative_ttl: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__chat_repo = chat_repository
+        self.__chat_member_repo = chat_member_repository
+        self.__versions = itertools.count(1)
+        self.__cache: LoadingCache[UUID, ChatSnapshot] = LoadingCache(
+            self.__load,
+            max_size=max_size,
+            ttl=ttl,
+            negative_ttl=negative_ttl,
+            clock=clock,
+        )
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.__cache.stats
+
+    def __len__(self) -> int:
+        return len(self.__cache)
+
+    async def get(self, chat_id: UUID) -> ChatSnapshot:
+        """Получить снимок чата
+
+        Args:
+            chat_id (UUID): Идентификатор чата
+
+        Returns:
+            ChatSnapshot: Снимок чата
+
+        Raises:
+            ObjectNotFoundExc: Чат не найден
+        """
+        return await self.__cache.get(chat_id)
+
+    def invalidate(self, chat_id: UUID) -> None:
+        self.__cache.invalidate(chat_id)
+
+    def clear(self) -> None:
+        self.__cache.clear()
+
+    def dump(self) -> Iterator[bytes]:
+        for chat_id, snapshot in self.__cache.items():
+            chat = snapshot.chat
+            created_at, created_aware = _pack_datetime(chat.created_at)
+            updated_at, updated_aware = _pack_datetime(chat.updated_at)
+            max_age, max_count = chat.retention.max_age, chat.retention.max_count
+            yield b"".join(
+                (
+                    _RECORD.pack(
+                        chat_id.bytes,
+                        _CHAT_TYPES.index(chat.chat_type),
+                        created_at,
+                        updated_at,
+                        created_aware | updated_aware << 1,
+                        snapshot.member_count,
+                        len(snapshot.owner_ids),
+                        -1 if max_age is None else max_age // _MICROSECOND,
+                        -1 if max_count is None else max_count,
+                    ),
+                    *(owner_id.bytes for owner_id in snapshot.owner_ids),
+                    chat.title.encode(),
+                )
+            )
+
+    def restore(self, records: Iterable[memoryview]) -> int:
+        restored = 0
+        for record in records:
+            (
+                chat_id,
+                chat_type,
+                created_at,
+                updated_at,
+                flags,
+                member_count,
+                owner_count,
+                max_age,
+                max_count,
+            ) = _RECORD.unpack_from(record)
+            offset = _RECORD.size
+            owner_ids = []
+            for _ in range(owner_count):
+                owner_ids.append(UUID(bytes=bytes(record[offset : offset + 16])))
+                offset += 16
+            chat = Chat(
+                id=UUID(bytes=chat_id),
+                chat_type=_CHAT_TYPES[chat_type],
+                title=str(record[offset:], "utf-8"),
+                created_at=_unpack_datetime(created_at, bool(flags & 1)),
+                updated_at=_unpack_datetime(updated_at, bool(flags & 2)),
+                retention=RetentionPolicy(
+                    max_age=None if max_age < 0 else max_age * _MICROSECOND,
+                    max_count=None if max_count < 0 else max_count,
+                ),
+            )
+            self.__cache.put(
+                chat.id,
+                ChatSnapshot(
+                    chat=chat,
+                    member_count=member_count,
+                    owner_ids=tuple(owner_ids),
+                    version=next(self.__versions),
+                ),
+            )
+            restored += 1
+        return restored
+
+    async def __load(self, chat_id: UUID) -> ChatSnapshot:
+        chat = await self.__chat_repo.get(_id=chat_id)
+        member_count, owner_ids = await asyncio.gather(
+            self.__chat_member_repo.count_by_chat_id(_id=chat_id),
+            self.__chat_member_repo.list_user_ids_by_chat_id(
+                _id=chat_id, permissions=ChatMemberPermissions.ROLE_OWNER
+            ),
+        )
+        return ChatSnapshot(
+            chat=chat,
+            member_count=member_count,
+            owner_ids=tuple(owner_ids),
+            version=next(self.__versions),
+        )
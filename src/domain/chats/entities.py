@@ -1,6 +1,7 @@
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum, IntFlag
+from typing import Tuple
 from uuid import UUID
 
 
@@ -9,6 +10,29 @@ class ChatType(str, Enum):
     GROUP = "group"
 
 
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Ограничение истории чата
+
+    Не заданные (`None`) ограничения берутся из глобальной политики.
+    """
+
+    max_age: timedelta | None = None
+    max_count: int | None = None
+
+    def merge(self, default: "RetentionPolicy") -> "RetentionPolicy":
+        return RetentionPolicy(
+            max_age=self.max_age if self.max_age is not None else default.max_age,
+            max_count=(
+                self.max_count if self.max_count is not None else default.max_count
+            ),
+        )
+
+    @property
+    def unlimited(self) -> bool:
+        return self.max_age is None and self.max_count is None
+
+
 @dataclass
 class Chat:
     id: UUID
@@ -16,6 +40,7 @@ class Chat:
     title: str
     created_at: datetime
     updated_at: datetime
+    retention: RetentionPolicy = RetentionPolicy()
 
 
 class ChatMemberPermissions(IntFlag):
@@ -42,3 +67,8 @@ class ChatMember:
     permissions: ChatMemberPermissions
     invited_by: UUID | None = None
     joined_at: datetime | None = None
+
+
+def personal_key(user_1: UUID, user_2: UUID) -> Tuple[UUID, UUID]:
+    """Канонический ключ личного чата: пара пользователей без учета порядка"""
+    return (user_1, user_2) if user_1.bytes <= user_2.bytes else (user_2, user_1)
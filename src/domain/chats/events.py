@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from uuid import UUID
+
+from ...common.events import DomainEvent
+from .entities import Chat, ChatMember, ChatMemberPermissions
+
+
+@dataclass(frozen=True, kw_only=True)
+class ChatCreated(DomainEvent):
+    chat: Chat
+
+
+@dataclass(frozen=True, kw_only=True)
+class ChatUpdated(DomainEvent):
+    chat: Chat
+    executor_id: UUID | None = None
+
+
+@dataclass(frozen=True, kw_only=True)
+class ChatDeleted(DomainEvent):
+    chat_id: UUID
+    executor_id: UUID | None = None
+
+
+@dataclass(frozen=True, kw_only=True)
+class MemberAdded(DomainEvent):
+    member: ChatMember
+
+
+@dataclass(frozen=True, kw_only=True)
+class MemberRemoved(DomainEvent):
+    chat_id: UUID
+    user_id: UUID
+    executor_id: UUID | None = None
+
+
+@dataclass(frozen=True, kw_only=True)
+class MemberPermissionsChanged(DomainEvent):
+    chat_id: UUID
+    user_id: UUID
+    permissions: ChatMemberPermissions
+    executor_id: UUID | None = None
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict
+from uuid import UUID
+
+from ..messages.cache import TimelineCache
+from ..messages.entities import SourceType
+from ..messages.repositories import AbstractMessageRepository
+from .repositories import AbstractChatMemberRepository, AbstractChatRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReapProgress:
+    chat_id: UUID
+    members: int = 0
+    messages: int = 0
+    batches: int = 0
+    started_at: float = 0.0
+    finished_at: float | None = None
+
+
+@dataclass
+class ReaperMetrics:
+    chats: int = 0
+    members: int = 0
+    messages: int = 0
+    batches: int = 0
+    errors: int = 0
+
+
+class ChatReaper:
+    """Фоновая очистка данных удаленных чатов
+
+    `ChatService.delete` только помечает чат удаленным. Реапер находит такие
+    чаты через `list_deleted` и удаляет сначала участников (чат сразу
+    становится недоступен для отправки), затем сообщения вместе с их
+    индексами, и последней — строку чата. После нее сообщения проверяются
+    еще раз: их могла записать отправка, начатая до удаления участников.
+    Каждая пачка не больше
+    `batch_size` строк удаляется отдельным запросом, между пачками реапер
+    засыпает на `pause` секунд, уступая базу основному трафику.
+
+    Состояние очистки хранится в самих данных: пока строка чата не удалена,
+    чат возвращается `list_deleted`, а каждая пачка удаляет то, что осталось.
+    Поэтому после падения процесса очистка продолжается с места остановки.
+    """
+
+    def __init__(
+        self,
+        chat_repository: AbstractChatRepository,
+        chat_member_repository: AbstractChatMemberRepository,
+        message_repository: AbstractMessageRepository,
+        timeline_cache: TimelineCache | None = None,
+        batch_size: int = 500,
+        pause: float = 0.05,
+        interval: float = 5.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.__chat_repo = chat_repository
+        self.__chat_member_repo = chat_member_repository
+        self.__message_repo = message_repository
+        self.__timeline_cache = timeline_cache
+        self.__batch_size = batch_size
+        self.__pause = pause
+        self.__interval = interval
+        self.__clock = clock
+        self.__wakeup = asyncio.Event()
+        self.progress: Dict[UUID, ReapProgress] = {}
+        self.metrics = ReaperMetrics()
+
+    def notify(self) -> None:
+        """Разбудить `run`, не дожидаясь интервала опроса"""
+        self.__wakeup.set()
+
+    async def reap(self, chat_id: UUID) -> ReapProgress:
+        """Очистить данные одного удаленного чата
+
+        Args:
+            chat_id (UUID): Идентификатор чата
+
+        Returns:
+            ReapProgress: Итог очистки
+        """
+        progress = self.progress.get(chat_id)
+        if progress is None:
+            progress = ReapProgress(chat_id=chat_id, started_at=self.__clock())
+            self.progress[chat_id] = progress
+
+        while deleted := await self.__chat_member_repo.delete_by_chat_id(
+            chat_id, limit=self.__batch_size
+        ):
+            progress.members += deleted
+            self.metrics.members += deleted
+            await self.__throttle(progress)
+
+        await self.__reap_messages(progress)
+        await self.__chat_repo.delete(_id=chat_id)
+        await self.__reap_messages(progress)
+        if self.__timeline_cache is not None:
+            for source_type in SourceType:
+                self.__timeline_cache.invalidate(chat_id, source_type)
+        progress.finished_at = self.__clock()
+        self.metrics.chats += 1
+        del self.progress[chat_id]
+        return progress
+
+    async def reap_pending(self) -> int:
+        """Очистить все помеченные удаленными чаты
+
+        Returns:
+            int: Количество очищенных чатов
+        """
+        reaped = 0
+        while chat_ids := await self.__chat_repo.list_deleted(limit=100):
+            for chat_id in chat_ids:
+                await self.reap(chat_id)
+                reaped += 1
+        return reaped
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.reap_pending()
+            except Exception:
+                self.metrics.errors += 1
+                logger.exception("Chat reaping failed")
+            self.__wakeup.clear()
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), self.__interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def __reap_messages(self, progress: ReapProgress) -> None:
+        while deleted := await self.__message_repo.delete_by_source(
+            progress.chat_id, limit=self.__batch_size
+        ):
+            progress.messages += deleted
+            self.metrics.messages += deleted
+            await self.__throttle(progress)
+
+    async def __throttle(self, progress: ReapProgress) -> None:
+        progress.batches += 1
+        self.metrics.batches += 1
+        await asyncio.sleep(self.__pause)
@@ -7,7 +7,7 @@ from ...common.repositories import (
     AbstractGet,
     AbstractUpdate,
 )
-from .entities import Chat, ChatMember, ChatType
+from .entities import Chat, ChatMember, ChatMemberPermissions, ChatType
 
 
 class AbstractChatRepository(
@@ -16,15 +16,66 @@ class AbstractChatRepository(
     AbstractDelete[UUID, Chat],
     Protocol,
 ):
-    async def create(self, chat_type: ChatType, title: str) -> Chat:
+    async def create(
+        self,
+        chat_type: ChatType,
+        title: str,
+        personal_key: Tuple[UUID, UUID] | None = None,
+    ) -> Chat:
         """Создать чат
 
         Args:
             chat_type (ChatType): Тип чата
             title (str): Название чата
+            personal_key (Tuple[UUID, UUID] | None, optional): Ключ личного чата
+                (`personal_key`), уникальный среди чатов
 
         Returns:
             Chat: Объект чата
+
+        Raises:
+            AlreadyExistsExc: Личный чат с таким ключом уже существует
+        """
+        ...
+
+    async def get_personal(self, personal_key: Tuple[UUID, UUID]) -> Chat:
+        """Получить личный чат по ключу одним индексированным запросом
+
+        Args:
+            personal_key (Tuple[UUID, UUID]): Ключ личного чата
+
+        Returns:
+            Chat: Объект чата
+
+        Raises:
+            ObjectNotFoundExc: Чат не найден
+        """
+        ...
+
+    async def mark_deleted(self, _id: UUID) -> None:
+        """Пометить чат удаленным
+
+        Помеченный чат сразу перестает находиться через `get` и
+        `get_personal`, ключ личного чата освобождается. Строка чата остается
+        до окончательного `delete`, которое выполняется после очистки его
+        данных.
+
+        Args:
+            _id (UUID): Идентификатор чата
+
+        Raises:
+            ObjectNotFoundExc: Чат не найден
+        """
+        ...
+
+    async def list_deleted(self, limit: int = 100) -> Sequence[UUID]:
+        """Получить помеченные удаленными чаты, данные которых еще не очищены
+
+        Args:
+            limit (int, optional): Лимит. По умолчанию 100.
+
+        Returns:
+            Sequence[UUID]: Идентификаторы чатов
         """
         ...
 
@@ -54,3 +105,41 @@ class AbstractChatMemberRepository(
         """
 
         ...
+
+    async def list_user_ids_by_chat_id(
+        self, _id: UUID, permissions: ChatMemberPermissions | None = None
+    ) -> Sequence[UUID]:
+        """Получить список идентификаторов участников чата.
+
+        Args:
+            _id (UUID): Уникальный идентификатор чата.
+            permissions (ChatMemberPermissions | None, optional): Если указано, вернуть
+                только участников с точно такими правами. По умолчанию None.
+
+        Returns:
+            Sequence[UUID]: Последовательность UUID участников чата.
+        """
+        ...
+
+    async def count_by_chat_id(self, _id: UUID) -> int:
+        """Получить количество участников чата.
+
+        Args:
+            _id (UUID): Уникальный идентификатор чата.
+
+        Returns:
+            int: Количество участников чата.
+        """
+        ...
+
+    async def delete_by_chat_id(self, _id: UUID, limit: int = 1000) -> int:
+        """Удалить очередную пачку участников чата.
+
+        Args:
+            _id (UUID): Уникальный идентификатор чата.
+            limit (int, optional): Максимальное количество удаляемых записей. По умолчанию 1000.
+
+        Returns:
+            int: Количество удаленных участников, 0 — участников не осталось.
+        """
+        ...
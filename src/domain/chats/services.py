@@ -1,8 +1,26 @@
-from typing import Protocol, Sequence
+from datetime import timedelta
+from typing import Iterable, Protocol, Sequence, Tuple
 from uuid import UUID
 
-from ...common.exceptions import AccessDeniedExc
-from .entities import Chat, ChatMember, ChatMemberPermissions, ChatType
+from ...common.events import AbstractEventPublisher, DomainEvent
+from ...common.exceptions import (
+    AccessDeniedExc,
+    AlreadyExistsExc,
+    InvalidFormatExc,
+    ObjectNotFoundExc,
+)
+from ...common.locks import KeyedLock
+from . import events
+from .cache import ChatSnapshot, ChatSnapshotCache
+from .entities import (
+    Chat,
+    ChatMember,
+    ChatMemberPermissions,
+    ChatType,
+    RetentionPolicy,
+    personal_key,
+)
+from .reaper import ChatReaper
 from .repositories import AbstractChatMemberRepository, AbstractChatRepository
 
 
@@ -17,6 +35,24 @@ class AbstractChatService(Protocol):
             owner_user_1 (UUID): ID первого владельца
             owner_user_2 (UUID): ID второго владельца
 
+        Returns:
+            Chat: Объект чата
+
+        Raises:
+            AlreadyExistsExc: Личный чат между пользователями уже существует
+        """
+        ...
+
+    async def get_or_create_personal(
+        self, title: str, owner_user_1: UUID, owner_user_2: UUID
+    ) -> Chat:
+        """Получить личный чат между двумя пользователями, создав его при отсутствии
+
+        Args:
+            title (str): Название чата, если он будет создан
+            owner_user_1 (UUID): ID первого владельца
+            owner_user_2 (UUID): ID второго владельца
+
         Returns:
             Chat: Объект чата
         """
@@ -48,6 +84,20 @@ class AbstractChatService(Protocol):
         """
         ...
 
+    async def get_snapshot(self, chat_id: UUID) -> ChatSnapshot:
+        """Получить снимок чата: чат, количество участников и владельцев
+
+        Args:
+            chat_id (UUID): Идентификатор чата
+
+        Returns:
+            ChatSnapshot: Снимок чата
+
+        Raises:
+            ObjectNotFoundExc: Чат не найден
+        """
+        ...
+
     async def update(
         self, chat_id: UUID, executor_id: UUID | None = None, title: str | None = None
     ) -> Chat:
@@ -67,9 +117,36 @@ class AbstractChatService(Protocol):
         """
         ...
 
+    async def set_retention(
+        self,
+        chat_id: UUID,
+        policy: RetentionPolicy,
+        executor_id: UUID | None = None,
+    ) -> Chat:
+        """Задать политику хранения истории чата
+
+        Args:
+            chat_id (UUID): Идентификатор чата
+            policy (RetentionPolicy): Политика; незаданные ограничения берутся
+                из глобальной политики сервиса сообщений
+            executor_id (UUID | None, optional): ID пользователя, выполняющего изменение
+
+        Returns:
+            Chat: Обновленный объект чата
+
+        Raises:
+            InvalidFormatExc: Неположительный срок или лимит
+            ObjectNotFoundExc: Чат не найден
+            AccessDeniedExc: Нет прав на изменение чата
+        """
+        ...
+
     async def delete(self, chat_id: UUID, executor_id: UUID | None = None) -> None:
         """Удалить чат
 
+        Чат сразу становится недоступен, его участники и сообщения удаляются
+        в фоне (см. `ChatReaper`).
+
         Args:
             chat_id (UUID): Идентификатор чата
             executor_id (UUID | None, optional): ID пользователя, выполняющего удаление
@@ -198,36 +275,97 @@ class AbstractChatService(Protocol):
         """
         ...
 
+    async def member_list_ids(self, chat_id: UUID) -> Sequence[UUID]:
+        """Получить ID всех участников чата
+
+        Args:
+            chat_id (UUID): ID чата
+
+        Returns:
+            Sequence[UUID]: ID участников
+        """
+        ...
+
 
 class ChatService:
+    """Сервис чатов
+
+    Изменения одного чата (проверка прав и запись) выполняются под блокировкой
+    чата и потому линеаризуемы в пределах процесса; разные чаты изменяются
+    параллельно. События публикуются после снятия блокировки, чтобы
+    обработчики могли сами вызывать сервис.
+
+    Удаление чата мягкое: данные чата очищает `ChatReaper`, если он передан,
+    то будится сразу после удаления.
+    """
+
     def __init__(
         self,
         chat_repository: AbstractChatRepository,
         chat_member_repository: AbstractChatMemberRepository,
+        snapshot_cache: ChatSnapshotCache | None = None,
+        event_bus: AbstractEventPublisher | None = None,
+        reaper: ChatReaper | None = None,
     ):
         self.__chat_repo = chat_repository
         self.__chat_member_repo = chat_member_repository
+        self.__snapshot_cache = snapshot_cache
+        # Пустой кэш ложен из-за `__len__`, поэтому сравнение с None
+        if snapshot_cache is None:
+            snapshot_cache = ChatSnapshotCache(
+                chat_repository, chat_member_repository, max_size=0
+            )
+        self.__snapshots = snapshot_cache
+        self.__event_bus = event_bus
+        self.__reaper = reaper
+        self.__locks: KeyedLock[UUID] = KeyedLock()
+        self.__personal_locks: KeyedLock[Tuple[UUID, UUID]] = KeyedLock()
 
     async def create_personal(
         self, title: str, owner_user_1: UUID, owner_user_2: UUID
     ) -> Chat:
-        chat = await self.__chat_repo.create(chat_type=ChatType.PERSONAL, title=title)
-        await self.__chat_member_repo.create(
-            ChatMember(
-                chat_id=chat.id,
-                user_id=owner_user_1,
-                permissions=ChatMemberPermissions.ROLE_OWNER,
-            )
-        )
-        await self.__chat_member_repo.create(
-            ChatMember(
-                chat_id=chat.id,
-                user_id=owner_user_2,
-                permissions=ChatMemberPermissions.ROLE_OWNER,
-            )
+        chat = await self.__chat_repo.create(
+            chat_type=ChatType.PERSONAL,
+            title=title,
+            personal_key=personal_key(owner_user_1, owner_user_2),
         )
+        await self.__create_owners(chat.id, (owner_user_1, owner_user_2))
+        await self._publish(events.ChatCreated(chat=chat))
         return chat
 
+    async def get_or_create_personal(
+        self, title: str, owner_user_1: UUID, owner_user_2: UUID
+    ) -> Chat:
+        key = personal_key(owner_user_1, owner_user_2)
+        async with self.__personal_locks(key):
+            try:
+                chat = await self.__chat_repo.get_personal(key)
+            except ObjectNotFoundExc:
+                try:
+                    return await self.create_personal(title, owner_user_1, owner_user_2)
+                except AlreadyExistsExc:
+                    # Чат создал другой процесс между проверкой и записью
+                    chat = await self.__chat_repo.get_personal(key)
+            # Создатель мог упасть, не успев добавить владельцев
+            members = await self.__chat_member_repo.list_user_ids_by_chat_id(
+                _id=chat.id
+            )
+            missing = {owner_user_1, owner_user_2}.difference(members)
+            if missing:
+                await self.__create_owners(chat.id, missing)
+                self._invalidate(chat.id)
+            return chat
+
+    async def __create_owners(self, chat_id: UUID, user_ids: Iterable[UUID]) -> None:
+        for user_id in user_ids:
+            await self.__chat_member_repo.create(
+                ChatMember(
+                    chat_id=chat_id,
+                    user_id=user_id,
+                    permissions=ChatMemberPermissions.ROLE_OWNER,
+                )
+            )
+
     async def create_group(self, title: str, owner_id: UUID) -> Chat:
         chat = await self.__chat_repo.create(chat_type=ChatType.GROUP, title=title)
         await self.__chat_member_repo.create(
@@ -237,6 +375,7 @@ class ChatService:
                 permissions=ChatMemberPermissions.ROLE_OWNER,
             )
         )
+        await self._publish(events.ChatCreated(chat=chat))
         return chat
 
     async def _can_execute(
@@ -245,24 +384,68 @@ class ChatService:
         member = await self.__chat_member_repo.get((chat_id, user_id))
         return action in member.permissions or action == member.permissions
 
+    def _invalidate(self, chat_id: UUID) -> None:
+        if self.__snapshot_cache is not None:
+            self.__snapshot_cache.invalidate(chat_id)
+
+    async def _publish(self, event: DomainEvent) -> None:
+        if self.__event_bus is not None:
+            await self.__event_bus.publish(event)
+
     async def get(self, chat_id: UUID) -> Chat:
+        if self.__snapshot_cache is not None:
+            return (await self.__snapshot_cache.get(chat_id)).chat
         return await self.__chat_repo.get(_id=chat_id)
 
+    async def get_snapshot(self, chat_id: UUID) -> ChatSnapshot:
+        return await self.__snapshots.get(chat_id)
+
     async def update(
         self, chat_id: UUID, executor_id: UUID | None = None, title: str | None = None
     ) -> Chat:
-        if executor_id is not None and not await self._can_execute(
-            chat_id, executor_id, ChatMemberPermissions.CHAT_CHANGE
+        async with self.__locks(chat_id):
+            if executor_id is not None and not await self._can_execute(
+                chat_id, executor_id, ChatMemberPermissions.CHAT_CHANGE
+            ):
+                raise AccessDeniedExc()
+            chat = await self.__chat_repo.update(_id=chat_id, title=title)
+            self._invalidate(chat_id)
+        await self._publish(events.ChatUpdated(chat=chat, executor_id=executor_id))
+        return chat
+
+    async def set_retention(
+        self,
+        chat_id: UUID,
+        policy: RetentionPolicy,
+        executor_id: UUID | None = None,
+    ) -> Chat:
+        if (policy.max_age is not None and policy.max_age <= timedelta(0)) or (
+            policy.max_count is not None and policy.max_count < 1
         ):
-            raise AccessDeniedExc()
-        return await self.__chat_repo.update(_id=chat_id, title=title)
+            raise InvalidFormatExc("Invalid retention policy")
+        async with self.__locks(chat_id):
+            if executor_id is not None and not await self._can_execute(
+                chat_id, executor_id, ChatMemberPermissions.CHAT_CHANGE
+            ):
+                raise AccessDeniedExc()
+            chat = await self.__chat_repo.update(_id=chat_id, retention=policy)
+            self._invalidate(chat_id)
+        await self._publish(events.ChatUpdated(chat=chat, executor_id=executor_id))
+        return chat
 
     async def delete(self, chat_id: UUID, executor_id: UUID | None = None) -> None:
-        if executor_id is not None and not await self._can_execute(
-            chat_id, executor_id, ChatMemberPermissions.CHAT_DELETE
-        ):
-            raise AccessDeniedExc()
-        await self.__chat_repo.delete(_id=chat_id)
+        async with self.__locks(chat_id):
+            if executor_id is not None and not await self._can_execute(
+                chat_id, executor_id, ChatMemberPermissions.CHAT_DELETE
+            ):
+                raise AccessDeniedExc()
+            await self.__chat_repo.mark_deleted(_id=chat_id)
+            self._invalidate(chat_id)
+        if self.__reaper is not None:
+            self.__reaper.notify()
+        await self._publish(
+            events.ChatDeleted(chat_id=chat_id, executor_id=executor_id)
+        )
 
     async def get_list(
         self, user_id: UUID, offset: int = 0, limit: int = 50
@@ -274,51 +457,85 @@ class ChatService:
     async def member_get(self, chat_id: UUID, user_id: UUID) -> ChatMember:
         return await self.__chat_member_repo.get((chat_id, user_id))
 
+    async def member_list_ids(self, chat_id: UUID) -> Sequence[UUID]:
+        return await self.__chat_member_repo.list_user_ids_by_chat_id(_id=chat_id)
+
     async def member_add(
         self, chat_id: UUID, user_id: UUID, executor_id: UUID | None = None
     ) -> ChatMember:
-        if executor_id is not None and not await self._can_execute(
-            chat_id, executor_id, ChatMemberPermissions.MEMBER_ADD
-        ):
-            raise AccessDeniedExc()
-        return await self.__chat_member_repo.create(
-            ChatMember(
-                chat_id=chat_id,
-                user_id=user_id,
-                permissions=ChatMemberPermissions.ROLE_DEFAULT,
-                invited_by=executor_id,
+        async with self.__locks(chat_id):
+            if executor_id is not None and not await self._can_execute(
+                chat_id, executor_id, ChatMemberPermissions.MEMBER_ADD
+            ):
+                raise AccessDeniedExc()
+            member = await self.__chat_member_repo.create(
+                ChatMember(
+                    chat_id=chat_id,
+                    user_id=user_id,
+                    permissions=ChatMemberPermissions.ROLE_DEFAULT,
+                    invited_by=executor_id,
+                )
             )
-        )
+            self._invalidate(chat_id)
+        await self._publish(events.MemberAdded(member=member))
+        return member
 
     async def member_remove(
         self, chat_id: UUID, user_id: UUID, executor_id: UUID | None = None
     ) -> None:
-        if executor_id is not None and not await self._can_execute(
-            chat_id, executor_id, ChatMemberPermissions.MEMBER_REMOVE
-        ):
-            raise AccessDeniedExc()
-        await self.__chat_member_repo.delete((chat_id, user_id))
+        async with self.__locks(chat_id):
+            if executor_id is not None and not await self._can_execute(
+                chat_id, executor_id, ChatMemberPermissions.MEMBER_REMOVE
+            ):
+                raise AccessDeniedExc()
+            await self.__chat_member_repo.delete((chat_id, user_id))
+            self._invalidate(chat_id)
+        await self._publish(
+            events.MemberRemoved(
+                chat_id=chat_id, user_id=user_id, executor_id=executor_id
+            )
+        )
 
     async def member_block(
         self, chat_id: UUID, user_id: UUID, executor_id: UUID | None = None
     ) -> None:
-        if executor_id is not None and not await self._can_execute(
-            chat_id, executor_id, ChatMemberPermissions.MEMBER_BLOCK
-        ):
-            raise AccessDeniedExc()
-        await self.__chat_member_repo.update(
-            (chat_id, user_id), permissions=ChatMemberPermissions.ROLE_BLOCKED
+        async with self.__locks(chat_id):
+            if executor_id is not None and not await self._can_execute(
+                chat_id, executor_id, ChatMemberPermissions.MEMBER_BLOCK
+            ):
+                raise AccessDeniedExc()
+            await self.__chat_member_repo.update(
+                (chat_id, user_id), permissions=ChatMemberPermissions.ROLE_BLOCKED
+            )
+            self._invalidate(chat_id)
+        await self._publish(
+            events.MemberPermissionsChanged(
+                chat_id=chat_id,
+                user_id=user_id,
+                permissions=ChatMemberPermissions.ROLE_BLOCKED,
+                executor_id=executor_id,
+            )
         )
 
     async def member_unblock(
         self, chat_id: UUID, user_id: UUID, executor_id: UUID | None = None
     ) -> None:
-        if executor_id is not None and not await self._can_execute(
-            chat_id, executor_id, ChatMemberPermissions.MEMBER_BLOCK
-        ):
-            raise AccessDeniedExc()
-        await self.__chat_member_repo.update(
-            (chat_id, user_id), permissions=ChatMemberPermissions.ROLE_DEFAULT
+        async with self.__locks(chat_id):
+            if executor_id is not None and not await self._can_execute(
+                chat_id, executor_id, ChatMemberPermissions.MEMBER_BLOCK
+            ):
+                raise AccessDeniedExc()
+            await self.__chat_member_repo.update(
+                (chat_id, user_id), permissions=ChatMemberPermissions.ROLE_DEFAULT
+            )
+            self._invalidate(chat_id)
+        await self._publish(
+            events.MemberPermissionsChanged(
+                chat_id=chat_id,
+                user_id=user_id,
+                permissions=ChatMemberPermissions.ROLE_DEFAULT,
+                executor_id=executor_id,
+            )
         )
 
     async def member_change_role(
@@ -328,10 +545,20 @@ class ChatService:
         permissions: ChatMemberPermissions,
         executor_id: UUID | None = None,
     ) -> None:
-        if executor_id is not None and not await self._can_execute(
-            chat_id, executor_id, ChatMemberPermissions.MEMBER_CHANGE_ROLE
-        ):
-            raise AccessDeniedExc()
-        await self.__chat_member_repo.update(
-            (chat_id, user_id), permissions=permissions
+        async with self.__locks(chat_id):
+            if executor_id is not None and not await self._can_execute(
+                chat_id, executor_id, ChatMemberPermissions.MEMBER_CHANGE_ROLE
+            ):
+                raise AccessDeniedExc()
+            await self.__chat_member_repo.update(
+                (chat_id, user_id), permissions=permissions
+            )
+            self._invalidate(chat_id)
+        await self._publish(
+            events.MemberPermissionsChanged(
+                chat_id=chat_id,
+                user_id=user_id,
+                permissions=permissions,
+                executor_id=executor_id,
+            )
         )
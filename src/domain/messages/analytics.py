@@ -0,0 +1,291 @@
+import functools
+import heapq
+import math
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Sequence, Tuple
+from uuid import UUID
+
+from .entities import Message, SourceType
+from .events import MessageSent
+
+_EPOCH = datetime(1970, 1, 1)
+_HOUR = timedelta(hours=1)
+_MASK = (1 << 64) - 1
+# Точность HyperLogLog: 2**12 регистров на день, ошибка около 1.6%
+_PRECISION = 12
+_REGISTERS = 1 << _PRECISION
+_REST_BITS = 64 - _PRECISION
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _utc(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _hour_of(moment: datetime) -> int:
+    return (_utc(moment) - _EPOCH) // _HOUR
+
+
+def _mix(value: int) -> int:
+    # Финализатор splitmix64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK
+    return value ^ (value >> 31)
+
+
+def _register_of(user_id: UUID) -> Tuple[int, int]:
+    value = user_id.int
+    digest = _mix((value >> 64) ^ _mix(value & _MASK))
+    # Ранг по 32 старшим битам остатка: точно совпадает с векторной версией
+    top = (digest & ((1 << _REST_BITS) - 1)) >> (_REST_BITS - 32)
+    return digest >> _REST_BITS, 33 - top.bit_length()
+
+
+def _estimate(registers: bytearray) -> int:
+    harmonic = math.fsum(2.0**-register for register in registers)
+    alpha = 0.7213 / (1 + 1.079 / _REGISTERS)
+    estimate = alpha * _REGISTERS * _REGISTERS / harmonic
+    zeros = registers.count(0)
+    if estimate <= 2.5 * _REGISTERS and zeros:
+        estimate = _REGISTERS * math.log(_REGISTERS / zeros)
+    return round(estimate)
+
+
+class _Series:
+    """Почасовые счетчики чата в кольцевом массиве"""
+
+    __slots__ = ("last_hour", "counts", "group")
+
+    def __init__(self, last_hour: int, counts: array, group: bool):
+        self.last_hour = last_hour
+        self.counts = counts
+        self.group = group
+
+
+class ActivityRollup:
+    """Агрегаты активности чатов для дашбордов
+
+    Для каждого чата хранится кольцевой массив `uint32` почасовых счетчиков
+    сообщений за последние `window_hours` часов (672 байта на чат за неделю),
+    для каждого дня — регистры HyperLogLog активных пользователей (4 КБ на
+    день, `window_days` последних дней). Запросы дашбордов читают только
+    эти массивы, не обращаясь к таблице сообщений.
+
+    Агрегаты пополняются на каждое `MessageSent`: подпишите `on_sent` на шину
+    событий сервиса сообщений. Для перестроения по истории `rebuild` считает
+    все агрегаты пачкой; если установлен NumPy, вычисления векторизуются.
+    Время сообщений трактуется как UTC, если у него нет часового пояса.
+    """
+
+    def __init__(self, window_hours: int = 7 * 24, window_days: int = 30):
+        self.__window = window_hours
+        self.__window_days = window_days
+        self.__series: Dict[UUID, _Series] = {}
+        self.__days: Dict[int, bytearray] = {}
+
+    def __len__(self) -> int:
+        return len(self.__series)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Размер массивов агрегатов"""
+        return len(self.__series) * self.__window * 4 + len(self.__days) * _REGISTERS
+
+    def record(self, message: Message) -> None:
+        hour = _hour_of(message.created_at)
+        self.__count(
+            message.source_id, message.source_type == SourceType.GROUP, hour, 1
+        )
+        registers = self.__day(hour // 24)
+        if registers is not None:
+            index, rank = _register_of(message.sender_id)
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def on_sent(self, event: MessageSent) -> None:
+        self.record(event.message)
+
+    def messages_per_hour(
+        self, chat_id: UUID, since: datetime, until: datetime
+    ) -> List[Tuple[datetime, int]]:
+        """Количество сообщений чата по часам
+
+        Args:
+            chat_id (UUID): Идентификатор чата
+            since (datetime): Начало периода, включительно
+            until (datetime): Конец периода, не включительно
+
+        Returns:
+            List[Tuple[datetime, int]]: Начало часа и количество сообщений
+        """
+        series = self.__series.get(chat_id)
+        return [
+            (_EPOCH + hour * _HOUR, self.__at(series, hour) if series else 0)
+            for hour in range(_hour_of(since), _hour_of(until))
+        ]
+
+    def active_users(self, day: date) -> int:
+        """Оценка количества пользователей, писавших сообщения за день
+
+        Args:
+            day (date): День (UTC)
+
+        Returns:
+            int: Количество пользователей, ошибка около 1.6%
+        """
+        registers = self.__days.get((day - _EPOCH.date()).days)
+        return _estimate(registers) if registers is not None else 0
+
+    def top_groups(
+        self, hours: int = 24, limit: int = 10, now: datetime | None = None
+    ) -> List[Tuple[UUID, int]]:
+        """Самые активные группы
+
+        Args:
+            hours (int, optional): Период в часах до `now`. По умолчанию 24.
+            limit (int, optional): Лимит. По умолчанию 10.
+            now (datetime | None, optional): Конец периода. По умолчанию сейчас.
+
+        Returns:
+            List[Tuple[UUID, int]]: Группы и количество сообщений, по убыванию
+        """
+        last = _hour_of(now or datetime.now())
+        totals = (
+            (chat_id, self.__sum(series, last - hours + 1, last))
+            for chat_id, series in self.__series.items()
+            if series.group
+        )
+        return [
+            (chat_id, total)
+            for chat_id, total in heapq.nlargest(
+                limit, totals, key=lambda item: (item[1], item[0])
+            )
+            if total
+        ]
+
+    def rebuild(self, messages: Sequence[Message], vectorized: bool = True) -> None:
+        """Пересчитать агрегаты по истории сообщений
+
+        Args:
+            messages (Sequence[Message]): Сообщения в любом порядке
+            vectorized (bool, optional): Использовать NumPy, если он
+                установлен. По умолчанию True.
+        """
+        self.__series.clear()
+        self.__days.clear()
+        np = _numpy() if vectorized else None
+        if np is None or not messages:
+            for message in messages:
+                self.record(message)
+            return
+        self.__rebuild(np, messages)
+
+    def __count(self, chat_id: UUID, group: bool, hour: int, count: int) -> None:
+        window = self.__window
+        series = self.__series.get(chat_id)
+        if series is None:
+            series = _Series(hour, array("I", bytes(4 * window)), group)
+            self.__series[chat_id] = series
+        elif hour > series.last_hour:
+            if hour - series.last_hour >= window:
+                series.counts = array("I", bytes(4 * window))
+            else:
+                for stale in range(series.last_hour + 1, hour + 1):
+                    series.counts[stale % window] = 0
+            series.last_hour = hour
+        elif hour <= series.last_hour - window:
+            return
+        series.counts[hour % window] += count
+
+    def __day(self, day: int) -> bytearray | None:
+        registers = self.__days.get(day)
+        if registers is None:
+            if self.__days and day <= max(self.__days) - self.__window_days:
+                return None
+            registers = self.__days[day] = bytearray(_REGISTERS)
+            newest = max(self.__days)
+            for stale in [d for d in self.__days if d <= newest - self.__window_days]:
+                del self.__days[stale]
+        return registers
+
+    def __at(self, series: _Series, hour: int) -> int:
+        if series.last_hour - self.__window < hour <= series.last_hour:
+            return series.counts[hour % self.__window]
+        return 0
+
+    def __sum(self, series: _Series, first: int, last: int) -> int:
+        first = max(first, series.last_hour - self.__window + 1)
+        last = min(last, series.last_hour)
+        if first > last:
+            return 0
+        start, stop = first % self.__window, last % self.__window + 1
+        if start < stop:
+            return sum(series.counts[start:stop])
+        return sum(series.counts[start:]) + sum(series.counts[:stop])
+
+    def __rebuild(self, np, messages: Sequence[Message]) -> None:
+        window = self.__window
+        chats: Dict[UUID, int] = {}
+        groups: List[bool] = []
+        codes, hours = array("q"), array("q")
+        senders = []
+        # Разбор сущностей остается на Python, дальше все считается массивами
+        for message in messages:
+            code = chats.get(message.source_id)
+            if code is None:
+                code = chats[message.source_id] = len(groups)
+                groups.append(message.source_type == SourceType.GROUP)
+            codes.append(code)
+            hours.append(_hour_of(message.created_at))
+            senders.append(message.sender_id.bytes)
+        codes = np.frombuffer(codes, dtype=np.int64)
+        hours = np.frombuffer(hours, dtype=np.int64)
+
+        last = np.full(len(chats), np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(last, codes, hours)
+        recent = hours > last[codes] - window
+        keys, counts = np.unique(
+            codes[recent] * window + hours[recent] % window, return_counts=True
+        )
+        rows, slots = keys // window, keys % window
+        bounds = np.searchsorted(rows, np.arange(len(chats) + 1))
+        for chat_id, code in chats.items():
+            buffer = np.zeros(window, dtype=np.uint32)
+            start, stop = bounds[code], bounds[code + 1]
+            buffer[slots[start:stop]] = counts[start:stop]
+            self.__series[chat_id] = _Series(
+                int(last[code]), array("I", buffer.tobytes()), groups[code]
+            )
+
+        ids = np.frombuffer(b"".join(senders), dtype=">u8").astype(np.uint64)
+        digests = _mix_vector(np, ids[0::2] ^ _mix_vector(np, ids[1::2]))
+        indexes = (digests >> np.uint64(_REST_BITS)).astype(np.int64)
+        top = (digests & np.uint64((1 << _REST_BITS) - 1)) >> np.uint64(_REST_BITS - 32)
+        # frexp дает длину в битах; для 32-битных значений float64 точен
+        ranks = (33 - np.frexp(top.astype(np.float64))[1]).astype(np.uint8)
+
+        days = hours // 24
+        newest = int(days.max())
+        for day in np.unique(days[days > newest - self.__window_days]).tolist():
+            selected = days == day
+            registers = np.zeros(_REGISTERS, dtype=np.uint8)
+            np.maximum.at(registers, indexes[selected], ranks[selected])
+            self.__days[day] = bytearray(registers.tobytes())
+
+
+def _mix_vector(np, values):
+    # Тот же splitmix64 над массивом uint64: умножение переполняется по модулю 2**64
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
@@ -0,0 +1,128 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Sequence, Tuple
+from uuid import UUID
+
+from ...common.cache import CacheStats
+from .entities import Message, SourceType
+from .repositories import AbstractMessageRepository
+
+_Key = Tuple[UUID, SourceType]
+
+
+class _Timeline:
+    __slots__ = ("messages", "complete")
+
+    def __init__(self, messages: Deque[Message], complete: bool):
+        # Новые сообщения справа
+        self.messages = messages
+        self.complete = complete
+
+
+class TimelineCache:
+    """Кольцевой буфер последних сообщений активных чатов
+
+    Для каждого чата хранится не больше `capacity` последних сообщений, для
+    всего кэша — не больше `max_chats` чатов, холодные вытесняются по LRU.
+    Страница обслуживается из буфера, если целиком в него попадает (или буфер
+    содержит всю историю чата), иначе запрос уходит в репозиторий.
+    Буфер заполняется при первом чтении первой страницы и дополняется `append`.
+    """
+
+    def __init__(
+        self,
+        message_repository: AbstractMessageRepository,
+        capacity: int = 100,
+        max_chats: int = 10_000,
+    ):
+        self.__message_repo = message_repository
+        self.__capacity = capacity
+        self.__max_chats = max_chats
+        self.__timelines: OrderedDict[_Key, _Timeline] = OrderedDict()
+        self.__loading: Dict[_Key, bool] = {}
+        self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self.__timelines)
+
+    async def get_list(
+        self, source_id: UUID, source_type: SourceType, offset: int = 0, limit: int = 50
+    ) -> Sequence[Message]:
+        """Получить страницу сообщений от новых к старым
+
+        Args:
+            source_id (UUID): Идентификатор ресурса
+            source_type (SourceType): Тип ресурса
+            offset (int, optional): Смещение. По умолчанию 0.
+            limit (int, optional): Лимит. По умолчанию 50.
+
+        Returns:
+            Sequence[Message]: Список сообщений
+        """
+        key = (source_id, source_type)
+        timeline = self.__timelines.get(key)
+        if timeline is not None:
+            self.__timelines.move_to_end(key)
+            if timeline.complete or offset + limit <= len(timeline.messages):
+                self.stats.hits += 1
+                return _page(timeline.messages, offset, limit)
+        self.stats.misses += 1
+
+        if timeline is not None or offset != 0:
+            return await self.__message_repo.get_list(
+                source_id=source_id, source_type=source_type, offset=offset, limit=limit
+            )
+        return (await self.__warm(key, limit))[:limit]
+
+    def append(self, message: Message) -> None:
+        key = (message.source_id, message.source_type)
+        if key in self.__loading:
+            self.__loading[key] = True
+        timeline = self.__timelines.get(key)
+        if timeline is None:
+            return
+        if len(timeline.messages) == self.__capacity:
+            timeline.complete = False
+        timeline.messages.append(message)
+
+    def invalidate(self, source_id: UUID, source_type: SourceType) -> None:
+        key = (source_id, source_type)
+        self.__timelines.pop(key, None)
+        if key in self.__loading:
+            self.__loading[key] = True
+
+    def clear(self) -> None:
+        self.__timelines.clear()
+        for key in self.__loading:
+            self.__loading[key] = True
+
+    async def __warm(self, key: _Key, limit: int) -> Sequence[Message]:
+        # Сообщение, отправленное во время загрузки, могло не попасть в ответ:
+        # такой результат возвращается, но в кэш не сохраняется
+        self.__loading.setdefault(key, False)
+        self.stats.loads += 1
+        fetch = max(limit, self.__capacity)
+        try:
+            newest_first = await self.__message_repo.get_list(
+                source_id=key[0], source_type=key[1], offset=0, limit=fetch
+            )
+        finally:
+            changed = self.__loading.pop(key, True)
+        if not changed:
+            messages = deque(
+                reversed(newest_first[: self.__capacity]), maxlen=self.__capacity
+            )
+            self.__timelines[key] = _Timeline(
+                messages, complete=len(newest_first) < self.__capacity
+            )
+            self.__timelines.move_to_end(key)
+            while len(self.__timelines) > self.__max_chats:
+                self.__timelines.popitem(last=False)
+                self.stats.evictions += 1
+        return newest_first
+
+
+def _page(messages: Deque[Message], offset: int, limit: int) -> List[Message]:
+    # deque индексируется за O(n) от ближайшего края: идем с правого
+    size = len(messages)
+    stop = max(size - offset - limit, 0)
+    return [messages[i] for i in range(size - 1 - offset, stop - 1, -1)]
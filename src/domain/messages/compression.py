@@ -0,0 +1,256 @@
+import dataclasses
+import functools
+import json
+import re
+import struct
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Mapping, Sequence, Tuple
+from uuid import UUID
+
+from .entities import Message
+
+RAW = 0
+ZLIB = 1
+ZSTD = 2
+
+_HEADER = struct.Struct("<BI")
+_TOKEN_RE = re.compile(r"\S+\s*")
+MAX_DICTIONARY_SIZE = 32 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _zstd():
+    try:
+        import zstandard  # type: ignore[import-not-found]
+    except ImportError:
+        return None
+    return zstandard
+
+
+def train_dictionary(
+    samples: Iterable[str], max_size: int = MAX_DICTIONARY_SIZE
+) -> bytes:
+    """Построить словарь для zlib из образцов сообщений
+
+    Частые токены располагаются в конце словаря, где zlib находит их дешевле.
+
+    Args:
+        samples (Iterable[str]): Образцы сообщений чата
+        max_size (int, optional): Максимальный размер словаря в байтах
+
+    Returns:
+        bytes: Словарь
+    """
+    counts: Counter[bytes] = Counter()
+    for sample in samples:
+        counts.update(t.encode() for t in _TOKEN_RE.findall(sample))
+
+    chosen = []
+    size = 0
+    for token, count in sorted(
+        counts.items(), key=lambda item: item[1] * len(item[0]), reverse=True
+    ):
+        if count < 2:
+            break
+        if size + len(token) > max_size:
+            continue
+        chosen.append(token)
+        size += len(token)
+    return b"".join(reversed(chosen))
+
+
+class PayloadCompressor:
+    """Сжатие текста сообщений для хранения
+
+    Формат: заголовок (кодек: u8, id словаря: u32) и данные. Короткие сообщения
+    и сообщения, которые не сжимаются, хранятся как есть в UTF-8.
+    Если установлен `zstandard`, используется zstd, иначе zlib.
+    """
+
+    def __init__(self, level: int = 6, min_size: int = 64, prefer_zstd: bool = True):
+        self.__level = level
+        self.__min_size = min_size
+        self.__zstd = _zstd() if prefer_zstd else None
+        self.__dictionaries: Dict[int, bytes] = {}
+        self.__chat_dictionaries: Dict[UUID, int] = {}
+        self.__zstd_compressors: Dict[int, object] = {}
+        self.__zstd_decompressors: Dict[int, object] = {}
+
+    def train(self, source_id: UUID, samples: Iterable[str]) -> int:
+        """Обучить словарь чата
+
+        Args:
+            source_id (UUID): Идентификатор ресурса
+            samples (Iterable[str]): Образцы сообщений
+
+        Returns:
+            int: Идентификатор словаря
+        """
+        dictionary = train_dictionary(samples)
+        dict_id = self.add_dictionary(dictionary)
+        self.__chat_dictionaries[source_id] = dict_id
+        return dict_id
+
+    def add_dictionary(self, dictionary: bytes) -> int:
+        dict_id = zlib.crc32(dictionary) or 1
+        self.__dictionaries[dict_id] = dictionary
+        return dict_id
+
+    def assign_dictionary(self, source_id: UUID, dict_id: int) -> None:
+        if dict_id not in self.__dictionaries:
+            raise KeyError(dict_id)
+        self.__chat_dictionaries[source_id] = dict_id
+
+    @property
+    def dictionaries(self) -> Mapping[int, bytes]:
+        return self.__dictionaries
+
+    def encode(self, source_id: UUID, text: str) -> bytes:
+        data = text.encode()
+        if len(data) < self.__min_size:
+            return _HEADER.pack(RAW, 0) + data
+
+        dict_id = self.__chat_dictionaries.get(source_id, 0)
+        dictionary = self.__dictionaries.get(dict_id)
+        if self.__zstd is not None:
+            codec = ZSTD
+            compressed = self.__zstd_compressor(dict_id, dictionary).compress(data)
+        else:
+            codec = ZLIB
+            compressor = (
+                zlib.compressobj(self.__level, zdict=dictionary)
+                if dictionary
+                else zlib.compressobj(self.__level)
+            )
+            compressed = compressor.compress(data) + compressor.flush()
+
+        if len(compressed) >= len(data):
+            return _HEADER.pack(RAW, 0) + data
+        return _HEADER.pack(codec, dict_id if dictionary else 0) + compressed
+
+    def decode(self, payload: bytes) -> str:
+        codec, dict_id = _HEADER.unpack_from(payload)
+        body = memoryview(payload)[_HEADER.size :]
+        if codec == RAW:
+            return str(body, "utf-8")
+
+        dictionary = self.__dictionaries[dict_id] if dict_id else None
+        if codec == ZLIB:
+            decompressor = (
+                zlib.decompressobj(zdict=dictionary)
+                if dictionary
+                else zlib.decompressobj()
+            )
+            data = decompressor.decompress(body) + decompressor.flush()
+        elif codec == ZSTD:
+            data = self.__zstd_decompressor(dict_id, dictionary).decompress(body)
+        else:
+            raise ValueError(f"Unknown codec {codec}")
+        return data.decode()
+
+    def __zstd_compressor(self, dict_id: int, dictionary: bytes | None):
+        compressor = self.__zstd_compressors.get(dict_id)
+        if compressor is None:
+            zstandard = self.__zstd
+            if zstandard is None:
+                raise RuntimeError("zstandard is not available")
+            params: Dict[str, object] = {"level": self.__level}
+            if dictionary:
+                params["dict_data"] = zstandard.ZstdCompressionDict(dictionary)
+            compressor = zstandard.ZstdCompressor(**params)
+            self.__zstd_compressors[dict_id] = compressor
+        return compressor
+
+    def __zstd_decompressor(self, dict_id: int, dictionary: bytes | None):
+        decompressor = self.__zstd_decompressors.get(dict_id)
+        if decompressor is None:
+            zstandard = _zstd()
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to decode this payload")
+            params = {}
+            if dictionary:
+                params["dict_data"] = zstandard.ZstdCompressionDict(dictionary)
+            decompressor = zstandard.ZstdDecompressor(**params)
+            self.__zstd_decompressors[dict_id] = decompressor
+        return decompressor
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    if _zstd() is not None:
+        return ("zstd", "gzip", "deflate", "identity")
+    return ("gzip", "deflate", "identity")
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str:
+    """Выбрать кодировку ответа по заголовку Accept-Encoding
+
+    Args:
+        accept_encoding (str | None): Значение заголовка
+
+    Returns:
+        str: Выбранная кодировка, `identity` если подходящей нет
+    """
+    if not accept_encoding:
+        return "identity"
+
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = "identity", 0.0
+    for encoding in supported_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+_MESSAGE_FIELDS = tuple(field.name for field in dataclasses.fields(Message))
+
+
+def _message_to_dict(message: Message) -> dict:
+    data = {name: getattr(message, name) for name in _MESSAGE_FIELDS}
+    if message.attachment is not None:
+        data["attachment"] = dataclasses.asdict(message.attachment)
+    return data
+
+
+def encode_history_page(
+    messages: Sequence[Message], accept_encoding: str | None, level: int = 6
+) -> Tuple[str, bytes]:
+    """Сериализовать страницу истории и сжать ее согласованной кодировкой
+
+    Args:
+        messages (Sequence[Message]): Страница сообщений
+        accept_encoding (str | None): Заголовок Accept-Encoding клиента
+        level (int, optional): Уровень сжатия
+
+    Returns:
+        Tuple[str, bytes]: Значение Content-Encoding и тело ответа
+    """
+    body = json.dumps(
+        [_message_to_dict(message) for message in messages],
+        default=str,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode()
+
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding == "gzip":
+        import gzip
+
+        return encoding, gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == "deflate":
+        return encoding, zlib.compress(body, level)
+    if encoding == "zstd":
+        return encoding, _zstd().ZstdCompressor(level=level).compress(body)
+    return encoding, body
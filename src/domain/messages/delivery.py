@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Protocol, Sequence, Set, Tuple
+from uuid import UUID
+
+from .entities import Message, OutboxEntry
+from .repositories import AbstractOutboxRepository
+
+logger = logging.getLogger(__name__)
+
+
+class AbstractDeliveryTransport(Protocol):
+    async def deliver(self, recipient_id: UUID, messages: Sequence[Message]) -> None:
+        """Передать сообщения получателю
+
+        Успешная передача не означает доставку: она подтверждается
+        получателем отдельно.
+
+        Args:
+            recipient_id (UUID): ID получателя
+            messages (Sequence[Message]): Сообщения
+
+        Raises:
+            Exception: Передача не удалась
+        """
+        ...
+
+
+@dataclass
+class DeliveryMetrics:
+    claimed: int = 0
+    sent: int = 0
+    acked: int = 0
+    rescheduled: int = 0
+    failed: int = 0
+    transport_errors: int = 0
+    errors: int = 0
+
+
+class OutboxDispatcher:
+    """Доставка сообщений из outbox получателям по модели at-least-once
+
+    Каждый проход забирает пачку готовых записей, передает их одним вызовом
+    транспорта на получателя и откладывает каждую запись до подтверждения с
+    экспоненциальной задержкой. Одно и то же сообщение передается получателю
+    один раз за проход. Подтверждения копятся в памяти и записываются пачкой
+    в начале прохода, до захвата записей; при ошибке записи они остаются в
+    памяти до следующего прохода.
+    """
+
+    def __init__(
+        self,
+        outbox_repository: AbstractOutboxRepository,
+        transport: AbstractDeliveryTransport,
+        batch_size: int = 500,
+        lease: float = 30.0,
+        base_backoff: float = 1.0,
+        max_backoff: float = 300.0,
+        max_attempts: int = 20,
+        jitter: float = 0.1,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.__outbox_repo = outbox_repository
+        self.__transport = transport
+        self.__batch_size = batch_size
+        self.__lease = lease
+        self.__base_backoff = base_backoff
+        self.__max_backoff = max_backoff
+        self.__max_attempts = max_attempts
+        self.__jitter = jitter
+        self.__clock = clock
+        self.__acks: Set[Tuple[UUID, UUID]] = set()
+        self.metrics = DeliveryMetrics()
+
+    def ack(self, recipient_id: UUID, message_ids: Sequence[UUID]) -> None:
+        """Принять подтверждение доставки от получателя
+
+        Args:
+            recipient_id (UUID): ID получателя
+            message_ids (Sequence[UUID]): ID доставленных сообщений
+        """
+        self.__acks.update((message_id, recipient_id) for message_id in message_ids)
+
+    async def flush_acks(self) -> int:
+        if not self.__acks:
+            return 0
+        keys = list(self.__acks)
+        self.__acks.clear()
+        try:
+            acked = await self.__outbox_repo.ack(keys)
+        except BaseException:
+            # Подтверждения нельзя терять: без них записи будут доставлены
+            # повторно вплоть до `max_attempts`
+            self.__acks.update(keys)
+            raise
+        self.metrics.acked += acked
+        return acked
+
+    async def drain_once(self) -> int:
+        """Выполнить один проход доставки
+
+        Returns:
+            int: Количество захваченных записей
+        """
+        await self.flush_acks()
+        now = self.__clock()
+        entries = await self.__outbox_repo.claim(
+            now, limit=self.__batch_size, lease=self.__lease
+        )
+        if not entries:
+            return 0
+        self.metrics.claimed += len(entries)
+
+        by_recipient: Dict[UUID, List[OutboxEntry]] = {}
+        for entry in entries:
+            by_recipient.setdefault(entry.recipient_id, []).append(entry)
+
+        recipients = list(by_recipient)
+        results = await asyncio.gather(
+            *(
+                self.__transport.deliver(
+                    recipient_id,
+                    list(
+                        {
+                            entry.message.id: entry.message
+                            for entry in by_recipient[recipient_id]
+                        }.values()
+                    ),
+                )
+                for recipient_id in recipients
+            ),
+            return_exceptions=True,
+        )
+
+        schedule: List[Tuple[int, float]] = []
+        failed: List[int] = []
+        for recipient_id, result in zip(recipients, results):
+            if isinstance(result, BaseException):
+                self.metrics.transport_errors += 1
+                logger.warning("Delivery to %s failed: %r", recipient_id, result)
+            else:
+                self.metrics.sent += len(by_recipient[recipient_id])
+            for entry in by_recipient[recipient_id]:
+                if entry.attempts + 1 >= self.__max_attempts:
+                    failed.append(entry.id)
+                else:
+                    schedule.append((entry.id, now + self.backoff(entry.attempts)))
+
+        if schedule:
+            await self.__outbox_repo.retry(schedule)
+            self.metrics.rescheduled += len(schedule)
+        if failed:
+            await self.__outbox_repo.fail(failed)
+            self.metrics.failed += len(failed)
+        return len(entries)
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.__max_backoff, self.__base_backoff * 2**attempts)
+        return delay * (1 - self.__jitter * random.random())
+
+    async def run(self, poll_interval: float = 0.5) -> None:
+        while True:
+            try:
+                claimed = await self.drain_once()
+            except Exception:
+                # Захваченные записи вернутся в очередь по истечении аренды
+                self.metrics.errors += 1
+                logger.exception("Outbox delivery failed")
+                claimed = 0
+            if claimed < self.__batch_size:
+                await asyncio.sleep(poll_interval)
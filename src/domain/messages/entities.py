@@ -1,14 +1,28 @@
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
+from typing import Dict, Sequence, Tuple
 from uuid import UUID
 
+_MENTION = re.compile(
+    r"@([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12})"
+)
+
 
 class SourceType(str, Enum):
     CHAT = "chat"
     GROUP = "group"
 
 
+@dataclass(frozen=True)
+class Attachment:
+    digest: str
+    size: int
+    content_type: str
+    filename: str | None = None
+
+
 @dataclass
 class Message:
     id: UUID
@@ -18,3 +32,62 @@ class Message:
     text_content: str
     created_at: datetime
     readed_at: datetime | None = None
+    attachment: Attachment | None = None
+    expires_at: datetime | None = None
+    reply_to_id: UUID | None = None
+    mentions: Tuple[UUID, ...] = ()
+    # Количество реакций по эмодзи
+    reactions: Dict[str, int] = field(default_factory=dict)
+
+
+def parse_mentions(text: str) -> Tuple[UUID, ...]:
+    """Извлечь упоминания вида `@<user_id>` без повторов в порядке появления"""
+    return tuple(dict.fromkeys(UUID(match) for match in _MENTION.findall(text)))
+
+
+@dataclass
+class MessagePage:
+    messages: Sequence[Message]
+    next_cursor: str | None = None
+
+
+@dataclass
+class PurgeStats:
+    messages: int = 0
+    # Освобожденное место в хранилище
+    bytes: int = 0
+
+
+@dataclass(frozen=True)
+class MessageRef:
+    id: UUID
+    source_id: UUID
+    source_type: SourceType
+
+
+@dataclass
+class ScheduledMessage:
+    id: UUID
+    source_id: UUID
+    source_type: SourceType
+    sender_id: UUID
+    text_content: str
+    send_at: datetime
+    attachment: Attachment | None = None
+    ttl: float | None = None
+
+
+@dataclass(frozen=True)
+class ReactionChange:
+    message_id: UUID
+    user_id: UUID
+    emoji: str
+    added: bool
+
+
+@dataclass
+class OutboxEntry:
+    id: int
+    message: Message
+    recipient_id: UUID
+    attempts: int = 0
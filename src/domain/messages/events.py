@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+
+from ...common.events import DomainEvent
+from .entities import Message
+
+
+@dataclass(frozen=True, kw_only=True)
+class MessageSent(DomainEvent):
+    message: Message
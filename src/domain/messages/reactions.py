@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Sequence, Tuple
+from uuid import UUID
+
+from ...common.exceptions import AccessDeniedExc, InvalidFormatExc, ObjectNotFoundExc
+from ..chats.entities import ChatMemberPermissions
+from ..chats.repositories import AbstractChatMemberRepository
+from .entities import Message, ReactionChange
+from .repositories import AbstractMessageRepository, AbstractReactionRepository
+
+logger = logging.getLogger(__name__)
+
+MAX_EMOJI_LENGTH = 32
+
+
+@dataclass
+class ReactionMetrics:
+    received: int = 0
+    coalesced: int = 0
+    flushed: int = 0
+    flushes: int = 0
+    hot: int = 0
+
+
+class ReactionService:
+    """Реакции на сообщения с пакетной записью счетчиков
+
+    Реакции копятся в памяти и записываются пачкой раз в `flush_interval`
+    или при накоплении `max_pending`; повторные изменения одной реакции
+    пользователя за это время схлопываются. Сообщение, получившее за пачку
+    не меньше `hot_threshold` реакций, пишется в случайный из
+    `counter_shards` шардов счетчика: процессы, одновременно сбрасывающие
+    реакции на популярное сообщение, не конкурируют за одну строку.
+
+    Итоговые счетчики, полученные при сбросе, хранятся в памяти
+    `flush_interval` секунд и подставляются в страницы ленты `attach`, в том
+    числе закэшированные, без дополнительных запросов. Дольше их держать
+    нельзя: реакции, сброшенные другими процессами, в них не попадают.
+
+    Реакцию может поставить только участник чата сообщения с правом чтения.
+    Чат сообщения не меняется, поэтому он запоминается для `max_tracked`
+    сообщений, и повторные реакции проверяют только участника.
+    """
+
+    def __init__(
+        self,
+        reaction_repository: AbstractReactionRepository,
+        message_repository: AbstractMessageRepository,
+        chat_member_repository: AbstractChatMemberRepository,
+        max_pending: int = 10_000,
+        flush_interval: float = 0.5,
+        hot_threshold: int = 100,
+        counter_shards: int = 8,
+        max_tracked: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__reaction_repo = reaction_repository
+        self.__message_repo = message_repository
+        self.__chat_member_repo = chat_member_repository
+        self.__max_pending = max_pending
+        self.__flush_interval = flush_interval
+        self.__hot_threshold = hot_threshold
+        self.__counter_shards = counter_shards
+        self.__max_tracked = max_tracked
+        self.__clock = clock
+        self.__pending: Dict[Tuple[UUID, UUID, str], bool] = {}
+        # ID сообщения -> (срок годности, счетчики)
+        self.__totals: OrderedDict[UUID, Tuple[float, Dict[str, int]]] = OrderedDict()
+        # ID сообщения -> ID его чата
+        self.__sources: OrderedDict[UUID, UUID] = OrderedDict()
+        self.metrics = ReactionMetrics()
+
+    @property
+    def pending(self) -> int:
+        return len(self.__pending)
+
+    async def react(self, message_id: UUID, user_id: UUID, emoji: str) -> None:
+        """Поставить реакцию
+
+        Args:
+            message_id (UUID): ID сообщения
+            user_id (UUID): ID пользователя
+            emoji (str): Эмодзи
+
+        Raises:
+            InvalidFormatExc: Пустой или слишком длинный эмодзи
+            ObjectNotFoundExc: Сообщение не найдено
+            AccessDeniedExc: Пользователь не может читать чат сообщения
+        """
+        await self.__change(message_id, user_id, emoji, True)
+
+    async def unreact(self, message_id: UUID, user_id: UUID, emoji: str) -> None:
+        await self.__change(message_id, user_id, emoji, False)
+
+    async def get_counts(self, message_id: UUID) -> Dict[str, int]:
+        totals = self.__fresh_totals(message_id)
+        if totals is not None:
+            return dict(totals)
+        return await self.__reaction_repo.get_counts(message_id)
+
+    def attach(self, messages: Sequence[Message]) -> Sequence[Message]:
+        """Подставить в сообщения свежие счетчики из памяти"""
+        if not self.__totals:
+            return messages
+        for message in messages:
+            totals = self.__fresh_totals(message.id)
+            if totals is not None:
+                message.reactions = dict(totals)
+        return messages
+
+    async def flush(self) -> int:
+        """Записать накопленные реакции
+
+        Returns:
+            int: Количество записанных изменений
+        """
+        if not self.__pending:
+            return 0
+        pending = self.__pending
+        self.__pending = {}
+        changes = [
+            ReactionChange(message_id, user_id, emoji, added)
+            for (message_id, user_id, emoji), added in pending.items()
+        ]
+        per_message = Counter(change.message_id for change in changes)
+        shards = {
+            message_id: random.randrange(self.__counter_shards)
+            for message_id, count in per_message.items()
+            if count >= self.__hot_threshold
+        }
+        try:
+            totals = await self.__reaction_repo.apply(changes, shards)
+        except BaseException:
+            # Вернуть пачку в буфер, более новые изменения остаются
+            for key, added in pending.items():
+                self.__pending.setdefault(key, added)
+            raise
+
+        expires_at = self.__clock() + self.__flush_interval
+        for message_id, counts in totals.items():
+            self.__totals[message_id] = (expires_at, counts)
+            self.__totals.move_to_end(message_id)
+        # Записи упорядочены по сроку: сначала истекшие, затем лишние
+        now = self.__clock()
+        while self.__totals and (
+            len(self.__totals) > self.__max_tracked
+            or next(iter(self.__totals.values()))[0] <= now
+        ):
+            self.__totals.popitem(last=False)
+        self.metrics.flushed += len(changes)
+        self.metrics.flushes += 1
+        self.metrics.hot += len(shards)
+        return len(changes)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.__flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Reaction flush failed")
+
+    def __fresh_totals(self, message_id: UUID) -> Dict[str, int] | None:
+        entry = self.__totals.get(message_id)
+        if entry is None:
+            return None
+        expires_at, totals = entry
+        if expires_at <= self.__clock():
+            del self.__totals[message_id]
+            return None
+        return totals
+
+    async def __change(
+        self, message_id: UUID, user_id: UUID, emoji: str, added: bool
+    ) -> None:
+        if not emoji or len(emoji) > MAX_EMOJI_LENGTH:
+            raise InvalidFormatExc("Invalid reaction")
+        await self.__ensure_can_read(message_id, user_id)
+        key = (message_id, user_id, emoji)
+        if key in self.__pending:
+            self.metrics.coalesced += 1
+        self.__pending[key] = added
+        self.metrics.received += 1
+        if len(self.__pending) >= self.__max_pending:
+            await self.flush()
+
+    async def __ensure_can_read(self, message_id: UUID, user_id: UUID) -> None:
+        source_id = self.__sources.get(message_id)
+        if source_id is None:
+            source_id = (await self.__message_repo.get(_id=message_id)).source_id
+            self.__sources[message_id] = source_id
+            if len(self.__sources) > self.__max_tracked:
+                self.__sources.popitem(last=False)
+        else:
+            self.__sources.move_to_end(message_id)
+        try:
+            member = await self.__chat_member_repo.get((source_id, user_id))
+        except ObjectNotFoundExc:
+            raise AccessDeniedExc()
+        if ChatMemberPermissions.MESSAGE_GET not in member.permissions:
+            raise AccessDeniedExc()
@@ -1,8 +1,31 @@
-from typing import Protocol, Sequence
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterable,
+    ContextManager,
+    Dict,
+    Mapping,
+    Protocol,
+    Sequence,
+    Tuple,
+)
 from uuid import UUID
 
 from ...common.repositories import AbstractGet
-from .entities import Message, SourceType
+from .entities import (
+    Attachment,
+    Message,
+    MessagePage,
+    MessageRef,
+    OutboxEntry,
+    PurgeStats,
+    ReactionChange,
+    ScheduledMessage,
+    SourceType,
+)
+
+if TYPE_CHECKING:
+    import socket
 
 
 class AbstractMessageRepository(AbstractGet[UUID, Message], Protocol):
@@ -12,14 +35,27 @@ class AbstractMessageRepository(AbstractGet[UUID, Message], Protocol):
         source_type: SourceType,
         sender_id: UUID,
         text_content: str,
+        attachment: Attachment | None = None,
+        recipient_ids: Sequence[UUID] = (),
+        expires_at: datetime | None = None,
+        reply_to_id: UUID | None = None,
+        mentions: Sequence[UUID] = (),
     ) -> Message:
         """Создать сообщение
 
+        Записи outbox для получателей и индексы ответов и упоминаний
+        обновляются в той же транзакции.
+
         Args:
             source_id (UUID): Идентификатор ресурса
             source_type (SourceType): Тип ресурса
             sender_id (UUID): Идентификатор отправителя
             text_content (str): Текстовое сообщение
+            attachment (Attachment | None, optional): Ссылка на вложение
+            recipient_ids (Sequence[UUID], optional): Получатели для доставки
+            expires_at (datetime | None, optional): Время самоуничтожения
+            reply_to_id (UUID | None, optional): ID сообщения, на которое отвечают
+            mentions (Sequence[UUID], optional): Упомянутые пользователи
 
         Returns:
             Message: Объект сообщения
@@ -29,7 +65,7 @@ class AbstractMessageRepository(AbstractGet[UUID, Message], Protocol):
     async def get_list(
         self, source_id: UUID, source_type: SourceType, offset: int = 0, limit: int = 50
     ) -> Sequence[Message]:
-        """Получить список сообщений
+        """Получить список сообщений от новых к старым вместе со счетчиками реакций
 
         Args:
             source_id (UUID): Идентификатор ресурса
@@ -41,3 +77,347 @@ class AbstractMessageRepository(AbstractGet[UUID, Message], Protocol):
             Sequence[Message]: Список сообщений
         """
         ...
+
+    async def list_replies(
+        self, reply_to_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        """Получить ответы на сообщение от старых к новым
+
+        Args:
+            reply_to_id (UUID): ID сообщения
+            cursor (str | None, optional): Курсор предыдущей страницы
+            limit (int, optional): Лимит. По умолчанию 50.
+
+        Returns:
+            MessagePage: Страница ответов и курсор следующей
+        """
+        ...
+
+    async def list_mentions(
+        self, user_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        """Получить сообщения с упоминанием пользователя от новых к старым
+
+        Args:
+            user_id (UUID): ID пользователя
+            cursor (str | None, optional): Курсор предыдущей страницы
+            limit (int, optional): Лимит. По умолчанию 50.
+
+        Returns:
+            MessagePage: Страница сообщений и курсор следующей
+        """
+        ...
+
+    async def delete_many(self, ids: Sequence[UUID]) -> int:
+        """Удалить сообщения одним запросом
+
+        Args:
+            ids (Sequence[UUID]): Идентификаторы сообщений
+
+        Returns:
+            int: Количество удаленных сообщений
+        """
+        ...
+
+    async def delete_by_source(self, source_id: UUID, limit: int = 1000) -> int:
+        """Удалить очередную пачку сообщений ресурса любого типа
+
+        Вместе с сообщениями удаляются их записи outbox, упоминаний и реакций.
+
+        Args:
+            source_id (UUID): Идентификатор ресурса
+            limit (int, optional): Лимит. По умолчанию 1000.
+
+        Returns:
+            int: Количество удаленных сообщений, 0 — сообщений не осталось
+        """
+        ...
+
+    async def purge(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        before: datetime | None = None,
+        keep: int | None = None,
+        limit: int = 1000,
+    ) -> PurgeStats:
+        """Удалить очередную пачку старых сообщений ресурса
+
+        Удаляется непрерывный диапазон в начале истории: сообщения старше
+        `before` и все, кроме `keep` последних. Вместе с сообщениями
+        удаляются их записи outbox, упоминаний и реакций.
+
+        Args:
+            source_id (UUID): Идентификатор ресурса
+            source_type (SourceType): Тип ресурса
+            before (datetime | None, optional): Удалить сообщения старше
+            keep (int | None, optional): Оставить столько последних сообщений
+            limit (int, optional): Лимит. По умолчанию 1000.
+
+        Returns:
+            PurgeStats: Количество удаленных сообщений (0 — удалять больше
+                нечего) и освобожденное место
+        """
+        ...
+
+    async def list_sources(
+        self, after: Tuple[UUID, SourceType] | None = None, limit: int = 1000
+    ) -> Sequence[Tuple[UUID, SourceType]]:
+        """Получить ресурсы, в которых есть сообщения, упорядоченные по ID
+
+        Args:
+            after (Tuple[UUID, SourceType] | None, optional): Последний ресурс
+                предыдущей страницы
+            limit (int, optional): Лимит. По умолчанию 1000.
+
+        Returns:
+            Sequence[Tuple[UUID, SourceType]]: Идентификаторы и типы ресурсов
+        """
+        ...
+
+    async def list_expiring(
+        self, after_id: UUID | None = None, limit: int = 1000
+    ) -> Sequence[Tuple[MessageRef, datetime]]:
+        """Получить сообщения со сроком жизни, упорядоченные по ID
+
+        Args:
+            after_id (UUID | None, optional): ID последнего сообщения предыдущей
+                страницы
+            limit (int, optional): Лимит. По умолчанию 1000.
+
+        Returns:
+            Sequence[Tuple[MessageRef, datetime]]: Сообщения и время их удаления
+        """
+        ...
+
+
+class AbstractScheduledMessageRepository(Protocol):
+    async def create(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        sender_id: UUID,
+        text_content: str,
+        send_at: datetime,
+        attachment: Attachment | None = None,
+        ttl: float | None = None,
+    ) -> ScheduledMessage:
+        """Запланировать отправку сообщения
+
+        Args:
+            source_id (UUID): Идентификатор ресурса
+            source_type (SourceType): Тип ресурса
+            sender_id (UUID): Идентификатор отправителя
+            text_content (str): Текстовое сообщение
+            send_at (datetime): Время отправки
+            attachment (Attachment | None, optional): Ссылка на вложение
+            ttl (float | None, optional): Срок жизни после отправки в секундах
+
+        Returns:
+            ScheduledMessage: Запланированное сообщение
+        """
+        ...
+
+    async def get_many(self, ids: Sequence[UUID]) -> Sequence[ScheduledMessage]:
+        """Получить запланированные сообщения одним запросом
+
+        Args:
+            ids (Sequence[UUID]): Идентификаторы
+
+        Returns:
+            Sequence[ScheduledMessage]: Найденные сообщения
+        """
+        ...
+
+    async def delete_many(self, ids: Sequence[UUID]) -> int:
+        """Удалить запланированные сообщения
+
+        Args:
+            ids (Sequence[UUID]): Идентификаторы
+
+        Returns:
+            int: Количество удаленных сообщений
+        """
+        ...
+
+    async def list_pending(
+        self, after_id: UUID | None = None, limit: int = 1000
+    ) -> Sequence[ScheduledMessage]:
+        """Получить запланированные сообщения, упорядоченные по ID
+
+        Args:
+            after_id (UUID | None, optional): ID последнего сообщения предыдущей
+                страницы
+            limit (int, optional): Лимит. По умолчанию 1000.
+
+        Returns:
+            Sequence[ScheduledMessage]: Запланированные сообщения
+        """
+        ...
+
+
+class AbstractReactionRepository(Protocol):
+    async def apply(
+        self, changes: Sequence[ReactionChange], shards: Mapping[UUID, int]
+    ) -> Mapping[UUID, Dict[str, int]]:
+        """Применить пачку реакций одной транзакцией
+
+        Повторная реакция пользователя тем же эмодзи и снятие отсутствующей
+        реакции счетчики не меняют. Реакции на несуществующие сообщения
+        отбрасываются. Счетчик сообщения хранится в нескольких строках-шардах,
+        чтобы параллельные записи в популярное сообщение не конкурировали за
+        одну строку.
+
+        Args:
+            changes (Sequence[ReactionChange]): Изменения в порядке поступления
+            shards (Mapping[UUID, int]): Шард счетчика для сообщения,
+                по умолчанию 0
+
+        Returns:
+            Mapping[UUID, Dict[str, int]]: Итоговые счетчики затронутых сообщений
+        """
+        ...
+
+    async def get_counts(self, message_id: UUID) -> Dict[str, int]:
+        """Получить счетчики реакций сообщения
+
+        Args:
+            message_id (UUID): ID сообщения
+
+        Returns:
+            Dict[str, int]: Количество реакций по эмодзи
+        """
+        ...
+
+
+class AbstractOutboxRepository(Protocol):
+    async def claim(
+        self, now: float, limit: int = 500, lease: float = 30.0
+    ) -> Sequence[OutboxEntry]:
+        """Захватить записи, готовые к доставке
+
+        Захваченные записи скрываются от других диспетчеров на `lease` секунд.
+
+        Args:
+            now (float): Текущее время
+            limit (int, optional): Максимум записей. По умолчанию 500.
+            lease (float, optional): Срок захвата. По умолчанию 30.
+
+        Returns:
+            Sequence[OutboxEntry]: Записи в порядке готовности
+        """
+        ...
+
+    async def ack(self, keys: Sequence[Tuple[UUID, UUID]]) -> int:
+        """Подтвердить доставку
+
+        Повторное подтверждение ничего не делает.
+
+        Args:
+            keys (Sequence[Tuple[UUID, UUID]]): Пары (ID сообщения, ID получателя)
+
+        Returns:
+            int: Количество подтвержденных записей
+        """
+        ...
+
+    async def retry(self, schedule: Sequence[Tuple[int, float]]) -> None:
+        """Запланировать повторную доставку и увеличить счетчик попыток
+
+        Args:
+            schedule (Sequence[Tuple[int, float]]): Пары (ID записи, время попытки)
+        """
+        ...
+
+    async def fail(self, ids: Sequence[int]) -> None:
+        """Прекратить доставку записей
+
+        Args:
+            ids (Sequence[int]): ID записей
+        """
+        ...
+
+    async def count_pending(self) -> int:
+        """Получить количество недоставленных записей
+
+        Returns:
+            int: Количество записей
+        """
+        ...
+
+
+class AbstractBlobRepository(Protocol):
+    async def put_stream(
+        self, chunks: AsyncIterable[bytes], max_size: int | None = None
+    ) -> Tuple[str, int]:
+        """Сохранить содержимое потоком, не буферизуя его целиком
+
+        Одинаковое содержимое хранится в единственном экземпляре.
+
+        Args:
+            chunks (AsyncIterable[bytes]): Части содержимого
+            max_size (int | None, optional): Максимальный размер в байтах
+
+        Returns:
+            Tuple[str, int]: Хэш содержимого и его размер
+
+        Raises:
+            PayloadTooLargeExc: Превышен максимальный размер
+        """
+        ...
+
+    async def size(self, digest: str) -> int:
+        """Получить размер содержимого
+
+        Args:
+            digest (str): Хэш содержимого
+
+        Returns:
+            int: Размер в байтах
+
+        Raises:
+            ObjectNotFoundExc: Содержимое не найдено
+        """
+        ...
+
+    def open_range(
+        self, digest: str, offset: int = 0, length: int | None = None
+    ) -> ContextManager[memoryview]:
+        """Открыть диапазон содержимого без копирования
+
+        Args:
+            digest (str): Хэш содержимого
+            offset (int, optional): Смещение. По умолчанию 0.
+            length (int | None, optional): Длина. По умолчанию до конца.
+
+        Returns:
+            ContextManager[memoryview]: Представление диапазона,
+                действительное внутри контекста
+
+        Raises:
+            ObjectNotFoundExc: Содержимое не найдено
+        """
+        ...
+
+    async def send_range(
+        self,
+        digest: str,
+        sock: "socket.socket",
+        offset: int = 0,
+        length: int | None = None,
+    ) -> int:
+        """Отправить диапазон содержимого в сокет через sendfile
+
+        Args:
+            digest (str): Хэш содержимого
+            sock (socket.socket): Неблокирующий сокет
+            offset (int, optional): Смещение. По умолчанию 0.
+            length (int | None, optional): Длина. По умолчанию до конца.
+
+        Returns:
+            int: Количество отправленных байт
+
+        Raises:
+            ObjectNotFoundExc: Содержимое не найдено
+        """
+        ...
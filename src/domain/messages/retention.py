@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Tuple
+from uuid import UUID
+
+from ...common.exceptions import ObjectNotFoundExc
+from ..chats.entities import RetentionPolicy
+from ..chats.repositories import AbstractChatRepository
+from .entities import PurgeStats, SourceType
+from .repositories import AbstractMessageRepository
+from .services import AbstractMessageService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionMetrics:
+    runs: int = 0
+    sources: int = 0
+    messages: int = 0
+    bytes: int = 0
+    errors: int = 0
+
+
+class RetentionJob:
+    """Периодическая очистка истории по политикам хранения
+
+    Обходит все ресурсы с сообщениями и для каждого вызывает
+    `MessageService.purge` с политикой чата, пока удалять больше нечего.
+    Сообщения удаляются диапазонами в начале истории не больше `batch_size`
+    за раз, между пачками задание засыпает на `pause` секунд.
+    """
+
+    def __init__(
+        self,
+        message_service: AbstractMessageService,
+        message_repository: AbstractMessageRepository,
+        chat_repository: AbstractChatRepository,
+        batch_size: int = 1000,
+        pause: float = 0.05,
+        interval: float = 3600.0,
+    ):
+        self.__message_service = message_service
+        self.__message_repo = message_repository
+        self.__chat_repo = chat_repository
+        self.__batch_size = batch_size
+        self.__pause = pause
+        self.__interval = interval
+        self.metrics = RetentionMetrics()
+
+    async def purge_source(
+        self, source_id: UUID, source_type: SourceType
+    ) -> PurgeStats:
+        """Привести историю ресурса к его политике хранения
+
+        Args:
+            source_id (UUID): Идентификатор ресурса
+            source_type (SourceType): Тип ресурса
+
+        Returns:
+            PurgeStats: Сколько сообщений удалено и места освобождено
+        """
+        try:
+            policy = (await self.__chat_repo.get(_id=source_id)).retention
+        except ObjectNotFoundExc:
+            policy = RetentionPolicy()
+        total = PurgeStats()
+        while True:
+            stats = await self.__message_service.purge(
+                source_id, source_type, policy, limit=self.__batch_size
+            )
+            if not stats.messages:
+                return total
+            total.messages += stats.messages
+            total.bytes += stats.bytes
+            self.metrics.messages += stats.messages
+            self.metrics.bytes += stats.bytes
+            await asyncio.sleep(self.__pause)
+
+    async def purge_all(self) -> PurgeStats:
+        """Привести к политикам хранения все ресурсы
+
+        Returns:
+            PurgeStats: Сколько сообщений удалено и места освобождено
+        """
+        total = PurgeStats()
+        after: Tuple[UUID, SourceType] | None = None
+        while sources := await self.__message_repo.list_sources(after=after):
+            for source_id, source_type in sources:
+                stats = await self.purge_source(source_id, source_type)
+                total.messages += stats.messages
+                total.bytes += stats.bytes
+                self.metrics.sources += 1
+            after = sources[-1]
+        self.metrics.runs += 1
+        return total
+
+    async def run(self) -> None:
+        while True:
+            try:
+                stats = await self.purge_all()
+                logger.info(
+                    "Retention purge removed %s messages, reclaimed %s bytes",
+                    stats.messages,
+                    stats.bytes,
+                )
+            except Exception:
+                self.metrics.errors += 1
+                logger.exception("Retention purge failed")
+            await asyncio.sleep(self.__interval)
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Hashable, List, Sequence, TypeVar
+from uuid import UUID
+
+from ...common.events import EventBus
+from ...common.exceptions import (
+    AccessDeniedExc,
+    InvalidFormatExc,
+    ObjectNotFoundExc,
+    PayloadTooLargeExc,
+)
+from ...common.timing_wheel import HierarchicalTimingWheel
+from .entities import Attachment, Message, MessageRef, ScheduledMessage, SourceType
+from .events import MessageSent
+from .repositories import AbstractMessageRepository, AbstractScheduledMessageRepository
+from .services import AbstractMessageService
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+
+# Повторная отправка не поможет: сообщение сразу уходит в dead letters
+_PERMANENT_ERRORS = (
+    AccessDeniedExc,
+    InvalidFormatExc,
+    ObjectNotFoundExc,
+    PayloadTooLargeExc,
+)
+
+
+@dataclass
+class SchedulerMetrics:
+    sent: int = 0
+    send_errors: int = 0
+    dead_letters: int = 0
+    expired: int = 0
+    errors: int = 0
+
+
+class MessageScheduler:
+    """Отложенная отправка и удаление сообщений по сроку
+
+    Все таймеры хранятся в двух иерархических колесах в памяти: отложенные
+    отправки и сроки жизни сообщений. Источник истины — репозитории, `start`
+    восстанавливает колеса из них постранично. Один проход `tick` стоит O(1)
+    от числа ожидающих таймеров плюс работа над наступившими, которая
+    выполняется пачками по `batch_size`.
+
+    Отправка выполняется по модели at-least-once: запланированное сообщение
+    удаляется из репозитория после отправки, поэтому при падении между
+    ними сообщение будет отправлено повторно после рестарта. Отправка,
+    отклоненная доменной ошибкой (нет доступа, чат удален) или не удавшаяся
+    `max_attempts` раз, удаляется из репозитория с записью в лог и метрику
+    `dead_letters`. Сообщения со сроком, отправленные в обход планировщика,
+    нужно передать в `track`: при наличии `event_bus` планировщик сам
+    подписывает его на `MessageSent`. Если пачку не удалось обработать из-за
+    ошибки репозитория, ее таймеры ставятся повторно через `retry_delay`.
+    """
+
+    def __init__(
+        self,
+        message_service: AbstractMessageService,
+        scheduled_message_repository: AbstractScheduledMessageRepository,
+        message_repository: AbstractMessageRepository,
+        tick: float = 1.0,
+        batch_size: int = 1000,
+        retry_delay: float = 5.0,
+        max_attempts: int = 5,
+        event_bus: EventBus | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.__message_service = message_service
+        self.__scheduled_repo = scheduled_message_repository
+        self.__message_repo = message_repository
+        self.__tick = tick
+        self.__batch_size = batch_size
+        self.__retry_delay = retry_delay
+        self.__max_attempts = max_attempts
+        self.__attempts: Dict[UUID, int] = {}
+        self.__clock = clock
+        self.__sends: HierarchicalTimingWheel[UUID] = HierarchicalTimingWheel(
+            tick=tick, clock=clock
+        )
+        self.__expiry: HierarchicalTimingWheel[MessageRef] = HierarchicalTimingWheel(
+            tick=tick, clock=clock
+        )
+        self.metrics = SchedulerMetrics()
+        if event_bus is not None:
+            event_bus.subscribe(MessageSent, self.__on_message_sent)
+
+    @property
+    def pending_sends(self) -> int:
+        return len(self.__sends)
+
+    @property
+    def pending_expiry(self) -> int:
+        return len(self.__expiry)
+
+    async def start(self) -> int:
+        """Восстановить таймеры из репозиториев
+
+        Returns:
+            int: Количество восстановленных таймеров
+        """
+        restored = 0
+        after_id = None
+        while True:
+            page = await self.__scheduled_repo.list_pending(
+                after_id=after_id, limit=self.__batch_size
+            )
+            for scheduled in page:
+                self.__sends.schedule(scheduled.id, scheduled.send_at.timestamp())
+            restored += len(page)
+            if len(page) < self.__batch_size:
+                break
+            after_id = page[-1].id
+
+        after_id = None
+        while True:
+            expiring = await self.__message_repo.list_expiring(
+                after_id=after_id, limit=self.__batch_size
+            )
+            for ref, expires_at in expiring:
+                self.__expiry.schedule(ref, expires_at.timestamp())
+            restored += len(expiring)
+            if len(expiring) < self.__batch_size:
+                break
+            after_id = expiring[-1][0].id
+        return restored
+
+    async def schedule_send(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        sender_id: UUID,
+        text_content: str,
+        send_at: datetime,
+        attachment: Attachment | None = None,
+        ttl: float | None = None,
+    ) -> ScheduledMessage:
+        """Запланировать отправку сообщения
+
+        Args:
+            source_id (UUID): Идентификатор ресурса
+            source_type (SourceType): Тип ресурса
+            sender_id (UUID): ID отправителя
+            text_content (str): Текст сообщения
+            send_at (datetime): Время отправки
+            attachment (Attachment | None, optional): Вложение
+            ttl (float | None, optional): Время жизни после отправки в секундах
+
+        Returns:
+            ScheduledMessage: Запланированное сообщение
+        """
+        scheduled = await self.__scheduled_repo.create(
+            source_id=source_id,
+            source_type=source_type,
+            sender_id=sender_id,
+            text_content=text_content,
+            send_at=send_at,
+            attachment=attachment,
+            ttl=ttl,
+        )
+        self.__sends.schedule(scheduled.id, send_at.timestamp())
+        return scheduled
+
+    async def cancel_send(self, _id: UUID) -> bool:
+        self.__sends.cancel(_id)
+        self.__attempts.pop(_id, None)
+        return await self.__scheduled_repo.delete_many([_id]) > 0
+
+    def track(self, message: Message) -> None:
+        if message.expires_at is not None:
+            self.__expiry.schedule(
+                MessageRef(message.id, message.source_id, message.source_type),
+                message.expires_at.timestamp(),
+            )
+
+    async def tick(self, now: float | None = None) -> int:
+        """Отправить и удалить сообщения с наступившим сроком
+
+        Args:
+            now (float | None, optional): Текущее время. По умолчанию по часам.
+
+        Returns:
+            int: Количество обработанных таймеров
+        """
+        if now is None:
+            now = self.__clock()
+        due_sends = self.__sends.advance(now)
+        due_expiry = self.__expiry.advance(now)
+        # Наступившие таймеры уже сняты с колес: пачка, на которой упал
+        # репозиторий, ставится обратно через `retry_delay`, а не теряется
+        for start in range(0, len(due_sends), self.__batch_size):
+            ids = due_sends[start : start + self.__batch_size]
+            try:
+                await self.__send_batch(ids, now)
+            except Exception:
+                self.__fail_batch(self.__sends, ids, now, "Scheduled sends failed")
+        for start in range(0, len(due_expiry), self.__batch_size):
+            refs = due_expiry[start : start + self.__batch_size]
+            try:
+                self.metrics.expired += await self.__message_service.expire(refs)
+            except Exception:
+                self.__fail_batch(self.__expiry, refs, now, "Message expiry failed")
+        return len(due_sends) + len(due_expiry)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                self.metrics.errors += 1
+                logger.exception("Scheduler tick failed")
+            await asyncio.sleep(self.__tick)
+
+    def __fail_batch(
+        self,
+        wheel: HierarchicalTimingWheel[K],
+        keys: Sequence[K],
+        now: float,
+        message: str,
+    ) -> None:
+        self.metrics.errors += 1
+        logger.exception(message)
+        for key in keys:
+            wheel.schedule(key, now + self.__retry_delay)
+
+    def __on_message_sent(self, event: MessageSent) -> None:
+        self.track(event.message)
+
+    async def __send_batch(self, ids: Sequence[UUID], now: float) -> None:
+        sent: List[UUID] = []
+        dead: List[UUID] = []
+        for scheduled in await self.__scheduled_repo.get_many(ids):
+            expires_at = (
+                datetime.fromtimestamp(now + scheduled.ttl)
+                if scheduled.ttl is not None
+                else None
+            )
+            try:
+                message = await self.__message_service.send(
+                    source_id=scheduled.source_id,
+                    source_type=scheduled.source_type,
+                    sender_id=scheduled.sender_id,
+                    text_content=scheduled.text_content,
+                    attachment=scheduled.attachment,
+                    expires_at=expires_at,
+                )
+            except Exception as exc:
+                self.metrics.send_errors += 1
+                attempts = self.__attempts.get(scheduled.id, 0) + 1
+                if (
+                    isinstance(exc, _PERMANENT_ERRORS)
+                    or attempts >= self.__max_attempts
+                ):
+                    logger.error(
+                        "Scheduled message %s dropped after %d attempts: %r",
+                        scheduled.id,
+                        attempts,
+                        exc,
+                    )
+                    self.__attempts.pop(scheduled.id, None)
+                    dead.append(scheduled.id)
+                    continue
+                logger.exception("Scheduled message %s failed", scheduled.id)
+                self.__attempts[scheduled.id] = attempts
+                self.__sends.schedule(scheduled.id, now + self.__retry_delay)
+                continue
+            self.__attempts.pop(scheduled.id, None)
+            self.track(message)
+            sent.append(scheduled.id)
+        if sent or dead:
+            await self.__scheduled_repo.delete_many(sent + dead)
+            self.metrics.sent += len(sent)
+            self.metrics.dead_letters += len(dead)
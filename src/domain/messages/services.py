@@ -1,8 +1,25 @@
-from typing import Protocol, Sequence
+from datetime import datetime
+from typing import AsyncIterable, ContextManager, Protocol, Sequence
 from uuid import UUID
 
-from .entities import Message, SourceType
-from .repositories import AbstractMessageRepository
+from ...common.events import AbstractEventPublisher
+from ...common.exceptions import ObjectNotFoundExc
+from ..chats.cache import ChatSnapshotCache
+from ..chats.entities import RetentionPolicy
+from ..chats.repositories import AbstractChatMemberRepository
+from .cache import TimelineCache
+from .entities import (
+    Attachment,
+    Message,
+    MessagePage,
+    MessageRef,
+    PurgeStats,
+    SourceType,
+    parse_mentions,
+)
+from .events import MessageSent
+from .reactions import ReactionService
+from .repositories import AbstractBlobRepository, AbstractMessageRepository
 
 
 class AbstractMessageService(Protocol):
@@ -12,17 +29,30 @@ class AbstractMessageService(Protocol):
         source_type: SourceType,
         sender_id: UUID,
         text_content: str,
+        attachment: Attachment | None = None,
+        expires_at: datetime | None = None,
+        reply_to_id: UUID | None = None,
     ) -> Message:
         """Отправить сообщение
 
+        Упоминания вида `@<user_id>` извлекаются из текста. Если сервис знает
+        участников чата, упоминания посторонних отбрасываются.
+
         Args:
             source_id (UUID): Идентификатор ресурса
             source_type (SourceType): Тип ресурса
             sender_id (UUID): Идентификатор отправителя
             text_content (str): Текстовое сообщение
+            attachment (Attachment | None, optional): Загруженное вложение
+            expires_at (datetime | None, optional): Время самоуничтожения
+            reply_to_id (UUID | None, optional): ID сообщения, на которое отвечают
 
         Returns:
             Message: Объект сообщения
+
+        Raises:
+            ObjectNotFoundExc: Сообщение, на которое отвечают, не найдено в чате,
+                или чат удален
         """
         ...
 
@@ -43,7 +73,7 @@ class AbstractMessageService(Protocol):
     async def get_list(
         self, source_id: UUID, source_type: SourceType, offset: int = 0, limit: int = 50
     ) -> Sequence[Message]:
-        """Получить список сообщений
+        """Получить список сообщений от новых к старым
 
         Args:
             source_id (UUID): Идентификатор ресурса
@@ -56,10 +86,141 @@ class AbstractMessageService(Protocol):
         """
         ...
 
+    async def list_replies(
+        self, message_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        """Получить ветку ответов на сообщение от старых к новым
+
+        Args:
+            message_id (UUID): ID сообщения
+            cursor (str | None, optional): Курсор предыдущей страницы
+            limit (int, optional): Лимит. По умолчанию 50.
+
+        Returns:
+            MessagePage: Страница ответов и курсор следующей
+        """
+        ...
+
+    async def list_mentions(
+        self, user_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        """Получить сообщения с упоминанием пользователя от новых к старым
+
+        Args:
+            user_id (UUID): ID пользователя
+            cursor (str | None, optional): Курсор предыдущей страницы
+            limit (int, optional): Лимит. По умолчанию 50.
+
+        Returns:
+            MessagePage: Страница сообщений и курсор следующей
+        """
+        ...
+
+    async def expire(self, refs: Sequence[MessageRef]) -> int:
+        """Удалить истекшие сообщения
+
+        Args:
+            refs (Sequence[MessageRef]): Ссылки на сообщения
+
+        Returns:
+            int: Количество удаленных сообщений
+        """
+        ...
+
+    async def purge(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        policy: RetentionPolicy | None = None,
+        limit: int = 1000,
+    ) -> PurgeStats:
+        """Удалить очередную пачку сообщений, вышедших за политику хранения
+
+        Args:
+            source_id (UUID): Идентификатор ресурса
+            source_type (SourceType): Тип ресурса
+            policy (RetentionPolicy | None, optional): Политика чата, дополняется
+                глобальной политикой сервиса
+            limit (int, optional): Лимит. По умолчанию 1000.
+
+        Returns:
+            PurgeStats: Количество удаленных сообщений (0 — удалять больше
+                нечего) и освобожденное место
+        """
+        ...
+
+
+class AbstractAttachmentService(Protocol):
+    async def upload(
+        self,
+        chunks: AsyncIterable[bytes],
+        content_type: str,
+        filename: str | None = None,
+    ) -> Attachment:
+        """Загрузить вложение потоком
+
+        Args:
+            chunks (AsyncIterable[bytes]): Части содержимого
+            content_type (str): MIME-тип
+            filename (str | None, optional): Имя файла
+
+        Returns:
+            Attachment: Ссылка на вложение
+
+        Raises:
+            PayloadTooLargeExc: Вложение превышает допустимый размер
+        """
+        ...
+
+    def open_range(
+        self, attachment: Attachment, offset: int = 0, length: int | None = None
+    ) -> ContextManager[memoryview]:
+        """Открыть диапазон вложения без копирования
+
+        Args:
+            attachment (Attachment): Ссылка на вложение
+            offset (int, optional): Смещение. По умолчанию 0.
+            length (int | None, optional): Длина. По умолчанию до конца.
+
+        Returns:
+            ContextManager[memoryview]: Представление диапазона
+
+        Raises:
+            ObjectNotFoundExc: Вложение не найдено
+        """
+        ...
+
 
 class MessageService:
-    def __init__(self, message_repository: AbstractMessageRepository):
+    """Сервис сообщений
+
+    Если передан репозиторий участников, каждое сообщение ставится в outbox
+    для доставки всем участникам чата, кроме отправителя, а отправка в чат
+    без участников (удаленный или не существовавший) отклоняется. Если
+    передан кэш снимков чатов, общий с `ChatService`, отправка в удаленный
+    чат отклоняется сразу после `ChatService.delete`. Если передан кэш
+    ленты, первые страницы истории читаются из него. Если передан сервис
+    реакций, в страницы подставляются его свежие счетчики. `retention` —
+    глобальная политика хранения, ее дополняют политики отдельных чатов.
+    """
+
+    def __init__(
+        self,
+        message_repository: AbstractMessageRepository,
+        event_bus: AbstractEventPublisher | None = None,
+        chat_member_repository: AbstractChatMemberRepository | None = None,
+        timeline_cache: TimelineCache | None = None,
+        reaction_service: ReactionService | None = None,
+        retention: RetentionPolicy | None = None,
+        chat_snapshot_cache: ChatSnapshotCache | None = None,
+    ):
         self.__message_repo = message_repository
+        self.__event_bus = event_bus
+        self.__chat_member_repo = chat_member_repository
+        self.__timeline_cache = timeline_cache
+        self.__reaction_service = reaction_service
+        self.__retention = retention or RetentionPolicy()
+        self.__chat_snapshots = chat_snapshot_cache
 
     async def send(
         self,
@@ -67,20 +228,139 @@ class MessageService:
         source_type: SourceType,
         sender_id: UUID,
         text_content: str,
+        attachment: Attachment | None = None,
+        expires_at: datetime | None = None,
+        reply_to_id: UUID | None = None,
     ) -> Message:
-        return await self.__message_repo.create(
+        if self.__chat_snapshots is not None:
+            # Удаленный чат не находится сразу, еще до очистки участников
+            await self.__chat_snapshots.get(source_id)
+        if reply_to_id is not None:
+            parent = await self.__message_repo.get(_id=reply_to_id)
+            if parent.source_id != source_id or parent.source_type != source_type:
+                raise ObjectNotFoundExc("Message not found")
+        mentions = parse_mentions(text_content)
+        recipient_ids: Sequence[UUID] = ()
+        if self.__chat_member_repo is not None:
+            members = await self.__chat_member_repo.list_user_ids_by_chat_id(
+                _id=source_id
+            )
+            # У живого чата всегда есть владелец, а реапер удаляет участников
+            # удаленного чата раньше его сообщений
+            if not members:
+                raise ObjectNotFoundExc("Chat not found")
+            recipient_ids = [user_id for user_id in members if user_id != sender_id]
+            if mentions:
+                member_ids = set(members)
+                mentions = tuple(m for m in mentions if m in member_ids)
+        message = await self.__message_repo.create(
             source_id=source_id,
             source_type=source_type,
             sender_id=sender_id,
             text_content=text_content,
+            attachment=attachment,
+            recipient_ids=recipient_ids,
+            expires_at=expires_at,
+            reply_to_id=reply_to_id,
+            mentions=mentions,
         )
+        if self.__timeline_cache is not None:
+            self.__timeline_cache.append(message)
+        if self.__event_bus is not None:
+            await self.__event_bus.publish(MessageSent(message=message))
+        return message
 
     async def get(self, _id: UUID) -> Message:
-        return await self.__message_repo.get(_id=_id)
+        message = await self.__message_repo.get(_id=_id)
+        if self.__reaction_service is not None:
+            self.__reaction_service.attach([message])
+        return message
 
     async def get_list(
         self, source_id: UUID, source_type: SourceType, offset: int = 0, limit: int = 50
     ) -> Sequence[Message]:
-        return await self.__message_repo.get_list(
-            source_id=source_id, source_type=source_type, offset=offset, limit=limit
+        if self.__timeline_cache is not None:
+            messages = await self.__timeline_cache.get_list(
+                source_id=source_id, source_type=source_type, offset=offset, limit=limit
+            )
+        else:
+            messages = await self.__message_repo.get_list(
+                source_id=source_id, source_type=source_type, offset=offset, limit=limit
+            )
+        if self.__reaction_service is not None:
+            self.__reaction_service.attach(messages)
+        return messages
+
+    async def list_replies(
+        self, message_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        return await self.__message_repo.list_replies(
+            reply_to_id=message_id, cursor=cursor, limit=limit
+        )
+
+    async def list_mentions(
+        self, user_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        return await self.__message_repo.list_mentions(
+            user_id=user_id, cursor=cursor, limit=limit
+        )
+
+    async def expire(self, refs: Sequence[MessageRef]) -> int:
+        deleted = await self.__message_repo.delete_many([ref.id for ref in refs])
+        if self.__timeline_cache is not None:
+            for source_id, source_type in {(r.source_id, r.source_type) for r in refs}:
+                self.__timeline_cache.invalidate(source_id, source_type)
+        return deleted
+
+    async def purge(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        policy: RetentionPolicy | None = None,
+        limit: int = 1000,
+    ) -> PurgeStats:
+        policy = (policy or RetentionPolicy()).merge(self.__retention)
+        if policy.unlimited:
+            return PurgeStats()
+        stats = await self.__message_repo.purge(
+            source_id=source_id,
+            source_type=source_type,
+            before=(
+                datetime.now() - policy.max_age if policy.max_age is not None else None
+            ),
+            keep=policy.max_count,
+            limit=limit,
+        )
+        if stats.messages and self.__timeline_cache is not None:
+            self.__timeline_cache.invalidate(source_id, source_type)
+        return stats
+
+
+class AttachmentService:
+    def __init__(
+        self,
+        blob_repository: AbstractBlobRepository,
+        max_size: int = 100 * 1024 * 1024,
+    ):
+        self.__blob_repo = blob_repository
+        self.__max_size = max_size
+
+    async def upload(
+        self,
+        chunks: AsyncIterable[bytes],
+        content_type: str,
+        filename: str | None = None,
+    ) -> Attachment:
+        digest, size = await self.__blob_repo.put_stream(
+            chunks, max_size=self.__max_size
+        )
+        return Attachment(
+            digest=digest, size=size, content_type=content_type, filename=filename
+        )
+
+    def open_range(
+        self, attachment: Attachment, offset: int = 0, length: int | None = None
+    ) -> ContextManager[memoryview]:
+        return self.__blob_repo.open_range(
+            attachment.digest, offset=offset, length=length
         )
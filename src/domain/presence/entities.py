@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from uuid import UUID
+
+
+class PresenceStatus(str, Enum):
+    ONLINE = "online"
+    OFFLINE = "offline"
+
+
+@dataclass
+class Presence:
+    user_id: UUID
+    status: PresenceStatus
+    last_seen_at: datetime | None = None
@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+from datetime import datetime
+from uuid import UUID
+
+from ...common.events import DomainEvent
+
+
+@dataclass(frozen=True, kw_only=True)
+class UserOnline(DomainEvent):
+    user_id: UUID
+
+
+@dataclass(frozen=True, kw_only=True)
+class UserOffline(DomainEvent):
+    user_id: UUID
+    last_seen_at: datetime
+
+
+@dataclass(frozen=True, kw_only=True)
+class TypingStarted(DomainEvent):
+    chat_id: UUID
+    user_id: UUID
+
+
+@dataclass(frozen=True, kw_only=True)
+class TypingStopped(DomainEvent):
+    chat_id: UUID
+    user_id: UUID
@@ -0,0 +1,234 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Protocol, Sequence, Set, Tuple
+from uuid import UUID
+
+from ...common.events import AbstractEventPublisher, DomainEvent
+from ...common.exceptions import AccessDeniedExc, ObjectNotFoundExc
+from ...common.timing_wheel import TimingWheel
+from ..chats.entities import ChatMemberPermissions
+from ..chats.services import AbstractChatService
+from . import events
+from .entities import Presence, PresenceStatus
+
+
+class AbstractPresenceService(Protocol):
+    async def heartbeat(self, user_id: UUID) -> None:
+        """Отметить пользователя в сети
+
+        Args:
+            user_id (UUID): ID пользователя
+        """
+        ...
+
+    async def disconnect(self, user_id: UUID) -> None:
+        """Отметить пользователя не в сети
+
+        Args:
+            user_id (UUID): ID пользователя
+        """
+        ...
+
+    async def typing(self, chat_id: UUID, user_id: UUID) -> bool:
+        """Отметить, что пользователь печатает в чате
+
+        Args:
+            chat_id (UUID): ID чата
+            user_id (UUID): ID пользователя
+
+        Returns:
+            bool: True, если пользователь только начал печатать
+
+        Raises:
+            AccessDeniedExc: Пользователь не может писать в чат
+        """
+        ...
+
+    async def get_presence(
+        self, chat_id: UUID, viewer_id: UUID, user_ids: Sequence[UUID]
+    ) -> Sequence[Presence]:
+        """Получить статусы участников чата
+
+        Args:
+            chat_id (UUID): ID чата
+            viewer_id (UUID): ID запрашивающего пользователя
+            user_ids (Sequence[UUID]): ID пользователей
+
+        Returns:
+            Sequence[Presence]: Статусы пользователей, состоящих в чате
+
+        Raises:
+            AccessDeniedExc: Запрашивающий не может читать чат
+        """
+        ...
+
+    async def get_typing(self, chat_id: UUID, viewer_id: UUID) -> Sequence[UUID]:
+        """Получить список печатающих в чате
+
+        Args:
+            chat_id (UUID): ID чата
+            viewer_id (UUID): ID запрашивающего пользователя
+
+        Returns:
+            Sequence[UUID]: ID печатающих пользователей
+
+        Raises:
+            AccessDeniedExc: Запрашивающий не может читать чат
+        """
+        ...
+
+
+class PresenceService:
+    """Эфемерное состояние присутствия и набора текста
+
+    Состояние хранится только в памяти процесса и истекает по колесу таймеров,
+    которое продвигает `tick` (или фоновая задача `run`). Репозитории не
+    используются, кроме проверки членства. Право печатать проверяется
+    заново, только когда меняется версия снимка чата, то есть после
+    изменения чата или его участников. Время последнего визита хранится
+    для `max_last_seen` пользователей, давно ушедшие вытесняются.
+    """
+
+    def __init__(
+        self,
+        chat_service: AbstractChatService,
+        event_bus: AbstractEventPublisher | None = None,
+        online_ttl: float = 60.0,
+        typing_ttl: float = 6.0,
+        tick: float = 1.0,
+        max_last_seen: int = 100_000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.__chat_service = chat_service
+        self.__event_bus = event_bus
+        self.__online_ttl = online_ttl
+        self.__typing_ttl = typing_ttl
+        self.__tick = tick
+        self.__clock = clock
+        self.__online: TimingWheel[UUID] = TimingWheel(tick=tick, clock=clock)
+        self.__typing_timers: TimingWheel[Tuple[UUID, UUID]] = TimingWheel(
+            tick=tick, slots=64, clock=clock
+        )
+        self.__typing: Dict[UUID, Set[UUID]] = {}
+        # Версия снимка чата, при которой проверено право печатать
+        self.__typing_checked: Dict[Tuple[UUID, UUID], int] = {}
+        self.__max_last_seen = max_last_seen
+        self.__last_seen: OrderedDict[UUID, float] = OrderedDict()
+
+    @property
+    def online_count(self) -> int:
+        return len(self.__online)
+
+    async def heartbeat(self, user_id: UUID) -> None:
+        now = self.__clock()
+        was_online = user_id in self.__online
+        self.__online.schedule(user_id, now + self.__online_ttl)
+        if not was_online:
+            self.__last_seen.pop(user_id, None)
+            await self._publish(events.UserOnline(user_id=user_id))
+
+    async def disconnect(self, user_id: UUID) -> None:
+        if self.__online.cancel(user_id):
+            await self._go_offline(user_id, self.__clock())
+
+    async def typing(self, chat_id: UUID, user_id: UUID) -> bool:
+        key = (chat_id, user_id)
+        try:
+            snapshot = await self.__chat_service.get_snapshot(chat_id)
+        except ObjectNotFoundExc:
+            raise AccessDeniedExc()
+        if self.__typing_checked.get(key) != snapshot.version:
+            await self._ensure_can(chat_id, user_id, ChatMemberPermissions.MESSAGE_ADD)
+            self.__typing_checked[key] = snapshot.version
+        started = key not in self.__typing_timers
+        self.__typing_timers.schedule(key, self.__clock() + self.__typing_ttl)
+        if started:
+            self.__typing.setdefault(chat_id, set()).add(user_id)
+            await self._publish(events.TypingStarted(chat_id=chat_id, user_id=user_id))
+        return started
+
+    async def typing_stop(self, chat_id: UUID, user_id: UUID) -> None:
+        if self.__typing_timers.cancel((chat_id, user_id)):
+            await self._stop_typing(chat_id, user_id)
+
+    def status(self, user_id: UUID) -> Presence:
+        deadline = self.__online.deadline(user_id)
+        if deadline is not None:
+            return Presence(
+                user_id=user_id,
+                status=PresenceStatus.ONLINE,
+                last_seen_at=datetime.fromtimestamp(deadline - self.__online_ttl),
+            )
+        last_seen = self.__last_seen.get(user_id)
+        return Presence(
+            user_id=user_id,
+            status=PresenceStatus.OFFLINE,
+            last_seen_at=datetime.fromtimestamp(last_seen) if last_seen else None,
+        )
+
+    async def get_presence(
+        self, chat_id: UUID, viewer_id: UUID, user_ids: Sequence[UUID]
+    ) -> Sequence[Presence]:
+        await self._ensure_can_read(chat_id, viewer_id)
+        members = set(await self.__chat_service.member_list_ids(chat_id))
+        return [self.status(user_id) for user_id in user_ids if user_id in members]
+
+    async def get_typing(self, chat_id: UUID, viewer_id: UUID) -> Sequence[UUID]:
+        await self._ensure_can_read(chat_id, viewer_id)
+        return [
+            user_id
+            for user_id in self.__typing.get(chat_id, ())
+            if user_id != viewer_id
+        ]
+
+    async def tick(self, now: float | None = None) -> None:
+        if now is None:
+            now = self.__clock()
+        for user_id in self.__online.advance(now):
+            await self._go_offline(user_id, now)
+        for chat_id, user_id in self.__typing_timers.advance(now):
+            await self._stop_typing(chat_id, user_id)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.__tick)
+            await self.tick()
+
+    async def _go_offline(self, user_id: UUID, now: float) -> None:
+        self.__last_seen[user_id] = now
+        self.__last_seen.move_to_end(user_id)
+        if len(self.__last_seen) > self.__max_last_seen:
+            self.__last_seen.popitem(last=False)
+        await self._publish(
+            events.UserOffline(
+                user_id=user_id, last_seen_at=datetime.fromtimestamp(now)
+            )
+        )
+
+    async def _stop_typing(self, chat_id: UUID, user_id: UUID) -> None:
+        self.__typing_checked.pop((chat_id, user_id), None)
+        users = self.__typing.get(chat_id)
+        if users is not None:
+            users.discard(user_id)
+            if not users:
+                del self.__typing[chat_id]
+        await self._publish(events.TypingStopped(chat_id=chat_id, user_id=user_id))
+
+    async def _ensure_can_read(self, chat_id: UUID, user_id: UUID) -> None:
+        await self._ensure_can(chat_id, user_id, ChatMemberPermissions.MESSAGE_GET)
+
+    async def _ensure_can(
+        self, chat_id: UUID, user_id: UUID, action: ChatMemberPermissions
+    ) -> None:
+        try:
+            member = await self.__chat_service.member_get(chat_id, user_id)
+        except ObjectNotFoundExc:
+            raise AccessDeniedExc()
+        if action not in member.permissions:
+            raise AccessDeniedExc()
+
+    async def _publish(self, event: DomainEvent) -> None:
+        if self.__event_bus is not None:
+            await self.__event_bus.publish(event)
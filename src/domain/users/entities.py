@@ -11,3 +11,4 @@ class User:
     hashed_password: str
     created_at: datetime
     updated_at: datetime | None = None
+    token_version: int = 0
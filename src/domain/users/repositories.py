@@ -40,3 +40,17 @@ class AbstractUserRepository(
             ObjectNotFoundExc: Пользователь не найден
         """
         ...
+
+    async def increment_token_version(self, _id: UUID) -> User:
+        """Атомарно увеличить версию токенов пользователя на единицу
+
+        Args:
+            _id (UUID): Идентификатор пользователя
+
+        Returns:
+            User: Объект пользователя с новой версией токенов
+
+        Raises:
+            ObjectNotFoundExc: Пользователь не найден
+        """
+        ...
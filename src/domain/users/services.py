@@ -74,6 +74,20 @@ class AbstractUserService(Protocol):
         """
         ...
 
+    async def revoke_sessions(self, _id: UUID) -> User:
+        """Отозвать все сессии пользователя, увеличив версию токенов
+
+        Args:
+            _id (UUID): Идентификатор пользователя
+
+        Returns:
+            User: Объект пользователя
+
+        Raises:
+            ObjectNotFoundExc: Пользователь не найден
+        """
+        ...
+
     async def delete(self, _id: UUID) -> None:
         """Удалить пользователя
 
@@ -118,5 +132,8 @@ class UserService:
 
         return await self.__user_repo.update(_id, **attrs)
 
+    async def revoke_sessions(self, _id: UUID) -> User:
+        return await self.__user_repo.increment_token_version(_id)
+
     async def delete(self, _id: UUID) -> None:
         return await self.__user_repo.delete(_id=_id)
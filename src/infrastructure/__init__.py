@@ -0,0 +1,35 @@
+import importlib
+from typing import Any
+
+# Модули пакета тянут тяжелые зависимости: загружаем их при первом обращении
+_EXPORTS = {
+    "LocalBlobRepository": ".blobs",
+    "MemoryChangeSequence": ".memory",
+    "MemoryChatMemberRepository": ".memory",
+    "MemoryChatRepository": ".memory",
+    "MemoryMessageRepository": ".memory",
+    "MemoryUserRepository": ".memory",
+    "SQLAlchemyChatMemberRepository": ".sqla",
+    "SQLAlchemyChatRepository": ".sqla",
+    "SQLAlchemyUserRepository": ".sqla",
+    "SQLiteDatabase": ".sqlite",
+    "SQLiteMessageRepository": ".sqlite",
+    "SQLiteOutboxRepository": ".sqlite",
+    "SQLiteReactionRepository": ".sqlite",
+    "SQLiteScheduledMessageRepository": ".sqlite",
+    "SendRequest": ".workers",
+    "ShardedChatService": ".workers",
+    "ShardedMessageService": ".workers",
+    "WorkerPool": ".workers",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
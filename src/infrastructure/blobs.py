@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import socket
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncIterable, Iterator, Tuple
+
+from ..common.exceptions import ObjectNotFoundExc, PayloadTooLargeExc
+
+
+class LocalBlobRepository:
+    """Content-addressed хранилище вложений в локальной файловой системе
+
+    Содержимое лежит в `root/<sha256[:2]>/<sha256[2:4]>/<sha256>`.
+    """
+
+    def __init__(self, root: str | os.PathLike):
+        self.__root = Path(root)
+        self.__tmp = self.__root / "tmp"
+        self.__tmp.mkdir(parents=True, exist_ok=True)
+
+    def path(self, digest: str) -> Path:
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ObjectNotFoundExc()
+        return self.__root / digest[:2] / digest[2:4] / digest
+
+    async def put_stream(
+        self, chunks: AsyncIterable[bytes], max_size: int | None = None
+    ) -> Tuple[str, int]:
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.__tmp)
+        try:
+            with os.fdopen(fd, "wb", buffering=0) as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise PayloadTooLargeExc()
+                    hasher.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            digest = hasher.hexdigest()
+            await asyncio.to_thread(self.__commit, tmp_name, digest)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return digest, size
+
+    async def size(self, digest: str) -> int:
+        try:
+            return self.path(digest).stat().st_size
+        except FileNotFoundError:
+            raise ObjectNotFoundExc()
+
+    @contextmanager
+    def open_range(
+        self, digest: str, offset: int = 0, length: int | None = None
+    ) -> Iterator[memoryview]:
+        try:
+            f = open(self.path(digest), "rb")
+        except FileNotFoundError:
+            raise ObjectNotFoundExc()
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = len(mm) if length is None else min(len(mm), offset + length)
+                view = memoryview(mm)[offset:end]
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    async def send_range(
+        self,
+        digest: str,
+        sock: socket.socket,
+        offset: int = 0,
+        length: int | None = None,
+    ) -> int:
+        try:
+            f = open(self.path(digest), "rb")
+        except FileNotFoundError:
+            raise ObjectNotFoundExc()
+        with f:
+            loop = asyncio.get_running_loop()
+            return await loop.sock_sendfile(sock, f, offset, length)
+
+    def __commit(self, tmp_name: str, digest: str) -> None:
+        target = self.path(digest)
+        if target.exists():
+            os.unlink(tmp_name)
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(tmp_name, 0o444)
+        os.replace(tmp_name, target)
@@ -0,0 +1,591 @@
+import bisect
+import itertools
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+from uuid import UUID, uuid4
+
+from ..common.exceptions import AlreadyExistsExc, InvalidFormatExc, ObjectNotFoundExc
+from ..domain.chats.entities import Chat, ChatMember, ChatMemberPermissions, ChatType
+from ..domain.messages.entities import (
+    Attachment,
+    Message,
+    MessagePage,
+    MessageRef,
+    PurgeStats,
+    SourceType,
+)
+from ..domain.users.entities import User
+
+# Длина блока `_Index`: вставка и удаление сдвигают элементы только внутри блока
+_BLOCK = 512
+
+K = TypeVar("K", int, bytes)
+
+
+class MemoryChangeSequence:
+    """Номер изменения, общий для репозиториев в памяти, как у одной базы"""
+
+    def __init__(self):
+        self.__seq = 0
+
+    def bump(self) -> None:
+        self.__seq += 1
+
+    async def get_change_seq(self) -> int:
+        return self.__seq
+
+
+class MemoryUserRepository:
+    """Пользователи в памяти процесса с индексом по EMail"""
+
+    def __init__(self, change_sequence: MemoryChangeSequence | None = None):
+        self.__changes = change_sequence or MemoryChangeSequence()
+        self.__users: Dict[UUID, User] = {}
+        self.__by_email: Dict[str, UUID] = {}
+
+    def __len__(self) -> int:
+        return len(self.__users)
+
+    async def create(self, name: str, email: str, hashed_password: str) -> User:
+        if email in self.__by_email:
+            raise AlreadyExistsExc("User already exists")
+        user = User(
+            id=uuid4(),
+            name=name,
+            email=email,
+            hashed_password=hashed_password,
+            created_at=datetime.now(),
+        )
+        self.__users[user.id] = user
+        self.__by_email[email] = user.id
+        self.__changes.bump()
+        return user
+
+    async def get(self, _id: UUID) -> User:
+        user = self.__users.get(_id)
+        if user is None:
+            raise ObjectNotFoundExc("User not found")
+        return user
+
+    async def get_by_email(self, email: str) -> User:
+        user_id = self.__by_email.get(email)
+        if user_id is None:
+            raise ObjectNotFoundExc("User not found")
+        return self.__users[user_id]
+
+    async def update(self, _id: UUID, **attrs: Any) -> User:
+        user = await self.get(_id)
+        email = attrs.get("email")
+        if email is not None and email != user.email:
+            if email in self.__by_email:
+                raise AlreadyExistsExc("User already exists")
+            del self.__by_email[user.email]
+            self.__by_email[email] = _id
+        for name, value in attrs.items():
+            if value is not None and hasattr(user, name):
+                setattr(user, name, value)
+        user.updated_at = datetime.now()
+        self.__changes.bump()
+        return user
+
+    async def increment_token_version(self, _id: UUID) -> User:
+        user = await self.get(_id)
+        user.token_version += 1
+        user.updated_at = datetime.now()
+        self.__changes.bump()
+        return user
+
+    async def delete(self, _id: UUID) -> None:
+        user = self.__users.pop(_id, None)
+        if user is None:
+            raise ObjectNotFoundExc("User not found")
+        del self.__by_email[user.email]
+        self.__changes.bump()
+
+    async def get_change_seq(self) -> int:
+        return await self.__changes.get_change_seq()
+
+
+class MemoryChatRepository:
+    """Чаты в памяти процесса
+
+    `id_factory` позволяет выдавать ID с нужным свойством, например
+    попадающие в шард процесса.
+    """
+
+    def __init__(
+        self,
+        id_factory: Callable[[], UUID] = uuid4,
+        change_sequence: MemoryChangeSequence | None = None,
+    ):
+        self.__id_factory = id_factory
+        self.__changes = change_sequence or MemoryChangeSequence()
+        self.__chats: Dict[UUID, Chat] = {}
+        self.__deleted: Dict[UUID, Chat] = {}
+        self.__personal: Dict[Tuple[UUID, UUID], UUID] = {}
+        self.__personal_keys: Dict[UUID, Tuple[UUID, UUID]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__chats)
+
+    async def create(
+        self,
+        chat_type: ChatType,
+        title: str,
+        personal_key: Tuple[UUID, UUID] | None = None,
+    ) -> Chat:
+        if personal_key is not None and personal_key in self.__personal:
+            raise AlreadyExistsExc("Personal chat already exists")
+        now = datetime.now()
+        chat = Chat(
+            id=self.__id_factory(),
+            chat_type=chat_type,
+            title=title,
+            created_at=now,
+            updated_at=now,
+        )
+        self.__chats[chat.id] = chat
+        if personal_key is not None:
+            self.__personal[personal_key] = chat.id
+            self.__personal_keys[chat.id] = personal_key
+        self.__changes.bump()
+        return chat
+
+    async def get(self, _id: UUID) -> Chat:
+        chat = self.__chats.get(_id)
+        if chat is None:
+            raise ObjectNotFoundExc("Chat not found")
+        return chat
+
+    async def get_personal(self, personal_key: Tuple[UUID, UUID]) -> Chat:
+        chat_id = self.__personal.get(personal_key)
+        if chat_id is None:
+            raise ObjectNotFoundExc("Chat not found")
+        return await self.get(chat_id)
+
+    async def update(self, _id: UUID, **attrs: Any) -> Chat:
+        chat = await self.get(_id)
+        for name, value in attrs.items():
+            if value is not None and hasattr(chat, name):
+                setattr(chat, name, value)
+        chat.updated_at = datetime.now()
+        self.__changes.bump()
+        return chat
+
+    async def mark_deleted(self, _id: UUID) -> None:
+        chat = self.__chats.pop(_id, None)
+        if chat is None:
+            raise ObjectNotFoundExc("Chat not found")
+        self.__deleted[_id] = chat
+        self.__release_personal(chat.id)
+        self.__changes.bump()
+
+    async def list_deleted(self, limit: int = 100) -> Sequence[UUID]:
+        return list(itertools.islice(self.__deleted, limit))
+
+    async def delete(self, _id: UUID) -> None:
+        chat = self.__chats.pop(_id, None) or self.__deleted.pop(_id, None)
+        if chat is None:
+            raise ObjectNotFoundExc("Chat not found")
+        self.__release_personal(chat.id)
+        self.__changes.bump()
+
+    async def get_change_seq(self) -> int:
+        return await self.__changes.get_change_seq()
+
+    def __release_personal(self, chat_id: UUID) -> None:
+        personal_key = self.__personal_keys.pop(chat_id, None)
+        if personal_key is not None:
+            del self.__personal[personal_key]
+
+
+class MemoryChatMemberRepository:
+    """Участники чатов в памяти процесса с индексами по чату и пользователю"""
+
+    def __init__(self, change_sequence: MemoryChangeSequence | None = None):
+        self.__changes = change_sequence or MemoryChangeSequence()
+        self.__members: Dict[Tuple[UUID, UUID], ChatMember] = {}
+        self.__by_chat: Dict[UUID, Dict[UUID, None]] = {}
+        self.__by_user: Dict[UUID, Dict[UUID, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__members)
+
+    async def create(self, obj: ChatMember) -> ChatMember:
+        key = (obj.chat_id, obj.user_id)
+        existing = self.__members.get(key)
+        if existing is not None:
+            return existing
+        if obj.joined_at is None:
+            obj.joined_at = datetime.now()
+        self.__members[key] = obj
+        self.__by_chat.setdefault(obj.chat_id, {})[obj.user_id] = None
+        self.__by_user.setdefault(obj.user_id, {})[obj.chat_id] = None
+        self.__changes.bump()
+        return obj
+
+    async def get(self, _id: Tuple[UUID, UUID]) -> ChatMember:
+        member = self.__members.get(_id)
+        if member is None:
+            raise ObjectNotFoundExc("Member not found")
+        return member
+
+    async def update(self, _id: Tuple[UUID, UUID], **attrs: Any) -> ChatMember:
+        member = await self.get(_id)
+        for name, value in attrs.items():
+            if value is not None and hasattr(member, name):
+                setattr(member, name, value)
+        self.__changes.bump()
+        return member
+
+    async def delete(self, _id: Tuple[UUID, UUID]) -> None:
+        if self.__members.pop(_id, None) is None:
+            raise ObjectNotFoundExc("Member not found")
+        chat_id, user_id = _id
+        _discard(self.__by_chat, chat_id, user_id)
+        _discard(self.__by_user, user_id, chat_id)
+        self.__changes.bump()
+
+    async def list_by_user_id(
+        self, _id: UUID, offset: int = 0, limit: int = 50
+    ) -> Sequence[UUID]:
+        chat_ids = self.__by_user.get(_id, {})
+        return list(itertools.islice(chat_ids, offset, offset + limit))
+
+    async def list_user_ids_by_chat_id(
+        self, _id: UUID, permissions: ChatMemberPermissions | None = None
+    ) -> Sequence[UUID]:
+        user_ids = self.__by_chat.get(_id, {})
+        if permissions is None:
+            return list(user_ids)
+        return [
+            user_id
+            for user_id in user_ids
+            if self.__members[(_id, user_id)].permissions == permissions
+        ]
+
+    async def count_by_chat_id(self, _id: UUID) -> int:
+        return len(self.__by_chat.get(_id, {}))
+
+    async def delete_by_chat_id(self, _id: UUID, limit: int = 1000) -> int:
+        user_ids = list(itertools.islice(self.__by_chat.get(_id, {}), limit))
+        for user_id in user_ids:
+            await self.delete((_id, user_id))
+        return len(user_ids)
+
+    async def get_change_seq(self) -> int:
+        return await self.__changes.get_change_seq()
+
+
+def _discard(index: Dict[UUID, Dict[UUID, None]], key: UUID, value: UUID) -> None:
+    values = index.get(key)
+    if values is not None:
+        values.pop(value, None)
+        if not values:
+            del index[key]
+
+
+class _Index(Generic[K]):
+    """Сообщения, упорядоченные по ключу (seq или ID), для курсорной пагинации
+
+    Сообщения лежат блоками не длиннее `2 * _BLOCK`, блок ищется бинарным
+    поиском по последним ключам блоков. Вставка и удаление сдвигают только
+    свой блок, страницы читаются от найденного места, не обходя весь индекс.
+    Во время обхода индекс менять нельзя.
+    """
+
+    __slots__ = ("lasts", "keys", "messages", "size")
+
+    def __init__(self):
+        self.lasts: List[K] = []
+        self.keys: List[List[K]] = []
+        self.messages: List[List[Message]] = []
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def insert(self, key: K, message: Message) -> None:
+        self.size += 1
+        block = bisect.bisect_left(self.lasts, key)
+        if block == len(self.lasts):
+            # Ключ больше всех: так добавляются все новые seq
+            if not self.keys or len(self.keys[-1]) >= _BLOCK:
+                self.lasts.append(key)
+                self.keys.append([key])
+                self.messages.append([message])
+            else:
+                self.lasts[-1] = key
+                self.keys[-1].append(key)
+                self.messages[-1].append(message)
+            return
+        keys, messages = self.keys[block], self.messages[block]
+        position = bisect.bisect_left(keys, key)
+        keys.insert(position, key)
+        messages.insert(position, message)
+        if len(keys) > 2 * _BLOCK:
+            self.lasts[block : block + 1] = [keys[_BLOCK - 1], keys[-1]]
+            self.keys[block : block + 1] = [keys[:_BLOCK], keys[_BLOCK:]]
+            self.messages[block : block + 1] = [messages[:_BLOCK], messages[_BLOCK:]]
+
+    def remove(self, key: K) -> None:
+        block = bisect.bisect_left(self.lasts, key)
+        if block == len(self.lasts):
+            return
+        keys = self.keys[block]
+        position = bisect.bisect_left(keys, key)
+        if keys[position] != key:
+            return
+        del keys[position]
+        del self.messages[block][position]
+        self.size -= 1
+        if not keys:
+            del self.lasts[block]
+            del self.keys[block]
+            del self.messages[block]
+        elif position == len(keys):
+            self.lasts[block] = keys[-1]
+
+    def forward(self, after: K | None = None) -> Iterator[Tuple[K, Message]]:
+        """Сообщения по возрастанию ключа, начиная со следующего за `after`"""
+        block, start = 0, 0
+        if after is not None:
+            block = bisect.bisect_right(self.lasts, after)
+            if block < len(self.keys):
+                start = bisect.bisect_right(self.keys[block], after)
+        for i in range(block, len(self.keys)):
+            keys, messages = self.keys[i], self.messages[i]
+            for j in range(start, len(keys)):
+                yield keys[j], messages[j]
+            start = 0
+
+    def backward(self, before: K | None = None) -> Iterator[Tuple[K, Message]]:
+        """Сообщения по убыванию ключа, начиная с предыдущего перед `before`"""
+        block, stop = len(self.keys) - 1, None
+        if before is not None:
+            block = bisect.bisect_left(self.lasts, before)
+            if block < len(self.keys):
+                stop = bisect.bisect_left(self.keys[block], before)
+            else:
+                block -= 1
+        for i in range(block, -1, -1):
+            keys, messages = self.keys[i], self.messages[i]
+            for j in range((len(keys) if stop is None else stop) - 1, -1, -1):
+                yield keys[j], messages[j]
+            stop = None
+
+    def tail(self, offset: int, limit: int) -> List[Message]:
+        """До `limit` сообщений от новых к старым, без `offset` новейших"""
+        page: List[Message] = []
+        for messages in reversed(self.messages):
+            if len(page) >= limit:
+                break
+            if offset >= len(messages):
+                offset -= len(messages)
+                continue
+            stop = len(messages) - offset
+            page.extend(reversed(messages[max(stop - limit + len(page), 0) : stop]))
+            offset = 0
+        return page
+
+
+class MemoryMessageRepository:
+    """Сообщения в памяти процесса
+
+    Outbox не ведется: `recipient_ids` игнорируются, доставку в этом режиме
+    выполняет сам процесс.
+    """
+
+    def __init__(self):
+        self.__seq = itertools.count(1)
+        self.__messages: Dict[UUID, Tuple[int, Message]] = {}
+        self.__sources: Dict[Tuple[UUID, SourceType], _Index[int]] = {}
+        self.__replies: Dict[UUID, _Index[int]] = {}
+        self.__mentions: Dict[UUID, _Index[int]] = {}
+        # Сообщения со сроком жизни по ID, в порядке обхода `list_expiring`
+        self.__expiring: _Index[bytes] = _Index()
+
+    def __len__(self) -> int:
+        return len(self.__messages)
+
+    async def create(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        sender_id: UUID,
+        text_content: str,
+        attachment: Attachment | None = None,
+        recipient_ids: Sequence[UUID] = (),
+        expires_at: datetime | None = None,
+        reply_to_id: UUID | None = None,
+        mentions: Sequence[UUID] = (),
+    ) -> Message:
+        message = Message(
+            id=uuid4(),
+            source_id=source_id,
+            source_type=source_type,
+            sender_id=sender_id,
+            text_content=text_content,
+            created_at=datetime.now(),
+            attachment=attachment,
+            expires_at=expires_at,
+            reply_to_id=reply_to_id,
+            mentions=tuple(mentions),
+        )
+        seq = next(self.__seq)
+        self.__messages[message.id] = (seq, message)
+        self.__sources.setdefault((source_id, source_type), _Index()).insert(
+            seq, message
+        )
+        if reply_to_id is not None:
+            self.__replies.setdefault(reply_to_id, _Index()).insert(seq, message)
+        for user_id in message.mentions:
+            self.__mentions.setdefault(user_id, _Index()).insert(seq, message)
+        if expires_at is not None:
+            self.__expiring.insert(message.id.bytes, message)
+        return message
+
+    async def get(self, _id: UUID) -> Message:
+        entry = self.__messages.get(_id)
+        if entry is None:
+            raise ObjectNotFoundExc("Message not found")
+        return entry[1]
+
+    async def get_list(
+        self, source_id: UUID, source_type: SourceType, offset: int = 0, limit: int = 50
+    ) -> Sequence[Message]:
+        index = self.__sources.get((source_id, source_type))
+        if index is None:
+            return []
+        return index.tail(offset, limit)
+
+    async def list_replies(
+        self, reply_to_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        index = self.__replies.get(reply_to_id)
+        if index is None:
+            return MessagePage(messages=[])
+        page = list(itertools.islice(index.forward(_seq_of(cursor)), limit + 1))
+        return _page(page, limit)
+
+    async def list_mentions(
+        self, user_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        index = self.__mentions.get(user_id)
+        if index is None:
+            return MessagePage(messages=[])
+        page = list(itertools.islice(index.backward(_seq_of(cursor)), limit + 1))
+        return _page(page, limit)
+
+    async def delete_many(self, ids: Sequence[UUID]) -> int:
+        deleted = 0
+        for _id in ids:
+            entry = self.__messages.pop(_id, None)
+            if entry is None:
+                continue
+            seq, message = entry
+            self.__remove(self.__sources, (message.source_id, message.source_type), seq)
+            if message.reply_to_id is not None:
+                self.__remove(self.__replies, message.reply_to_id, seq)
+            for user_id in message.mentions:
+                self.__remove(self.__mentions, user_id, seq)
+            if message.expires_at is not None:
+                self.__expiring.remove(message.id.bytes)
+            deleted += 1
+        return deleted
+
+    async def delete_by_source(self, source_id: UUID, limit: int = 1000) -> int:
+        ids: List[UUID] = []
+        for source_type in SourceType:
+            index = self.__sources.get((source_id, source_type))
+            if index is not None:
+                messages = itertools.islice(index.forward(), limit - len(ids))
+                ids.extend(message.id for _, message in messages)
+        return await self.delete_many(ids)
+
+    async def purge(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        before: datetime | None = None,
+        keep: int | None = None,
+        limit: int = 1000,
+    ) -> PurgeStats:
+        index = self.__sources.get((source_id, source_type))
+        if index is None:
+            return PurgeStats()
+        excess = len(index) - keep if keep is not None else 0
+        doomed = []
+        oldest = itertools.islice(index.forward(), limit)
+        for position, (_, message) in enumerate(oldest):
+            if position >= excess and (before is None or message.created_at >= before):
+                break
+            doomed.append(message)
+        # Место оценивается по тексту: объекты в памяти отдельно не измерить
+        size = sum(len(message.text_content.encode()) for message in doomed)
+        deleted = await self.delete_many([message.id for message in doomed])
+        return PurgeStats(messages=deleted, bytes=size)
+
+    async def list_sources(
+        self, after: Tuple[UUID, SourceType] | None = None, limit: int = 1000
+    ) -> Sequence[Tuple[UUID, SourceType]]:
+        keys = sorted(self.__sources, key=_source_order)
+        start = (
+            bisect.bisect_right(keys, _source_order(after), key=_source_order)
+            if after
+            else 0
+        )
+        return keys[start : start + limit]
+
+    async def list_expiring(
+        self, after_id: UUID | None = None, limit: int = 1000
+    ) -> Sequence[Tuple[MessageRef, datetime]]:
+        expiring = self.__expiring.forward(after_id.bytes if after_id else None)
+        return [
+            (
+                MessageRef(message.id, message.source_id, message.source_type),
+                message.expires_at,
+            )
+            for _, message in itertools.islice(expiring, limit)
+            if message.expires_at is not None
+        ]
+
+    @staticmethod
+    def __remove(indexes: Dict[Any, _Index[int]], key: Any, seq: int) -> None:
+        index = indexes.get(key)
+        if index is not None:
+            index.remove(seq)
+            if not index:
+                del indexes[key]
+
+
+def _source_order(key: Tuple[UUID, SourceType]) -> Tuple[bytes, str]:
+    return key[0].bytes, key[1].value
+
+
+def _page(page: List[Tuple[int, Message]], limit: int) -> MessagePage:
+    # Лишнее сообщение в `page` только показывает, что страница не последняя
+    more = len(page) > limit
+    return MessagePage(
+        messages=[message for _, message in page[:limit]],
+        next_cursor=str(page[limit - 1][0]) if more else None,
+    )
+
+
+def _seq_of(cursor: str | None) -> int | None:
+    if cursor is None:
+        return None
+    try:
+        return int(cursor)
+    except ValueError:
+        raise InvalidFormatExc(f"Invalid cursor {cursor!r}") from None
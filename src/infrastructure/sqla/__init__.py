@@ -0,0 +1,11 @@
+from .chats import SQLAlchemyChatMemberRepository, SQLAlchemyChatRepository
+from .schema import create_engine, metadata
+from .users import SQLAlchemyUserRepository
+
+__all__ = [
+    "SQLAlchemyChatMemberRepository",
+    "SQLAlchemyChatRepository",
+    "SQLAlchemyUserRepository",
+    "create_engine",
+    "metadata",
+]
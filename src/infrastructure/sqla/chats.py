@@ -0,0 +1,272 @@
+from datetime import datetime
+from typing import Any, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy import Row, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ...common.exceptions import AlreadyExistsExc, ObjectNotFoundExc
+from ...domain.chats.entities import (
+    Chat,
+    ChatMember,
+    ChatMemberPermissions,
+    ChatType,
+    RetentionPolicy,
+)
+from .schema import bump_change_seq, chat_members, chats, get_change_seq, upsert
+
+
+def _personal_key(key: Tuple[UUID, UUID] | None) -> str | None:
+    return None if key is None else key[0].hex + key[1].hex
+
+
+def _chat_from_row(row: Row) -> Chat:
+    return Chat(
+        id=row.id,
+        chat_type=ChatType(row.chat_type),
+        title=row.title,
+        created_at=row.created_at,
+        updated_at=row.updated_at,
+        retention=RetentionPolicy(
+            max_age=row.retention_max_age, max_count=row.retention_max_count
+        ),
+    )
+
+
+def _member_from_row(row: Row) -> ChatMember:
+    return ChatMember(
+        chat_id=row.chat_id,
+        user_id=row.user_id,
+        permissions=ChatMemberPermissions(row.permissions),
+        invited_by=row.invited_by,
+        joined_at=row.joined_at,
+    )
+
+
+_LIVE = chats.c.deleted_at.is_(None)
+
+
+class SQLAlchemyChatRepository:
+    """Чаты в SQL-базе через SQLAlchemy
+
+    Уникальность личного чата обеспечивает уникальный индекс по
+    `personal_key`: вставка с `ON CONFLICT DO NOTHING` создает чат или
+    сообщает, что он уже есть, одним запросом. Удаленный чат теряет ключ,
+    и пара пользователей может создать новый.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self.__engine = engine
+
+    async def create(
+        self,
+        chat_type: ChatType,
+        title: str,
+        personal_key: Tuple[UUID, UUID] | None = None,
+    ) -> Chat:
+        now = datetime.now()
+        statement = (
+            upsert(self.__engine, chats)
+            .values(
+                id=uuid4(),
+                chat_type=chat_type.value,
+                title=title,
+                created_at=now,
+                updated_at=now,
+                personal_key=_personal_key(personal_key),
+            )
+            .on_conflict_do_nothing(index_elements=[chats.c.personal_key])
+            .returning(*chats.c)
+        )
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            row = (await connection.execute(statement)).first()
+        if row is None:
+            raise AlreadyExistsExc("Personal chat already exists")
+        return _chat_from_row(row)
+
+    async def get(self, _id: UUID) -> Chat:
+        return await self.__get_one(chats.c.id == _id)
+
+    async def get_personal(self, personal_key: Tuple[UUID, UUID]) -> Chat:
+        return await self.__get_one(chats.c.personal_key == _personal_key(personal_key))
+
+    async def update(self, _id: UUID, **attrs: Any) -> Chat:
+        values = {
+            name: value
+            for name, value in attrs.items()
+            if value is not None and name in ("title", "chat_type")
+        }
+        retention = attrs.get("retention")
+        if retention is not None:
+            values["retention_max_age"] = retention.max_age
+            values["retention_max_count"] = retention.max_count
+        statement = (
+            update(chats)
+            .where(chats.c.id == _id, _LIVE)
+            .values(**values, updated_at=datetime.now())
+            .returning(*chats.c)
+        )
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            row = (await connection.execute(statement)).first()
+        if row is None:
+            raise ObjectNotFoundExc("Chat not found")
+        return _chat_from_row(row)
+
+    async def mark_deleted(self, _id: UUID) -> None:
+        statement = (
+            update(chats)
+            .where(chats.c.id == _id, _LIVE)
+            .values(deleted_at=datetime.now(), personal_key=None)
+        )
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            result = await connection.execute(statement)
+        if not result.rowcount:
+            raise ObjectNotFoundExc("Chat not found")
+
+    async def list_deleted(self, limit: int = 100) -> Sequence[UUID]:
+        statement = (
+            select(chats.c.id)
+            .where(chats.c.deleted_at.is_not(None))
+            .order_by(chats.c.deleted_at)
+            .limit(limit)
+        )
+        async with self.__engine.connect() as connection:
+            return list((await connection.execute(statement)).scalars())
+
+    async def delete(self, _id: UUID) -> None:
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            result = await connection.execute(delete(chats).where(chats.c.id == _id))
+        if not result.rowcount:
+            raise ObjectNotFoundExc("Chat not found")
+
+    async def get_change_seq(self) -> int:
+        return await get_change_seq(self.__engine)
+
+    async def __get_one(self, condition) -> Chat:
+        async with self.__engine.connect() as connection:
+            row = (
+                await connection.execute(select(chats).where(condition, _LIVE))
+            ).first()
+        if row is None:
+            raise ObjectNotFoundExc("Chat not found")
+        return _chat_from_row(row)
+
+
+class SQLAlchemyChatMemberRepository:
+    """Участники чатов в SQL-базе через SQLAlchemy
+
+    Повторное добавление участника не ошибка: вставка с `ON CONFLICT DO
+    UPDATE`, не меняющим строку, одним запросом возвращает либо новую, либо
+    уже существующую запись.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self.__engine = engine
+
+    async def create(self, obj: ChatMember) -> ChatMember:
+        insert = upsert(self.__engine, chat_members).values(
+            chat_id=obj.chat_id,
+            user_id=obj.user_id,
+            permissions=int(obj.permissions),
+            invited_by=obj.invited_by,
+            joined_at=obj.joined_at or datetime.now(),
+        )
+        statement = insert.on_conflict_do_update(
+            index_elements=[chat_members.c.chat_id, chat_members.c.user_id],
+            set_={"chat_id": insert.excluded.chat_id},
+        ).returning(*chat_members.c)
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            row = (await connection.execute(statement)).one()
+        return _member_from_row(row)
+
+    async def get(self, _id: Tuple[UUID, UUID]) -> ChatMember:
+        async with self.__engine.connect() as connection:
+            row = (
+                await connection.execute(select(chat_members).where(*self.__key(_id)))
+            ).first()
+        if row is None:
+            raise ObjectNotFoundExc("Member not found")
+        return _member_from_row(row)
+
+    async def update(self, _id: Tuple[UUID, UUID], **attrs: Any) -> ChatMember:
+        values = {
+            name: int(value) if name == "permissions" else value
+            for name, value in attrs.items()
+            if value is not None and name in ("permissions", "invited_by")
+        }
+        if not values:
+            return await self.get(_id)
+        statement = (
+            update(chat_members)
+            .where(*self.__key(_id))
+            .values(**values)
+            .returning(*chat_members.c)
+        )
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            row = (await connection.execute(statement)).first()
+        if row is None:
+            raise ObjectNotFoundExc("Member not found")
+        return _member_from_row(row)
+
+    async def delete(self, _id: Tuple[UUID, UUID]) -> None:
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            result = await connection.execute(
+                delete(chat_members).where(*self.__key(_id))
+            )
+        if not result.rowcount:
+            raise ObjectNotFoundExc("Member not found")
+
+    async def list_by_user_id(
+        self, _id: UUID, offset: int = 0, limit: int = 50
+    ) -> Sequence[UUID]:
+        statement = (
+            select(chat_members.c.chat_id)
+            .where(chat_members.c.user_id == _id)
+            .order_by(chat_members.c.joined_at, chat_members.c.chat_id)
+            .offset(offset)
+            .limit(limit)
+        )
+        async with self.__engine.connect() as connection:
+            return list((await connection.execute(statement)).scalars())
+
+    async def list_user_ids_by_chat_id(
+        self, _id: UUID, permissions: ChatMemberPermissions | None = None
+    ) -> Sequence[UUID]:
+        statement = select(chat_members.c.user_id).where(chat_members.c.chat_id == _id)
+        if permissions is not None:
+            statement = statement.where(chat_members.c.permissions == int(permissions))
+        async with self.__engine.connect() as connection:
+            return list((await connection.execute(statement)).scalars())
+
+    async def count_by_chat_id(self, _id: UUID) -> int:
+        statement = select(func.count()).where(chat_members.c.chat_id == _id)
+        async with self.__engine.connect() as connection:
+            return (await connection.execute(statement)).scalar_one()
+
+    async def delete_by_chat_id(self, _id: UUID, limit: int = 1000) -> int:
+        batch = (
+            select(chat_members.c.user_id)
+            .where(chat_members.c.chat_id == _id)
+            .limit(limit)
+        )
+        statement = delete(chat_members).where(
+            chat_members.c.chat_id == _id, chat_members.c.user_id.in_(batch)
+        )
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            return (await connection.execute(statement)).rowcount
+
+    async def get_change_seq(self) -> int:
+        return await get_change_seq(self.__engine)
+
+    @staticmethod
+    def __key(_id: Tuple[UUID, UUID]):
+        chat_id, user_id = _id
+        return chat_members.c.chat_id == chat_id, chat_members.c.user_id == user_id
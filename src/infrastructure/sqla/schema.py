@@ -0,0 +1,211 @@
+"""Схема пользователей, чатов и участников
+
+Единственное описание этих таблиц: по нему написана ревизия Alembic и
+строится `infrastructure.sqlite.database.SCHEMA`. В SQLite хранение совпадает с остальными таблицами
+`infrastructure.sqlite`: идентификаторы — 16 байт BLOB, время — ISO-строки,
+длительности — секунды. В PostgreSQL используются родные типы.
+"""
+
+from datetime import datetime, timedelta
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Dialect,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    Interval,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    Text,
+    TypeDecorator,
+    Uuid,
+    event,
+    select,
+    text,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.types import TypeEngine
+
+
+class BinaryUuid(TypeDecorator[UUID]):
+    """UUID; в SQLite — 16 байт BLOB"""
+
+    impl = Uuid
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect: Dialect) -> TypeEngine[Any]:
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(LargeBinary(16))
+        return dialect.type_descriptor(Uuid())
+
+    def process_bind_param(self, value: UUID | None, dialect: Dialect) -> Any:
+        if value is None or dialect.name != "sqlite":
+            return value
+        return value.bytes
+
+    def process_result_value(self, value: Any, dialect: Dialect) -> UUID | None:
+        if value is None or dialect.name != "sqlite":
+            return value
+        return UUID(bytes=value)
+
+
+class IsoDateTime(TypeDecorator[datetime]):
+    """Время; в SQLite — строка `datetime.isoformat`"""
+
+    impl = DateTime
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect: Dialect) -> TypeEngine[Any]:
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(Text())
+        return dialect.type_descriptor(DateTime())
+
+    def process_bind_param(self, value: datetime | None, dialect: Dialect) -> Any:
+        if value is None or dialect.name != "sqlite":
+            return value
+        return value.isoformat()
+
+    def process_result_value(self, value: Any, dialect: Dialect) -> datetime | None:
+        if value is None or dialect.name != "sqlite":
+            return value
+        return datetime.fromisoformat(value)
+
+
+class Seconds(TypeDecorator[timedelta]):
+    """Длительность; в SQLite — число секунд"""
+
+    impl = Interval
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect: Dialect) -> TypeEngine[Any]:
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(Float())
+        return dialect.type_descriptor(Interval())
+
+    def process_bind_param(self, value: timedelta | None, dialect: Dialect) -> Any:
+        if value is None or dialect.name != "sqlite":
+            return value
+        return value.total_seconds()
+
+    def process_result_value(self, value: Any, dialect: Dialect) -> timedelta | None:
+        if value is None or dialect.name != "sqlite":
+            return value
+        return timedelta(seconds=value)
+
+
+metadata = MetaData()
+
+users = Table(
+    "users",
+    metadata,
+    Column("id", BinaryUuid, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("email", String(320), nullable=False),
+    Column("hashed_password", String(255), nullable=False),
+    Column("created_at", IsoDateTime, nullable=False),
+    Column("updated_at", IsoDateTime),
+    Column("token_version", Integer, nullable=False, server_default="0"),
+    Index("users_email", "email", unique=True),
+)
+
+chats = Table(
+    "chats",
+    metadata,
+    Column("id", BinaryUuid, primary_key=True),
+    Column("chat_type", String(16), nullable=False),
+    Column("title", String(255), nullable=False),
+    Column("created_at", IsoDateTime, nullable=False),
+    Column("updated_at", IsoDateTime, nullable=False),
+    # Ключ личного чата; NULL у групп и удаленных чатов
+    Column("personal_key", String(64)),
+    Column("deleted_at", IsoDateTime),
+    Column("retention_max_age", Seconds),
+    Column("retention_max_count", Integer),
+    Index("chats_personal_key", "personal_key", unique=True),
+    Index(
+        "chats_deleted",
+        "deleted_at",
+        sqlite_where=text("deleted_at IS NOT NULL"),
+        postgresql_where=text("deleted_at IS NOT NULL"),
+    ),
+)
+
+chat_members = Table(
+    "chat_members",
+    metadata,
+    Column(
+        "chat_id",
+        BinaryUuid,
+        ForeignKey("chats.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column("user_id", BinaryUuid, primary_key=True),
+    Column("permissions", Integer, nullable=False),
+    Column("invited_by", BinaryUuid),
+    Column("joined_at", IsoDateTime),
+    Index("chat_members_user", "user_id"),
+)
+
+# Номер изменения (`AbstractChangeSequence`): одна строка, которую каждая
+# запись репозиториев увеличивает в своей транзакции
+change_sequence = Table(
+    "change_sequence",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("seq", BigInteger, nullable=False),
+)
+
+
+def upsert(engine: AsyncEngine, table: Table) -> sqlite.Insert | postgresql.Insert:
+    """INSERT с поддержкой ON CONFLICT в диалекте движка
+
+    Raises:
+        ValueError: Диалект не поддерживает INSERT ... ON CONFLICT
+    """
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    raise ValueError(f"Dialect {engine.dialect.name!r} is not supported")
+
+
+def bump_change_seq(engine: AsyncEngine) -> sqlite.Insert | postgresql.Insert:
+    """Увеличить номер изменения; выполняется в транзакции записи"""
+    insert = upsert(engine, change_sequence).values(id=1, seq=1)
+    return insert.on_conflict_do_update(
+        index_elements=[change_sequence.c.id],
+        set_={"seq": change_sequence.c.seq + 1},
+    )
+
+
+async def get_change_seq(engine: AsyncEngine) -> int:
+    async with engine.connect() as connection:
+        seq = (
+            await connection.execute(
+                select(change_sequence.c.seq).where(change_sequence.c.id == 1)
+            )
+        ).scalar()
+    return seq or 0
+
+
+def create_engine(url: str, **kwargs: Any) -> AsyncEngine:
+    """Создать асинхронный движок; в SQLite включаются внешние ключи"""
+    engine = create_async_engine(url, **kwargs)
+    if engine.dialect.name == "sqlite":
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def enable_foreign_keys(connection, _) -> None:
+            cursor = connection.cursor()
+            cursor.execute("PRAGMA foreign_keys = ON")
+            cursor.close()
+
+    return engine
@@ -0,0 +1,99 @@
+from datetime import datetime
+from typing import Any, Dict
+from uuid import UUID, uuid4
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ...common.exceptions import AlreadyExistsExc, ObjectNotFoundExc
+from ...domain.users.entities import User
+from .schema import bump_change_seq, get_change_seq, upsert, users
+
+
+class SQLAlchemyUserRepository:
+    """Пользователи в SQL-базе через SQLAlchemy
+
+    Уникальность email проверяется самой вставкой (`ON CONFLICT DO
+    NOTHING`): один запрос вместо проверки и записи, без гонки между ними.
+    """
+
+    def __init__(self, engine: AsyncEngine):
+        self.__engine = engine
+
+    async def create(self, name: str, email: str, hashed_password: str) -> User:
+        user = User(
+            id=uuid4(),
+            name=name,
+            email=email,
+            hashed_password=hashed_password,
+            created_at=datetime.now(),
+        )
+        statement = (
+            upsert(self.__engine, users)
+            .values(
+                id=user.id,
+                name=user.name,
+                email=user.email,
+                hashed_password=user.hashed_password,
+                created_at=user.created_at,
+                token_version=user.token_version,
+            )
+            .on_conflict_do_nothing(index_elements=[users.c.email])
+            .returning(users.c.id)
+        )
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            if (await connection.execute(statement)).first() is None:
+                raise AlreadyExistsExc("User already exists")
+        return user
+
+    async def get(self, _id: UUID) -> User:
+        return await self.__get_one(users.c.id == _id)
+
+    async def get_by_email(self, email: str) -> User:
+        return await self.__get_one(users.c.email == email)
+
+    async def update(self, _id: UUID, **attrs: Any) -> User:
+        values = {k: v for k, v in attrs.items() if k in users.c and k != "id"}
+        try:
+            return await self.__update_one(_id, values)
+        except IntegrityError:
+            raise AlreadyExistsExc("User already exists") from None
+
+    async def increment_token_version(self, _id: UUID) -> User:
+        # Увеличение внутри UPDATE: параллельные отзывы не теряются
+        return await self.__update_one(
+            _id, {"token_version": users.c.token_version + 1}
+        )
+
+    async def delete(self, _id: UUID) -> None:
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            result = await connection.execute(delete(users).where(users.c.id == _id))
+        if not result.rowcount:
+            raise ObjectNotFoundExc("User not found")
+
+    async def get_change_seq(self) -> int:
+        return await get_change_seq(self.__engine)
+
+    async def __update_one(self, _id: UUID, values: Dict[str, Any]) -> User:
+        statement = (
+            update(users)
+            .where(users.c.id == _id)
+            .values(**values, updated_at=datetime.now())
+            .returning(*users.c)
+        )
+        async with self.__engine.begin() as connection:
+            await connection.execute(bump_change_seq(self.__engine))
+            row = (await connection.execute(statement)).first()
+        if row is None:
+            raise ObjectNotFoundExc("User not found")
+        return User(**row._mapping)
+
+    async def __get_one(self, condition) -> User:
+        async with self.__engine.connect() as connection:
+            row = (await connection.execute(select(users).where(condition))).first()
+        if row is None:
+            raise ObjectNotFoundExc("User not found")
+        return User(**row._mapping)
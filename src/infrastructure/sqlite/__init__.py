@@ -0,0 +1,15 @@
+from .database import SQLiteDatabase
+from .messages import (
+    SQLiteMessageRepository,
+    SQLiteOutboxRepository,
+    SQLiteReactionRepository,
+    SQLiteScheduledMessageRepository,
+)
+
+__all__ = [
+    "SQLiteDatabase",
+    "SQLiteMessageRepository",
+    "SQLiteOutboxRepository",
+    "SQLiteReactionRepository",
+    "SQLiteScheduledMessageRepository",
+]
@@ -0,0 +1,461 @@
+"""Пакетная загрузка и выгрузка данных SQLite в NDJSON/CSV
+
+Загрузка: python -m src.infrastructure.sqlite.bulk import app.db \\
+    users=users.ndjson chats=chats.csv chat_members=members.ndjson
+Выгрузка: python -m src.infrastructure.sqlite.bulk export app.db messages out.ndjson
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, List, Sequence, TextIO, Tuple
+from uuid import UUID
+
+from ...common.exceptions import InvalidFormatExc
+from ...domain.chats.entities import ChatMemberPermissions, ChatType
+from ...domain.messages.entities import SourceType
+from .database import bump_change_seq, migrate
+from .payloads import SQLitePayloads
+
+
+def _uuid(value: Any) -> bytes:
+    return UUID(str(value)).bytes
+
+
+def _datetime(value: Any) -> str:
+    return datetime.fromisoformat(value).isoformat()
+
+
+def _permissions(value: Any) -> int:
+    if isinstance(value, str) and not value.isdigit():
+        return int(ChatMemberPermissions[value])
+    return int(value)
+
+
+def _mentions(value: Any) -> bytes | None:
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    return b"".join(_uuid(user_id) for user_id in value) or None
+
+
+def _export_uuid(value: bytes) -> str:
+    return str(UUID(bytes=value))
+
+
+def _export_mentions(value: bytes) -> str:
+    return " ".join(_export_uuid(value[i : i + 16]) for i in range(0, len(value), 16))
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    parse: Callable[[Any], Any] = str
+    nullable: bool = False
+    default: Any = None
+    export: Callable[[Any], Any] | None = None
+
+
+def _uuid_column(name: str, nullable: bool = False) -> Column:
+    return Column(name, _uuid, nullable, export=_export_uuid)
+
+
+# Столбцы и их хранение совпадают с `sqla.schema` для пользователей и чатов
+# и с `database.SCHEMA` для сообщений
+TABLES: Dict[str, Tuple[Column, ...]] = {
+    "users": (
+        _uuid_column("id"),
+        Column("name"),
+        Column("email"),
+        Column("hashed_password"),
+        Column("created_at", _datetime),
+        Column("updated_at", _datetime, nullable=True),
+        Column("token_version", int, default=0),
+    ),
+    "chats": (
+        _uuid_column("id"),
+        Column("chat_type", lambda value: ChatType(value).value),
+        Column("title"),
+        Column("created_at", _datetime),
+        Column("updated_at", _datetime),
+        Column("personal_key", nullable=True),
+        Column("deleted_at", _datetime, nullable=True),
+        Column("retention_max_age", float, nullable=True),
+        Column("retention_max_count", int, nullable=True),
+    ),
+    "chat_members": (
+        _uuid_column("chat_id"),
+        _uuid_column("user_id"),
+        Column("permissions", _permissions),
+        _uuid_column("invited_by", nullable=True),
+        Column("joined_at", _datetime, nullable=True),
+    ),
+    "messages": (
+        _uuid_column("id"),
+        _uuid_column("source_id"),
+        Column("source_type", lambda value: SourceType(value).value),
+        _uuid_column("sender_id"),
+        Column("text_content"),
+        Column("created_at", _datetime),
+        Column("readed_at", _datetime, nullable=True),
+        Column("attachment_digest", nullable=True),
+        Column("attachment_size", int, nullable=True),
+        Column("attachment_content_type", nullable=True),
+        Column("attachment_filename", nullable=True),
+        Column("expires_at", _datetime, nullable=True),
+        _uuid_column("reply_to_id", nullable=True),
+        Column("mentions", _mentions, nullable=True, export=_export_mentions),
+    ),
+}
+
+_MESSAGE_ID = 0
+_MESSAGE_MENTIONS = len(TABLES["messages"]) - 1
+
+
+def _index_mentions(connection: sqlite3.Connection, batch: Sequence[Tuple]) -> None:
+    connection.executemany(
+        "INSERT INTO message_mentions (user_id, message_seq) "
+        "SELECT ?, seq FROM messages WHERE id = ? ON CONFLICT DO NOTHING",
+        [
+            (row[_MESSAGE_MENTIONS][i : i + 16], row[_MESSAGE_ID])
+            for row in batch
+            if row[_MESSAGE_MENTIONS] is not None
+            for i in range(0, len(row[_MESSAGE_MENTIONS]), 16)
+        ],
+    )
+
+
+def _parse(columns: Sequence[Column], record: Dict[str, Any]) -> Tuple:
+    values: List[Any] = []
+    for column in columns:
+        value = record.get(column.name)
+        if value is None or value == "":
+            if column.default is not None:
+                value = column.default
+            elif column.nullable:
+                values.append(None)
+                continue
+            else:
+                raise InvalidFormatExc(f"Column {column.name!r} is required")
+        values.append(column.parse(value))
+    return tuple(values)
+
+
+def _format_of(path: Path) -> str:
+    if path.suffix in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if path.suffix == ".csv":
+        return "csv"
+    raise InvalidFormatExc(
+        f"Unknown format of {path}: expected .ndjson, .jsonl or .csv"
+    )
+
+
+def _records(f: TextIO, fmt: str, skip: int) -> Iterator[Dict[str, Any]]:
+    if fmt == "csv":
+        return itertools.islice(csv.DictReader(f), skip, None)
+    lines = itertools.islice((line for line in f if line.strip()), skip, None)
+    return map(json.loads, lines)
+
+
+@dataclass
+class ImportJob:
+    table: str
+    path: Path
+    done: int = 0
+    skipped: int = 0
+    error: BaseException | None = None
+
+    @property
+    def source(self) -> str:
+        return f"{self.table}:{self.path.resolve()}"
+
+
+@dataclass
+class _Progress:
+    started: float = field(default_factory=time.perf_counter)
+    reported: float = 0.0
+
+
+def _put(batches: queue.Queue, item: Tuple, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _read(
+    job: ImportJob, batches: queue.Queue, batch_size: int, stop: threading.Event
+) -> None:
+    columns = TABLES[job.table]
+    position = job.skipped
+    try:
+        with open(job.path, newline="", encoding="utf-8") as f:
+            records = _records(f, _format_of(job.path), job.skipped)
+            while True:
+                batch = []
+                for record in itertools.islice(records, batch_size):
+                    batch.append(_parse(columns, record))
+                    position += 1
+                if not batch:
+                    break
+                # Запись прервана: поток не должен висеть на полной очереди
+                if not _put(batches, (job, batch), stop):
+                    return
+    except (InvalidFormatExc, ValueError, KeyError, TypeError) as exc:
+        job.error = InvalidFormatExc(f"{job.path}: record {position + 1}: {exc}")
+    except BaseException as exc:
+        job.error = exc
+    finally:
+        _put(batches, (job, None), stop)
+
+
+def import_files(
+    connection: sqlite3.Connection,
+    jobs: Sequence[ImportJob],
+    batch_size: int = 10_000,
+    workers: int = 4,
+    report: Callable[[str], None] | None = None,
+    report_interval: float = 5.0,
+) -> Sequence[ImportJob]:
+    """Загрузить файлы в таблицы пачками
+
+    Файлы читаются и разбираются параллельно в `workers` потоках, запись идет
+    в одном потоке: SQLite допускает только одного писателя. Каждая пачка
+    пишется в своей транзакции вместе с контрольной точкой, поэтому
+    прерванную загрузку можно продолжить повторным запуском. Уже существующие
+    строки пропускаются, повторная загрузка безопасна.
+
+    Args:
+        connection (sqlite3.Connection): Соединение в режиме autocommit
+        jobs (Sequence[ImportJob]): Таблицы и файлы
+        batch_size (int, optional): Размер пачки. По умолчанию 10000.
+        workers (int, optional): Количество читающих потоков. По умолчанию 4.
+        report (Callable[[str], None] | None, optional): Вывод прогресса
+        report_interval (float, optional): Период вывода прогресса в секундах
+
+    Returns:
+        Sequence[ImportJob]: Задания с числом загруженных записей
+
+    Raises:
+        InvalidFormatExc: Некорректные входные данные
+    """
+    migrate(connection)
+    for job in jobs:
+        if job.table not in TABLES:
+            raise InvalidFormatExc(f"Unknown table {job.table!r}")
+        _format_of(job.path)
+        row = connection.execute(
+            "SELECT records FROM bulk_checkpoints WHERE source = ?", (job.source,)
+        ).fetchone()
+        job.skipped = row[0] if row else 0
+
+    statements = {
+        table: (
+            f"INSERT INTO {table} ({', '.join(c.name for c in columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)}) ON CONFLICT DO NOTHING"
+        )
+        for table, columns in TABLES.items()
+    }
+    batches: queue.Queue = queue.Queue(maxsize=max(workers, 1) * 4)
+    stop = threading.Event()
+    pending = list(jobs)
+    running = 0
+    progress = _Progress()
+
+    def start_next() -> None:
+        nonlocal running
+        job = pending.pop(0)
+        threading.Thread(
+            target=_read, args=(job, batches, batch_size, stop), daemon=True
+        ).start()
+        running += 1
+
+    try:
+        while pending and running < max(workers, 1):
+            start_next()
+        while running:
+            job, batch = batches.get()
+            if batch is None:
+                running -= 1
+                if job.error is not None:
+                    raise job.error
+                if pending:
+                    start_next()
+                continue
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany(statements[job.table], batch)
+                if job.table == "messages":
+                    _index_mentions(connection, batch)
+                job.done += len(batch)
+                connection.execute(
+                    "INSERT INTO bulk_checkpoints (source, table_name, records) "
+                    "VALUES (?, ?, ?) ON CONFLICT (source) DO UPDATE "
+                    "SET records = excluded.records",
+                    (job.source, job.table, job.skipped + job.done),
+                )
+                bump_change_seq(connection)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            if report is not None:
+                _report(jobs, progress, report, report_interval)
+    finally:
+        stop.set()
+
+    if report is not None:
+        _report(jobs, progress, report, 0.0)
+    return jobs
+
+
+def _report(
+    jobs: Sequence[ImportJob],
+    progress: _Progress,
+    report: Callable[[str], None],
+    interval: float,
+) -> None:
+    now = time.perf_counter()
+    if now - progress.reported < interval:
+        return
+    progress.reported = now
+    elapsed = max(now - progress.started, 1e-9)
+    total = sum(job.done for job in jobs)
+    parts = [f"{job.table}={job.done}" for job in jobs]
+    report(
+        f"{total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s): "
+        + " ".join(parts)
+    )
+
+
+def export_table(
+    connection: sqlite3.Connection,
+    table: str,
+    out: IO[str],
+    fmt: str = "ndjson",
+    batch_size: int = 10_000,
+) -> int:
+    """Выгрузить таблицу потоком
+
+    Args:
+        connection (sqlite3.Connection): Соединение
+        table (str): Таблица
+        out (IO[str]): Текстовый поток
+        fmt (str, optional): `ndjson` или `csv`. По умолчанию `ndjson`.
+        batch_size (int, optional): Размер пачки чтения. По умолчанию 10000.
+
+    Returns:
+        int: Количество выгруженных строк
+    """
+    columns = TABLES.get(table)
+    if columns is None:
+        raise InvalidFormatExc(f"Unknown table {table!r}")
+    names = [column.name for column in columns]
+    exports = [(i, c.export) for i, c in enumerate(columns) if c.export is not None]
+    if table == "messages":
+        # Сжатый текст выгружается расшифрованным, словари берутся из базы
+        exports.append(
+            (names.index("text_content"), partial(SQLitePayloads().decode, connection))
+        )
+    cursor = connection.execute(f"SELECT {', '.join(names)} FROM {table}")
+
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(names)
+    exported = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        lines: List[str] = []
+        for row in rows:
+            values = list(row)
+            for index, export in exports:
+                if values[index] is not None:
+                    values[index] = export(values[index])
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                lines.append(json.dumps(dict(zip(names, values)), ensure_ascii=False))
+        if lines:
+            out.write("\n".join(lines) + "\n")
+        exported += len(rows)
+    return exported
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    return connection
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.infrastructure.sqlite.bulk")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("import", help="Загрузить NDJSON/CSV в базу")
+    load.add_argument("database")
+    load.add_argument("sources", nargs="+", metavar="TABLE=PATH")
+    load.add_argument("--batch-size", type=int, default=10_000)
+    load.add_argument("--workers", type=int, default=4)
+
+    dump = commands.add_parser("export", help="Выгрузить таблицу в NDJSON/CSV")
+    dump.add_argument("database")
+    dump.add_argument("table", choices=sorted(TABLES))
+    dump.add_argument("path", help="Файл .ndjson/.jsonl/.csv или - для stdout")
+    dump.add_argument("--format", choices=("ndjson", "csv"))
+
+    args = parser.parse_args(argv)
+    connection = connect(args.database)
+    try:
+        if args.command == "import":
+            jobs = []
+            for source in args.sources:
+                table, sep, path = source.partition("=")
+                if not sep:
+                    parser.error(f"Expected TABLE=PATH, got {source!r}")
+                jobs.append(ImportJob(table=table, path=Path(path)))
+            import_files(
+                connection,
+                jobs,
+                batch_size=args.batch_size,
+                workers=args.workers,
+                report=lambda line: print(line, file=sys.stderr),
+            )
+        else:
+            if args.path == "-":
+                exported = export_table(
+                    connection, args.table, sys.stdout, args.format or "ndjson"
+                )
+            else:
+                path = Path(args.path)
+                with open(path, "w", newline="", encoding="utf-8") as out:
+                    exported = export_table(
+                        connection, args.table, out, args.format or _format_of(path)
+                    )
+            print(f"{args.table}: {exported} rows", file=sys.stderr)
+    except InvalidFormatExc as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
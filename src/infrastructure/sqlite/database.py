@@ -0,0 +1,242 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Iterator, List, Sequence, Tuple, TypeVar
+
+from sqlalchemy import Table
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from ..sqla.schema import metadata
+
+T = TypeVar("T")
+
+
+def _ddl(tables: Sequence[Table]) -> str:
+    dialect = sqlite.dialect()
+    statements: List[CreateTable | CreateIndex] = []
+    for table in tables:
+        statements.append(CreateTable(table, if_not_exists=True))
+        statements.extend(
+            CreateIndex(index, if_not_exists=True)
+            for index in sorted(table.indexes, key=lambda index: index.name or "")
+        )
+    return "".join(
+        f"{str(statement.compile(dialect=dialect)).strip()};\n"
+        for statement in statements
+    )
+
+
+# Пользователи, чаты и участники описаны в `sqla.schema` вместе с ревизией
+# Alembic; здесь — таблицы, которые читаются только через sqlite3
+SCHEMA = _ddl(metadata.sorted_tables) + """
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY,
+    id BLOB NOT NULL UNIQUE,
+    source_id BLOB NOT NULL,
+    source_type TEXT NOT NULL,
+    sender_id BLOB NOT NULL,
+    text_content TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    readed_at TEXT,
+    attachment_digest TEXT,
+    attachment_size INTEGER,
+    attachment_content_type TEXT,
+    attachment_filename TEXT,
+    expires_at TEXT,
+    reply_to_id BLOB,
+    mentions BLOB
+);
+CREATE INDEX IF NOT EXISTS messages_source ON messages (source_id, source_type, seq);
+CREATE INDEX IF NOT EXISTS messages_expiring ON messages (id) WHERE expires_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS messages_replies ON messages (reply_to_id, seq)
+    WHERE reply_to_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS message_mentions (
+    user_id BLOB NOT NULL,
+    message_seq INTEGER NOT NULL REFERENCES messages (seq) ON DELETE CASCADE,
+    PRIMARY KEY (user_id, message_seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS message_mentions_message ON message_mentions (message_seq);
+
+CREATE TABLE IF NOT EXISTS message_dictionaries (
+    id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS source_dictionaries (
+    source_id BLOB PRIMARY KEY,
+    dictionary_id INTEGER NOT NULL REFERENCES message_dictionaries (id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS message_reactions (
+    message_id BLOB NOT NULL,
+    user_id BLOB NOT NULL,
+    emoji TEXT NOT NULL,
+    PRIMARY KEY (message_id, user_id, emoji)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS message_reaction_counts (
+    message_id BLOB NOT NULL,
+    emoji TEXT NOT NULL,
+    shard INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (message_id, emoji, shard)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS scheduled_messages (
+    id BLOB PRIMARY KEY,
+    source_id BLOB NOT NULL,
+    source_type TEXT NOT NULL,
+    sender_id BLOB NOT NULL,
+    text_content TEXT NOT NULL,
+    send_at TEXT NOT NULL,
+    attachment_digest TEXT,
+    attachment_size INTEGER,
+    attachment_content_type TEXT,
+    attachment_filename TEXT,
+    ttl REAL
+);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    message_seq INTEGER NOT NULL REFERENCES messages (seq) ON DELETE CASCADE,
+    message_id BLOB NOT NULL,
+    recipient_id BLOB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    failed INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (message_id, recipient_id)
+);
+CREATE INDEX IF NOT EXISTS outbox_ready ON outbox (available_at) WHERE failed = 0;
+
+CREATE TABLE IF NOT EXISTS bulk_checkpoints (
+    source TEXT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    records INTEGER NOT NULL
+);
+"""
+
+
+def _add_columns(
+    table: str, columns: Sequence[Tuple[str, str]]
+) -> Callable[[sqlite3.Connection], None]:
+    def step(connection: sqlite3.Connection) -> None:
+        existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+        # Таблицы еще нет: ее целиком создаст SCHEMA
+        if not existing:
+            return
+        for name, declaration in columns:
+            if name not in existing:
+                connection.execute(
+                    f"ALTER TABLE {table} ADD COLUMN {name} {declaration}"
+                )
+
+    return step
+
+
+# Шаги обновления баз, созданных до появления столбцов в SCHEMA. После шага
+# с индексом i в `PRAGMA user_version` записывается i + 1. Новые таблицы и
+# индексы шагов не требуют: SCHEMA создает их через IF NOT EXISTS.
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _add_columns(
+        "messages",
+        [("expires_at", "TEXT"), ("reply_to_id", "BLOB"), ("mentions", "BLOB")],
+    ),
+    _add_columns(
+        "chats",
+        [
+            ("personal_key", "VARCHAR(64)"),
+            ("deleted_at", "TEXT"),
+            ("retention_max_age", "FLOAT"),
+            ("retention_max_count", "INTEGER"),
+        ],
+    ),
+]
+
+
+def bump_change_seq(connection: sqlite3.Connection) -> None:
+    """Увеличить номер изменения `sqla.schema.change_sequence` в текущей транзакции"""
+    connection.execute(
+        "INSERT INTO change_sequence (id, seq) VALUES (1, 1) "
+        "ON CONFLICT (id) DO UPDATE SET seq = seq + 1"
+    )
+
+
+def get_change_seq(connection: sqlite3.Connection) -> int:
+    row = connection.execute("SELECT seq FROM change_sequence WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def migrate(connection: sqlite3.Connection) -> None:
+    """Создать схему и выполнить шаги `MIGRATIONS`, которых еще не было
+
+    Args:
+        connection (sqlite3.Connection): Соединение в режиме autocommit
+    """
+    with transaction(connection):
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        for step in MIGRATIONS[version:]:
+            step(connection)
+        connection.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+    connection.executescript(SCHEMA)
+
+
+class SQLiteDatabase:
+    """Подключение к SQLite для асинхронных репозиториев
+
+    Все запросы выполняются в одном выделенном потоке: соединение SQLite
+    нельзя безопасно использовать из нескольких потоков одновременно, а запись
+    в SQLite все равно последовательная.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self.__connection = self.__executor.submit(self.__connect, path).result()
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """Выполнить функцию с соединением в потоке базы
+
+        Args:
+            fn (Callable[..., T]): Функция, первым аргументом принимает соединение
+
+        Returns:
+            T: Результат функции
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.__executor, partial(fn, self.__connection, *args)
+        )
+
+    async def migrate(self) -> None:
+        """Создать схему и обновить базу, созданную прежней версией"""
+        await self.run(migrate)
+
+    async def get_change_seq(self) -> int:
+        """Номер последнего изменения (`AbstractChangeSequence`)"""
+        return await self.run(get_change_seq)
+
+    def close(self) -> None:
+        self.__executor.submit(self.__connection.close).result()
+        self.__executor.shutdown()
+
+    @staticmethod
+    def __connect(path: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(path, isolation_level=None)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+
+@contextmanager
+def transaction(connection: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
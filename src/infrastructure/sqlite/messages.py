@@ -0,0 +1,763 @@
+import sqlite3
+import time
+from collections import defaultdict
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from ...common.exceptions import InvalidFormatExc, ObjectNotFoundExc
+from ...domain.messages.compression import PayloadCompressor
+from ...domain.messages.entities import (
+    Attachment,
+    Message,
+    MessagePage,
+    MessageRef,
+    OutboxEntry,
+    PurgeStats,
+    ReactionChange,
+    ScheduledMessage,
+    SourceType,
+)
+from .database import SQLiteDatabase, transaction
+from .payloads import SQLitePayloads
+
+# Не больше лимита параметров SQLite (999 в старых сборках)
+_DELETE_CHUNK = 500
+
+_MESSAGE_COLUMNS = (
+    "m.id, m.source_id, m.source_type, m.sender_id, m.text_content, m.created_at, "
+    "m.readed_at, m.attachment_digest, m.attachment_size, "
+    "m.attachment_content_type, m.attachment_filename, m.expires_at, "
+    "m.reply_to_id, m.mentions, "
+    # Счетчики реакций по шардам одной строкой: без отдельного запроса
+    "(SELECT group_concat(r.emoji || char(31) || r.count, char(30)) "
+    "FROM message_reaction_counts r WHERE r.message_id = m.id)"
+)
+_MESSAGE_WIDTH = 15
+
+
+def _message_from_row(row: Sequence, decode: Callable[[Any], str]) -> Message:
+    (
+        _id,
+        source_id,
+        source_type,
+        sender_id,
+        text_content,
+        created_at,
+        readed_at,
+        digest,
+        size,
+        content_type,
+        filename,
+        expires_at,
+        reply_to_id,
+        mentions,
+        reactions,
+    ) = row
+    return Message(
+        id=UUID(bytes=_id),
+        source_id=UUID(bytes=source_id),
+        source_type=SourceType(source_type),
+        sender_id=UUID(bytes=sender_id),
+        text_content=decode(text_content),
+        created_at=datetime.fromisoformat(created_at),
+        readed_at=datetime.fromisoformat(readed_at) if readed_at else None,
+        attachment=(
+            Attachment(
+                digest=digest, size=size, content_type=content_type, filename=filename
+            )
+            if digest is not None
+            else None
+        ),
+        expires_at=datetime.fromisoformat(expires_at) if expires_at else None,
+        reply_to_id=UUID(bytes=reply_to_id) if reply_to_id else None,
+        mentions=tuple(
+            UUID(bytes=mentions[i : i + 16]) for i in range(0, len(mentions or b""), 16)
+        ),
+        reactions=_reactions_from_column(reactions),
+    )
+
+
+def _reactions_from_column(column: str | None) -> Dict[str, int]:
+    reactions: Dict[str, int] = {}
+    if column:
+        for item in column.split("\x1e"):
+            emoji, _, count = item.partition("\x1f")
+            reactions[emoji] = reactions.get(emoji, 0) + int(count)
+    return {emoji: count for emoji, count in reactions.items() if count > 0}
+
+
+def _seq_of(cursor: str | None) -> int | None:
+    if cursor is None:
+        return None
+    try:
+        return int(cursor)
+    except ValueError:
+        raise InvalidFormatExc(f"Invalid cursor {cursor!r}") from None
+
+
+def _page(
+    rows: List[Sequence], limit: int, decode: Callable[[Any], str]
+) -> MessagePage:
+    # Запрашивается limit + 1 строка: так известно, есть ли следующая страница
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return MessagePage(
+        messages=[_message_from_row(row[1:], decode) for row in rows],
+        next_cursor=str(rows[-1][0]) if more else None,
+    )
+
+
+_SCHEDULED_COLUMNS = (
+    "id, source_id, source_type, sender_id, text_content, send_at, "
+    "attachment_digest, attachment_size, attachment_content_type, "
+    "attachment_filename, ttl"
+)
+
+
+def _scheduled_from_row(row: Sequence) -> ScheduledMessage:
+    (
+        _id,
+        source_id,
+        source_type,
+        sender_id,
+        text_content,
+        send_at,
+        digest,
+        size,
+        content_type,
+        filename,
+        ttl,
+    ) = row
+    return ScheduledMessage(
+        id=UUID(bytes=_id),
+        source_id=UUID(bytes=source_id),
+        source_type=SourceType(source_type),
+        sender_id=UUID(bytes=sender_id),
+        text_content=text_content,
+        send_at=datetime.fromisoformat(send_at),
+        attachment=(
+            Attachment(
+                digest=digest, size=size, content_type=content_type, filename=filename
+            )
+            if digest is not None
+            else None
+        ),
+        ttl=ttl,
+    )
+
+
+def _placeholders(count: int) -> str:
+    return ", ".join("?" for _ in range(count))
+
+
+class SQLiteMessageRepository:
+    """Сообщения в SQLite
+
+    С `compressor` текст длинных сообщений хранится сжатым, словари чатов
+    обучаются `train_dictionary` и сохраняются в базе (см. `SQLitePayloads`).
+    """
+
+    def __init__(
+        self,
+        database: SQLiteDatabase,
+        clock: Callable[[], float] = time.time,
+        compressor: PayloadCompressor | None = None,
+    ):
+        self.__db = database
+        self.__clock = clock
+        self.__payloads = SQLitePayloads(compressor)
+
+    async def create(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        sender_id: UUID,
+        text_content: str,
+        attachment: Attachment | None = None,
+        recipient_ids: Sequence[UUID] = (),
+        expires_at: datetime | None = None,
+        reply_to_id: UUID | None = None,
+        mentions: Sequence[UUID] = (),
+    ) -> Message:
+        message = Message(
+            id=uuid4(),
+            source_id=source_id,
+            source_type=source_type,
+            sender_id=sender_id,
+            text_content=text_content,
+            created_at=datetime.now(),
+            attachment=attachment,
+            expires_at=expires_at,
+            reply_to_id=reply_to_id,
+            mentions=tuple(mentions),
+        )
+        await self.__db.run(self.__insert, message, recipient_ids, self.__clock())
+        return message
+
+    async def get(self, _id: UUID) -> Message:
+        messages = await self.__db.run(
+            self.__select,
+            f"SELECT {_MESSAGE_COLUMNS} FROM messages m WHERE m.id = ?",
+            (_id.bytes,),
+        )
+        if not messages:
+            raise ObjectNotFoundExc("Message not found")
+        return messages[0]
+
+    async def get_list(
+        self, source_id: UUID, source_type: SourceType, offset: int = 0, limit: int = 50
+    ) -> Sequence[Message]:
+        return await self.__db.run(
+            self.__select,
+            f"SELECT {_MESSAGE_COLUMNS} FROM messages m "
+            "WHERE m.source_id = ? AND m.source_type = ? "
+            "ORDER BY m.seq DESC LIMIT ? OFFSET ?",
+            (source_id.bytes, source_type.value, limit, offset),
+        )
+
+    async def list_replies(
+        self, reply_to_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        after = _seq_of(cursor)
+        return await self.__db.run(
+            self.__select_page,
+            f"SELECT m.seq, {_MESSAGE_COLUMNS} FROM messages m "
+            "WHERE m.reply_to_id = ? AND m.seq > ? ORDER BY m.seq LIMIT ?",
+            (reply_to_id.bytes, after if after is not None else -1, limit + 1),
+            limit,
+        )
+
+    async def list_mentions(
+        self, user_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        before = _seq_of(cursor)
+        return await self.__db.run(
+            self.__select_page,
+            f"SELECT m.seq, {_MESSAGE_COLUMNS} FROM message_mentions mm "
+            "JOIN messages m ON m.seq = mm.message_seq "
+            "WHERE mm.user_id = ? AND mm.message_seq < ? "
+            "ORDER BY mm.message_seq DESC LIMIT ?",
+            (user_id.bytes, before if before is not None else 2**63 - 1, limit + 1),
+            limit,
+        )
+
+    async def train_dictionary(self, source_id: UUID, samples: int = 1000) -> int:
+        """Обучить словарь сжатия чата по его последним сообщениям
+
+        Словарь сохраняется в базе и применяется к новым сообщениям чата.
+
+        Args:
+            source_id (UUID): Идентификатор ресурса
+            samples (int, optional): Количество сообщений. По умолчанию 1000.
+
+        Returns:
+            int: Идентификатор словаря
+        """
+        return await self.__db.run(self.__payloads.train, source_id, samples)
+
+    async def delete_many(self, ids: Sequence[UUID]) -> int:
+        return await self.__db.run(self.__delete_many, ids)
+
+    async def delete_by_source(self, source_id: UUID, limit: int = 1000) -> int:
+        return await self.__db.run(self.__delete_by_source, source_id, limit)
+
+    async def purge(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        before: datetime | None = None,
+        keep: int | None = None,
+        limit: int = 1000,
+    ) -> PurgeStats:
+        return await self.__db.run(
+            self.__purge, source_id, source_type, before, keep, limit
+        )
+
+    async def list_sources(
+        self, after: Tuple[UUID, SourceType] | None = None, limit: int = 1000
+    ) -> Sequence[Tuple[UUID, SourceType]]:
+        rows = await self.__db.run(
+            lambda connection: connection.execute(
+                "SELECT DISTINCT source_id, source_type FROM messages "
+                "WHERE (source_id, source_type) > (?, ?) "
+                "ORDER BY source_id, source_type LIMIT ?",
+                (
+                    after[0].bytes if after else b"",
+                    after[1].value if after else "",
+                    limit,
+                ),
+            ).fetchall()
+        )
+        return [
+            (UUID(bytes=source_id), SourceType(source_type))
+            for source_id, source_type in rows
+        ]
+
+    async def list_expiring(
+        self, after_id: UUID | None = None, limit: int = 1000
+    ) -> Sequence[Tuple[MessageRef, datetime]]:
+        rows = await self.__db.run(
+            lambda connection: connection.execute(
+                "SELECT id, source_id, source_type, expires_at FROM messages "
+                "WHERE expires_at IS NOT NULL AND id > ? ORDER BY id LIMIT ?",
+                (after_id.bytes if after_id else b"", limit),
+            ).fetchall()
+        )
+        return [
+            (
+                MessageRef(
+                    id=UUID(bytes=_id),
+                    source_id=UUID(bytes=source_id),
+                    source_type=SourceType(source_type),
+                ),
+                datetime.fromisoformat(expires_at),
+            )
+            for _id, source_id, source_type, expires_at in rows
+        ]
+
+    def __select(
+        self, connection: sqlite3.Connection, sql: str, parameters: Tuple
+    ) -> List[Message]:
+        decode = partial(self.__payloads.decode, connection)
+        return [
+            _message_from_row(row, decode)
+            for row in connection.execute(sql, parameters)
+        ]
+
+    def __select_page(
+        self, connection: sqlite3.Connection, sql: str, parameters: Tuple, limit: int
+    ) -> MessagePage:
+        rows = connection.execute(sql, parameters).fetchall()
+        return _page(rows, limit, partial(self.__payloads.decode, connection))
+
+    @staticmethod
+    def __delete_many(connection: sqlite3.Connection, ids: Sequence[UUID]) -> int:
+        deleted = 0
+        with transaction(connection):
+            for start in range(0, len(ids), _DELETE_CHUNK):
+                chunk = [_id.bytes for _id in ids[start : start + _DELETE_CHUNK]]
+                seqs = [
+                    row[0]
+                    for row in connection.execute(
+                        "SELECT seq FROM messages "
+                        f"WHERE id IN ({_placeholders(len(chunk))})",
+                        chunk,
+                    )
+                ]
+                if not seqs:
+                    continue
+                marks = _placeholders(len(seqs))
+                connection.execute(
+                    f"DELETE FROM outbox WHERE message_seq IN ({marks})", seqs
+                )
+                connection.execute(
+                    f"DELETE FROM message_mentions WHERE message_seq IN ({marks})",
+                    seqs,
+                )
+                for table in ("message_reactions", "message_reaction_counts"):
+                    connection.execute(
+                        f"DELETE FROM {table} WHERE message_id IN "
+                        f"({_placeholders(len(chunk))})",
+                        chunk,
+                    )
+                deleted += connection.execute(
+                    f"DELETE FROM messages WHERE seq IN ({marks})", seqs
+                ).rowcount
+        return deleted
+
+    @classmethod
+    def __delete_by_source(
+        cls, connection: sqlite3.Connection, source_id: UUID, limit: int
+    ) -> int:
+        # Префикс индекса messages_source: без сортировки и полного прохода
+        ids = [
+            UUID(bytes=row[0])
+            for row in connection.execute(
+                "SELECT id FROM messages WHERE source_id = ? LIMIT ?",
+                (source_id.bytes, limit),
+            )
+        ]
+        return cls.__delete_many(connection, ids) if ids else 0
+
+    @staticmethod
+    def __purge(
+        connection: sqlite3.Connection,
+        source_id: UUID,
+        source_type: SourceType,
+        before: datetime | None,
+        keep: int | None,
+        limit: int,
+    ) -> PurgeStats:
+        key = (source_id.bytes, source_type.value)
+        history = "FROM messages WHERE source_id = ? AND source_type = ?"
+        # Граница каждого ограничения — самое новое сообщение, которое оно
+        # удаляет. Сообщение удаляется, если нарушает любое из ограничений:
+        # удаляется все до большей из границ, но не больше limit сообщений
+        cutoffs = []
+        if keep is not None:
+            row = connection.execute(
+                f"SELECT seq {history} ORDER BY seq DESC LIMIT 1 OFFSET ?",
+                (*key, keep),
+            ).fetchone()
+            if row is not None:
+                cutoffs.append(row[0])
+        if before is not None:
+            # Время создания растет вместе с seq, а ISO-строки сравниваются
+            # как время: старые сообщения — префикс истории
+            (seq,) = connection.execute(
+                "SELECT max(seq) FROM (SELECT seq, created_at "
+                f"{history} ORDER BY seq LIMIT ?) WHERE created_at < ?",
+                (*key, limit, before.isoformat()),
+            ).fetchone()
+            if seq is not None:
+                cutoffs.append(seq)
+        if not cutoffs:
+            return PurgeStats()
+        cutoff = max(cutoffs)
+        row = connection.execute(
+            f"SELECT seq {history} ORDER BY seq LIMIT 1 OFFSET ?", (*key, limit - 1)
+        ).fetchone()
+        if row is not None:
+            cutoff = min(cutoff, row[0])
+
+        prefix = "FROM messages WHERE source_id = ? AND source_type = ? AND seq <= ?"
+        bounds = (*key, cutoff)
+        free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        with transaction(connection):
+            connection.execute(
+                f"DELETE FROM outbox WHERE message_id IN (SELECT id {prefix})", bounds
+            )
+            connection.execute(
+                "DELETE FROM message_mentions "
+                f"WHERE message_seq IN (SELECT seq {prefix})",
+                bounds,
+            )
+            for table in ("message_reactions", "message_reaction_counts"):
+                connection.execute(
+                    f"DELETE FROM {table} WHERE message_id IN (SELECT id {prefix})",
+                    bounds,
+                )
+            deleted = connection.execute(f"DELETE {prefix}", bounds).rowcount
+        freed = connection.execute("PRAGMA freelist_count").fetchone()[0] - free_pages
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        return PurgeStats(messages=deleted, bytes=max(freed, 0) * page_size)
+
+    def __insert(
+        self,
+        connection: sqlite3.Connection,
+        message: Message,
+        recipient_ids: Sequence[UUID],
+        now: float,
+    ) -> None:
+        attachment = message.attachment
+        with transaction(connection):
+            seq = connection.execute(
+                "INSERT INTO messages (id, source_id, source_type, sender_id, "
+                "text_content, created_at, attachment_digest, attachment_size, "
+                "attachment_content_type, attachment_filename, expires_at, "
+                "reply_to_id, mentions) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    message.id.bytes,
+                    message.source_id.bytes,
+                    message.source_type.value,
+                    message.sender_id.bytes,
+                    self.__payloads.encode(
+                        connection, message.source_id, message.text_content
+                    ),
+                    message.created_at.isoformat(),
+                    attachment.digest if attachment else None,
+                    attachment.size if attachment else None,
+                    attachment.content_type if attachment else None,
+                    attachment.filename if attachment else None,
+                    message.expires_at.isoformat() if message.expires_at else None,
+                    message.reply_to_id.bytes if message.reply_to_id else None,
+                    b"".join(user_id.bytes for user_id in message.mentions) or None,
+                ),
+            ).lastrowid
+            connection.executemany(
+                "INSERT INTO message_mentions (user_id, message_seq) VALUES (?, ?) "
+                "ON CONFLICT DO NOTHING",
+                [(user_id.bytes, seq) for user_id in message.mentions],
+            )
+            connection.executemany(
+                "INSERT INTO outbox (message_seq, message_id, recipient_id, "
+                "available_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (message_id, recipient_id) DO NOTHING",
+                [
+                    (seq, message.id.bytes, recipient_id.bytes, now)
+                    for recipient_id in recipient_ids
+                ],
+            )
+
+
+class SQLiteOutboxRepository:
+    def __init__(
+        self, database: SQLiteDatabase, compressor: PayloadCompressor | None = None
+    ):
+        self.__db = database
+        self.__payloads = SQLitePayloads(compressor)
+
+    async def claim(
+        self, now: float, limit: int = 500, lease: float = 30.0
+    ) -> Sequence[OutboxEntry]:
+        return await self.__db.run(self.__claim, now, limit, lease)
+
+    async def ack(self, keys: Sequence[Tuple[UUID, UUID]]) -> int:
+        return await self.__db.run(self.__ack, keys)
+
+    async def retry(self, schedule: Sequence[Tuple[int, float]]) -> None:
+        await self.__db.run(
+            self.__execute_many,
+            "UPDATE outbox SET attempts = attempts + 1, available_at = ? WHERE id = ?",
+            [(available_at, _id) for _id, available_at in schedule],
+        )
+
+    async def fail(self, ids: Sequence[int]) -> None:
+        await self.__db.run(
+            self.__execute_many,
+            "UPDATE outbox SET attempts = attempts + 1, failed = 1 WHERE id = ?",
+            [(_id,) for _id in ids],
+        )
+
+    async def count_pending(self) -> int:
+        return await self.__db.run(
+            lambda connection: connection.execute(
+                "SELECT count(*) FROM outbox WHERE failed = 0"
+            ).fetchone()[0]
+        )
+
+    def __claim(
+        self, connection: sqlite3.Connection, now: float, limit: int, lease: float
+    ) -> List[OutboxEntry]:
+        with transaction(connection):
+            rows = connection.execute(
+                f"SELECT {_MESSAGE_COLUMNS}, o.id, o.recipient_id, o.attempts "
+                "FROM outbox o JOIN messages m ON m.seq = o.message_seq "
+                "WHERE o.failed = 0 AND o.available_at <= ? "
+                "ORDER BY o.available_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE outbox SET available_at = ? WHERE id = ?",
+                [(now + lease, row[_MESSAGE_WIDTH]) for row in rows],
+            )
+        return [
+            OutboxEntry(
+                id=row[_MESSAGE_WIDTH],
+                message=_message_from_row(
+                    row[:_MESSAGE_WIDTH], partial(self.__payloads.decode, connection)
+                ),
+                recipient_id=UUID(bytes=row[_MESSAGE_WIDTH + 1]),
+                attempts=row[_MESSAGE_WIDTH + 2],
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def __ack(connection: sqlite3.Connection, keys: Sequence[Tuple[UUID, UUID]]) -> int:
+        with transaction(connection):
+            cursor = connection.executemany(
+                "DELETE FROM outbox WHERE message_id = ? AND recipient_id = ?",
+                [
+                    (message_id.bytes, recipient_id.bytes)
+                    for message_id, recipient_id in keys
+                ],
+            )
+        return cursor.rowcount
+
+    @staticmethod
+    def __execute_many(
+        connection: sqlite3.Connection, sql: str, parameters: List[Tuple]
+    ) -> None:
+        with transaction(connection):
+            connection.executemany(sql, parameters)
+
+
+class SQLiteReactionRepository:
+    def __init__(self, database: SQLiteDatabase):
+        self.__db = database
+
+    async def apply(
+        self, changes: Sequence[ReactionChange], shards: Mapping[UUID, int]
+    ) -> Mapping[UUID, Dict[str, int]]:
+        return await self.__db.run(self.__apply, changes, shards)
+
+    async def get_counts(self, message_id: UUID) -> Dict[str, int]:
+        rows = await self.__db.run(
+            lambda connection: connection.execute(
+                "SELECT emoji, sum(count) FROM message_reaction_counts "
+                "WHERE message_id = ? GROUP BY emoji HAVING sum(count) > 0",
+                (message_id.bytes,),
+            ).fetchall()
+        )
+        return dict(rows)
+
+    @staticmethod
+    def __apply(
+        connection: sqlite3.Connection,
+        changes: Sequence[ReactionChange],
+        shards: Mapping[UUID, int],
+    ) -> Dict[UUID, Dict[str, int]]:
+        message_ids = list({change.message_id for change in changes})
+        totals: Dict[UUID, Dict[str, int]] = {}
+        with transaction(connection):
+            for start in range(0, len(message_ids), _DELETE_CHUNK):
+                chunk = [
+                    _id.bytes for _id in message_ids[start : start + _DELETE_CHUNK]
+                ]
+                totals.update(
+                    (UUID(bytes=row[0]), {})
+                    for row in connection.execute(
+                        "SELECT id FROM messages "
+                        f"WHERE id IN ({_placeholders(len(chunk))})",
+                        chunk,
+                    )
+                )
+
+            deltas: Dict[Tuple[UUID, str], int] = defaultdict(int)
+            for change in changes:
+                if change.message_id not in totals:
+                    continue
+                key = (change.message_id.bytes, change.user_id.bytes, change.emoji)
+                if change.added:
+                    changed = connection.execute(
+                        "INSERT INTO message_reactions (message_id, user_id, emoji) "
+                        "VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+                        key,
+                    ).rowcount
+                else:
+                    changed = connection.execute(
+                        "DELETE FROM message_reactions "
+                        "WHERE message_id = ? AND user_id = ? AND emoji = ?",
+                        key,
+                    ).rowcount
+                if changed:
+                    deltas[(change.message_id, change.emoji)] += (
+                        1 if change.added else -1
+                    )
+
+            connection.executemany(
+                "INSERT INTO message_reaction_counts (message_id, emoji, shard, count) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (message_id, emoji, shard) "
+                "DO UPDATE SET count = count + excluded.count",
+                [
+                    (message_id.bytes, emoji, shards.get(message_id, 0), delta)
+                    for (message_id, emoji), delta in deltas.items()
+                    if delta
+                ],
+            )
+
+            touched = [_id.bytes for _id in totals]
+            for start in range(0, len(touched), _DELETE_CHUNK):
+                chunk = touched[start : start + _DELETE_CHUNK]
+                for message_id, emoji, count in connection.execute(
+                    "SELECT message_id, emoji, sum(count) FROM message_reaction_counts "
+                    f"WHERE message_id IN ({_placeholders(len(chunk))}) "
+                    "GROUP BY message_id, emoji HAVING sum(count) > 0",
+                    chunk,
+                ):
+                    totals[UUID(bytes=message_id)][emoji] = count
+        return totals
+
+
+class SQLiteScheduledMessageRepository:
+    def __init__(self, database: SQLiteDatabase):
+        self.__db = database
+
+    async def create(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        sender_id: UUID,
+        text_content: str,
+        send_at: datetime,
+        attachment: Attachment | None = None,
+        ttl: float | None = None,
+    ) -> ScheduledMessage:
+        scheduled = ScheduledMessage(
+            id=uuid4(),
+            source_id=source_id,
+            source_type=source_type,
+            sender_id=sender_id,
+            text_content=text_content,
+            send_at=send_at,
+            attachment=attachment,
+            ttl=ttl,
+        )
+        await self.__db.run(
+            self.__execute_many,
+            f"INSERT INTO scheduled_messages ({_SCHEDULED_COLUMNS}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    scheduled.id.bytes,
+                    source_id.bytes,
+                    source_type.value,
+                    sender_id.bytes,
+                    text_content,
+                    send_at.isoformat(),
+                    attachment.digest if attachment else None,
+                    attachment.size if attachment else None,
+                    attachment.content_type if attachment else None,
+                    attachment.filename if attachment else None,
+                    ttl,
+                )
+            ],
+        )
+        return scheduled
+
+    async def get_many(self, ids: Sequence[UUID]) -> Sequence[ScheduledMessage]:
+        return await self.__db.run(self.__get_many, ids)
+
+    async def delete_many(self, ids: Sequence[UUID]) -> int:
+        return await self.__db.run(self.__delete_many, ids)
+
+    async def list_pending(
+        self, after_id: UUID | None = None, limit: int = 1000
+    ) -> Sequence[ScheduledMessage]:
+        rows = await self.__db.run(
+            lambda connection: connection.execute(
+                f"SELECT {_SCHEDULED_COLUMNS} FROM scheduled_messages "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id.bytes if after_id else b"", limit),
+            ).fetchall()
+        )
+        return [_scheduled_from_row(row) for row in rows]
+
+    @staticmethod
+    def __get_many(
+        connection: sqlite3.Connection, ids: Sequence[UUID]
+    ) -> List[ScheduledMessage]:
+        result: List[ScheduledMessage] = []
+        for start in range(0, len(ids), _DELETE_CHUNK):
+            chunk = [_id.bytes for _id in ids[start : start + _DELETE_CHUNK]]
+            rows = connection.execute(
+                f"SELECT {_SCHEDULED_COLUMNS} FROM scheduled_messages "
+                f"WHERE id IN ({_placeholders(len(chunk))}) ORDER BY send_at",
+                chunk,
+            )
+            result.extend(_scheduled_from_row(row) for row in rows)
+        return result
+
+    @staticmethod
+    def __delete_many(connection: sqlite3.Connection, ids: Sequence[UUID]) -> int:
+        deleted = 0
+        with transaction(connection):
+            for start in range(0, len(ids), _DELETE_CHUNK):
+                chunk = [_id.bytes for _id in ids[start : start + _DELETE_CHUNK]]
+                deleted += connection.execute(
+                    "DELETE FROM scheduled_messages "
+                    f"WHERE id IN ({_placeholders(len(chunk))})",
+                    chunk,
+                ).rowcount
+        return deleted
+
+    @staticmethod
+    def __execute_many(
+        connection: sqlite3.Connection, sql: str, parameters: List[Tuple]
+    ) -> None:
+        with transaction(connection):
+            connection.executemany(sql, parameters)
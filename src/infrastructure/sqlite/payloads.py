@@ -0,0 +1,88 @@
+import sqlite3
+from uuid import UUID
+
+from ...domain.messages.compression import RAW, PayloadCompressor
+from .database import transaction
+
+
+class SQLitePayloads:
+    """Текст сообщений со сжатием и словарями чатов в базе
+
+    Сжатый текст хранится в `messages.text_content` как BLOB, несжатый — как
+    TEXT, поэтому старые и новые строки уживаются в одной таблице. Словари
+    хранятся в `message_dictionaries` и загружаются при первом обращении и
+    при встрече неизвестного словаря, например обученного другим процессом.
+    Без `compressor` текст пишется как есть, сжатый по-прежнему читается.
+
+    Методы принимают соединение и вызываются в потоке базы.
+    """
+
+    def __init__(self, compressor: PayloadCompressor | None = None):
+        self.__enabled = compressor is not None
+        self.__compressor = compressor or PayloadCompressor()
+        self.__loaded = False
+
+    def encode(
+        self, connection: sqlite3.Connection, source_id: UUID, text: str
+    ) -> str | bytes:
+        if not self.__enabled:
+            return text
+        if not self.__loaded:
+            self.load(connection)
+        payload = self.__compressor.encode(source_id, text)
+        # Несжимаемый текст хранится как TEXT, без заголовка
+        return text if payload[0] == RAW else payload
+
+    def decode(self, connection: sqlite3.Connection, value: str | bytes) -> str:
+        if isinstance(value, str):
+            return value
+        try:
+            return self.__compressor.decode(value)
+        except KeyError:
+            self.load(connection)
+            return self.__compressor.decode(value)
+
+    def train(
+        self, connection: sqlite3.Connection, source_id: UUID, samples: int
+    ) -> int:
+        """Обучить и сохранить словарь чата по его последним сообщениям
+
+        Args:
+            connection (sqlite3.Connection): Соединение
+            source_id (UUID): Идентификатор ресурса
+            samples (int): Количество сообщений для обучения
+
+        Returns:
+            int: Идентификатор словаря
+        """
+        texts = [
+            self.decode(connection, row[0])
+            for row in connection.execute(
+                "SELECT text_content FROM messages WHERE source_id = ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (source_id.bytes, samples),
+            )
+        ]
+        dict_id = self.__compressor.train(source_id, texts)
+        with transaction(connection):
+            connection.execute(
+                "INSERT INTO message_dictionaries (id, data) VALUES (?, ?) "
+                "ON CONFLICT DO NOTHING",
+                (dict_id, self.__compressor.dictionaries[dict_id]),
+            )
+            connection.execute(
+                "INSERT INTO source_dictionaries (source_id, dictionary_id) "
+                "VALUES (?, ?) ON CONFLICT (source_id) DO UPDATE "
+                "SET dictionary_id = excluded.dictionary_id",
+                (source_id.bytes, dict_id),
+            )
+        return dict_id
+
+    def load(self, connection: sqlite3.Connection) -> None:
+        for (data,) in connection.execute("SELECT data FROM message_dictionaries"):
+            self.__compressor.add_dictionary(data)
+        for source_id, dict_id in connection.execute(
+            "SELECT source_id, dictionary_id FROM source_dictionaries"
+        ):
+            self.__compressor.assign_dictionary(UUID(bytes=source_id), dict_id)
+        self.__loaded = True
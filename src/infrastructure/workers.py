@@ -0,0 +1,834 @@
+"""Многопроцессный режим: чаты распределены по процессам-воркерам
+
+Фронтовой процесс держит `WorkerPool` и фасады `ShardedChatService` и
+`ShardedMessageService`, реализующие протоколы сервисов. Запросы по чату
+уходят в воркер, выбранный по хешу `chat_id`, поэтому состояние и кэши чата
+живут ровно в одном процессе. Запросы по пользователю рассылаются во все
+воркеры, ответы объединяются.
+"""
+
+import asyncio
+import base64
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from multiprocessing.connection import Connection
+from multiprocessing.context import SpawnContext
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple, cast
+from uuid import UUID, uuid4
+
+from ..common.exceptions import InvalidFormatExc, ObjectNotFoundExc
+from ..domain.chats.cache import ChatSnapshot, ChatSnapshotCache
+from ..domain.chats.entities import (
+    Chat,
+    ChatMember,
+    ChatMemberPermissions,
+    RetentionPolicy,
+)
+from ..domain.chats.entities import personal_key as make_personal_key
+from ..domain.chats.reaper import ChatReaper
+from ..domain.chats.services import ChatService
+from ..domain.messages.entities import (
+    Attachment,
+    Message,
+    MessagePage,
+    MessageRef,
+    PurgeStats,
+    SourceType,
+)
+from ..domain.messages.retention import RetentionJob
+from ..domain.messages.services import MessageService
+from .memory import (
+    MemoryChatMemberRepository,
+    MemoryChatRepository,
+    MemoryMessageRepository,
+)
+
+ServiceFactory = Callable[[int, int], Mapping[str, Any]]
+
+# Запрос остановки воркера
+_STOP = None
+# Остановка потока отправки, в канал не попадает
+_CLOSE = object()
+
+
+def shard_of(key: UUID, shards: int) -> int:
+    return key.int % shards
+
+
+def shard_ids(shard: int, shards: int) -> Callable[[], UUID]:
+    """Фабрика UUID, попадающих в заданный шард
+
+    В среднем требует `shards` вызовов `uuid4`, поэтому подходит только для
+    редко создаваемых объектов вроде чатов.
+    """
+
+    def factory() -> UUID:
+        while True:
+            _id = uuid4()
+            if shard_of(_id, shards) == shard:
+                return _id
+
+    return factory
+
+
+def memory_services(shard: int, shards: int) -> Mapping[str, Any]:
+    """Сервисы воркера поверх репозиториев в памяти"""
+    chat_repository = MemoryChatRepository(id_factory=shard_ids(shard, shards))
+    member_repository = MemoryChatMemberRepository()
+    message_repository = MemoryMessageRepository()
+    snapshot_cache = ChatSnapshotCache(chat_repository, member_repository)
+    message_service = MessageService(
+        message_repository,
+        chat_member_repository=member_repository,
+        chat_snapshot_cache=snapshot_cache,
+    )
+    reaper = ChatReaper(chat_repository, member_repository, message_repository)
+    return {
+        "chats": ChatService(
+            chat_repository, member_repository, snapshot_cache, reaper=reaper
+        ),
+        "messages": message_service,
+        "reaper": reaper,
+        "retention": RetentionJob(message_service, message_repository, chat_repository),
+    }
+
+
+def _portable(exc: BaseException) -> BaseException:
+    # Исключение должно не только сериализоваться, но и восстановиться
+    # на другой стороне: конструкторы с обязательными аргументами этого не дают
+    try:
+        pickle.loads(pickle.dumps(exc))
+    except Exception:
+        return RuntimeError(repr(exc))
+    return exc
+
+
+def _decode(data: bytes) -> Tuple[List[int], List[Any] | Exception]:
+    # Пачка — два pickle подряд: ID запросов и сами элементы. ID читаются
+    # отдельно, чтобы при ошибке разбора элементов ответить каждому запросу
+    stream = io.BytesIO(data)
+    request_ids = pickle.load(stream)
+    try:
+        return request_ids, pickle.load(stream)
+    except Exception as exc:
+        return request_ids, exc
+
+
+class _Outcomes(list):
+    # Результаты `call_many`: (ok, результат или исключение) по порядку вызовов
+    pass
+
+
+class _Sender:
+    # Отправка в отдельном потоке: цикл событий продолжает читать ответы, и
+    # процессы не блокируют друг друга на заполненном канале. Все, что
+    # накопилось в очереди, сериализуется и уходит одним сообщением. Если
+    # пачка не сериализуется, элементы проверяются по одному: несериализуемый
+    # передается в `on_error`, который возвращает замену или None.
+    def __init__(
+        self,
+        connection: Connection,
+        on_error: Callable[[int, Any, Exception], Any],
+    ):
+        self.__connection = connection
+        self.__on_error = on_error
+        self.__queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def send(self, request_id: int, item: Any) -> None:
+        self.__queue.put((request_id, item))
+
+    def close(self) -> None:
+        self.__queue.put(_CLOSE)
+        self.__thread.join()
+
+    def __run(self) -> None:
+        while True:
+            batch = [self.__queue.get()]
+            while True:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _CLOSE
+            if stop:
+                batch.pop()
+            try:
+                if batch:
+                    self.__connection.send_bytes(self.__encode(batch))
+            except (OSError, EOFError):
+                return
+            if stop:
+                return
+
+    def __encode(self, batch: List[Tuple[int, Any]]) -> bytes:
+        try:
+            items = pickle.dumps([item for _, item in batch], pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            checked = []
+            for request_id, item in batch:
+                try:
+                    pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+                except Exception as exc:
+                    item = self.__on_error(request_id, item, exc)
+                    if item is None:
+                        continue
+                checked.append((request_id, item))
+            batch = checked
+            items = pickle.dumps([item for _, item in batch], pickle.HIGHEST_PROTOCOL)
+        request_ids = [request_id for request_id, _ in batch]
+        return pickle.dumps(request_ids, pickle.HIGHEST_PROTOCOL) + items
+
+
+def _checked(outcome: Tuple[bool, Any]) -> Tuple[bool, Any]:
+    try:
+        pickle.dumps(outcome[1], pickle.HIGHEST_PROTOCOL)
+    except Exception as exc:
+        return False, RuntimeError(f"Unpicklable result: {exc!r}")
+    return outcome
+
+
+def _unpicklable_reply(
+    request_id: int, reply: Tuple[bool, Any], exc: Exception
+) -> Tuple[bool, Any]:
+    ok, result = reply
+    if ok and isinstance(result, _Outcomes):
+        return True, _Outcomes(_checked(outcome) for outcome in result)
+    return False, RuntimeError(f"Unpicklable result: {exc!r}")
+
+
+def _worker_main(
+    connection: Connection, shard: int, shards: int, factory: ServiceFactory
+) -> None:
+    asyncio.run(_serve(connection, factory(shard, shards)))
+
+
+async def _serve(connection: Connection, services: Mapping[str, Any]) -> None:
+    loop = asyncio.get_running_loop()
+    sender = _Sender(connection, _unpicklable_reply)
+    stopped = loop.create_future()
+    tasks = set()
+    # Фоновые циклы сервисов (`run`) работают все время жизни воркера
+    background = [
+        loop.create_task(service.run())
+        for service in services.values()
+        if callable(getattr(service, "run", None))
+    ]
+
+    async def handle(request_id: int, service: str, method: str, args, kwargs):
+        try:
+            result = await getattr(services[service], method)(*args, **kwargs)
+            sender.send(request_id, (True, result))
+        except Exception as exc:
+            sender.send(request_id, (False, _portable(exc)))
+
+    async def handle_many(request_id: int, service: str, method: str, calls):
+        # Вызовы пачки выполняются по порядку: так сохраняется порядок
+        # сообщений одного клиента в чате
+        try:
+            fn = getattr(services[service], method)
+            outcomes = _Outcomes()
+            for args, kwargs in calls:
+                try:
+                    outcomes.append((True, await fn(*args, **kwargs)))
+                except Exception as exc:
+                    outcomes.append((False, _portable(exc)))
+            sender.send(request_id, (True, outcomes))
+        except Exception as exc:
+            sender.send(request_id, (False, _portable(exc)))
+
+    def on_readable() -> None:
+        try:
+            request_ids, requests = _decode(connection.recv_bytes())
+        except (EOFError, OSError):
+            requests = [_STOP]
+            request_ids = [-1]
+        if isinstance(requests, Exception):
+            error = RuntimeError(f"Bad request: {requests!r}")
+            for request_id in request_ids:
+                sender.send(request_id, (False, error))
+            return
+        for request_id, request in zip(request_ids, requests):
+            if request is _STOP:
+                if not stopped.done():
+                    stopped.set_result(None)
+                return
+            # (service, method, args, kwargs) или (service, method, calls)
+            target = handle if len(request) == 4 else handle_many
+            task = loop.create_task(target(request_id, *request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    loop.add_reader(connection.fileno(), on_readable)
+    try:
+        await stopped
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        for task in background:
+            task.cancel()
+        loop.remove_reader(connection.fileno())
+        sender.close()
+        connection.close()
+
+
+class _Worker:
+    def __init__(
+        self,
+        process,
+        connection: Connection,
+        on_error: Callable[[int, Any, Exception], Any],
+    ):
+        self.process = process
+        self.connection = connection
+        self.sender = _Sender(connection, on_error)
+        self.pending: Dict[int, asyncio.Future] = {}
+
+
+class WorkerPool:
+    """Пул процессов-воркеров с маршрутизацией по ключу
+
+    Каждый воркер исполняет свои экземпляры сервисов, созданные `factory`
+    (функцией уровня модуля: она передается в дочерний процесс). Запросы и
+    ответы передаются пачками: все, что накопилось за время отправки
+    предыдущей пачки, уходит одним сообщением.
+    """
+
+    def __init__(
+        self,
+        factory: ServiceFactory = memory_services,
+        workers: int | None = None,
+        start_method: str = "spawn",
+    ):
+        self.__factory = factory
+        self.__size = workers or os.cpu_count() or 1
+        # Process есть у всех контекстов, но в заглушках типов — только
+        # у конкретных
+        self.__context = cast(SpawnContext, multiprocessing.get_context(start_method))
+        self.__workers: List[_Worker] = []
+        self.__ids = itertools.count()
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def shard_of(self, key: UUID) -> int:
+        return shard_of(key, self.__size)
+
+    @property
+    def pids(self) -> List[int]:
+        return [worker.process.pid for worker in self.__workers]
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        for shard in range(self.__size):
+            parent, child = self.__context.Pipe()
+            process = self.__context.Process(
+                target=_worker_main,
+                args=(child, shard, self.__size, self.__factory),
+                name=f"worker-{shard}",
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            worker = _Worker(process, parent, partial(self.__unpicklable, loop, shard))
+            self.__workers.append(worker)
+            loop.add_reader(parent.fileno(), self.__on_readable, worker)
+
+    async def call(
+        self, shard: int, service: str, method: str, *args: Any, **kwargs: Any
+    ) -> Any:
+        """Вызвать метод сервиса в воркере
+
+        Raises:
+            Exception: Исключение, возбужденное методом в воркере
+            ConnectionError: Воркер завершился
+        """
+        return await self.__request(shard, (service, method, args, kwargs))
+
+    async def call_many(
+        self,
+        shard: int,
+        service: str,
+        method: str,
+        calls: Sequence[Tuple[Sequence[Any], Mapping[str, Any]]],
+    ) -> List[Any]:
+        """Вызвать метод сервиса в воркере несколько раз одним запросом
+
+        Вызовы выполняются в воркере по порядку. Пачка снимает накладные
+        расходы на запрос (сериализация, задача, future), которые для
+        дешевых методов сравнимы со временем самого вызова.
+
+        Args:
+            shard (int): Номер воркера
+            service (str): Имя сервиса
+            method (str): Имя метода
+            calls (Sequence[Tuple[Sequence[Any], Mapping[str, Any]]]):
+                Позиционные и именованные аргументы каждого вызова
+
+        Returns:
+            List[Any]: Результаты по порядку вызовов; исключение вызова
+                возвращается на месте его результата
+
+        Raises:
+            ConnectionError: Воркер завершился
+        """
+        outcomes = await self.__request(
+            shard,
+            (service, method, [(tuple(args), dict(kwargs)) for args, kwargs in calls]),
+        )
+        return [result for _, result in outcomes]
+
+    async def route(
+        self, key: UUID, service: str, method: str, *args: Any, **kwargs: Any
+    ) -> Any:
+        return await self.call(self.shard_of(key), service, method, *args, **kwargs)
+
+    async def scatter(
+        self, service: str, method: str, *args: Any, **kwargs: Any
+    ) -> List[Any]:
+        """Вызвать метод во всех воркерах и вернуть результаты по порядку шардов"""
+        return await asyncio.gather(
+            *(
+                self.call(shard, service, method, *args, **kwargs)
+                for shard in range(self.__size)
+            )
+        )
+
+    async def close(self) -> None:
+        loop = asyncio.get_running_loop()
+        for worker in self.__workers:
+            worker.sender.send(-1, _STOP)
+            worker.sender.close()
+        for worker in self.__workers:
+            await loop.run_in_executor(None, worker.process.join, 5.0)
+            if worker.process.is_alive():
+                worker.process.kill()
+            self.__disconnect(worker)
+        self.__workers.clear()
+
+    async def __request(self, shard: int, request: Tuple) -> Any:
+        worker = self.__workers[shard]
+        if worker.connection.closed:
+            raise ConnectionError(f"Worker {shard} is not running")
+        request_id = next(self.__ids)
+        future = asyncio.get_running_loop().create_future()
+        worker.pending[request_id] = future
+        worker.sender.send(request_id, request)
+        return await future
+
+    def __unpicklable(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        shard: int,
+        request_id: int,
+        request: Any,
+        exc: Exception,
+    ) -> None:
+        # Вызывается из потока отправки: запрос не уходит, вызов завершается
+        # ошибкой сериализации
+        loop.call_soon_threadsafe(self.__fail, shard, request_id, exc)
+
+    def __fail(self, shard: int, request_id: int, exc: Exception) -> None:
+        future = self.__workers[shard].pending.pop(request_id, None)
+        if future is not None and not future.done():
+            future.set_exception(exc)
+
+    def __on_readable(self, worker: _Worker) -> None:
+        try:
+            request_ids, replies = _decode(worker.connection.recv_bytes())
+        except (EOFError, OSError):
+            self.__disconnect(worker)
+            return
+        if isinstance(replies, Exception):
+            error = RuntimeError(f"Bad reply: {replies!r}")
+            replies = [(False, error)] * len(request_ids)
+        for request_id, (ok, result) in zip(request_ids, replies):
+            future = worker.pending.pop(request_id, None)
+            if future is None or future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+
+    def __disconnect(self, worker: _Worker) -> None:
+        if worker.connection.closed:
+            return
+        asyncio.get_running_loop().remove_reader(worker.connection.fileno())
+        worker.connection.close()
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"{worker.process.name} exited"))
+        worker.pending.clear()
+
+
+def _personal_shard(pool: WorkerPool, user_1: UUID, user_2: UUID) -> int:
+    first, second = make_personal_key(user_1, user_2)
+    return pool.shard_of(UUID(int=first.int ^ second.int))
+
+
+class ShardedChatService:
+    """`AbstractChatService` поверх пула воркеров
+
+    Группа создается в следующем по кругу воркере, личный чат — в воркере,
+    выбранном по паре пользователей. ID чата всегда попадает в шард своего
+    воркера (см. `shard_ids`), поэтому дальнейшие запросы маршрутизируются
+    по `chat_id`. Список чатов пользователя собирается со всех воркеров.
+    """
+
+    def __init__(self, pool: WorkerPool):
+        self.__pool = pool
+        self.__next_shard = itertools.count()
+
+    async def create_personal(
+        self, title: str, owner_user_1: UUID, owner_user_2: UUID
+    ) -> Chat:
+        return await self.__pool.call(
+            _personal_shard(self.__pool, owner_user_1, owner_user_2),
+            "chats",
+            "create_personal",
+            title,
+            owner_user_1,
+            owner_user_2,
+        )
+
+    async def get_or_create_personal(
+        self, title: str, owner_user_1: UUID, owner_user_2: UUID
+    ) -> Chat:
+        return await self.__pool.call(
+            _personal_shard(self.__pool, owner_user_1, owner_user_2),
+            "chats",
+            "get_or_create_personal",
+            title,
+            owner_user_1,
+            owner_user_2,
+        )
+
+    async def create_group(self, title: str, owner_id: UUID) -> Chat:
+        shard = next(self.__next_shard) % len(self.__pool)
+        return await self.__pool.call(shard, "chats", "create_group", title, owner_id)
+
+    async def get(self, chat_id: UUID) -> Chat:
+        return await self.__pool.route(chat_id, "chats", "get", chat_id)
+
+    async def get_snapshot(self, chat_id: UUID) -> ChatSnapshot:
+        return await self.__pool.route(chat_id, "chats", "get_snapshot", chat_id)
+
+    async def update(
+        self, chat_id: UUID, executor_id: UUID | None = None, title: str | None = None
+    ) -> Chat:
+        return await self.__pool.route(
+            chat_id, "chats", "update", chat_id, executor_id, title
+        )
+
+    async def set_retention(
+        self,
+        chat_id: UUID,
+        policy: RetentionPolicy,
+        executor_id: UUID | None = None,
+    ) -> Chat:
+        return await self.__pool.route(
+            chat_id, "chats", "set_retention", chat_id, policy, executor_id
+        )
+
+    async def delete(self, chat_id: UUID, executor_id: UUID | None = None) -> None:
+        await self.__pool.route(chat_id, "chats", "delete", chat_id, executor_id)
+
+    async def get_list(
+        self, user_id: UUID, offset: int = 0, limit: int = 50
+    ) -> Sequence[UUID]:
+        # Порядок: по шардам, внутри шарда — порядок репозитория
+        pages = await self.__pool.scatter(
+            "chats", "get_list", user_id, offset=0, limit=offset + limit
+        )
+        return list(itertools.chain.from_iterable(pages))[offset : offset + limit]
+
+    async def member_get(self, chat_id: UUID, user_id: UUID) -> ChatMember:
+        return await self.__pool.route(chat_id, "chats", "member_get", chat_id, user_id)
+
+    async def member_list_ids(self, chat_id: UUID) -> Sequence[UUID]:
+        return await self.__pool.route(chat_id, "chats", "member_list_ids", chat_id)
+
+    async def member_add(
+        self, chat_id: UUID, user_id: UUID, executor_id: UUID | None = None
+    ) -> ChatMember:
+        return await self.__pool.route(
+            chat_id, "chats", "member_add", chat_id, user_id, executor_id
+        )
+
+    async def member_remove(
+        self, chat_id: UUID, user_id: UUID, executor_id: UUID | None = None
+    ) -> None:
+        await self.__pool.route(
+            chat_id, "chats", "member_remove", chat_id, user_id, executor_id
+        )
+
+    async def member_block(
+        self, chat_id: UUID, user_id: UUID, executor_id: UUID | None = None
+    ) -> None:
+        await self.__pool.route(
+            chat_id, "chats", "member_block", chat_id, user_id, executor_id
+        )
+
+    async def member_unblock(
+        self, chat_id: UUID, user_id: UUID, executor_id: UUID | None = None
+    ) -> None:
+        await self.__pool.route(
+            chat_id, "chats", "member_unblock", chat_id, user_id, executor_id
+        )
+
+    async def member_change_role(
+        self,
+        chat_id: UUID,
+        user_id: UUID,
+        permissions: ChatMemberPermissions,
+        executor_id: UUID | None = None,
+    ) -> None:
+        await self.__pool.route(
+            chat_id,
+            "chats",
+            "member_change_role",
+            chat_id,
+            user_id,
+            permissions,
+            executor_id,
+        )
+
+
+def _encode_cursor(state: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Any:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise InvalidFormatExc(f"Invalid cursor {cursor!r}") from None
+
+
+@dataclass(frozen=True)
+class SendRequest:
+    """Аргументы `send` для пакетной отправки `ShardedMessageService.send_many`"""
+
+    source_id: UUID
+    source_type: SourceType
+    sender_id: UUID
+    text_content: str
+    attachment: Attachment | None = None
+    expires_at: datetime | None = None
+    reply_to_id: UUID | None = None
+
+
+def _send_call(request: SendRequest) -> Tuple[Tuple[Any, ...], Dict[str, Any]]:
+    return (
+        (
+            request.source_id,
+            request.source_type,
+            request.sender_id,
+            request.text_content,
+        ),
+        {
+            "attachment": request.attachment,
+            "expires_at": request.expires_at,
+            "reply_to_id": request.reply_to_id,
+        },
+    )
+
+
+class ShardedMessageService:
+    """`AbstractMessageService` поверх пула воркеров
+
+    Сообщения живут в шарде своего чата (`source_id`). Поиск сообщения по ID
+    и ленты упоминаний пользователя собираются со всех воркеров; курсор
+    упоминаний хранит позицию в каждом шарде.
+    """
+
+    def __init__(self, pool: WorkerPool):
+        self.__pool = pool
+
+    async def send(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        sender_id: UUID,
+        text_content: str,
+        attachment: Attachment | None = None,
+        expires_at: datetime | None = None,
+        reply_to_id: UUID | None = None,
+    ) -> Message:
+        return await self.__pool.route(
+            source_id,
+            "messages",
+            "send",
+            source_id,
+            source_type,
+            sender_id,
+            text_content,
+            attachment=attachment,
+            expires_at=expires_at,
+            reply_to_id=reply_to_id,
+        )
+
+    async def send_many(
+        self, requests: Sequence[SendRequest]
+    ) -> List[Message | Exception]:
+        """Отправить сообщения пачками, по одному запросу на воркер
+
+        Сообщения одного чата отправляются в порядке `requests`.
+
+        Args:
+            requests (Sequence[SendRequest]): Сообщения
+
+        Returns:
+            List[Message | Exception]: Сообщения по порядку запросов;
+                на месте неотправленного — исключение `send`
+        """
+        by_shard: Dict[int, List[int]] = {}
+        for index, request in enumerate(requests):
+            shard = self.__pool.shard_of(request.source_id)
+            by_shard.setdefault(shard, []).append(index)
+        results = await asyncio.gather(
+            *(
+                self.__pool.call_many(
+                    shard,
+                    "messages",
+                    "send",
+                    [_send_call(requests[i]) for i in indexes],
+                )
+                for shard, indexes in by_shard.items()
+            )
+        )
+        by_index: Dict[int, Message | Exception] = {}
+        for indexes, shard_results in zip(by_shard.values(), results):
+            by_index.update(zip(indexes, shard_results))
+        return [by_index[index] for index in range(len(requests))]
+
+    async def get(self, _id: UUID) -> Message:
+        results = await asyncio.gather(
+            *(
+                self.__pool.call(shard, "messages", "get", _id)
+                for shard in range(len(self.__pool))
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Message):
+                return result
+        for result in results:
+            if not isinstance(result, ObjectNotFoundExc):
+                raise result
+        raise ObjectNotFoundExc("Message not found")
+
+    async def get_list(
+        self, source_id: UUID, source_type: SourceType, offset: int = 0, limit: int = 50
+    ) -> Sequence[Message]:
+        return await self.__pool.route(
+            source_id, "messages", "get_list", source_id, source_type, offset, limit
+        )
+
+    async def list_replies(
+        self, message_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        # Ответы лежат в шарде родительского сообщения, курсор помнит шард
+        if cursor is not None:
+            shard, shard_cursor = _decode_cursor(cursor)
+            pages = [
+                await self.__pool.call(
+                    shard, "messages", "list_replies", message_id, shard_cursor, limit
+                )
+            ]
+            shards = [shard]
+        else:
+            pages = await self.__pool.scatter(
+                "messages", "list_replies", message_id, None, limit
+            )
+            shards = list(range(len(self.__pool)))
+        for shard, page in zip(shards, pages):
+            if page.messages:
+                return MessagePage(
+                    messages=page.messages,
+                    next_cursor=(
+                        _encode_cursor([shard, page.next_cursor])
+                        if page.next_cursor is not None
+                        else None
+                    ),
+                )
+        return MessagePage(messages=[])
+
+    async def list_mentions(
+        self, user_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> MessagePage:
+        # Позиция шарда — курсор его страницы и число уже отданных сообщений
+        # из нее; None вместо позиции — шард исчерпан
+        positions: List[Tuple[str | None, int] | None] = (
+            [tuple(p) if p is not None else None for p in _decode_cursor(cursor)]
+            if cursor is not None
+            else [(None, 0)] * len(self.__pool)
+        )
+        if len(positions) != len(self.__pool):
+            raise InvalidFormatExc("Cursor belongs to another pool")
+
+        active = [(shard, p) for shard, p in enumerate(positions) if p is not None]
+        pages = await asyncio.gather(
+            *(
+                self.__pool.call(
+                    shard, "messages", "list_mentions", user_id, start, limit + skip
+                )
+                for shard, (start, skip) in active
+            )
+        )
+        candidates: List[Tuple[Message, int]] = []
+        for (shard, (_, skip)), page in zip(active, pages):
+            candidates.extend((m, shard) for m in page.messages[skip:])
+        candidates.sort(key=lambda item: item[0].created_at, reverse=True)
+        taken = candidates[:limit]
+
+        consumed = {shard: 0 for shard, _ in active}
+        for _, shard in taken:
+            consumed[shard] += 1
+        for (shard, (start, skip)), page in zip(active, pages):
+            used = skip + consumed[shard]
+            if used < len(page.messages):
+                positions[shard] = (start, used)
+            elif page.next_cursor is not None:
+                positions[shard] = (page.next_cursor, 0)
+            else:
+                positions[shard] = None
+        more = len(candidates) > limit or any(p is not None for p in positions)
+        return MessagePage(
+            messages=[message for message, _ in taken],
+            next_cursor=_encode_cursor(positions) if more and taken else None,
+        )
+
+    async def expire(self, refs: Sequence[MessageRef]) -> int:
+        by_shard: Dict[int, List[MessageRef]] = {}
+        for ref in refs:
+            by_shard.setdefault(self.__pool.shard_of(ref.source_id), []).append(ref)
+        results = await asyncio.gather(
+            *(
+                self.__pool.call(shard, "messages", "expire", shard_refs)
+                for shard, shard_refs in by_shard.items()
+            )
+        )
+        return sum(results)
+
+    async def purge(
+        self,
+        source_id: UUID,
+        source_type: SourceType,
+        policy: RetentionPolicy | None = None,
+        limit: int = 1000,
+    ) -> PurgeStats:
+        return await self.__pool.route(
+            source_id, "messages", "purge", source_id, source_type, policy, limit
+        )
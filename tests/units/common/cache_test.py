@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from src.common.cache import LoadingCache
+from src.common.exceptions import ObjectNotFoundExc
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingLoader:
+    def __init__(self, values):
+        self.values = values
+        self.calls = 0
+        self.gate: asyncio.Event | None = None
+
+    async def __call__(self, key):
+        self.calls += 1
+        value = self.values.get(key)
+        if self.gate is not None:
+            await self.gate.wait()
+        if value is None:
+            raise ObjectNotFoundExc()
+        return value
+
+
+class TestLoadingCache:
+    async def test_hit_after_load(self):
+        loader = CountingLoader({"a": 1})
+        cache = LoadingCache(loader)
+
+        assert await cache.get("a") == 1
+        assert await cache.get("a") == 1
+        assert loader.calls == 1
+
+    async def test_ttl_expiry(self):
+        clock = FakeClock()
+        loader = CountingLoader({"a": 1})
+        cache = LoadingCache(loader, ttl=10, clock=clock)
+
+        await cache.get("a")
+        clock.now = 11
+        await cache.get("a")
+        assert loader.calls == 2
+
+    async def test_negative_ttl(self):
+        clock = FakeClock()
+        loader = CountingLoader({})
+        cache = LoadingCache(loader, negative_ttl=1, clock=clock)
+
+        for _ in range(2):
+            with pytest.raises(ObjectNotFoundExc):
+                await cache.get("missing")
+        assert loader.calls == 1
+
+        clock.now = 2
+        loader.values["missing"] = 3
+        assert await cache.get("missing") == 3
+
+    async def test_lru_eviction(self):
+        loader = CountingLoader({"a": 1, "b": 2, "c": 3})
+        cache = LoadingCache(loader, max_size=2)
+
+        await cache.get("a")
+        await cache.get("b")
+        await cache.get("a")
+        await cache.get("c")
+        assert "a" in cache
+        assert "b" not in cache
+        assert cache.stats.evictions == 1
+
+    async def test_invalidate_discards_inflight_load(self):
+        loader = CountingLoader({"a": 1})
+        loader.gate = asyncio.Event()
+        cache = LoadingCache(loader)
+
+        pending = asyncio.ensure_future(cache.get("a"))
+        while loader.calls == 0:
+            await asyncio.sleep(0)
+        cache.invalidate("a")
+        loader.values["a"] = 2
+        loader.gate.set()
+
+        assert await pending == 1
+        assert "a" not in cache
+        assert await cache.get("a") == 2
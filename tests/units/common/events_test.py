@@ -0,0 +1,103 @@
+import asyncio
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+
+import pytest
+
+from src.common.events import DomainEvent, EventBus, HandlerMode
+
+
+@dataclass(frozen=True, kw_only=True)
+class Ping(DomainEvent):
+    value: int
+
+
+@dataclass(frozen=True, kw_only=True)
+class LoudPing(Ping):
+    pass
+
+
+def write_values(path: str, events: Sequence[Ping]) -> None:
+    with open(path, "a") as f:
+        for event in events:
+            f.write(f"{event.value}\n")
+
+
+class TestEventBus:
+    async def test_inline_handler(self):
+        bus = EventBus()
+        received = []
+        bus.subscribe(Ping, received.append)
+
+        await bus.publish(Ping(value=1))
+        await bus.publish(LoudPing(value=2))
+        assert [event.value for event in received] == [1, 2]
+
+    async def test_inline_failure_is_isolated(self):
+        bus = EventBus()
+
+        def fail(event):
+            raise RuntimeError()
+
+        bus.subscribe(Ping, fail, name="fail")
+        await bus.publish(Ping(value=1))
+        assert bus.metrics()["fail"].failed == 1
+
+    async def test_async_handler_receives_batches(self):
+        bus = EventBus()
+        batches = []
+
+        async def handler(events):
+            batches.append([event.value for event in events])
+
+        bus.subscribe(Ping, handler, mode=HandlerMode.ASYNC, batch_size=3)
+        for i in range(7):
+            await bus.publish(Ping(value=i))
+        await bus.close()
+
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+    async def test_slow_consumer_does_not_block_publish(self):
+        bus = EventBus()
+        release = asyncio.Event()
+
+        async def slow(events):
+            await release.wait()
+
+        bus.subscribe(Ping, slow, mode=HandlerMode.ASYNC, max_queue=2, name="slow")
+        for i in range(5):
+            await asyncio.wait_for(bus.publish(Ping(value=i)), timeout=0.1)
+        await asyncio.sleep(0)
+        for i in range(5):
+            await bus.publish(Ping(value=i))
+
+        metrics = bus.metrics()["slow"]
+        assert metrics.dropped > 0
+        assert metrics.queue_depth <= 2
+        release.set()
+        await bus.close()
+        assert metrics.processed + metrics.dropped == metrics.received
+
+    async def test_process_handler(self, tmp_path: Path):
+        path = tmp_path / "values.txt"
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            bus = EventBus(executor=executor)
+            bus.subscribe(
+                Ping,
+                functools.partial(write_values, str(path)),
+                mode=HandlerMode.PROCESS,
+                name="writer",
+            )
+            for i in range(3):
+                await bus.publish(Ping(value=i))
+            await bus.close()
+
+        assert path.read_text().split() == ["0", "1", "2"]
+        assert bus.metrics()["writer"].processed == 3
+
+    def test_process_handler_requires_executor(self):
+        with pytest.raises(ValueError):
+            EventBus().subscribe(Ping, print, mode=HandlerMode.PROCESS)
@@ -0,0 +1,77 @@
+from uuid import uuid4
+
+import pytest
+
+from src.common.instrumentation import LatencyHistogram, MetricsRegistry
+from src.domain.chats.services import ChatService
+
+from ..services.chat_service_test import FakeChatMemberRepository, FakeChatRepository
+
+
+@pytest.fixture
+def registry() -> MetricsRegistry:
+    return MetricsRegistry()
+
+
+@pytest.fixture
+def chat_service(registry) -> ChatService:
+    chat_repository = registry.instrument_repository(FakeChatRepository(), "chat")
+    member_repository = registry.instrument_repository(
+        FakeChatMemberRepository(), "chat_member"
+    )
+    return registry.instrument_service(
+        ChatService(chat_repository, member_repository), "chat"
+    )
+
+
+class TestLatencyHistogram:
+    def test_quantiles_within_relative_error(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 10_001):
+            histogram.record(value * 1000)
+
+        assert histogram.count == 10_000
+        for q in (0.5, 0.9, 0.99):
+            expected = q * 10_000 * 1000
+            assert abs(histogram.quantile(q) - expected) / expected <= 0.125
+        assert histogram.quantile(1.0) == histogram.max
+        assert abs(histogram.max - 10_000_000) / 10_000_000 <= 0.125
+
+
+class TestMetricsRegistry:
+    async def test_service_and_repository_latency(self, registry, chat_service):
+        owner_id = uuid4()
+        chat = await chat_service.create_group(title="Group", owner_id=owner_id)
+        await chat_service.update(chat.id, executor_id=owner_id, title="New")
+
+        assert registry.histogram("service", "chat", "update").count == 1
+        assert registry.histogram("service", "chat", "_can_execute").count == 1
+        assert registry.histogram("repository", "chat", "update").count == 1
+        assert registry.repository_calls()[("chat_member", "get")] == 1
+
+    async def test_request_scope_counts_repository_calls(self, registry, chat_service):
+        owner_id = uuid4()
+        chat = await chat_service.create_group(title="Group", owner_id=owner_id)
+
+        with registry.request("update_chat") as calls:
+            await chat_service.update(chat.id, executor_id=owner_id, title="New")
+
+        assert calls[("chat_member", "get")] == 1
+        assert calls[("chat", "update")] == 1
+
+    async def test_render_prometheus(self, registry, chat_service):
+        with registry.request("create_group"):
+            await chat_service.create_group(title="Group", owner_id=uuid4())
+
+        text = registry.render_prometheus()
+        assert "# TYPE messenger_service_latency_seconds histogram" in text
+        assert (
+            'messenger_service_latency_seconds_count{service="chat",'
+            'method="create_group"} 1'
+        ) in text
+        assert (
+            'messenger_repository_calls_total{repository="chat",method="create"} 1'
+        ) in text
+        assert (
+            'messenger_request_repository_calls_count{request="create_group"} 1'
+        ) in text
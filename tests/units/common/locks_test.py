@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from src.common.locks import KeyedLock
+
+
+@pytest.fixture
+def locks() -> KeyedLock:
+    return KeyedLock()
+
+
+class TestKeyedLock:
+    async def test_same_key_serialized(self, locks):
+        order = []
+
+        async def worker(name: str):
+            async with locks("chat"):
+                order.append(f"{name}:start")
+                await asyncio.sleep(0)
+                order.append(f"{name}:end")
+
+        await asyncio.gather(worker("a"), worker("b"))
+        assert order == ["a:start", "a:end", "b:start", "b:end"]
+
+    async def test_different_keys_parallel(self, locks):
+        entered = asyncio.Event()
+
+        async def holder():
+            async with locks("a"):
+                await entered.wait()
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        async with locks("b"):
+            entered.set()
+        await task
+
+    async def test_entries_released(self, locks):
+        async with locks("a"):
+            assert locks.locked("a")
+            assert len(locks) == 1
+        assert len(locks) == 0
+        assert not locks.locked("a")
+
+    async def test_cancelled_waiter_released(self, locks):
+        async with locks("a"):
+            waiter = asyncio.create_task(locks("a").__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        assert len(locks) == 0
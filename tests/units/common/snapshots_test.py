@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List
+
+import pytest
+
+from src.common.snapshots import SnapshotStore
+from src.domain.chats import entities
+from src.domain.chats.cache import ChatSnapshotCache
+from src.infrastructure.memory import (
+    MemoryChangeSequence,
+    MemoryChatMemberRepository,
+    MemoryChatRepository,
+)
+
+from ..services.chat_service_test import (
+    FakeChatMemberRepository,
+    FakeChatRepository,
+)
+
+
+class FakeChangeSequence:
+    def __init__(self):
+        self.seq = 0
+
+    async def get_change_seq(self) -> int:
+        return self.seq
+
+
+class FakeComponent:
+    snapshot_name = "fake"
+
+    def __init__(self, records: List[bytes] | None = None):
+        self.records = records or []
+
+    def dump(self) -> Iterable[bytes]:
+        return self.records
+
+    def restore(self, records) -> int:
+        self.records = [bytes(record) for record in records]
+        return len(self.records)
+
+
+@pytest.fixture
+def change_sequence() -> FakeChangeSequence:
+    return FakeChangeSequence()
+
+
+@pytest.fixture
+def store(tmp_path) -> SnapshotStore:
+    return SnapshotStore(tmp_path / "state.snap")
+
+
+class TestSnapshotStore:
+    async def test_roundtrip(self, store, change_sequence):
+        records = [b"", b"a", b"\x00" * 1000]
+        await store.save([FakeComponent(records)], change_sequence)
+
+        restored = FakeComponent()
+        assert await store.load([restored], change_sequence)
+        assert restored.records == records
+
+    async def test_missing_file(self, store, change_sequence):
+        assert not await store.load([FakeComponent()], change_sequence)
+
+    async def test_stale_snapshot(self, store, change_sequence):
+        await store.save([FakeComponent([b"a"])], change_sequence)
+        change_sequence.seq += 1
+
+        restored = FakeComponent()
+        assert not await store.load([restored], change_sequence)
+        assert restored.records == []
+
+    async def test_corrupted_snapshot(self, tmp_path, store, change_sequence):
+        await store.save([FakeComponent([b"abc"])], change_sequence)
+        path = tmp_path / "state.snap"
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xFF
+        path.write_bytes(bytes(data))
+
+        assert not await store.load([FakeComponent()], change_sequence)
+
+    async def test_unknown_sections_skipped(self, store, change_sequence):
+        other = FakeComponent([b"x"])
+        other.snapshot_name = "other"
+        await store.save([other, FakeComponent([b"y"])], change_sequence)
+
+        restored = FakeComponent()
+        assert await store.load([restored], change_sequence)
+        assert restored.records == [b"y"]
+
+    async def test_chat_snapshot_cache(self, store, change_sequence):
+        chat_repository = FakeChatRepository()
+        member_repository = FakeChatMemberRepository()
+        chat = await chat_repository.create(entities.ChatType.GROUP, "Чат")
+        chat.updated_at = datetime(2024, 5, 1, 12, 30, 0, 123456, tzinfo=timezone.utc)
+        chat.retention = entities.RetentionPolicy(max_age=timedelta(days=30))
+        owner = entities.ChatMember(
+            chat_id=chat.id,
+            user_id=chat.id,
+            permissions=entities.ChatMemberPermissions.ROLE_OWNER,
+        )
+        await member_repository.create(owner)
+
+        warm = ChatSnapshotCache(chat_repository, member_repository)
+        expected = await warm.get(chat.id)
+        await store.save([warm], change_sequence)
+
+        cold = ChatSnapshotCache(chat_repository, member_repository)
+        assert await store.load([cold], change_sequence)
+        snapshot = await cold.get(chat.id)
+        assert cold.stats.loads == 0
+        assert snapshot.chat == expected.chat
+        assert snapshot.member_count == 1
+        assert snapshot.owner_ids == (chat.id,)
+
+    async def test_stale_after_repository_write(self, store):
+        changes = MemoryChangeSequence()
+        chat_repository = MemoryChatRepository(change_sequence=changes)
+        member_repository = MemoryChatMemberRepository(change_sequence=changes)
+        chat = await chat_repository.create(entities.ChatType.GROUP, "Чат")
+        warm = ChatSnapshotCache(chat_repository, member_repository)
+        await warm.get(chat.id)
+        await store.save([warm], changes)
+
+        assert await store.load(
+            [ChatSnapshotCache(chat_repository, member_repository)], changes
+        )
+        await member_repository.create(
+            entities.ChatMember(
+                chat_id=chat.id,
+                user_id=chat.id,
+                permissions=entities.ChatMemberPermissions.ROLE_OWNER,
+            )
+        )
+        cold = ChatSnapshotCache(chat_repository, member_repository)
+        assert not await store.load([cold], changes)
+        assert (await cold.get(chat.id)).member_count == 1
@@ -0,0 +1,106 @@
+import random
+
+from src.common.timing_wheel import HierarchicalTimingWheel, TimingWheel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTimingWheel:
+    def test_expires_in_deadline_order(self):
+        wheel = TimingWheel(tick=1, slots=8, clock=FakeClock())
+        wheel.schedule("a", 2.5)
+        wheel.schedule("b", 5)
+
+        assert wheel.advance(2) == []
+        assert wheel.advance(3) == ["a"]
+        assert wheel.advance(10) == ["b"]
+        assert len(wheel) == 0
+
+    def test_deadline_beyond_one_rotation(self):
+        wheel = TimingWheel(tick=1, slots=4, clock=FakeClock())
+        wheel.schedule("far", 9)
+
+        assert wheel.advance(5) == []
+        assert wheel.advance(8) == []
+        assert wheel.advance(9) == ["far"]
+
+    def test_reschedule_and_cancel(self):
+        wheel = TimingWheel(tick=1, slots=8, clock=FakeClock())
+        wheel.schedule("a", 1)
+        wheel.schedule("a", 6)
+        wheel.schedule("b", 2)
+
+        assert wheel.advance(3) == ["b"]
+        assert "a" in wheel
+        assert wheel.cancel("a")
+        assert not wheel.cancel("a")
+        assert wheel.advance(10) == []
+
+    def test_past_deadline_expires_on_next_advance(self):
+        clock = FakeClock()
+        wheel = TimingWheel(tick=1, slots=8, clock=clock)
+        wheel.advance(20)
+        wheel.schedule("late", 3)
+
+        assert wheel.advance(20) == ["late"]
+
+
+class TestHierarchicalTimingWheel:
+    def test_never_fires_early(self):
+        wheel = HierarchicalTimingWheel(tick=1, levels=(4, 4), clock=FakeClock())
+        wheel.schedule("a", 2.5)
+
+        assert wheel.advance(2.9) == []
+        assert wheel.advance(3) == ["a"]
+
+    def test_cascades_far_deadlines(self):
+        wheel = HierarchicalTimingWheel(tick=1, levels=(4, 4), clock=FakeClock())
+        wheel.schedule("level1", 9)
+        wheel.schedule("overflow", 100)
+
+        assert wheel.advance(8) == []
+        assert wheel.advance(9) == ["level1"]
+        assert wheel.advance(99) == []
+        assert wheel.advance(100) == ["overflow"]
+        assert len(wheel) == 0
+
+    def test_reschedule_cancel_and_past_deadlines(self):
+        clock = FakeClock()
+        wheel = HierarchicalTimingWheel(tick=1, levels=(4, 4), clock=clock)
+        wheel.schedule("a", 30)
+        wheel.schedule("a", 5)
+        wheel.schedule("b", 6)
+        assert wheel.deadline("a") == 5
+        assert wheel.cancel("b")
+        assert not wheel.cancel("b")
+
+        assert wheel.advance(20) == ["a"]
+        wheel.schedule("late", 3)
+        assert wheel.advance(20) == ["late"]
+
+    def test_matches_brute_force(self):
+        rng = random.Random(42)
+        wheel = HierarchicalTimingWheel(tick=1, levels=(8, 4, 4), clock=FakeClock())
+        deadlines = {}
+        for key in range(2000):
+            deadlines[key] = rng.uniform(0, 1000)
+            wheel.schedule(key, deadlines[key])
+        for key in range(0, 2000, 7):
+            wheel.cancel(key)
+            del deadlines[key]
+
+        fired = {}
+        now = 0.0
+        while now < 1000:
+            now += rng.uniform(0.1, 20)
+            for key in wheel.advance(now):
+                fired[key] = now
+        assert fired.keys() == deadlines.keys()
+        for key, moment in fired.items():
+            assert deadlines[key] <= moment
@@ -0,0 +1,62 @@
+import logging
+from uuid import uuid4
+
+import pytest
+
+from src.common.exceptions import QueryBudgetExceededExc
+from src.common.tracing import (
+    BudgetMode,
+    arguments_shape,
+    query_budget,
+    trace_repository,
+)
+
+
+class FakeRepository:
+    async def get(self, _id):
+        return _id
+
+    async def update(self, _id, **attrs):
+        return attrs
+
+
+@pytest.fixture
+def repository() -> FakeRepository:
+    return trace_repository(FakeRepository(), "fake")
+
+
+class TestQueryBudget:
+    def test_arguments_shape(self):
+        assert arguments_shape((uuid4(), uuid4()), {}) == "UUID,UUID"
+        assert arguments_shape(((uuid4(), uuid4()),), {"title": "x"}) == (
+            "(UUID,UUID),title=str"
+        )
+        assert arguments_shape(([1, 2],), {}) == "list[int]"
+
+    async def test_calls_outside_scope_are_not_recorded(self, repository):
+        await repository.get(1)
+        with query_budget("op") as trace:
+            await repository.get(2)
+            await repository.update(2, title="x")
+        assert [call.method for call in trace.calls] == ["get", "update"]
+        assert trace.calls[1].shape == "int,title=str"
+
+    async def test_budget_exceeded_raises(self, repository):
+        with pytest.raises(QueryBudgetExceededExc, match="3 repository calls"):
+            with query_budget("op", max_calls=2):
+                for i in range(3):
+                    await repository.get(i)
+
+    async def test_budget_exceeded_logs(self, repository, caplog):
+        with caplog.at_level(logging.WARNING):
+            with query_budget("op", max_calls=0, mode=BudgetMode.LOG):
+                await repository.get(1)
+        assert "op: 1 repository calls > budget 0" in caplog.text
+
+    async def test_nested_scopes(self, repository):
+        with query_budget("outer") as outer:
+            await repository.get(1)
+            with query_budget("inner") as inner:
+                await repository.get(2)
+        assert outer.count() == 2
+        assert inner.count() == 1
@@ -0,0 +1,85 @@
+import gzip
+import json
+import zlib
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from src.domain.messages import compression, entities
+
+SAMPLES = [
+    f"Привет! Созвон по проекту в {hour}:00, ссылка https://meet.example.com/room"
+    for hour in range(24)
+]
+
+
+@pytest.fixture(params=[True, False], ids=["default", "zlib"])
+def compressor(request) -> compression.PayloadCompressor:
+    return compression.PayloadCompressor(prefer_zstd=request.param)
+
+
+class TestPayloadCompressor:
+    def test_roundtrip(self, compressor):
+        text = "Длинное сообщение. " * 50
+        payload = compressor.encode(uuid4(), text)
+        assert len(payload) < len(text.encode())
+        assert compressor.decode(payload) == text
+
+    def test_short_message_is_stored_raw(self, compressor):
+        payload = compressor.encode(uuid4(), "ok")
+        assert payload[0] == compression.RAW
+        assert compressor.decode(payload) == "ok"
+
+    def test_trained_dictionary_improves_ratio(self, compressor):
+        chat_id = uuid4()
+        text = "Привет! Созвон по проекту в 25:00, ссылка https://meet.example.com/room"
+        plain = compressor.encode(chat_id, text)
+        compressor.train(chat_id, SAMPLES)
+        trained = compressor.encode(chat_id, text)
+
+        assert len(trained) < len(plain)
+        assert compressor.decode(trained) == text
+
+    def test_dictionary_keeps_frequent_tokens(self):
+        dictionary = compression.train_dictionary(SAMPLES)
+        assert b"https://meet.example.com/room" in dictionary
+        assert len(dictionary) <= compression.MAX_DICTIONARY_SIZE
+
+
+class TestNegotiation:
+    @pytest.mark.parametrize(
+        "header, expected",
+        [
+            (None, "identity"),
+            ("", "identity"),
+            ("gzip", "gzip"),
+            ("deflate, gzip;q=0.5", "deflate"),
+            ("gzip;q=0, br", "identity"),
+            ("br, *;q=0.1", compression.supported_encodings()[0]),
+        ],
+    )
+    def test_negotiate_encoding(self, header, expected):
+        assert compression.negotiate_encoding(header) == expected
+
+    def test_encode_history_page(self):
+        messages = [
+            entities.Message(
+                id=uuid4(),
+                source_id=uuid4(),
+                source_type=entities.SourceType.CHAT,
+                sender_id=uuid4(),
+                text_content=f"message {i}",
+                created_at=datetime.now(),
+            )
+            for i in range(20)
+        ]
+        encoding, body = compression.encode_history_page(messages, "gzip")
+        assert encoding == "gzip"
+        page = json.loads(gzip.decompress(body))
+        assert [item["text_content"] for item in page] == [
+            f"message {i}" for i in range(20)
+        ]
+
+        encoding, body = compression.encode_history_page(messages, "deflate")
+        assert len(json.loads(zlib.decompress(body))) == 20
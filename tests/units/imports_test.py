@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+CHECK = """
+import json, pkgutil, sys
+import src.domain
+for info in pkgutil.walk_packages(src.domain.__path__, "src.domain."):
+    __import__(info.name)
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def loaded_modules(code: str) -> set:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(json.loads(result.stdout))
+
+
+class TestImports:
+    def test_domain_layer_is_import_light(self):
+        modules = loaded_modules(CHECK)
+        for heavy in ("sqlalchemy", "fastapi", "pydantic", "multiprocessing"):
+            assert heavy not in modules
+        assert not any(name.startswith("src.infrastructure") for name in modules)
+
+    def test_infrastructure_exports_are_lazy(self):
+        modules = loaded_modules(
+            "import json, sys, src.infrastructure; print(json.dumps(sorted(sys.modules)))"
+        )
+        assert "src.infrastructure.blobs" not in modules
+
+        modules = loaded_modules(
+            "import json, sys\n"
+            "from src.infrastructure import LocalBlobRepository\n"
+            "print(json.dumps(sorted(sys.modules)))"
+        )
+        assert "src.infrastructure.blobs" in modules
@@ -0,0 +1,67 @@
+import asyncio
+import hashlib
+import socket
+
+import pytest
+
+from src.common.exceptions import ObjectNotFoundExc
+from src.infrastructure.blobs import LocalBlobRepository
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.fixture
+def blob_repository(tmp_path) -> LocalBlobRepository:
+    return LocalBlobRepository(tmp_path)
+
+
+class TestLocalBlobRepository:
+    async def test_put_stream_is_content_addressed(self, blob_repository):
+        digest, size = await blob_repository.put_stream(stream(b"abc", b"def"))
+        assert digest == hashlib.sha256(b"abcdef").hexdigest()
+        assert size == 6
+        assert blob_repository.path(digest).exists()
+
+    async def test_duplicates_are_stored_once(self, blob_repository, tmp_path):
+        first, _ = await blob_repository.put_stream(stream(b"same"))
+        second, _ = await blob_repository.put_stream(stream(b"sa", b"me"))
+        assert first == second
+        assert len([p for p in tmp_path.rglob("*") if p.is_file()]) == 1
+
+    async def test_open_range(self, blob_repository):
+        digest, _ = await blob_repository.put_stream(stream(b"0123456789"))
+        with blob_repository.open_range(digest, offset=2, length=3) as view:
+            assert bytes(view) == b"234"
+        with blob_repository.open_range(digest, offset=8) as view:
+            assert bytes(view) == b"89"
+
+    async def test_open_empty_blob(self, blob_repository):
+        digest, size = await blob_repository.put_stream(stream())
+        assert size == 0
+        with blob_repository.open_range(digest) as view:
+            assert bytes(view) == b""
+
+    async def test_missing_blob(self, blob_repository):
+        with pytest.raises(ObjectNotFoundExc):
+            await blob_repository.size("0" * 64)
+        with pytest.raises(ObjectNotFoundExc):
+            with blob_repository.open_range("../../etc/passwd"):
+                pass
+
+    async def test_send_range(self, blob_repository):
+        digest, _ = await blob_repository.put_stream(stream(b"x" * 1000, b"y" * 1000))
+        left, right = socket.socketpair()
+        left.setblocking(False)
+        right.setblocking(False)
+        loop = asyncio.get_running_loop()
+        try:
+            sent = await blob_repository.send_range(digest, left, offset=990, length=20)
+            received = await loop.sock_recv(right, 100)
+        finally:
+            left.close()
+            right.close()
+        assert sent == 20
+        assert received == b"x" * 10 + b"y" * 10
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+import threading
+import time
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from src.common.exceptions import InvalidFormatExc
+from src.domain.chats.entities import ChatMemberPermissions
+from src.infrastructure.sqlite.bulk import (
+    ImportJob,
+    connect,
+    export_table,
+    import_files,
+    main,
+)
+
+
+def user_record(i: int) -> dict:
+    return {
+        "id": str(uuid4()),
+        "name": f"User {i}",
+        "email": f"user{i}@example.com",
+        "hashed_password": "hash",
+        "created_at": datetime(2024, 1, 1, 12, 0, i % 60).isoformat(),
+    }
+
+
+def write_ndjson(path, records) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = connect(str(tmp_path / "app.db"))
+    yield connection
+    connection.close()
+
+
+class TestBulkImport:
+    def test_import_ndjson_and_csv(self, tmp_path, connection):
+        users = [user_record(i) for i in range(25)]
+        write_ndjson(tmp_path / "users.ndjson", users)
+
+        chat_id = uuid4()
+        with open(tmp_path / "members.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["chat_id", "user_id", "permissions"])
+            writer.writeheader()
+            for i, user in enumerate(users):
+                writer.writerow(
+                    {
+                        "chat_id": chat_id,
+                        "user_id": user["id"],
+                        "permissions": "ROLE_OWNER" if i == 0 else 3,
+                    }
+                )
+
+        lines = []
+        jobs = import_files(
+            connection,
+            [
+                ImportJob("users", tmp_path / "users.ndjson"),
+                ImportJob("chat_members", tmp_path / "members.csv"),
+            ],
+            batch_size=10,
+            workers=2,
+            report=lines.append,
+        )
+        assert [job.done for job in jobs] == [25, 25]
+        assert connection.execute("SELECT count(*) FROM users").fetchone() == (25,)
+        assert connection.execute(
+            "SELECT count(*) FROM chat_members WHERE permissions = ?",
+            (int(ChatMemberPermissions.ROLE_OWNER),),
+        ).fetchone() == (1,)
+        assert "50 rows" in lines[-1]
+
+    def test_resume_from_checkpoint(self, tmp_path, connection):
+        path = tmp_path / "users.ndjson"
+        write_ndjson(path, [user_record(i) for i in range(10)])
+        import_files(connection, [ImportJob("users", path)], batch_size=4)
+
+        write_ndjson(path, [user_record(i) for i in range(10, 15)])
+        (job,) = import_files(connection, [ImportJob("users", path)], batch_size=4)
+        assert (job.skipped, job.done) == (10, 5)
+        assert connection.execute("SELECT count(*) FROM users").fetchone() == (15,)
+
+    def test_invalid_record(self, tmp_path, connection):
+        path = tmp_path / "users.ndjson"
+        record = user_record(1)
+        del record["email"]
+        write_ndjson(path, [user_record(0), record])
+
+        with pytest.raises(InvalidFormatExc, match="record 2"):
+            import_files(connection, [ImportJob("users", path)])
+
+    def test_readers_stop_after_writer_error(self, tmp_path, connection):
+        for name in ("a", "b"):
+            write_ndjson(
+                tmp_path / f"{name}.ndjson", [user_record(i) for i in range(50)]
+            )
+        threads = threading.active_count()
+
+        def report(line):
+            raise RuntimeError("report failed")
+
+        with pytest.raises(RuntimeError):
+            import_files(
+                connection,
+                [
+                    ImportJob("users", tmp_path / "a.ndjson"),
+                    ImportJob("users", tmp_path / "b.ndjson"),
+                ],
+                batch_size=1,
+                workers=2,
+                report=report,
+                report_interval=0.0,
+            )
+        deadline = time.monotonic() + 5
+        while threading.active_count() > threads and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert threading.active_count() == threads
+
+    def test_import_messages_indexes_mentions(self, tmp_path, connection):
+        mentioned = [uuid4(), uuid4()]
+        messages = [
+            {
+                "id": str(uuid4()),
+                "source_id": str(uuid4()),
+                "source_type": "chat",
+                "sender_id": str(uuid4()),
+                "text_content": f"message {i}",
+                "created_at": datetime(2024, 1, 1).isoformat(),
+                "mentions": [str(user_id) for user_id in mentioned[: i + 1]],
+            }
+            for i in range(2)
+        ]
+        write_ndjson(tmp_path / "messages.ndjson", messages)
+        import_files(connection, [ImportJob("messages", tmp_path / "messages.ndjson")])
+
+        assert connection.execute(
+            "SELECT count(*) FROM message_mentions WHERE user_id = ?",
+            (mentioned[0].bytes,),
+        ).fetchone() == (2,)
+        out = io.StringIO()
+        export_table(connection, "messages", out)
+        exported = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert exported[1]["mentions"] == " ".join(map(str, mentioned))
+
+
+class TestBulkExport:
+    def test_roundtrip(self, tmp_path, connection):
+        users = [user_record(i) for i in range(5)]
+        write_ndjson(tmp_path / "users.ndjson", users)
+        import_files(connection, [ImportJob("users", tmp_path / "users.ndjson")])
+
+        out = io.StringIO()
+        assert export_table(connection, "users", out, batch_size=2) == 5
+        exported = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [u["id"] for u in exported] == [u["id"] for u in users]
+        assert exported[0]["token_version"] == 0
+
+    def test_cli_csv_export(self, tmp_path, connection):
+        write_ndjson(tmp_path / "users.ndjson", [user_record(0)])
+        database = str(tmp_path / "app.db")
+        assert main(["import", database, f"users={tmp_path / 'users.ndjson'}"]) == 0
+        assert main(["export", database, "users", str(tmp_path / "users.csv")]) == 0
+
+        with open(tmp_path / "users.csv", newline="") as f:
+            (row,) = list(csv.DictReader(f))
+        assert row["email"] == "user0@example.com"
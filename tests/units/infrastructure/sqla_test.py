@@ -0,0 +1,294 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine as create_sync_engine
+
+from src.common.exceptions import AlreadyExistsExc, ObjectNotFoundExc
+from src.common.snapshots import SnapshotStore
+from src.domain.chats.cache import ChatSnapshotCache
+from src.domain.chats.entities import (
+    ChatMember,
+    ChatMemberPermissions,
+    ChatType,
+    RetentionPolicy,
+    personal_key,
+)
+from src.domain.chats.services import ChatService
+from src.infrastructure.sqla import (
+    SQLAlchemyChatMemberRepository,
+    SQLAlchemyChatRepository,
+    SQLAlchemyUserRepository,
+    create_engine,
+    metadata,
+)
+from src.infrastructure.sqlite.bulk import TABLES, ImportJob, connect, import_files
+from src.infrastructure.sqlite.database import get_change_seq, migrate
+
+ROOT = Path(__file__).resolve().parents[3]
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def user_repository(engine) -> SQLAlchemyUserRepository:
+    return SQLAlchemyUserRepository(engine)
+
+
+@pytest.fixture
+def chat_repository(engine) -> SQLAlchemyChatRepository:
+    return SQLAlchemyChatRepository(engine)
+
+
+@pytest.fixture
+def member_repository(engine) -> SQLAlchemyChatMemberRepository:
+    return SQLAlchemyChatMemberRepository(engine)
+
+
+class TestSQLAlchemyUserRepository:
+    async def test_duplicate_email(self, user_repository):
+        user = await user_repository.create("Ann", "ann@example.com", "hash")
+        with pytest.raises(AlreadyExistsExc):
+            await user_repository.create("Other", "ann@example.com", "hash")
+        assert await user_repository.get_by_email("ann@example.com") == user
+
+        other = await user_repository.create("Bob", "bob@example.com", "hash")
+        with pytest.raises(AlreadyExistsExc):
+            await user_repository.update(other.id, email="ann@example.com")
+        updated = await user_repository.update(other.id, token_version=1)
+        assert (updated.token_version, updated.email) == (1, "bob@example.com")
+
+        await user_repository.delete(user.id)
+        with pytest.raises(ObjectNotFoundExc):
+            await user_repository.get(user.id)
+        with pytest.raises(ObjectNotFoundExc):
+            await user_repository.delete(user.id)
+        with pytest.raises(ObjectNotFoundExc):
+            await user_repository.increment_token_version(user.id)
+
+    async def test_concurrent_token_version_increments(self, user_repository):
+        user = await user_repository.create("Ann", "ann@example.com", "hash")
+        await asyncio.gather(
+            *(user_repository.increment_token_version(user.id) for _ in range(5))
+        )
+        assert (await user_repository.get(user.id)).token_version == 5
+
+
+class TestSQLAlchemyChatRepository:
+    async def test_personal_key_unique_until_deleted(self, chat_repository):
+        key = personal_key(uuid4(), uuid4())
+        chat = await chat_repository.create(ChatType.PERSONAL, "p", personal_key=key)
+        with pytest.raises(AlreadyExistsExc):
+            await chat_repository.create(ChatType.PERSONAL, "p", personal_key=key)
+        assert await chat_repository.get_personal(key) == chat
+        await chat_repository.create(ChatType.GROUP, "g1")
+        await chat_repository.create(ChatType.GROUP, "g2")
+
+        await chat_repository.mark_deleted(chat.id)
+        with pytest.raises(ObjectNotFoundExc):
+            await chat_repository.get(chat.id)
+        assert await chat_repository.list_deleted() == [chat.id]
+        recreated = await chat_repository.create(
+            ChatType.PERSONAL, "p", personal_key=key
+        )
+        assert recreated.id != chat.id
+
+        await chat_repository.delete(chat.id)
+        assert await chat_repository.list_deleted() == []
+
+    async def test_update_retention(self, chat_repository):
+        chat = await chat_repository.create(ChatType.GROUP, "g")
+        policy = RetentionPolicy(max_age=timedelta(days=3), max_count=100)
+        updated = await chat_repository.update(chat.id, title=None, retention=policy)
+        assert (updated.title, updated.retention) == ("g", policy)
+        assert (await chat_repository.get(chat.id)).retention == policy
+
+
+class TestSQLAlchemyChatMemberRepository:
+    async def test_create_returns_existing(self, chat_repository, member_repository):
+        chat = await chat_repository.create(ChatType.GROUP, "g")
+        user_id = uuid4()
+        owner = await member_repository.create(
+            ChatMember(chat.id, user_id, ChatMemberPermissions.ROLE_OWNER)
+        )
+        again = await member_repository.create(
+            ChatMember(chat.id, user_id, ChatMemberPermissions.ROLE_DEFAULT)
+        )
+        assert again == owner
+        assert again.permissions == ChatMemberPermissions.ROLE_OWNER
+
+        blocked = await member_repository.update(
+            (chat.id, user_id), permissions=ChatMemberPermissions.ROLE_BLOCKED
+        )
+        assert blocked.permissions == ChatMemberPermissions.ROLE_BLOCKED
+        assert await member_repository.list_by_user_id(user_id) == [chat.id]
+
+    async def test_delete_by_chat_id(self, chat_repository, member_repository):
+        chat = await chat_repository.create(ChatType.GROUP, "g")
+        for _ in range(5):
+            await member_repository.create(
+                ChatMember(chat.id, uuid4(), ChatMemberPermissions.ROLE_DEFAULT)
+            )
+        assert await member_repository.delete_by_chat_id(chat.id, limit=3) == 3
+        assert await member_repository.count_by_chat_id(chat.id) == 2
+        assert await member_repository.delete_by_chat_id(chat.id, limit=3) == 2
+        assert await member_repository.delete_by_chat_id(chat.id, limit=3) == 0
+
+    async def test_chat_service_races(self, chat_repository, member_repository):
+        chat_service = ChatService(chat_repository, member_repository)
+        user_1, user_2 = uuid4(), uuid4()
+        # Разные экземпляры сервиса не делят блокировки: дубли отсекает база
+        chats = await asyncio.gather(
+            *(
+                ChatService(chat_repository, member_repository).get_or_create_personal(
+                    "p", user_1, user_2
+                )
+                for _ in range(5)
+            )
+        )
+        assert len({chat.id for chat in chats}) == 1
+        assert await member_repository.count_by_chat_id(chats[0].id) == 2
+
+        group = await chat_service.create_group("g", user_1)
+        await chat_service.delete(group.id, user_1)
+        await chat_repository.delete(group.id)
+        assert await member_repository.count_by_chat_id(group.id) == 0
+
+
+class TestChangeSequence:
+    async def test_snapshot_stale_after_write(
+        self, tmp_path, chat_repository, member_repository
+    ):
+        chat = await chat_repository.create(ChatType.GROUP, "g")
+        seq = await member_repository.get_change_seq()
+        assert seq == await chat_repository.get_change_seq() > 0
+
+        store = SnapshotStore(tmp_path / "state.snap")
+        warm = ChatSnapshotCache(chat_repository, member_repository)
+        await warm.get(chat.id)
+        await store.save([warm], chat_repository)
+        assert await store.load(
+            [ChatSnapshotCache(chat_repository, member_repository)], member_repository
+        )
+
+        await member_repository.create(
+            ChatMember(chat.id, uuid4(), ChatMemberPermissions.ROLE_OWNER)
+        )
+        assert await chat_repository.get_change_seq() == seq + 1
+        assert not await store.load(
+            [ChatSnapshotCache(chat_repository, member_repository)], chat_repository
+        )
+
+
+def test_migration_matches_metadata(tmp_path, monkeypatch):
+    path = tmp_path / "migrated.db"
+    monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{path}")
+    config = Config(str(ROOT / "alembic.ini"))
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
+
+    engine = create_sync_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        assert compare_metadata(context, metadata) == []
+    engine.dispose()
+
+
+def test_sqlite_schema_matches_metadata(tmp_path):
+    path = tmp_path / "sqlite.db"
+    connection = connect(str(path))
+    migrate(connection)
+    connection.close()
+
+    engine = create_sync_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        context = MigrationContext.configure(
+            connection,
+            opts={
+                "include_name": lambda name, type_, _: type_ != "table"
+                or name in metadata.tables
+            },
+        )
+        assert compare_metadata(context, metadata) == []
+    engine.dispose()
+
+    for name in ("users", "chats", "chat_members"):
+        assert [(c.name, c.nullable) for c in TABLES[name]] == [
+            (c.name, bool(c.nullable)) for c in metadata.tables[name].columns
+        ]
+
+
+async def test_bulk_import_readable_by_repositories(tmp_path):
+    path = tmp_path / "app.db"
+    user_id, chat_id = uuid4(), uuid4()
+    (tmp_path / "users.ndjson").write_text(
+        json.dumps(
+            {
+                "id": str(user_id),
+                "name": "Ann",
+                "email": "ann@example.com",
+                "hashed_password": "hash",
+                "created_at": "2024-01-01T12:00:00",
+            }
+        )
+        + "\n"
+    )
+    (tmp_path / "chats.ndjson").write_text(
+        json.dumps(
+            {
+                "id": str(chat_id),
+                "chat_type": "group",
+                "title": "g",
+                "created_at": "2024-01-01T12:00:00",
+                "updated_at": "2024-01-01T12:00:00",
+                "retention_max_age": 3600,
+            }
+        )
+        + "\n"
+    )
+    connection = connect(str(path))
+    import_files(
+        connection,
+        [
+            ImportJob("users", tmp_path / "users.ndjson"),
+            ImportJob("chats", tmp_path / "chats.ndjson"),
+        ],
+    )
+    assert get_change_seq(connection) == 2
+    connection.close()
+
+    engine = create_engine(f"sqlite+aiosqlite:///{path}")
+    user = await SQLAlchemyUserRepository(engine).get_by_email("ann@example.com")
+    assert (user.id, user.created_at) == (user_id, datetime(2024, 1, 1, 12))
+    chat_repository = SQLAlchemyChatRepository(engine)
+    chat = await chat_repository.get(chat_id)
+    assert chat.retention.max_age == timedelta(hours=1)
+    await SQLAlchemyChatMemberRepository(engine).create(
+        ChatMember(chat_id, user_id, ChatMemberPermissions.ROLE_OWNER)
+    )
+    await chat_repository.mark_deleted(chat_id)
+    assert await chat_repository.list_deleted() == [chat_id]
+    await engine.dispose()
+
+
+def test_migration_requires_url(monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    config = Config(str(ROOT / "alembic.ini"))
+    config.attributes["configure_logger"] = False
+    config.set_main_option("sqlalchemy.url", "")
+    with pytest.raises(RuntimeError, match="DATABASE_URL"):
+        command.upgrade(config, "head")
@@ -0,0 +1,616 @@
+import asyncio
+import io
+import json
+from datetime import datetime
+from typing import Dict, List
+from uuid import UUID, uuid4
+
+import pytest
+
+from src.common.exceptions import InvalidFormatExc, ObjectNotFoundExc
+from src.domain.chats.entities import ChatMember, ChatMemberPermissions
+from src.domain.messages import entities, services
+from src.domain.messages.compression import PayloadCompressor
+from src.domain.messages.delivery import OutboxDispatcher
+from src.infrastructure.sqlite import (
+    SQLiteDatabase,
+    SQLiteMessageRepository,
+    SQLiteOutboxRepository,
+    SQLiteReactionRepository,
+    SQLiteScheduledMessageRepository,
+)
+from src.infrastructure.sqlite.bulk import export_table
+
+from ..services.chat_service_test import FakeChatMemberRepository
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeTransport:
+    def __init__(self):
+        self.deliveries: Dict[UUID, List[UUID]] = {}
+        self.down: set = set()
+
+    async def deliver(self, recipient_id, messages) -> None:
+        if recipient_id in self.down:
+            raise ConnectionError(recipient_id)
+        self.deliveries.setdefault(recipient_id, []).extend(m.id for m in messages)
+
+
+class FlakyOutboxRepository(SQLiteOutboxRepository):
+    def __init__(self, database):
+        super().__init__(database)
+        self.failures: Dict[str, int] = {}
+
+    def fail_next(self, method: str) -> None:
+        self.failures[method] = self.failures.get(method, 0) + 1
+
+    def check(self, method: str) -> None:
+        if self.failures.get(method):
+            self.failures[method] -= 1
+            raise ConnectionError("database is down")
+
+    async def ack(self, keys):
+        self.check("ack")
+        return await super().ack(keys)
+
+    async def claim(self, now, limit=500, lease=30.0):
+        self.check("claim")
+        return await super().claim(now, limit, lease)
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+async def database():
+    database = SQLiteDatabase()
+    await database.migrate()
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def message_repository(database, clock) -> SQLiteMessageRepository:
+    return SQLiteMessageRepository(database, clock=clock)
+
+
+@pytest.fixture
+def outbox_repository(database) -> SQLiteOutboxRepository:
+    return SQLiteOutboxRepository(database)
+
+
+@pytest.fixture
+def transport() -> FakeTransport:
+    return FakeTransport()
+
+
+@pytest.fixture
+def dispatcher(outbox_repository, transport, clock) -> OutboxDispatcher:
+    return OutboxDispatcher(
+        outbox_repository, transport, batch_size=100, jitter=0.0, clock=clock
+    )
+
+
+@pytest.fixture
+async def chat(message_repository):
+    chat_id, sender_id = uuid4(), uuid4()
+    recipients = [uuid4(), uuid4()]
+    member_repository = FakeChatMemberRepository()
+    for user_id in (sender_id, *recipients):
+        await member_repository.create(
+            ChatMember(
+                chat_id=chat_id,
+                user_id=user_id,
+                permissions=ChatMemberPermissions.ROLE_DEFAULT,
+            )
+        )
+    service = services.MessageService(
+        message_repository, chat_member_repository=member_repository
+    )
+    return service, chat_id, sender_id, recipients
+
+
+class TestSQLiteDatabase:
+    async def test_migrate_existing_database(self, clock):
+        database = SQLiteDatabase()
+        await database.run(lambda connection: connection.executescript("""
+                CREATE TABLE messages (
+                    seq INTEGER PRIMARY KEY,
+                    id BLOB NOT NULL UNIQUE,
+                    source_id BLOB NOT NULL,
+                    source_type TEXT NOT NULL,
+                    sender_id BLOB NOT NULL,
+                    text_content TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    readed_at TEXT,
+                    attachment_digest TEXT,
+                    attachment_size INTEGER,
+                    attachment_content_type TEXT,
+                    attachment_filename TEXT,
+                    expires_at TEXT
+                );
+                CREATE TABLE chats (
+                    id BLOB PRIMARY KEY,
+                    chat_type TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+                """))
+        await database.migrate()
+        await database.migrate()
+
+        version = await database.run(
+            lambda connection: connection.execute("PRAGMA user_version").fetchone()[0]
+        )
+        assert version > 0
+        repository = SQLiteMessageRepository(database, clock=clock)
+        message = await repository.create(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "hello", mentions=[uuid4()]
+        )
+        assert (await repository.get(message.id)).mentions == message.mentions
+        columns = await database.run(
+            lambda connection: [
+                row[1] for row in connection.execute("PRAGMA table_info(chats)")
+            ]
+        )
+        assert "personal_key" in columns and "retention_max_count" in columns
+        database.close()
+
+
+class TestSQLiteMessageRepository:
+    async def test_roundtrip(self, message_repository):
+        attachment = entities.Attachment(
+            digest="a" * 64, size=3, content_type="text/plain", filename="a.txt"
+        )
+        message = await message_repository.create(
+            source_id=uuid4(),
+            source_type=entities.SourceType.CHAT,
+            sender_id=uuid4(),
+            text_content="Привет",
+            attachment=attachment,
+        )
+        assert await message_repository.get(message.id) == message
+
+    async def test_get_missing(self, message_repository):
+        with pytest.raises(ObjectNotFoundExc):
+            await message_repository.get(uuid4())
+
+    async def test_get_list_newest_first(self, message_repository):
+        source_id = uuid4()
+        sent = [
+            await message_repository.create(
+                source_id, entities.SourceType.CHAT, uuid4(), str(i)
+            )
+            for i in range(5)
+        ]
+        page = await message_repository.get_list(
+            source_id, entities.SourceType.CHAT, offset=1, limit=2
+        )
+        assert [m.id for m in page] == [sent[3].id, sent[2].id]
+
+    async def test_expiring_messages(self, message_repository, outbox_repository):
+        expires_at = datetime(2030, 1, 1, 12, 0)
+        expiring = [
+            await message_repository.create(
+                uuid4(),
+                entities.SourceType.CHAT,
+                uuid4(),
+                str(i),
+                recipient_ids=[uuid4()],
+                expires_at=expires_at,
+            )
+            for i in range(3)
+        ]
+        await message_repository.create(uuid4(), entities.SourceType.CHAT, uuid4(), "")
+        assert (await message_repository.get(expiring[0].id)).expires_at == expires_at
+
+        first = await message_repository.list_expiring(limit=2)
+        rest = await message_repository.list_expiring(after_id=first[-1][0].id)
+        refs = [ref for ref, _ in [*first, *rest]]
+        assert sorted(ref.id for ref in refs) == sorted(m.id for m in expiring)
+
+        assert await message_repository.delete_many([ref.id for ref in refs]) == 3
+        assert await message_repository.list_expiring() == []
+        assert await outbox_repository.count_pending() == 0
+
+    async def test_replies_and_mentions(self, message_repository):
+        source_id, user_id = uuid4(), uuid4()
+        root = await message_repository.create(
+            source_id, entities.SourceType.GROUP, uuid4(), "root"
+        )
+        replies = [
+            await message_repository.create(
+                source_id,
+                entities.SourceType.GROUP,
+                uuid4(),
+                str(i),
+                reply_to_id=root.id,
+                mentions=[user_id] if i % 2 else [],
+            )
+            for i in range(5)
+        ]
+        assert await message_repository.get(replies[1].id) == replies[1]
+
+        first = await message_repository.list_replies(root.id, limit=3)
+        rest = await message_repository.list_replies(root.id, cursor=first.next_cursor)
+        assert [m.id for m in first.messages] == [m.id for m in replies[:3]]
+        assert [m.id for m in rest.messages] == [m.id for m in replies[3:]]
+        assert rest.next_cursor is None
+
+        mentions = await message_repository.list_mentions(user_id, limit=1)
+        assert [m.id for m in mentions.messages] == [replies[3].id]
+        mentions = await message_repository.list_mentions(
+            user_id, cursor=mentions.next_cursor
+        )
+        assert [m.id for m in mentions.messages] == [replies[1].id]
+
+        await message_repository.delete_many([replies[1].id])
+        assert (await message_repository.list_mentions(user_id)).messages == [
+            replies[3]
+        ]
+
+    async def test_delete_by_source_in_batches(
+        self, message_repository, outbox_repository
+    ):
+        source_id, other_id = uuid4(), uuid4()
+        for source_type in entities.SourceType:
+            for i in range(3):
+                await message_repository.create(
+                    source_id, source_type, uuid4(), str(i), recipient_ids=[uuid4()]
+                )
+        kept = await message_repository.create(
+            other_id, entities.SourceType.GROUP, uuid4(), "kept"
+        )
+
+        assert await message_repository.delete_by_source(source_id, limit=4) == 4
+        assert await message_repository.delete_by_source(source_id, limit=4) == 2
+        assert await message_repository.delete_by_source(source_id, limit=4) == 0
+        assert await outbox_repository.count_pending() == 0
+        assert await message_repository.get(kept.id) == kept
+
+    async def test_purge_prefix_and_list_sources(self, database, message_repository):
+        source_id = uuid4()
+        sent = [
+            await message_repository.create(
+                source_id, entities.SourceType.GROUP, uuid4(), "x" * 2000
+            )
+            for _ in range(50)
+        ]
+        other = await message_repository.create(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "other"
+        )
+        assert set(await message_repository.list_sources()) == {
+            (source_id, entities.SourceType.GROUP),
+            (other.source_id, entities.SourceType.CHAT),
+        }
+        [first, second] = sorted(
+            await message_repository.list_sources(), key=lambda s: s[0].bytes
+        )
+        assert await message_repository.list_sources(after=first) == [second]
+
+        stats = await message_repository.purge(
+            source_id, entities.SourceType.GROUP, keep=10, limit=30
+        )
+        assert stats.messages == 30
+        assert stats.bytes > 0
+        stats = await message_repository.purge(
+            source_id, entities.SourceType.GROUP, keep=10, limit=30
+        )
+        assert stats.messages == 10
+        assert (
+            await message_repository.purge(
+                source_id, entities.SourceType.GROUP, keep=10
+            )
+        ).messages == 0
+
+        await database.run(
+            lambda connection: connection.execute(
+                "UPDATE messages SET created_at = ? WHERE id = ?",
+                (datetime(2000, 1, 1).isoformat(), sent[40].id.bytes),
+            )
+        )
+        stats = await message_repository.purge(
+            source_id, entities.SourceType.GROUP, before=datetime(2001, 1, 1)
+        )
+        assert stats.messages == 1
+        page = await message_repository.get_list(source_id, entities.SourceType.GROUP)
+        assert [m.id for m in page] == [m.id for m in reversed(sent[41:])]
+
+    async def test_purge_either_limit(self, database, message_repository):
+        source_id = uuid4()
+        sent = [
+            await message_repository.create(
+                source_id, entities.SourceType.GROUP, uuid4(), str(i)
+            )
+            for i in range(5)
+        ]
+        stats = await message_repository.purge(
+            source_id,
+            entities.SourceType.GROUP,
+            before=datetime(2000, 1, 1),
+            keep=2,
+        )
+        assert stats.messages == 3
+
+        await database.run(
+            lambda connection: connection.execute(
+                "UPDATE messages SET created_at = ?",
+                (datetime(1999, 1, 1).isoformat(),),
+            )
+        )
+        stats = await message_repository.purge(
+            source_id,
+            entities.SourceType.GROUP,
+            before=datetime(2000, 1, 1),
+            keep=2,
+            limit=1,
+        )
+        assert stats.messages == 1
+        page = await message_repository.get_list(source_id, entities.SourceType.GROUP)
+        assert [m.id for m in page] == [sent[4].id]
+
+    async def test_purge_removes_dependent_rows(
+        self, database, message_repository, outbox_repository
+    ):
+        source_id, other_id, user_id = uuid4(), uuid4(), uuid4()
+        sent, others = [], []
+        for i in range(4):
+            for target, messages in ((source_id, sent), (other_id, others)):
+                messages.append(
+                    await message_repository.create(
+                        target,
+                        entities.SourceType.GROUP,
+                        uuid4(),
+                        f"@{user_id} {i}",
+                        recipient_ids=[user_id],
+                        mentions=[user_id],
+                    )
+                )
+        reactions = SQLiteReactionRepository(database)
+        await reactions.apply(
+            [entities.ReactionChange(m.id, user_id, "👍", True) for m in sent + others],
+            shards={},
+        )
+
+        stats = await message_repository.purge(
+            source_id, entities.SourceType.GROUP, keep=1
+        )
+        assert stats.messages == 3
+        assert await outbox_repository.count_pending() == 5
+        page = await message_repository.list_mentions(user_id)
+        assert {m.id for m in page.messages} == {m.id for m in others + sent[3:]}
+        assert await reactions.get_counts(sent[0].id) == {}
+        assert await reactions.get_counts(sent[3].id) == {"👍": 1}
+        assert await reactions.get_counts(others[0].id) == {"👍": 1}
+
+    async def test_invalid_cursor(self, message_repository):
+        with pytest.raises(InvalidFormatExc):
+            await message_repository.list_mentions(uuid4(), cursor="abc")
+
+    async def test_compressed_text_with_persisted_dictionary(self, database, clock):
+        repository = SQLiteMessageRepository(
+            database, clock=clock, compressor=PayloadCompressor(prefer_zstd=False)
+        )
+        source_id, recipient_id = uuid4(), uuid4()
+        texts = [
+            f"Созвон по проекту в {hour}:00, ссылка в календаре" for hour in range(24)
+        ]
+        for text in texts:
+            await repository.create(
+                source_id, entities.SourceType.GROUP, uuid4(), text * 2
+            )
+        await repository.train_dictionary(source_id)
+        sent = await repository.create(
+            source_id,
+            entities.SourceType.GROUP,
+            uuid4(),
+            texts[0] * 2,
+            recipient_ids=[recipient_id],
+        )
+        short = await repository.create(
+            source_id, entities.SourceType.GROUP, uuid4(), "ok"
+        )
+
+        stored = dict(
+            await database.run(
+                lambda connection: connection.execute(
+                    "SELECT id, text_content FROM messages WHERE id IN (?, ?)",
+                    (sent.id.bytes, short.id.bytes),
+                ).fetchall()
+            )
+        )
+        assert isinstance(stored[sent.id.bytes], bytes)
+        assert stored[sent.id.bytes][1:5] != b"\0\0\0\0"
+        assert stored[short.id.bytes] == "ok"
+
+        # Новые экземпляры без словарей в памяти, как после перезапуска
+        restarted = SQLiteMessageRepository(database, clock=clock)
+        page = await restarted.get_list(source_id, entities.SourceType.GROUP)
+        assert [m.text_content for m in page[:2]] == ["ok", texts[0] * 2]
+        assert (await restarted.get(sent.id)).text_content == texts[0] * 2
+        entries = await SQLiteOutboxRepository(database).claim(clock.now)
+        assert [entry.message.text_content for entry in entries] == [texts[0] * 2]
+
+        out = io.StringIO()
+        await database.run(export_table, "messages", out)
+        exported = [
+            json.loads(line)["text_content"] for line in out.getvalue().splitlines()
+        ]
+        assert exported[-2:] == [texts[0] * 2, "ok"]
+
+
+class TestSQLiteReactionRepository:
+    async def test_counts_in_message_pages(self, database, message_repository):
+        repository = SQLiteReactionRepository(database)
+        source_id, user_id = uuid4(), uuid4()
+        message = await message_repository.create(
+            source_id, entities.SourceType.GROUP, uuid4(), "hi"
+        )
+        changes = [
+            entities.ReactionChange(message.id, user_id, "👍", True),
+            entities.ReactionChange(message.id, user_id, "👍", True),
+            entities.ReactionChange(message.id, uuid4(), "👍", True),
+            entities.ReactionChange(message.id, uuid4(), "🔥", True),
+            entities.ReactionChange(uuid4(), user_id, "👍", True),
+        ]
+        totals = await repository.apply(changes[:3], shards={})
+        assert totals == {message.id: {"👍": 2}}
+        totals = await repository.apply(changes[3:], shards={message.id: 5})
+        assert totals == {message.id: {"👍": 2, "🔥": 1}}
+
+        [page] = await message_repository.get_list(source_id, entities.SourceType.GROUP)
+        assert page.reactions == {"👍": 2, "🔥": 1}
+
+        unreact = entities.ReactionChange(message.id, user_id, "👍", False)
+        assert await repository.apply([unreact, unreact], {}) == {
+            message.id: {"👍": 1, "🔥": 1}
+        }
+        assert await repository.get_counts(message.id) == {"👍": 1, "🔥": 1}
+
+        await message_repository.delete_many([message.id])
+        assert await repository.get_counts(message.id) == {}
+
+
+class TestSQLiteScheduledMessageRepository:
+    async def test_roundtrip(self, database):
+        repository = SQLiteScheduledMessageRepository(database)
+        send_at = datetime(2030, 1, 1, 12, 0)
+        created = [
+            await repository.create(
+                uuid4(), entities.SourceType.CHAT, uuid4(), str(i), send_at, ttl=60.0
+            )
+            for i in range(3)
+        ]
+
+        assert await repository.get_many([created[1].id]) == [created[1]]
+        pending = await repository.list_pending(limit=2)
+        pending += await repository.list_pending(after_id=pending[-1].id)
+        assert sorted(s.id for s in pending) == sorted(s.id for s in created)
+
+        assert await repository.delete_many([s.id for s in created]) == 3
+        assert await repository.list_pending() == []
+
+
+class TestOutboxDelivery:
+    async def test_fan_out_and_ack(
+        self, chat, dispatcher, transport, outbox_repository
+    ):
+        service, chat_id, sender_id, recipients = chat
+        message = await service.send(chat_id, entities.SourceType.CHAT, sender_id, "hi")
+        assert await outbox_repository.count_pending() == 2
+
+        assert await dispatcher.drain_once() == 2
+        assert transport.deliveries == {r: [message.id] for r in recipients}
+
+        for recipient_id in recipients:
+            dispatcher.ack(recipient_id, [message.id])
+            dispatcher.ack(recipient_id, [message.id])
+        assert await dispatcher.flush_acks() == 2
+        assert await outbox_repository.count_pending() == 0
+
+    async def test_unacked_redelivered_with_backoff(
+        self, chat, dispatcher, transport, clock
+    ):
+        service, chat_id, sender_id, recipients = chat
+        await service.send(chat_id, entities.SourceType.CHAT, sender_id, "hi")
+
+        assert await dispatcher.drain_once() == 2
+        assert await dispatcher.drain_once() == 0
+
+        clock.now += 1
+        assert await dispatcher.drain_once() == 2
+        clock.now += 1
+        assert await dispatcher.drain_once() == 0
+        clock.now += 1
+        assert await dispatcher.drain_once() == 2
+        assert all(len(ids) == 3 for ids in transport.deliveries.values())
+
+    async def test_transport_error_retried(self, chat, dispatcher, transport, clock):
+        service, chat_id, sender_id, recipients = chat
+        message = await service.send(chat_id, entities.SourceType.CHAT, sender_id, "hi")
+        transport.down.add(recipients[0])
+
+        await dispatcher.drain_once()
+        assert dispatcher.metrics.transport_errors == 1
+        assert recipients[0] not in transport.deliveries
+
+        transport.down.clear()
+        clock.now += 1
+        await dispatcher.drain_once()
+        assert transport.deliveries[recipients[0]] == [message.id]
+
+    async def test_gives_up_after_max_attempts(
+        self, chat, outbox_repository, transport, clock
+    ):
+        service, chat_id, sender_id, recipients = chat
+        await service.send(chat_id, entities.SourceType.CHAT, sender_id, "hi")
+        dispatcher = OutboxDispatcher(
+            outbox_repository, transport, max_attempts=2, jitter=0.0, clock=clock
+        )
+
+        await dispatcher.drain_once()
+        clock.now += 1
+        await dispatcher.drain_once()
+        assert dispatcher.metrics.failed == 2
+        assert await outbox_repository.count_pending() == 0
+
+    async def test_duplicate_recipients_collapsed(
+        self, message_repository, outbox_repository
+    ):
+        recipient_id = uuid4()
+        await message_repository.create(
+            uuid4(),
+            entities.SourceType.CHAT,
+            uuid4(),
+            "hi",
+            recipient_ids=[recipient_id, recipient_id],
+        )
+        assert await outbox_repository.count_pending() == 1
+
+    async def test_failed_ack_write_kept(self, database, chat, transport, clock):
+        outbox_repository = FlakyOutboxRepository(database)
+        dispatcher = OutboxDispatcher(
+            outbox_repository, transport, jitter=0.0, clock=clock
+        )
+        service, chat_id, sender_id, recipients = chat
+        message = await service.send(chat_id, entities.SourceType.CHAT, sender_id, "hi")
+        await dispatcher.drain_once()
+        dispatcher.ack(recipients[0], [message.id])
+
+        outbox_repository.fail_next("ack")
+        with pytest.raises(ConnectionError):
+            await dispatcher.flush_acks()
+        assert await dispatcher.flush_acks() == 1
+        assert await outbox_repository.count_pending() == 1
+
+    async def test_run_survives_repository_errors(
+        self, database, chat, transport, clock
+    ):
+        outbox_repository = FlakyOutboxRepository(database)
+        dispatcher = OutboxDispatcher(
+            outbox_repository, transport, jitter=0.0, clock=clock
+        )
+        service, chat_id, sender_id, recipients = chat
+        message = await service.send(chat_id, entities.SourceType.CHAT, sender_id, "hi")
+        outbox_repository.fail_next("claim")
+
+        task = asyncio.create_task(dispatcher.run(poll_interval=0))
+        try:
+            for _ in range(100):
+                if len(transport.deliveries) == 2:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+        assert dispatcher.metrics.errors == 1
+        assert transport.deliveries == {r: [message.id] for r in recipients}
@@ -0,0 +1,324 @@
+import asyncio
+import random
+import threading
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from src.common.exceptions import AccessDeniedExc, AlreadyExistsExc, ObjectNotFoundExc
+from src.domain.chats.entities import ChatType
+from src.domain.messages.entities import SourceType
+from src.infrastructure import memory
+from src.infrastructure.memory import MemoryChatRepository, MemoryMessageRepository
+from src.infrastructure.workers import (
+    SendRequest,
+    ShardedChatService,
+    ShardedMessageService,
+    WorkerPool,
+    shard_ids,
+    shard_of,
+)
+
+
+class StrictError(Exception):
+    def __init__(self, code, detail):
+        super().__init__(code)
+        self.detail = detail
+
+
+class EchoService:
+    async def echo(self, value):
+        return value
+
+    async def lock(self):
+        return threading.Lock()
+
+    async def fail(self):
+        raise StrictError(1, "detail")
+
+
+def echo_services(shard: int, shards: int):
+    return {"echo": EchoService()}
+
+
+@pytest.fixture
+async def pool():
+    pool = WorkerPool(workers=3)
+    await pool.start()
+    yield pool
+    await pool.close()
+
+
+@pytest.fixture
+def chat_service(pool) -> ShardedChatService:
+    return ShardedChatService(pool)
+
+
+@pytest.fixture
+def message_service(pool) -> ShardedMessageService:
+    return ShardedMessageService(pool)
+
+
+def test_shard_ids():
+    factory = shard_ids(2, 5)
+    assert all(shard_of(factory(), 5) == 2 for _ in range(100))
+
+
+class TestMemoryMessageRepository:
+    async def test_mentions_cursor(self):
+        repository = MemoryMessageRepository()
+        user_id = uuid4()
+        sent = [
+            await repository.create(
+                uuid4(), SourceType.CHAT, uuid4(), str(i), mentions=[user_id]
+            )
+            for i in range(5)
+        ]
+        first = await repository.list_mentions(user_id, limit=3)
+        rest = await repository.list_mentions(user_id, cursor=first.next_cursor)
+        assert first.messages == sent[:1:-1]
+        assert rest.messages == sent[1::-1]
+        assert rest.next_cursor is None
+
+        assert await repository.delete_many([sent[4].id, uuid4()]) == 1
+        assert (await repository.list_mentions(user_id, limit=1)).messages == [sent[3]]
+
+    async def test_get_list_newest_first(self):
+        repository = MemoryMessageRepository()
+        source_id = uuid4()
+        sent = [
+            await repository.create(source_id, SourceType.CHAT, uuid4(), str(i))
+            for i in range(5)
+        ]
+        page = await repository.get_list(source_id, SourceType.CHAT, offset=1, limit=2)
+        assert page == [sent[3], sent[2]]
+        assert await repository.get_list(source_id, SourceType.CHAT, offset=9) == []
+
+    async def test_purge_by_count(self):
+        repository = MemoryMessageRepository()
+        source_id = uuid4()
+        sent = [
+            await repository.create(source_id, SourceType.CHAT, uuid4(), str(i))
+            for i in range(5)
+        ]
+        stats = await repository.purge(source_id, SourceType.CHAT, keep=2, limit=2)
+        assert (stats.messages, stats.bytes) == (2, 2)
+        stats = await repository.purge(source_id, SourceType.CHAT, keep=2)
+        assert stats.messages == 1
+        assert await repository.get_list(source_id, SourceType.CHAT) == sent[:2:-1]
+        assert await repository.list_sources() == [(source_id, SourceType.CHAT)]
+        assert await repository.list_sources(after=(source_id, SourceType.CHAT)) == []
+
+    async def test_index_blocks_after_deletes(self, monkeypatch):
+        monkeypatch.setattr(memory, "_BLOCK", 3)
+        repository = MemoryMessageRepository()
+        source_id, user_id = uuid4(), uuid4()
+        sent = [
+            await repository.create(
+                source_id,
+                SourceType.CHAT,
+                uuid4(),
+                str(i),
+                mentions=[user_id],
+                expires_at=datetime.now() if i % 2 else None,
+            )
+            for i in range(40)
+        ]
+        doomed = random.Random(1).sample(sent, 25)
+        assert await repository.delete_many([m.id for m in doomed]) == 25
+        alive = [m for m in sent if m not in doomed]
+
+        for offset in range(len(alive) + 1):
+            page = await repository.get_list(
+                source_id, SourceType.CHAT, offset=offset, limit=4
+            )
+            assert page == alive[::-1][offset : offset + 4]
+
+        mentions, cursor = [], None
+        while True:
+            page = await repository.list_mentions(user_id, cursor=cursor, limit=4)
+            mentions.extend(page.messages)
+            if (cursor := page.next_cursor) is None:
+                break
+        assert mentions == alive[::-1]
+
+        expiring, after_id = [], None
+        while batch := await repository.list_expiring(after_id=after_id, limit=3):
+            expiring.extend(ref.id for ref, _ in batch)
+            after_id = batch[-1][0].id
+        expected = [m.id for m in alive if m.expires_at is not None]
+        assert expiring == sorted(expected, key=lambda _id: _id.bytes)
+
+    async def test_expiring_inserted_out_of_order(self, monkeypatch):
+        monkeypatch.setattr(memory, "_BLOCK", 2)
+        repository = MemoryMessageRepository()
+        sent = [
+            await repository.create(
+                uuid4(), SourceType.CHAT, uuid4(), "x", expires_at=datetime.now()
+            )
+            for _ in range(30)
+        ]
+        refs = await repository.list_expiring(limit=100)
+        assert [ref.id for ref, _ in refs] == sorted(
+            (m.id for m in sent), key=lambda _id: _id.bytes
+        )
+
+
+class TestMemoryChatRepository:
+    async def test_personal_key_released(self):
+        repository = MemoryChatRepository()
+        key = (uuid4(), uuid4())
+        chat = await repository.create(ChatType.PERSONAL, "dm", personal_key=key)
+        other = await repository.create(ChatType.PERSONAL, "dm", (uuid4(), uuid4()))
+        with pytest.raises(AlreadyExistsExc):
+            await repository.create(ChatType.PERSONAL, "dm", personal_key=key)
+
+        await repository.mark_deleted(chat.id)
+        with pytest.raises(ObjectNotFoundExc):
+            await repository.get_personal(key)
+        recreated = await repository.create(ChatType.PERSONAL, "dm", key)
+        await repository.delete(chat.id)
+        assert await repository.get_personal(key) == recreated
+        assert await repository.get(other.id) == other
+
+
+class TestWorkerPool:
+    async def test_chat_lives_in_one_worker(self, pool, chat_service, message_service):
+        owner_id, user_id = uuid4(), uuid4()
+        chats = [await chat_service.create_group(str(i), owner_id) for i in range(3)]
+        assert sorted(pool.shard_of(chat.id) for chat in chats) == [0, 1, 2]
+
+        for chat in chats:
+            await chat_service.member_add(chat.id, user_id, owner_id)
+            message = await message_service.send(
+                chat.id, SourceType.GROUP, user_id, f"@{owner_id} hi"
+            )
+            assert await message_service.get(message.id) == message
+            assert await message_service.get_list(chat.id, SourceType.GROUP) == [
+                message
+            ]
+
+        assert set(await chat_service.get_list(user_id)) == {c.id for c in chats}
+        assert len(await chat_service.get_list(user_id, offset=1, limit=5)) == 2
+
+    async def test_errors_propagate(self, chat_service, message_service):
+        with pytest.raises(ObjectNotFoundExc):
+            await chat_service.get(uuid4())
+        with pytest.raises(ObjectNotFoundExc):
+            await message_service.get(uuid4())
+
+        owner_id, member_id = uuid4(), uuid4()
+        chat = await chat_service.create_group("g", owner_id)
+        await chat_service.member_add(chat.id, member_id, owner_id)
+        with pytest.raises(AccessDeniedExc):
+            await chat_service.member_add(chat.id, uuid4(), member_id)
+
+    async def test_deleted_chat_reaped_in_worker(self, chat_service, message_service):
+        owner_id = uuid4()
+        chat = await chat_service.create_group("g", owner_id)
+        for i in range(3):
+            await message_service.send(chat.id, SourceType.GROUP, owner_id, str(i))
+        await chat_service.delete(chat.id, owner_id)
+        with pytest.raises(ObjectNotFoundExc):
+            await chat_service.get(chat.id)
+
+        for _ in range(100):
+            if not await message_service.get_list(chat.id, SourceType.GROUP):
+                break
+            await asyncio.sleep(0.01)
+        assert await message_service.get_list(chat.id, SourceType.GROUP) == []
+        assert await chat_service.get_list(owner_id) == []
+
+    async def test_personal_chat_deduplicated(self, chat_service):
+        user_1, user_2 = uuid4(), uuid4()
+        chat = await chat_service.get_or_create_personal("p", user_1, user_2)
+        assert await chat_service.get_or_create_personal("p", user_2, user_1) == chat
+        assert await chat_service.get(chat.id) == chat
+
+    async def test_mentions_merged_across_workers(self, chat_service, message_service):
+        user_id = uuid4()
+        chats = [await chat_service.create_group(str(i), user_id) for i in range(3)]
+        sent = []
+        for i in range(7):
+            chat = chats[i % 3]
+            sent.append(
+                await message_service.send(
+                    chat.id, SourceType.GROUP, user_id, f"@{user_id} {i}"
+                )
+            )
+
+        received = []
+        cursor = None
+        while True:
+            page = await message_service.list_mentions(user_id, cursor, limit=2)
+            received.extend(page.messages)
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        assert [m.id for m in received] == [m.id for m in reversed(sent)]
+
+    async def test_reply_thread(self, chat_service, message_service):
+        user_id = uuid4()
+        chat = await chat_service.create_group("g", user_id)
+        root = await message_service.send(chat.id, SourceType.GROUP, user_id, "root")
+        replies = [
+            await message_service.send(
+                chat.id, SourceType.GROUP, user_id, str(i), reply_to_id=root.id
+            )
+            for i in range(3)
+        ]
+        page = await message_service.list_replies(root.id, limit=2)
+        rest = await message_service.list_replies(root.id, page.next_cursor)
+        assert page.messages + rest.messages == replies
+
+    async def test_send_many(self, chat_service, message_service):
+        owner_id = uuid4()
+        chats = [await chat_service.create_group(str(i), owner_id) for i in range(3)]
+        requests = [
+            SendRequest(chats[i % 3].id, SourceType.GROUP, owner_id, str(i))
+            for i in range(9)
+        ]
+        requests.insert(
+            4,
+            SendRequest(
+                chats[0].id, SourceType.GROUP, owner_id, "x", reply_to_id=uuid4()
+            ),
+        )
+
+        results = await message_service.send_many(requests)
+        assert isinstance(results.pop(4), ObjectNotFoundExc)
+        assert [m.text_content for m in results] == [str(i) for i in range(9)]
+        for chat in chats:
+            page = await message_service.get_list(chat.id, SourceType.GROUP)
+            assert [m.id for m in page] == [
+                m.id for m in reversed(results) if m.source_id == chat.id
+            ]
+
+
+class TestWorkerPoolSerialization:
+    @pytest.fixture
+    async def pool(self):
+        pool = WorkerPool(echo_services, workers=1)
+        await pool.start()
+        yield pool
+        await pool.close()
+
+    async def test_unpicklable_argument(self, pool):
+        with pytest.raises(Exception):
+            await pool.call(0, "echo", "echo", threading.Lock())
+        assert await pool.call(0, "echo", "echo", 1) == 1
+
+    async def test_unpicklable_result(self, pool):
+        with pytest.raises(RuntimeError, match="Unpicklable result"):
+            await asyncio.wait_for(pool.call(0, "echo", "lock"), 5)
+        results = await pool.call_many(0, "echo", "lock", [((), {})])
+        assert isinstance(results[0], RuntimeError)
+        assert await pool.call(0, "echo", "echo", 2) == 2
+
+    async def test_exception_that_cannot_be_restored(self, pool):
+        with pytest.raises(RuntimeError, match="StrictError"):
+            await asyncio.wait_for(pool.call(0, "echo", "fail"), 5)
+        assert await pool.call_many(
+            0, "echo", "echo", [((i,), {}) for i in range(3)]
+        ) == [0, 1, 2]
@@ -0,0 +1,187 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+from uuid import UUID, uuid4
+
+import pytest
+
+from src.common.events import EventBus
+from src.domain.messages import analytics, entities, events, services
+
+from .message_service_test import FakeMessageRepository
+
+NOW = datetime(2024, 5, 10, 12, 30)
+
+
+def message(
+    source_id: UUID,
+    created_at: datetime,
+    sender_id: UUID | None = None,
+    source_type: entities.SourceType = entities.SourceType.GROUP,
+) -> entities.Message:
+    return entities.Message(
+        id=uuid4(),
+        source_id=source_id,
+        source_type=source_type,
+        sender_id=sender_id or uuid4(),
+        text_content="text",
+        created_at=created_at,
+    )
+
+
+def history(chats: int = 20, users: int = 300, count: int = 5000, seed: int = 1):
+    rng = random.Random(seed)
+    chat_types = {
+        UUID(int=rng.getrandbits(128)): rng.choice(list(entities.SourceType))
+        for _ in range(chats)
+    }
+    user_ids = [UUID(int=rng.getrandbits(128)) for _ in range(users)]
+    messages = []
+    for _ in range(count):
+        chat_id = rng.choice(list(chat_types))
+        messages.append(
+            message(
+                chat_id,
+                NOW - timedelta(minutes=rng.randrange(10 * 24 * 60)),
+                rng.choice(user_ids),
+                chat_types[chat_id],
+            )
+        )
+    return messages
+
+
+class TestActivityRollup:
+    def test_messages_per_hour(self):
+        rollup = analytics.ActivityRollup()
+        chat_id = uuid4()
+        for minutes in (0, 10, 70, 200):
+            rollup.record(message(chat_id, NOW - timedelta(minutes=minutes)))
+
+        hours = rollup.messages_per_hour(
+            chat_id, NOW - timedelta(hours=4), NOW + timedelta(hours=1)
+        )
+        assert hours == [
+            (datetime(2024, 5, 10, 8), 0),
+            (datetime(2024, 5, 10, 9), 1),
+            (datetime(2024, 5, 10, 10), 0),
+            (datetime(2024, 5, 10, 11), 1),
+            (datetime(2024, 5, 10, 12), 2),
+        ]
+        assert rollup.messages_per_hour(uuid4(), NOW, NOW + timedelta(hours=1)) == [
+            (datetime(2024, 5, 10, 12), 0)
+        ]
+
+    def test_aware_datetimes_are_utc(self):
+        rollup = analytics.ActivityRollup()
+        chat_id = uuid4()
+        moscow = timezone(timedelta(hours=3))
+        rollup.record(message(chat_id, datetime(2024, 5, 10, 15, 5, tzinfo=moscow)))
+
+        assert rollup.messages_per_hour(chat_id, NOW, NOW + timedelta(hours=1)) == [
+            (datetime(2024, 5, 10, 12), 1)
+        ]
+
+    def test_window_drops_old_hours(self):
+        rollup = analytics.ActivityRollup(window_hours=3)
+        chat_id = uuid4()
+        rollup.record(message(chat_id, NOW - timedelta(hours=5)))
+        rollup.record(message(chat_id, NOW - timedelta(hours=2)))
+        rollup.record(message(chat_id, NOW))
+        # Старше окна относительно последнего сообщения чата
+        rollup.record(message(chat_id, NOW - timedelta(hours=3)))
+
+        counts = [
+            count
+            for _, count in rollup.messages_per_hour(
+                chat_id, NOW - timedelta(hours=5), NOW + timedelta(hours=1)
+            )
+        ]
+        assert counts == [0, 0, 0, 1, 0, 1]
+
+    def test_top_groups(self):
+        rollup = analytics.ActivityRollup()
+        busy, quiet, stale, private = uuid4(), uuid4(), uuid4(), uuid4()
+        for _ in range(5):
+            rollup.record(message(busy, NOW))
+            rollup.record(message(private, NOW, source_type=entities.SourceType.CHAT))
+        rollup.record(message(quiet, NOW - timedelta(hours=3)))
+        rollup.record(message(stale, NOW - timedelta(days=2)))
+
+        assert rollup.top_groups(now=NOW) == [(busy, 5), (quiet, 1)]
+        assert rollup.top_groups(hours=1, now=NOW) == [(busy, 5)]
+        assert rollup.top_groups(hours=72, limit=1, now=NOW) == [(busy, 5)]
+
+    def test_active_users(self):
+        rollup = analytics.ActivityRollup()
+        users = [uuid4() for _ in range(5000)]
+        for user_id in users:
+            for _ in range(2):
+                rollup.record(message(uuid4(), NOW, user_id))
+        rollup.record(message(uuid4(), NOW - timedelta(days=1), users[0]))
+
+        assert rollup.active_users(NOW.date()) == pytest.approx(5000, rel=0.05)
+        assert rollup.active_users(date(2024, 5, 9)) == 1
+        assert rollup.active_users(date(2024, 5, 8)) == 0
+
+    def test_active_users_window(self):
+        rollup = analytics.ActivityRollup(window_days=2)
+        for days in (3, 1, 0, 2):
+            rollup.record(message(uuid4(), NOW - timedelta(days=days)))
+
+        days = [NOW.date() - timedelta(days=d) for d in range(4)]
+        assert [rollup.active_users(day) for day in days] == [1, 1, 0, 0]
+        assert rollup.memory_bytes == 2 * 4096 + 4 * 7 * 24 * 4
+
+    async def test_fed_by_message_service(self):
+        rollup = analytics.ActivityRollup()
+        bus = EventBus()
+        bus.subscribe(events.MessageSent, rollup.on_sent)
+        message_service = services.MessageService(
+            FakeMessageRepository(), event_bus=bus
+        )
+        source_id = uuid4()
+        for _ in range(3):
+            await message_service.send(
+                source_id, entities.SourceType.GROUP, uuid4(), "hello"
+            )
+
+        now = datetime.now()
+        assert rollup.top_groups(hours=2, now=now + timedelta(hours=1)) == [
+            (source_id, 3)
+        ]
+        assert rollup.active_users(now.date()) == 3
+
+    @pytest.mark.parametrize("vectorized", [False, True])
+    def test_rebuild_matches_streaming(self, vectorized):
+        if vectorized:
+            pytest.importorskip("numpy")
+        messages = history()
+        streamed = analytics.ActivityRollup(window_hours=48, window_days=7)
+        for item in messages:
+            streamed.record(item)
+        # Поток в другом порядке и данные до пересчета не должны влиять
+        rebuilt = analytics.ActivityRollup(window_hours=48, window_days=7)
+        rebuilt.record(message(uuid4(), NOW))
+        rebuilt.rebuild(list(reversed(messages)), vectorized=vectorized)
+
+        assert len(rebuilt) == len(streamed) == 20
+        for chat_id in {item.source_id for item in messages}:
+            assert rebuilt.messages_per_hour(
+                chat_id, NOW - timedelta(days=11), NOW
+            ) == streamed.messages_per_hour(chat_id, NOW - timedelta(days=11), NOW)
+        assert rebuilt.top_groups(hours=48, limit=20, now=NOW) == streamed.top_groups(
+            hours=48, limit=20, now=NOW
+        )
+        for days in range(11):
+            day = NOW.date() - timedelta(days=days)
+            assert rebuilt.active_users(day) == streamed.active_users(day)
+        senders = {m.sender_id for m in messages if m.created_at.date() == NOW.date()}
+        assert rebuilt.active_users(NOW.date()) == pytest.approx(len(senders), rel=0.05)
+        assert rebuilt.memory_bytes == streamed.memory_bytes
+
+    def test_rebuild_empty(self):
+        rollup = analytics.ActivityRollup()
+        rollup.record(message(uuid4(), NOW))
+        rollup.rebuild([])
+
+        assert len(rollup) == 0
+        assert rollup.active_users(NOW.date()) == 0
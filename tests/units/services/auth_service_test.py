@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.common.exceptions import InvalidCredentialsExc, OverloadedExc
+from src.domain.auth import hashing, services
+from src.domain.users.services import UserService
+
+from .user_service_test import FakeUserRepository
+
+FAST_PARAMS = hashing.ScryptParams(n=2**8)
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+@pytest.fixture
+def hashing_pool(executor) -> hashing.HashingPool:
+    return hashing.HashingPool(FAST_PARAMS, max_workers=2, executor=executor)
+
+
+@pytest.fixture
+def user_service() -> UserService:
+    return UserService(FakeUserRepository())
+
+
+@pytest.fixture
+def auth_service(user_service, hashing_pool) -> services.AbstractAuthService:
+    return services.AuthService(user_service, hashing_pool)
+
+
+class TestPasswordHashing:
+    def test_hash_and_verify(self):
+        hashed = hashing.hash_password("secret", FAST_PARAMS)
+        assert hashed.startswith("scrypt$256$8$1$")
+        assert hashing.verify_password("secret", hashed)
+        assert not hashing.verify_password("wrong", hashed)
+        assert not hashing.verify_password("secret", "plain-text")
+
+    def test_needs_rehash(self):
+        hashed = hashing.hash_password("secret", FAST_PARAMS)
+        assert not hashing.needs_rehash(hashed, FAST_PARAMS)
+        assert hashing.needs_rehash(hashed, hashing.ScryptParams(n=2**9))
+        assert hashing.needs_rehash("legacy", FAST_PARAMS)
+
+
+class TestAuthService:
+    async def test_register_and_authenticate(self, auth_service):
+        user = await auth_service.register("Test", "test@example.com", "secret")
+        assert user.hashed_password != "secret"
+
+        authenticated = await auth_service.authenticate("test@example.com", "secret")
+        assert authenticated.id == user.id
+
+    async def test_wrong_password(self, auth_service):
+        await auth_service.register("Test", "test@example.com", "secret")
+        with pytest.raises(InvalidCredentialsExc):
+            await auth_service.authenticate("test@example.com", "wrong")
+
+    async def test_unknown_email(self, auth_service):
+        with pytest.raises(InvalidCredentialsExc):
+            await auth_service.authenticate("missing@example.com", "secret")
+
+    async def test_rehash_on_login(self, user_service, executor):
+        old_pool = hashing.HashingPool(FAST_PARAMS, executor=executor)
+        user = await services.AuthService(user_service, old_pool).register(
+            "Test", "test@example.com", "secret"
+        )
+
+        new_params = hashing.ScryptParams(n=2**9)
+        new_pool = hashing.HashingPool(new_params, executor=executor)
+        user = await services.AuthService(user_service, new_pool).authenticate(
+            "test@example.com", "secret"
+        )
+        assert user.hashed_password.startswith("scrypt$512$")
+        assert not new_pool.needs_rehash(user.hashed_password)
+
+    async def test_queue_limit(self, executor):
+        pool = hashing.HashingPool(
+            FAST_PARAMS, max_workers=1, max_queue=2, executor=executor
+        )
+        results = await asyncio.gather(
+            *(pool.hash("secret") for _ in range(5)), return_exceptions=True
+        )
+        assert sum(isinstance(r, OverloadedExc) for r in results) == 2
+        assert pool.metrics.rejected == 2
+        assert pool.metrics.max_queue_depth == 2
+        assert pool.metrics.completed == 3
@@ -0,0 +1,159 @@
+import asyncio
+from uuid import UUID, uuid4
+
+import pytest
+
+from src.common.exceptions import ObjectNotFoundExc
+from src.domain.chats import reaper, services
+from src.domain.messages.entities import SourceType
+
+from .chat_service_test import FakeChatMemberRepository, FakeChatRepository
+from .message_service_test import FakeMessageRepository
+
+
+class CrashingMessageRepository(FakeMessageRepository):
+    def __init__(self, crash_after: int):
+        super().__init__()
+        self.crash_after = crash_after
+
+    async def delete_by_source(self, source_id: UUID, limit: int = 1000) -> int:
+        if self.crash_after == 0:
+            raise ConnectionError("database is down")
+        self.crash_after -= 1
+        return await super().delete_by_source(source_id, limit)
+
+
+@pytest.fixture
+def chat_repository() -> FakeChatRepository:
+    return FakeChatRepository()
+
+
+@pytest.fixture
+def chat_member_repository() -> FakeChatMemberRepository:
+    return FakeChatMemberRepository()
+
+
+@pytest.fixture
+def message_repository() -> FakeMessageRepository:
+    return FakeMessageRepository()
+
+
+@pytest.fixture
+def chat_reaper(chat_repository, chat_member_repository, message_repository):
+    return reaper.ChatReaper(
+        chat_repository,
+        chat_member_repository,
+        message_repository,
+        batch_size=3,
+        pause=0,
+        interval=60,
+    )
+
+
+@pytest.fixture
+def chat_service(chat_repository, chat_member_repository, chat_reaper):
+    return services.ChatService(
+        chat_repository, chat_member_repository, reaper=chat_reaper
+    )
+
+
+async def populate(chat_service, message_repository, members=5, messages=7):
+    owner_id = uuid4()
+    chat = await chat_service.create_group("group", owner_id)
+    for _ in range(members - 1):
+        await chat_service.member_add(chat.id, uuid4())
+    for i in range(messages):
+        await message_repository.create(chat.id, SourceType.GROUP, owner_id, str(i))
+    return chat, owner_id
+
+
+class TestChatReaper:
+    async def test_delete_hides_chat_before_reaping(
+        self, chat_service, chat_member_repository, message_repository, chat_reaper
+    ):
+        chat, owner_id = await populate(chat_service, message_repository)
+        await chat_service.delete(chat.id, executor_id=owner_id)
+
+        with pytest.raises(ObjectNotFoundExc):
+            await chat_service.get(chat.id)
+        assert await chat_member_repository.count_by_chat_id(chat.id) == 5
+
+        progress = await chat_reaper.reap(chat.id)
+        assert (progress.members, progress.messages) == (5, 7)
+        assert progress.batches == 5
+        assert progress.finished_at is not None
+        assert await chat_member_repository.count_by_chat_id(chat.id) == 0
+        assert message_repository.messages == {}
+        assert chat_reaper.progress == {}
+
+    async def test_send_racing_reaper_not_orphaned(
+        self, chat_service, chat_repository, message_repository, chat_reaper
+    ):
+        chat, owner_id = await populate(chat_service, message_repository)
+        await chat_service.delete(chat.id)
+        delete = chat_repository.delete
+
+        async def delete_after_late_send(_id):
+            await message_repository.create(chat.id, SourceType.GROUP, owner_id, "x")
+            await delete(_id=_id)
+
+        chat_repository.delete = delete_after_late_send
+        progress = await chat_reaper.reap(chat.id)
+        assert progress.messages == 8
+        assert message_repository.messages == {}
+
+    async def test_resumes_after_crash(
+        self, chat_service, chat_repository, chat_member_repository
+    ):
+        message_repository = CrashingMessageRepository(crash_after=1)
+        chat, owner_id = await populate(chat_service, message_repository)
+        await chat_service.delete(chat.id)
+
+        crashed = reaper.ChatReaper(
+            chat_repository,
+            chat_member_repository,
+            message_repository,
+            batch_size=3,
+            pause=0,
+        )
+        with pytest.raises(ConnectionError):
+            await crashed.reap_pending()
+        assert crashed.progress[chat.id].messages == 3
+        assert await chat_repository.list_deleted() == [chat.id]
+
+        message_repository.crash_after = -1
+        restarted = reaper.ChatReaper(
+            chat_repository,
+            chat_member_repository,
+            message_repository,
+            batch_size=3,
+            pause=0,
+        )
+        assert await restarted.reap_pending() == 1
+        assert restarted.metrics.messages == 4
+        assert message_repository.messages == {}
+        assert await chat_repository.list_deleted() == []
+
+    async def test_run_woken_by_delete(
+        self, chat_service, chat_repository, message_repository, chat_reaper
+    ):
+        chat, _ = await populate(chat_service, message_repository)
+        task = asyncio.create_task(chat_reaper.run())
+        try:
+            await asyncio.sleep(0)
+            await chat_service.delete(chat.id)
+            for _ in range(100):
+                if chat_reaper.metrics.chats:
+                    break
+                await asyncio.sleep(0)
+        finally:
+            task.cancel()
+        assert chat_reaper.metrics.chats == 1
+        assert chat.id not in chat_repository.deleted
+
+    async def test_personal_chat_recreated_after_delete(self, chat_service):
+        user_1, user_2 = uuid4(), uuid4()
+        chat = await chat_service.create_personal("personal", user_1, user_2)
+        await chat_service.delete(chat.id)
+        recreated = await chat_service.get_or_create_personal("again", user_2, user_1)
+        assert recreated.id != chat.id
@@ -1,18 +1,36 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
 from typing import Any, Dict, Sequence
 from uuid import UUID, uuid4
 
 import pytest
 
-from src.common.exceptions import AccessDeniedExc, ObjectNotFoundExc
-from src.domain.chats import entities, repositories, services
+from src.common.events import EventBus
+from src.common.exceptions import (
+    AccessDeniedExc,
+    AlreadyExistsExc,
+    InvalidFormatExc,
+    ObjectNotFoundExc,
+    QueryBudgetExceededExc,
+)
+from src.common.tracing import query_budget, trace_repository
+from src.domain.chats import cache, entities, events, repositories, services
 
 
 class FakeChatRepository:
     def __init__(self):
         self.chats = {}
-
-    async def create(self, chat_type: entities.ChatType, title: str) -> entities.Chat:
+        self.personal = {}
+        self.deleted = {}
+
+    async def create(
+        self,
+        chat_type: entities.ChatType,
+        title: str,
+        personal_key: tuple[UUID, UUID] | None = None,
+    ) -> entities.Chat:
+        if personal_key is not None and personal_key in self.personal:
+            raise AlreadyExistsExc("Personal chat already exists")
         chat = entities.Chat(
             id=uuid4(),
             chat_type=chat_type,
@@ -21,8 +39,15 @@ class FakeChatRepository:
             updated_at=datetime.now(),
         )
         self.chats[chat.id] = chat
+        if personal_key is not None:
+            self.personal[personal_key] = chat.id
         return chat
 
+    async def get_personal(self, personal_key: tuple[UUID, UUID]) -> entities.Chat:
+        if personal_key not in self.personal:
+            raise ObjectNotFoundExc("Chat not found")
+        return await self.get(self.personal[personal_key])
+
     async def get(self, _id: UUID) -> entities.Chat:
         if _id not in self.chats:
             raise ObjectNotFoundExc("Chat not found")
@@ -37,10 +62,18 @@ class FakeChatRepository:
         self.chats[_id] = chat
         return chat
 
+    async def mark_deleted(self, _id: UUID) -> None:
+        self.deleted[_id] = await self.get(_id)
+        del self.chats[_id]
+        self.personal = {k: v for k, v in self.personal.items() if v != _id}
+
+    async def list_deleted(self, limit: int = 100) -> Sequence[UUID]:
+        return list(self.deleted)[:limit]
+
     async def delete(self, _id: UUID) -> None:
-        if _id not in self.chats:
+        if self.chats.pop(_id, None) is None and self.deleted.pop(_id, None) is None:
             raise ObjectNotFoundExc("Chat not found")
-        del self.chats[_id]
+        self.personal = {k: v for k, v in self.personal.items() if v != _id}
 
 
 class FakeChatMemberRepository:
@@ -83,6 +116,25 @@ class FakeChatMemberRepository:
         ]
         return chat_ids[offset : offset + limit]
 
+    async def list_user_ids_by_chat_id(
+        self, _id: UUID, permissions: entities.ChatMemberPermissions | None = None
+    ) -> Sequence[UUID]:
+        return [
+            user_id
+            for (chat_id, user_id), member in self.members.items()
+            if chat_id == _id
+            and (permissions is None or member.permissions == permissions)
+        ]
+
+    async def count_by_chat_id(self, _id: UUID) -> int:
+        return len([chat_id for chat_id, _ in self.members.keys() if chat_id == _id])
+
+    async def delete_by_chat_id(self, _id: UUID, limit: int = 1000) -> int:
+        keys = [key for key in self.members if key[0] == _id][:limit]
+        for key in keys:
+            del self.members[key]
+        return len(keys)
+
 
 @pytest.fixture
 def chat_repository() -> repositories.AbstractChatRepository:
@@ -101,6 +153,30 @@ def chat_service(
     return services.ChatService(chat_repository, chat_member_repository)
 
 
+@pytest.fixture
+def traced_chat_service(
+    chat_repository, chat_member_repository
+) -> services.AbstractChatService:
+    return services.ChatService(
+        trace_repository(chat_repository, "chat"),
+        trace_repository(chat_member_repository, "chat_member"),
+    )
+
+
+@pytest.fixture
+def snapshot_cache(chat_repository, chat_member_repository) -> cache.ChatSnapshotCache:
+    return cache.ChatSnapshotCache(chat_repository, chat_member_repository)
+
+
+@pytest.fixture
+def cached_chat_service(
+    chat_repository, chat_member_repository, snapshot_cache
+) -> services.AbstractChatService:
+    return services.ChatService(
+        chat_repository, chat_member_repository, snapshot_cache=snapshot_cache
+    )
+
+
 class TestChatService:
     async def test_create_personal_chat(self, chat_service):
         user1_id = uuid4()
@@ -114,6 +190,50 @@ class TestChatService:
         assert chat.chat_type == entities.ChatType.PERSONAL
         assert chat.title == "Test Personal Chat"
 
+    async def test_create_personal_chat_twice(self, chat_service):
+        user1_id, user2_id = uuid4(), uuid4()
+        await chat_service.create_personal("DM", user1_id, user2_id)
+        with pytest.raises(AlreadyExistsExc):
+            await chat_service.create_personal("DM", user2_id, user1_id)
+
+    async def test_get_or_create_personal(self, chat_service, chat_repository):
+        user1_id, user2_id = uuid4(), uuid4()
+        chats = await asyncio.gather(
+            chat_service.get_or_create_personal("DM", user1_id, user2_id),
+            chat_service.get_or_create_personal("DM", user2_id, user1_id),
+            chat_service.get_or_create_personal("DM", user1_id, user2_id),
+        )
+
+        assert len({chat.id for chat in chats}) == 1
+        assert len(chat_repository.chats) == 1
+        member = await chat_service.member_get(chats[0].id, user2_id)
+        assert member.permissions == entities.ChatMemberPermissions.ROLE_OWNER
+
+    async def test_get_or_create_personal_restores_owners(
+        self, chat_service, chat_repository
+    ):
+        user1_id, user2_id = uuid4(), uuid4()
+        # Создатель упал между записью чата и участников
+        chat = await chat_repository.create(
+            chat_type=entities.ChatType.PERSONAL,
+            title="DM",
+            personal_key=entities.personal_key(user1_id, user2_id),
+        )
+
+        found = await chat_service.get_or_create_personal("DM", user2_id, user1_id)
+        assert found.id == chat.id
+        for user_id in (user1_id, user2_id):
+            member = await chat_service.member_get(chat.id, user_id)
+            assert member.permissions == entities.ChatMemberPermissions.ROLE_OWNER
+
+    async def test_get_or_create_personal_after_delete(self, chat_service):
+        user1_id, user2_id = uuid4(), uuid4()
+        chat = await chat_service.get_or_create_personal("DM", user1_id, user2_id)
+        await chat_service.delete(chat.id)
+
+        recreated = await chat_service.get_or_create_personal("DM", user1_id, user2_id)
+        assert recreated.id != chat.id
+
     async def test_create_group_chat(self, chat_service):
         owner_id = uuid4()
         chat = await chat_service.create_group(
@@ -196,6 +316,25 @@ class TestChatService:
         with pytest.raises(AccessDeniedExc):
             await chat_service.delete(chat_id=created_chat.id, executor_id=non_owner_id)
 
+    async def test_set_retention(self, chat_service):
+        owner_id, member_id = uuid4(), uuid4()
+        chat = await chat_service.create_group(title="History", owner_id=owner_id)
+        await chat_service.member_add(chat.id, member_id, executor_id=owner_id)
+        policy = entities.RetentionPolicy(max_age=timedelta(days=7))
+
+        with pytest.raises(AccessDeniedExc):
+            await chat_service.set_retention(chat.id, policy, executor_id=member_id)
+        with pytest.raises(InvalidFormatExc):
+            await chat_service.set_retention(
+                chat.id, entities.RetentionPolicy(max_count=0), executor_id=owner_id
+            )
+
+        await chat_service.set_retention(chat.id, policy, executor_id=owner_id)
+        assert (await chat_service.get(chat.id)).retention == policy
+        assert policy.merge(entities.RetentionPolicy(max_count=10)) == (
+            entities.RetentionPolicy(max_age=timedelta(days=7), max_count=10)
+        )
+
     async def test_get_chat_list(self, chat_service):
         user_id = uuid4()
         chat1 = await chat_service.create_group(title="Chat 1", owner_id=user_id)
@@ -254,3 +393,197 @@ class TestChatService:
 
         with pytest.raises(ObjectNotFoundExc):
             await chat_service.member_get(chat_id=chat.id, user_id=uuid4())
+
+    async def test_member_mutations_publish_events(
+        self, chat_repository, chat_member_repository
+    ):
+        bus = EventBus()
+        published = []
+        bus.subscribe(events.ChatCreated, published.append)
+        bus.subscribe(events.MemberAdded, published.append)
+        bus.subscribe(events.MemberPermissionsChanged, published.append)
+        chat_service = services.ChatService(
+            chat_repository, chat_member_repository, event_bus=bus
+        )
+        owner_id = uuid4()
+        user_id = uuid4()
+
+        chat = await chat_service.create_group(title="Group", owner_id=owner_id)
+        await chat_service.member_add(
+            chat_id=chat.id, user_id=user_id, executor_id=owner_id
+        )
+        await chat_service.member_block(
+            chat_id=chat.id, user_id=user_id, executor_id=owner_id
+        )
+
+        assert [type(event) for event in published] == [
+            events.ChatCreated,
+            events.MemberAdded,
+            events.MemberPermissionsChanged,
+        ]
+        assert published[1].member.user_id == user_id
+        assert published[2].permissions == entities.ChatMemberPermissions.ROLE_BLOCKED
+
+
+class TestChatSnapshotCache:
+    async def test_get_snapshot(self, chat_service):
+        owner_id = uuid4()
+        chat = await chat_service.create_group(title="Group", owner_id=owner_id)
+        await chat_service.member_add(
+            chat_id=chat.id, user_id=uuid4(), executor_id=owner_id
+        )
+
+        snapshot = await chat_service.get_snapshot(chat_id=chat.id)
+        assert snapshot.chat.id == chat.id
+        assert snapshot.member_count == 2
+        assert snapshot.owner_ids == (owner_id,)
+
+    async def test_get_served_from_cache(
+        self, cached_chat_service, chat_repository, snapshot_cache
+    ):
+        chat = await cached_chat_service.create_group(title="Group", owner_id=uuid4())
+        await cached_chat_service.get(chat_id=chat.id)
+        del chat_repository.chats[chat.id]
+
+        cached = await cached_chat_service.get(chat_id=chat.id)
+        assert cached.id == chat.id
+        assert snapshot_cache.stats.loads == 1
+        assert snapshot_cache.stats.hits == 1
+
+    async def test_get_snapshot_served_from_shared_cache(
+        self, cached_chat_service, snapshot_cache
+    ):
+        chat = await cached_chat_service.create_group(title="Group", owner_id=uuid4())
+        first = await cached_chat_service.get_snapshot(chat.id)
+        assert await cached_chat_service.get_snapshot(chat.id) is first
+        assert snapshot_cache.stats.loads == 1
+
+    async def test_update_invalidates_snapshot(self, cached_chat_service):
+        owner_id = uuid4()
+        chat = await cached_chat_service.create_group(title="Old", owner_id=owner_id)
+        before = await cached_chat_service.get_snapshot(chat_id=chat.id)
+
+        await cached_chat_service.update(
+            chat_id=chat.id, executor_id=owner_id, title="New"
+        )
+        after = await cached_chat_service.get_snapshot(chat_id=chat.id)
+        assert after.chat.title == "New"
+        assert after.version > before.version
+
+    async def test_member_add_invalidates_snapshot(self, cached_chat_service):
+        owner_id = uuid4()
+        chat = await cached_chat_service.create_group(title="Group", owner_id=owner_id)
+        assert (await cached_chat_service.get_snapshot(chat.id)).member_count == 1
+
+        await cached_chat_service.member_add(
+            chat_id=chat.id, user_id=uuid4(), executor_id=owner_id
+        )
+        assert (await cached_chat_service.get_snapshot(chat.id)).member_count == 2
+
+    async def test_delete_is_cached_negatively(
+        self, cached_chat_service, chat_repository, snapshot_cache
+    ):
+        owner_id = uuid4()
+        chat = await cached_chat_service.create_group(title="Group", owner_id=owner_id)
+        await cached_chat_service.get(chat_id=chat.id)
+        await cached_chat_service.delete(chat_id=chat.id, executor_id=owner_id)
+
+        for _ in range(3):
+            with pytest.raises(ObjectNotFoundExc):
+                await cached_chat_service.get(chat_id=chat.id)
+        assert snapshot_cache.stats.loads == 2
+        assert snapshot_cache.stats.negative_hits == 2
+
+    async def test_concurrent_misses_load_once(
+        self, cached_chat_service, chat_repository, snapshot_cache
+    ):
+        chat = await cached_chat_service.create_group(title="Hot", owner_id=uuid4())
+        calls = 0
+        original_get = chat_repository.get
+
+        async def slow_get(_id):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return await original_get(_id)
+
+        chat_repository.get = slow_get
+        results = await asyncio.gather(
+            *(cached_chat_service.get(chat_id=chat.id) for _ in range(50))
+        )
+        assert calls == 1
+        assert all(result.id == chat.id for result in results)
+
+
+class TestChatServiceQueryBudget:
+    async def test_update_repository_calls(self, traced_chat_service):
+        owner_id = uuid4()
+        chat = await traced_chat_service.create_group(title="Group", owner_id=owner_id)
+
+        with query_budget("update", max_calls=3) as trace:
+            await traced_chat_service.update(
+                chat_id=chat.id, executor_id=owner_id, title="New"
+            )
+
+        assert trace.count("chat_member", "get") == 1
+        assert trace.count("chat", "update") == 1
+
+    async def test_member_add_without_executor_skips_permission_check(
+        self, traced_chat_service
+    ):
+        chat = await traced_chat_service.create_group(title="Group", owner_id=uuid4())
+
+        with query_budget("member_add", max_calls=1) as trace:
+            await traced_chat_service.member_add(chat_id=chat.id, user_id=uuid4())
+
+        assert trace.count("chat_member", "get") == 0
+
+    async def test_n_plus_one_is_detected(self, traced_chat_service):
+        owner_id = uuid4()
+        chat = await traced_chat_service.create_group(title="Group", owner_id=owner_id)
+        user_ids = [uuid4() for _ in range(5)]
+        for user_id in user_ids:
+            await traced_chat_service.member_add(
+                chat_id=chat.id, user_id=user_id, executor_id=owner_id
+            )
+
+        with pytest.raises(QueryBudgetExceededExc, match="N\\+1: chat_member.get"):
+            with query_budget("members", n_plus_one_threshold=3):
+                for user_id in user_ids:
+                    await traced_chat_service.member_get(chat.id, user_id)
+
+
+class YieldingChatMemberRepository(FakeChatMemberRepository):
+    async def get(self, _id: tuple[UUID, UUID]) -> entities.ChatMember:
+        await asyncio.sleep(0)
+        return await super().get(_id)
+
+
+class TestChatServiceConcurrency:
+    async def test_member_mutations_linearizable(self, chat_repository):
+        chat_service = services.ChatService(
+            chat_repository, YieldingChatMemberRepository()
+        )
+        owner_id, admin_id, user_id = uuid4(), uuid4(), uuid4()
+        chat = await chat_service.create_group(title="Group", owner_id=owner_id)
+        for member_id in (admin_id, user_id):
+            await chat_service.member_add(chat_id=chat.id, user_id=member_id)
+        await chat_service.member_change_role(
+            chat.id, admin_id, entities.ChatMemberPermissions.ROLE_ADMIN
+        )
+
+        demote, block = await asyncio.gather(
+            chat_service.member_change_role(
+                chat.id,
+                admin_id,
+                entities.ChatMemberPermissions.ROLE_DEFAULT,
+                executor_id=owner_id,
+            ),
+            chat_service.member_block(chat.id, user_id, executor_id=admin_id),
+            return_exceptions=True,
+        )
+
+        assert demote is None
+        assert isinstance(block, AccessDeniedExc)
+        member = await chat_service.member_get(chat.id, user_id)
+        assert member.permissions == entities.ChatMemberPermissions.ROLE_DEFAULT
@@ -0,0 +1,338 @@
+from datetime import datetime
+from typing import Sequence
+from uuid import UUID, uuid4
+
+import pytest
+
+from src.common.events import EventBus
+from src.common.exceptions import AccessDeniedExc
+from src.domain.messages import entities, scheduler, services
+
+from .message_service_test import FakeMessageRepository
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeScheduledMessageRepository:
+    def __init__(self):
+        self.scheduled = {}
+
+    async def create(
+        self,
+        source_id: UUID,
+        source_type: entities.SourceType,
+        sender_id: UUID,
+        text_content: str,
+        send_at: datetime,
+        attachment: entities.Attachment | None = None,
+        ttl: float | None = None,
+    ) -> entities.ScheduledMessage:
+        scheduled = entities.ScheduledMessage(
+            id=uuid4(),
+            source_id=source_id,
+            source_type=source_type,
+            sender_id=sender_id,
+            text_content=text_content,
+            send_at=send_at,
+            attachment=attachment,
+            ttl=ttl,
+        )
+        self.scheduled[scheduled.id] = scheduled
+        return scheduled
+
+    async def get_many(
+        self, ids: Sequence[UUID]
+    ) -> Sequence[entities.ScheduledMessage]:
+        return [self.scheduled[_id] for _id in ids if _id in self.scheduled]
+
+    async def delete_many(self, ids: Sequence[UUID]) -> int:
+        return len([_id for _id in ids if self.scheduled.pop(_id, None)])
+
+    async def list_pending(
+        self, after_id: UUID | None = None, limit: int = 1000
+    ) -> Sequence[entities.ScheduledMessage]:
+        pending = sorted(
+            (
+                s
+                for s in self.scheduled.values()
+                if after_id is None or s.id.bytes > after_id.bytes
+            ),
+            key=lambda s: s.id.bytes,
+        )
+        return pending[:limit]
+
+
+class FlakyScheduledMessageRepository(FakeScheduledMessageRepository):
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    async def get_many(
+        self, ids: Sequence[UUID]
+    ) -> Sequence[entities.ScheduledMessage]:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database is down")
+        return await super().get_many(ids)
+
+
+class FailingMessageService(services.MessageService):
+    def __init__(self, *args, failures: int = 1, error: Exception | None = None):
+        super().__init__(*args)
+        self.failures = failures
+        self.error = error or ConnectionError("database is down")
+
+    async def send(self, *args, **kwargs) -> entities.Message:
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        return await super().send(*args, **kwargs)
+
+    async def expire(self, refs: Sequence[entities.MessageRef]) -> int:
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        return await super().expire(refs)
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def message_repository() -> FakeMessageRepository:
+    return FakeMessageRepository()
+
+
+@pytest.fixture
+def scheduled_repository() -> FakeScheduledMessageRepository:
+    return FakeScheduledMessageRepository()
+
+
+@pytest.fixture
+def message_service(message_repository) -> services.AbstractMessageService:
+    return services.MessageService(message_repository)
+
+
+@pytest.fixture
+def message_scheduler(
+    message_service, scheduled_repository, message_repository, clock
+) -> scheduler.MessageScheduler:
+    return scheduler.MessageScheduler(
+        message_service, scheduled_repository, message_repository, clock=clock
+    )
+
+
+def at(clock: FakeClock, delay: float) -> datetime:
+    return datetime.fromtimestamp(clock.now + delay)
+
+
+class TestMessageScheduler:
+    async def test_send_later(
+        self, message_scheduler, message_repository, scheduled_repository, clock
+    ):
+        source_id = uuid4()
+        scheduled = await message_scheduler.schedule_send(
+            source_id, entities.SourceType.CHAT, uuid4(), "later", at(clock, 10)
+        )
+
+        assert await message_scheduler.tick(clock.now + 9) == 0
+        assert message_repository.messages == {}
+
+        assert await message_scheduler.tick(clock.now + 10) == 1
+        [message] = message_repository.messages.values()
+        assert message.text_content == "later"
+        assert message.source_id == source_id
+        assert scheduled.id not in scheduled_repository.scheduled
+
+    async def test_cancel_send(
+        self, message_scheduler, message_repository, scheduled_repository, clock
+    ):
+        scheduled = await message_scheduler.schedule_send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "never", at(clock, 5)
+        )
+        assert await message_scheduler.cancel_send(scheduled.id)
+        assert await message_scheduler.tick(clock.now + 60) == 0
+        assert message_repository.messages == {}
+        assert scheduled_repository.scheduled == {}
+
+    async def test_scheduled_message_expires(
+        self, message_scheduler, message_repository, clock
+    ):
+        await message_scheduler.schedule_send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "bye", at(clock, 1), ttl=30
+        )
+        await message_scheduler.tick(clock.now + 1)
+        [message] = message_repository.messages.values()
+        assert message.expires_at == at(clock, 31)
+        assert message_scheduler.pending_expiry == 1
+
+        await message_scheduler.tick(clock.now + 30)
+        assert message.id in message_repository.messages
+        await message_scheduler.tick(clock.now + 31)
+        assert message_repository.messages == {}
+        assert message_scheduler.metrics.expired == 1
+
+    async def test_expiry_in_batches(
+        self, message_service, scheduled_repository, message_repository, clock
+    ):
+        message_scheduler = scheduler.MessageScheduler(
+            message_service,
+            scheduled_repository,
+            message_repository,
+            batch_size=3,
+            clock=clock,
+        )
+        for i in range(10):
+            message = await message_service.send(
+                uuid4(),
+                entities.SourceType.CHAT,
+                uuid4(),
+                str(i),
+                expires_at=at(clock, 5),
+            )
+            message_scheduler.track(message)
+
+        assert await message_scheduler.tick(clock.now + 5) == 10
+        assert message_repository.messages == {}
+
+    async def test_start_restores_timers(
+        self, message_service, scheduled_repository, message_repository, clock
+    ):
+        for i in range(5):
+            await scheduled_repository.create(
+                uuid4(), entities.SourceType.CHAT, uuid4(), str(i), at(clock, i)
+            )
+        await message_service.send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "x", expires_at=at(clock, 2)
+        )
+        message_scheduler = scheduler.MessageScheduler(
+            message_service,
+            scheduled_repository,
+            message_repository,
+            batch_size=2,
+            clock=clock,
+        )
+
+        assert await message_scheduler.start() == 6
+        assert await message_scheduler.tick(clock.now + 2) == 4
+        assert len(message_repository.messages) == 3
+        assert await message_scheduler.tick(clock.now + 4) == 2
+        assert len(message_repository.messages) == 5
+
+    async def test_failed_send_retried(
+        self, message_repository, scheduled_repository, clock
+    ):
+        message_scheduler = scheduler.MessageScheduler(
+            FailingMessageService(message_repository),
+            scheduled_repository,
+            message_repository,
+            retry_delay=5.0,
+            clock=clock,
+        )
+        scheduled = await message_scheduler.schedule_send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "retry", at(clock, 1)
+        )
+
+        await message_scheduler.tick(clock.now + 1)
+        assert message_scheduler.metrics.send_errors == 1
+        assert scheduled.id in scheduled_repository.scheduled
+
+        await message_scheduler.tick(clock.now + 6)
+        assert message_scheduler.metrics.sent == 1
+        assert scheduled_repository.scheduled == {}
+
+    async def test_dead_letter_after_max_attempts(
+        self, message_repository, scheduled_repository, clock
+    ):
+        message_scheduler = scheduler.MessageScheduler(
+            FailingMessageService(message_repository, failures=10),
+            scheduled_repository,
+            message_repository,
+            retry_delay=5.0,
+            max_attempts=2,
+            clock=clock,
+        )
+        await message_scheduler.schedule_send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "retry", at(clock, 1)
+        )
+
+        await message_scheduler.tick(clock.now + 1)
+        await message_scheduler.tick(clock.now + 6)
+        assert message_scheduler.metrics.send_errors == 2
+        assert message_scheduler.metrics.dead_letters == 1
+        assert message_scheduler.pending_sends == 0
+        assert scheduled_repository.scheduled == {}
+
+    async def test_permanent_error_not_retried(
+        self, message_repository, scheduled_repository, clock
+    ):
+        message_scheduler = scheduler.MessageScheduler(
+            FailingMessageService(message_repository, error=AccessDeniedExc()),
+            scheduled_repository,
+            message_repository,
+            clock=clock,
+        )
+        await message_scheduler.schedule_send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "denied", at(clock, 1)
+        )
+
+        await message_scheduler.tick(clock.now + 1)
+        assert message_scheduler.metrics.dead_letters == 1
+        assert message_scheduler.pending_sends == 0
+        assert scheduled_repository.scheduled == {}
+
+    async def test_tracks_messages_sent_through_event_bus(
+        self, message_repository, scheduled_repository, clock
+    ):
+        event_bus = EventBus()
+        message_service = services.MessageService(message_repository, event_bus)
+        message_scheduler = scheduler.MessageScheduler(
+            message_service,
+            scheduled_repository,
+            message_repository,
+            event_bus=event_bus,
+            clock=clock,
+        )
+        await message_service.send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "x", expires_at=at(clock, 5)
+        )
+
+        assert message_scheduler.pending_expiry == 1
+        await message_scheduler.tick(clock.now + 5)
+        assert message_repository.messages == {}
+
+    async def test_repository_error_keeps_timers(self, message_repository, clock):
+        scheduled_repository = FlakyScheduledMessageRepository()
+        message_service = FailingMessageService(message_repository, failures=0)
+        message_scheduler = scheduler.MessageScheduler(
+            message_service,
+            scheduled_repository,
+            message_repository,
+            retry_delay=5.0,
+            clock=clock,
+        )
+        await message_scheduler.schedule_send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "later", at(clock, 1)
+        )
+        message = await message_service.send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "x", expires_at=at(clock, 1)
+        )
+        message_scheduler.track(message)
+        message_service.failures = 1
+
+        assert await message_scheduler.tick(clock.now + 1) == 2
+        assert message_scheduler.metrics.errors == 2
+        assert message_scheduler.pending_sends == 1
+        assert message_scheduler.pending_expiry == 1
+        assert await message_scheduler.tick(clock.now + 6) == 2
+        assert message_scheduler.metrics.sent == 1
+        assert message_scheduler.metrics.expired == 1
+        assert scheduled_repository.scheduled == {}
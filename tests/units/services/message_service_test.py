@@ -1,16 +1,25 @@
+import asyncio
 from datetime import datetime
 from typing import Sequence
 from uuid import UUID, uuid4
 
 import pytest
 
-from src.common.exceptions import ObjectNotFoundExc
-from src.domain.messages import entities, repositories, services
+from src.common.events import EventBus
+from src.common.exceptions import ObjectNotFoundExc, PayloadTooLargeExc
+from src.domain.chats.cache import ChatSnapshotCache
+from src.domain.chats.entities import ChatMember, ChatMemberPermissions
+from src.domain.chats.services import ChatService
+from src.domain.messages import cache, entities, events, repositories, services
+from src.infrastructure.blobs import LocalBlobRepository
+
+from .chat_service_test import FakeChatMemberRepository, FakeChatRepository
 
 
 class FakeMessageRepository:
     def __init__(self):
         self.messages = {}
+        self.recipients = {}
 
     async def create(
         self,
@@ -18,6 +27,11 @@ class FakeMessageRepository:
         source_type: entities.SourceType,
         sender_id: UUID,
         text_content: str,
+        attachment: entities.Attachment | None = None,
+        recipient_ids: Sequence[UUID] = (),
+        expires_at: datetime | None = None,
+        reply_to_id: UUID | None = None,
+        mentions: Sequence[UUID] = (),
     ) -> entities.Message:
         message = entities.Message(
             id=uuid4(),
@@ -26,8 +40,13 @@ class FakeMessageRepository:
             sender_id=sender_id,
             text_content=text_content,
             created_at=datetime.now(),
+            attachment=attachment,
+            expires_at=expires_at,
+            reply_to_id=reply_to_id,
+            mentions=tuple(mentions),
         )
         self.messages[message.id] = message
+        self.recipients[message.id] = list(recipient_ids)
         return message
 
     async def get(self, _id: UUID) -> entities.Message:
@@ -44,22 +63,136 @@ class FakeMessageRepository:
     ) -> Sequence[entities.Message]:
         messages = [
             msg
-            for msg in self.messages.values()
+            for msg in reversed(self.messages.values())
             if msg.source_id == source_id and msg.source_type == source_type
         ]
         return messages[offset : offset + limit]
 
+    async def list_replies(
+        self, reply_to_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> entities.MessagePage:
+        replies = [
+            msg for msg in self.messages.values() if msg.reply_to_id == reply_to_id
+        ]
+        return self.__page(replies, cursor, limit)
+
+    async def list_mentions(
+        self, user_id: UUID, cursor: str | None = None, limit: int = 50
+    ) -> entities.MessagePage:
+        mentions = [
+            msg for msg in reversed(self.messages.values()) if user_id in msg.mentions
+        ]
+        return self.__page(mentions, cursor, limit)
+
+    @staticmethod
+    def __page(
+        messages: Sequence[entities.Message], cursor: str | None, limit: int
+    ) -> entities.MessagePage:
+        start = 0
+        if cursor is not None:
+            start = [str(msg.id) for msg in messages].index(cursor) + 1
+        page = messages[start : start + limit]
+        more = start + limit < len(messages)
+        return entities.MessagePage(page, str(page[-1].id) if more else None)
+
+    async def delete_many(self, ids: Sequence[UUID]) -> int:
+        deleted = [_id for _id in ids if self.messages.pop(_id, None) is not None]
+        return len(deleted)
+
+    async def delete_by_source(self, source_id: UUID, limit: int = 1000) -> int:
+        ids = [_id for _id, msg in self.messages.items() if msg.source_id == source_id]
+        return await self.delete_many(ids[:limit])
+
+    async def purge(
+        self,
+        source_id: UUID,
+        source_type: entities.SourceType,
+        before: datetime | None = None,
+        keep: int | None = None,
+        limit: int = 1000,
+    ) -> entities.PurgeStats:
+        history = [
+            msg
+            for msg in self.messages.values()
+            if msg.source_id == source_id and msg.source_type == source_type
+        ]
+        excess = len(history) - keep if keep is not None else 0
+        doomed = [
+            msg
+            for position, msg in enumerate(history)
+            if position < excess or (before is not None and msg.created_at < before)
+        ][:limit]
+        return entities.PurgeStats(
+            messages=await self.delete_many([msg.id for msg in doomed]),
+            bytes=sum(len(msg.text_content) for msg in doomed),
+        )
+
+    async def list_sources(
+        self, after: tuple[UUID, entities.SourceType] | None = None, limit: int = 1000
+    ) -> Sequence[tuple[UUID, entities.SourceType]]:
+        sources = sorted(
+            {(msg.source_id, msg.source_type) for msg in self.messages.values()},
+            key=lambda source: (source[0].bytes, source[1].value),
+        )
+        if after is not None:
+            sources = [
+                source
+                for source in sources
+                if (source[0].bytes, source[1].value) > (after[0].bytes, after[1].value)
+            ]
+        return sources[:limit]
+
+    async def list_expiring(
+        self, after_id: UUID | None = None, limit: int = 1000
+    ) -> Sequence[tuple[entities.MessageRef, datetime]]:
+        expiring = sorted(
+            (
+                msg
+                for msg in self.messages.values()
+                if msg.expires_at is not None
+                and (after_id is None or msg.id.bytes > after_id.bytes)
+            ),
+            key=lambda msg: msg.id.bytes,
+        )
+        return [
+            (
+                entities.MessageRef(msg.id, msg.source_id, msg.source_type),
+                msg.expires_at,
+            )
+            for msg in expiring[:limit]
+        ]
+
 
 @pytest.fixture
 def message_repository() -> repositories.AbstractMessageRepository:
     return FakeMessageRepository()
 
 
+class CountingMessageRepository(FakeMessageRepository):
+    def __init__(self):
+        super().__init__()
+        self.list_calls = 0
+
+    async def get_list(self, *args, **kwargs) -> Sequence[entities.Message]:
+        self.list_calls += 1
+        return await super().get_list(*args, **kwargs)
+
+
 @pytest.fixture
 def message_service(message_repository) -> services.AbstractMessageService:
     return services.MessageService(message_repository)
 
 
+@pytest.fixture
+def attachment_service(tmp_path) -> services.AbstractAttachmentService:
+    return services.AttachmentService(LocalBlobRepository(tmp_path), max_size=1024)
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
 class TestMessageService:
     async def test_send_message(self, message_service):
         source_id = uuid4()
@@ -125,3 +258,249 @@ class TestMessageService:
         assert len(retrieved_messages) == 3
         for msg in messages:
             assert msg in retrieved_messages
+
+    async def test_send_publishes_event(self, message_repository):
+        bus = EventBus()
+        published = []
+        bus.subscribe(events.MessageSent, published.append)
+        message_service = services.MessageService(message_repository, event_bus=bus)
+
+        message = await message_service.send(
+            source_id=uuid4(),
+            source_type=entities.SourceType.CHAT,
+            sender_id=uuid4(),
+            text_content="Hello",
+        )
+
+        assert len(published) == 1
+        assert published[0].message == message
+
+    async def test_reply_thread_pages(self, message_service):
+        source_id = uuid4()
+        root = await message_service.send(
+            source_id, entities.SourceType.GROUP, uuid4(), "root"
+        )
+        replies = [
+            await message_service.send(
+                source_id,
+                entities.SourceType.GROUP,
+                uuid4(),
+                str(i),
+                reply_to_id=root.id,
+            )
+            for i in range(5)
+        ]
+
+        first = await message_service.list_replies(root.id, limit=3)
+        assert first.messages == replies[:3]
+        second = await message_service.list_replies(
+            root.id, cursor=first.next_cursor, limit=3
+        )
+        assert second.messages == replies[3:]
+        assert second.next_cursor is None
+
+    async def test_reply_to_other_chat_rejected(self, message_service):
+        other = await message_service.send(
+            uuid4(), entities.SourceType.CHAT, uuid4(), "elsewhere"
+        )
+        with pytest.raises(ObjectNotFoundExc):
+            await message_service.send(
+                uuid4(), entities.SourceType.CHAT, uuid4(), "hi", reply_to_id=other.id
+            )
+
+    async def test_mentions_inbox(self, message_service):
+        user_id = uuid4()
+        mentioned = [
+            await message_service.send(
+                uuid4(), entities.SourceType.GROUP, uuid4(), f"@{user_id} ping {i}"
+            )
+            for i in range(3)
+        ]
+        await message_service.send(
+            uuid4(), entities.SourceType.GROUP, uuid4(), "no mentions"
+        )
+
+        assert mentioned[0].mentions == (user_id,)
+        page = await message_service.list_mentions(user_id, limit=2)
+        assert page.messages == [mentioned[2], mentioned[1]]
+        page = await message_service.list_mentions(user_id, cursor=page.next_cursor)
+        assert page.messages == [mentioned[0]]
+
+    async def test_mentions_limited_to_members(self, message_repository):
+        chat_id, member_id, stranger_id = uuid4(), uuid4(), uuid4()
+        member_repository = FakeChatMemberRepository()
+        await member_repository.create(
+            ChatMember(
+                chat_id=chat_id,
+                user_id=member_id,
+                permissions=ChatMemberPermissions.ROLE_DEFAULT,
+            )
+        )
+        message_service = services.MessageService(
+            message_repository, chat_member_repository=member_repository
+        )
+
+        message = await message_service.send(
+            chat_id,
+            entities.SourceType.GROUP,
+            uuid4(),
+            f"@{member_id} @{stranger_id} @{member_id}",
+        )
+        assert message.mentions == (member_id,)
+
+    async def test_send_to_chat_without_members(self, message_repository):
+        message_service = services.MessageService(
+            message_repository, chat_member_repository=FakeChatMemberRepository()
+        )
+        with pytest.raises(ObjectNotFoundExc):
+            await message_service.send(
+                uuid4(), entities.SourceType.GROUP, uuid4(), "hello"
+            )
+        assert message_repository.messages == {}
+
+    async def test_send_to_deleted_chat_before_reap(self, message_repository):
+        chat_repository = FakeChatRepository()
+        member_repository = FakeChatMemberRepository()
+        snapshot_cache = ChatSnapshotCache(chat_repository, member_repository)
+        chat_service = ChatService(chat_repository, member_repository, snapshot_cache)
+        message_service = services.MessageService(
+            message_repository,
+            chat_member_repository=member_repository,
+            chat_snapshot_cache=snapshot_cache,
+        )
+        owner_id = uuid4()
+        chat = await chat_service.create_group("group", owner_id)
+        await message_service.send(chat.id, entities.SourceType.GROUP, owner_id, "hi")
+
+        await chat_service.delete(chat.id)
+        # Участники еще на месте: реапер не запускался
+        assert await member_repository.list_user_ids_by_chat_id(_id=chat.id)
+        with pytest.raises(ObjectNotFoundExc):
+            await message_service.send(
+                chat.id, entities.SourceType.GROUP, owner_id, "late"
+            )
+        assert len(message_repository.messages) == 1
+
+
+class TestTimelineCache:
+    @pytest.fixture
+    def counting_repository(self) -> CountingMessageRepository:
+        return CountingMessageRepository()
+
+    @pytest.fixture
+    def timeline_cache(self, counting_repository) -> cache.TimelineCache:
+        return cache.TimelineCache(counting_repository, capacity=5, max_chats=2)
+
+    @pytest.fixture
+    def cached_service(
+        self, counting_repository, timeline_cache
+    ) -> services.AbstractMessageService:
+        return services.MessageService(
+            counting_repository, timeline_cache=timeline_cache
+        )
+
+    @staticmethod
+    async def send_many(service, source_id, count):
+        return [
+            await service.send(source_id, entities.SourceType.CHAT, uuid4(), str(i))
+            for i in range(count)
+        ]
+
+    async def test_newest_page_served_from_buffer(
+        self, cached_service, counting_repository, timeline_cache
+    ):
+        source_id = uuid4()
+        sent = await self.send_many(cached_service, source_id, 3)
+
+        first = await cached_service.get_list(source_id, entities.SourceType.CHAT)
+        assert first == sent[::-1]
+        assert counting_repository.list_calls == 1
+
+        sent += await self.send_many(cached_service, source_id, 4)
+        page = await cached_service.get_list(
+            source_id, entities.SourceType.CHAT, limit=5
+        )
+        assert page == sent[:1:-1]
+        assert counting_repository.list_calls == 1
+        assert timeline_cache.stats.hit_ratio == 0.5
+
+    async def test_older_pages_fall_through(self, cached_service, counting_repository):
+        source_id = uuid4()
+        sent = await self.send_many(cached_service, source_id, 8)
+        await cached_service.get_list(source_id, entities.SourceType.CHAT, limit=2)
+
+        page = await cached_service.get_list(
+            source_id, entities.SourceType.CHAT, offset=4, limit=3
+        )
+        assert page == [sent[3], sent[2], sent[1]]
+        assert counting_repository.list_calls == 2
+
+    async def test_cold_chats_evicted(self, cached_service, timeline_cache):
+        for _ in range(3):
+            source_id = uuid4()
+            await self.send_many(cached_service, source_id, 1)
+            await cached_service.get_list(source_id, entities.SourceType.CHAT)
+        assert len(timeline_cache) == 2
+        assert timeline_cache.stats.evictions == 1
+
+    async def test_send_during_warmup_not_lost(
+        self, counting_repository, timeline_cache
+    ):
+        source_id = uuid4()
+        gate = asyncio.Event()
+        original = counting_repository.get_list
+
+        async def slow_get_list(*args, **kwargs):
+            result = await original(*args, **kwargs)
+            await gate.wait()
+            return result
+
+        counting_repository.get_list = slow_get_list
+        service = services.MessageService(
+            counting_repository, timeline_cache=timeline_cache
+        )
+        warmup = asyncio.create_task(
+            service.get_list(source_id, entities.SourceType.CHAT)
+        )
+        await asyncio.sleep(0)
+        message = await service.send(
+            source_id, entities.SourceType.CHAT, uuid4(), "late"
+        )
+        gate.set()
+        assert await warmup == []
+
+        counting_repository.get_list = original
+        assert await service.get_list(source_id, entities.SourceType.CHAT) == [message]
+
+
+class TestAttachmentService:
+    async def test_send_message_with_attachment(
+        self, message_service, attachment_service
+    ):
+        attachment = await attachment_service.upload(
+            stream(b"hello ", b"world"), content_type="text/plain", filename="a.txt"
+        )
+        message = await message_service.send(
+            source_id=uuid4(),
+            source_type=entities.SourceType.CHAT,
+            sender_id=uuid4(),
+            text_content="",
+            attachment=attachment,
+        )
+
+        assert message.attachment == attachment
+        assert attachment.size == 11
+        with attachment_service.open_range(attachment, offset=6) as view:
+            assert bytes(view) == b"world"
+
+    async def test_duplicate_upload_has_same_digest(self, attachment_service):
+        first = await attachment_service.upload(stream(b"x" * 100), "image/png")
+        second = await attachment_service.upload(
+            stream(b"x" * 50, b"x" * 50), "image/png"
+        )
+        assert first.digest == second.digest
+
+    async def test_upload_too_large(self, attachment_service, tmp_path):
+        with pytest.raises(PayloadTooLargeExc):
+            await attachment_service.upload(stream(b"x" * 1000, b"x" * 1000), "a/b")
+        assert list((tmp_path / "tmp").iterdir()) == []
@@ -0,0 +1,186 @@
+from uuid import uuid4
+
+import pytest
+
+from src.common.events import EventBus
+from src.common.exceptions import AccessDeniedExc
+from src.domain.chats.cache import ChatSnapshotCache
+from src.domain.chats.services import ChatService
+from src.domain.presence import entities, events, services
+
+from .chat_service_test import FakeChatMemberRepository, FakeChatRepository
+
+
+class CountingChatMemberRepository(FakeChatMemberRepository):
+    def __init__(self):
+        super().__init__()
+        self.gets = 0
+
+    async def get(self, key):
+        self.gets += 1
+        return await super().get(key)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def chat_service() -> ChatService:
+    return ChatService(FakeChatRepository(), FakeChatMemberRepository())
+
+
+@pytest.fixture
+def event_log() -> list:
+    return []
+
+
+@pytest.fixture
+def presence_service(chat_service, clock, event_log) -> services.PresenceService:
+    bus = EventBus()
+    bus.subscribe(events.DomainEvent, event_log.append)
+    return services.PresenceService(
+        chat_service, event_bus=bus, online_ttl=30, typing_ttl=5, clock=clock
+    )
+
+
+class TestPresenceService:
+    async def test_heartbeat_and_expiry(self, presence_service, clock, event_log):
+        user_id = uuid4()
+        await presence_service.heartbeat(user_id)
+        await presence_service.heartbeat(user_id)
+        assert presence_service.status(user_id).status == entities.PresenceStatus.ONLINE
+
+        clock.now += 31
+        await presence_service.tick()
+        presence = presence_service.status(user_id)
+        assert presence.status == entities.PresenceStatus.OFFLINE
+        assert presence.last_seen_at is not None
+        assert [type(event) for event in event_log] == [
+            events.UserOnline,
+            events.UserOffline,
+        ]
+
+    async def test_disconnect(self, presence_service):
+        user_id = uuid4()
+        await presence_service.heartbeat(user_id)
+        await presence_service.disconnect(user_id)
+        assert presence_service.online_count == 0
+        assert (
+            presence_service.status(user_id).status == entities.PresenceStatus.OFFLINE
+        )
+
+    async def test_typing_is_coalesced(
+        self, presence_service, chat_service, clock, event_log
+    ):
+        owner_id = uuid4()
+        user_id = uuid4()
+        chat = await chat_service.create_group(title="Group", owner_id=owner_id)
+        await chat_service.member_add(chat.id, user_id, executor_id=owner_id)
+
+        assert await presence_service.typing(chat.id, user_id)
+        for _ in range(10):
+            clock.now += 1
+            assert not await presence_service.typing(chat.id, user_id)
+        assert await presence_service.get_typing(chat.id, owner_id) == [user_id]
+
+        clock.now += 6
+        await presence_service.tick()
+        assert await presence_service.get_typing(chat.id, owner_id) == []
+        assert [type(event) for event in event_log] == [
+            events.TypingStarted,
+            events.TypingStopped,
+        ]
+
+    async def test_visibility_is_scoped_by_membership(
+        self, presence_service, chat_service
+    ):
+        owner_id = uuid4()
+        member_id = uuid4()
+        stranger_id = uuid4()
+        chat = await chat_service.create_group(title="Group", owner_id=owner_id)
+        await chat_service.member_add(chat.id, member_id, executor_id=owner_id)
+        for user_id in (owner_id, member_id, stranger_id):
+            await presence_service.heartbeat(user_id)
+
+        presences = await presence_service.get_presence(
+            chat.id, owner_id, [member_id, stranger_id]
+        )
+        assert [presence.user_id for presence in presences] == [member_id]
+
+        with pytest.raises(AccessDeniedExc):
+            await presence_service.get_presence(chat.id, stranger_id, [owner_id])
+
+        await chat_service.member_block(chat.id, member_id, executor_id=owner_id)
+        with pytest.raises(AccessDeniedExc):
+            await presence_service.get_typing(chat.id, member_id)
+
+    async def test_typing_requires_membership(self, presence_service, chat_service):
+        owner_id = uuid4()
+        member_id = uuid4()
+        chat = await chat_service.create_group(title="Group", owner_id=owner_id)
+        await chat_service.member_add(chat.id, member_id, executor_id=owner_id)
+
+        with pytest.raises(AccessDeniedExc):
+            await presence_service.typing(chat.id, uuid4())
+        with pytest.raises(AccessDeniedExc):
+            await presence_service.typing(uuid4(), owner_id)
+
+        assert await presence_service.typing(chat.id, member_id)
+        await chat_service.member_block(chat.id, member_id, executor_id=owner_id)
+        with pytest.raises(AccessDeniedExc):
+            await presence_service.typing(chat.id, member_id)
+
+        await chat_service.delete(chat.id)
+        with pytest.raises(AccessDeniedExc):
+            await presence_service.typing(chat.id, owner_id)
+
+    async def test_typing_check_cached_by_snapshot(self, clock):
+        chat_repository = FakeChatRepository()
+        member_repository = CountingChatMemberRepository()
+        chat_service = ChatService(
+            chat_repository,
+            member_repository,
+            ChatSnapshotCache(chat_repository, member_repository),
+        )
+        presence_service = services.PresenceService(
+            chat_service, typing_ttl=5, clock=clock
+        )
+        owner_id, member_id = uuid4(), uuid4()
+        chat = await chat_service.create_group(title="Group", owner_id=owner_id)
+
+        await presence_service.typing(chat.id, owner_id)
+        gets = member_repository.gets
+        for _ in range(10):
+            clock.now += 1
+            await presence_service.typing(chat.id, owner_id)
+        assert member_repository.gets == gets
+
+        # Новый участник меняет версию снимка: право проверяется заново
+        await chat_service.member_add(chat.id, member_id)
+        await presence_service.typing(chat.id, owner_id)
+        assert member_repository.gets == gets + 1
+
+    async def test_last_seen_is_bounded(self, chat_service, clock):
+        presence_service = services.PresenceService(
+            chat_service, max_last_seen=2, clock=clock
+        )
+        user_ids = [uuid4() for _ in range(3)]
+        for user_id in user_ids:
+            await presence_service.heartbeat(user_id)
+            await presence_service.disconnect(user_id)
+
+        assert presence_service.status(user_ids[0]).last_seen_at is None
+        assert all(
+            presence_service.status(user_id).last_seen_at is not None
+            for user_id in user_ids[1:]
+        )
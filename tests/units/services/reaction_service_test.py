@@ -0,0 +1,256 @@
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Mapping, Sequence, Set, Tuple
+from uuid import UUID, uuid4
+
+import pytest
+
+from src.common.exceptions import AccessDeniedExc, InvalidFormatExc, ObjectNotFoundExc
+from src.domain.chats.entities import ChatMember, ChatMemberPermissions
+from src.domain.messages import cache, entities, reactions, services
+
+from .chat_service_test import FakeChatMemberRepository
+from .message_service_test import FakeMessageRepository
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeReactionRepository:
+    def __init__(self, message_repository: FakeMessageRepository):
+        self.message_repository = message_repository
+        self.reactions: Set[Tuple[UUID, UUID, str]] = set()
+        self.counts: Counter = Counter()
+        self.batches: List[Tuple[List[entities.ReactionChange], Dict[UUID, int]]] = []
+        self.fail = False
+
+    async def apply(
+        self, changes: Sequence[entities.ReactionChange], shards: Mapping[UUID, int]
+    ) -> Mapping[UUID, Dict[str, int]]:
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.batches.append((list(changes), dict(shards)))
+        touched: Dict[UUID, None] = {}
+        for change in changes:
+            if change.message_id not in self.message_repository.messages:
+                continue
+            touched[change.message_id] = None
+            key = (change.message_id, change.user_id, change.emoji)
+            shard = shards.get(change.message_id, 0)
+            if change.added and key not in self.reactions:
+                self.reactions.add(key)
+                self.counts[(change.message_id, change.emoji, shard)] += 1
+            elif not change.added and key in self.reactions:
+                self.reactions.remove(key)
+                self.counts[(change.message_id, change.emoji, shard)] -= 1
+        return {message_id: await self.get_counts(message_id) for message_id in touched}
+
+    async def get_counts(self, message_id: UUID) -> Dict[str, int]:
+        totals: Counter = Counter()
+        for (_id, emoji, _), count in self.counts.items():
+            if _id == message_id:
+                totals[emoji] += count
+        return {emoji: count for emoji, count in totals.items() if count > 0}
+
+
+@pytest.fixture
+def message_repository() -> FakeMessageRepository:
+    return FakeMessageRepository()
+
+
+@pytest.fixture
+def reaction_repository(message_repository) -> FakeReactionRepository:
+    return FakeReactionRepository(message_repository)
+
+
+@pytest.fixture
+def member_repository() -> FakeChatMemberRepository:
+    return FakeChatMemberRepository()
+
+
+@pytest.fixture
+def new_member(member_repository) -> Callable[[UUID], Awaitable[UUID]]:
+    async def new_member(
+        chat_id: UUID,
+        permissions: ChatMemberPermissions = ChatMemberPermissions.ROLE_DEFAULT,
+    ) -> UUID:
+        member = ChatMember(chat_id=chat_id, user_id=uuid4(), permissions=permissions)
+        await member_repository.create(member)
+        return member.user_id
+
+    return new_member
+
+
+@pytest.fixture
+def reaction_service(
+    reaction_repository, message_repository, member_repository
+) -> reactions.ReactionService:
+    return reactions.ReactionService(
+        reaction_repository,
+        message_repository,
+        member_repository,
+        max_pending=100,
+        hot_threshold=3,
+        counter_shards=4,
+    )
+
+
+@pytest.fixture
+async def message(message_repository) -> entities.Message:
+    return await message_repository.create(
+        uuid4(), entities.SourceType.GROUP, uuid4(), "hello"
+    )
+
+
+class TestReactionService:
+    async def test_changes_coalesced_until_flush(
+        self, reaction_service, reaction_repository, message, new_member
+    ):
+        user_id = await new_member(message.source_id)
+        await reaction_service.react(message.id, user_id, "👍")
+        await reaction_service.unreact(message.id, user_id, "👍")
+        await reaction_service.react(message.id, user_id, "👍")
+        await reaction_service.react(
+            message.id, await new_member(message.source_id), "🔥"
+        )
+        assert reaction_repository.batches == []
+        assert reaction_service.pending == 2
+
+        assert await reaction_service.flush() == 2
+        assert len(reaction_repository.batches) == 1
+        assert await reaction_service.get_counts(message.id) == {"👍": 1, "🔥": 1}
+        assert reaction_service.metrics.coalesced == 2
+
+    async def test_duplicate_reaction_counted_once(
+        self, reaction_service, message, new_member
+    ):
+        user_id = await new_member(message.source_id)
+        for _ in range(2):
+            await reaction_service.react(message.id, user_id, "👍")
+            await reaction_service.flush()
+        assert await reaction_service.get_counts(message.id) == {"👍": 1}
+
+        await reaction_service.unreact(message.id, user_id, "👍")
+        await reaction_service.flush()
+        assert await reaction_service.get_counts(message.id) == {}
+
+    async def test_hot_message_uses_counter_shard(
+        self, reaction_service, reaction_repository, message, new_member
+    ):
+        for _ in range(5):
+            await reaction_service.react(
+                message.id, await new_member(message.source_id), "🔥"
+            )
+        await reaction_service.flush()
+        _, shards = reaction_repository.batches[0]
+        assert set(shards) == {message.id}
+        assert reaction_service.metrics.hot == 1
+        assert await reaction_service.get_counts(message.id) == {"🔥": 5}
+
+    async def test_flush_on_max_pending(
+        self,
+        reaction_repository,
+        message,
+        new_member,
+        message_repository,
+        member_repository,
+    ):
+        service = reactions.ReactionService(
+            reaction_repository, message_repository, member_repository, max_pending=3
+        )
+        for _ in range(3):
+            await service.react(message.id, await new_member(message.source_id), "👍")
+        assert service.pending == 0
+        assert len(reaction_repository.batches) == 1
+
+    async def test_failed_flush_keeps_newer_changes(
+        self, reaction_service, reaction_repository, message, new_member
+    ):
+        user_id = await new_member(message.source_id)
+        await reaction_service.react(message.id, user_id, "👍")
+        reaction_repository.fail = True
+        with pytest.raises(ConnectionError):
+            await reaction_service.flush()
+        assert reaction_service.pending == 1
+
+        reaction_repository.fail = False
+        await reaction_service.flush()
+        assert await reaction_service.get_counts(message.id) == {"👍": 1}
+
+    async def test_totals_expire_after_flush_interval(
+        self,
+        reaction_repository,
+        message,
+        new_member,
+        message_repository,
+        member_repository,
+    ):
+        clock = FakeClock()
+        reaction_service = reactions.ReactionService(
+            reaction_repository,
+            message_repository,
+            member_repository,
+            flush_interval=0.5,
+            clock=clock,
+        )
+        await reaction_service.react(
+            message.id, await new_member(message.source_id), "👍"
+        )
+        await reaction_service.flush()
+        # Реакцию сбросил другой процесс
+        reaction_repository.counts[(message.id, "👍", 1)] += 1
+        assert await reaction_service.get_counts(message.id) == {"👍": 1}
+
+        clock.now += 0.5
+        assert await reaction_service.get_counts(message.id) == {"👍": 2}
+        message.reactions = {"👍": 2}
+        reaction_service.attach([message])
+        assert message.reactions == {"👍": 2}
+
+    async def test_invalid_emoji(self, reaction_service, message):
+        with pytest.raises(InvalidFormatExc):
+            await reaction_service.react(message.id, uuid4(), "")
+
+    async def test_cached_pages_get_fresh_counts(
+        self, message_repository, reaction_service, new_member
+    ):
+        message_service = services.MessageService(
+            message_repository,
+            timeline_cache=cache.TimelineCache(message_repository),
+            reaction_service=reaction_service,
+        )
+        source_id = uuid4()
+        message = await message_service.send(
+            source_id, entities.SourceType.GROUP, uuid4(), "hi"
+        )
+        [cached] = await message_service.get_list(source_id, entities.SourceType.GROUP)
+        assert cached.reactions == {}
+
+        await reaction_service.react(
+            message.id, await new_member(message.source_id), "👍"
+        )
+        await reaction_service.flush()
+        [cached] = await message_service.get_list(source_id, entities.SourceType.GROUP)
+        assert cached.reactions == {"👍": 1}
+
+    async def test_reaction_requires_message(self, reaction_service):
+        with pytest.raises(ObjectNotFoundExc):
+            await reaction_service.react(uuid4(), uuid4(), "👍")
+        assert reaction_service.pending == 0
+
+    async def test_reaction_requires_read_access(
+        self, reaction_service, message, new_member
+    ):
+        blocked_id = await new_member(
+            message.source_id, ChatMemberPermissions.ROLE_BLOCKED
+        )
+        for user_id in (uuid4(), blocked_id):
+            with pytest.raises(AccessDeniedExc):
+                await reaction_service.react(message.id, user_id, "👍")
+            with pytest.raises(AccessDeniedExc):
+                await reaction_service.unreact(message.id, user_id, "👍")
+        assert reaction_service.pending == 0
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from src.domain.chats.entities import ChatType, RetentionPolicy
+from src.domain.messages import cache, entities, retention, services
+
+from .chat_service_test import FakeChatRepository
+from .message_service_test import FakeMessageRepository
+
+
+@pytest.fixture
+def chat_repository() -> FakeChatRepository:
+    return FakeChatRepository()
+
+
+@pytest.fixture
+def message_repository() -> FakeMessageRepository:
+    return FakeMessageRepository()
+
+
+@pytest.fixture
+def message_service(message_repository) -> services.MessageService:
+    return services.MessageService(
+        message_repository,
+        timeline_cache=cache.TimelineCache(message_repository),
+        retention=RetentionPolicy(max_count=5),
+    )
+
+
+@pytest.fixture
+def retention_job(message_service, message_repository, chat_repository):
+    return retention.RetentionJob(
+        message_service, message_repository, chat_repository, batch_size=2, pause=0
+    )
+
+
+async def fill(message_service, source_id, count):
+    return [
+        await message_service.send(
+            source_id, entities.SourceType.GROUP, uuid4(), f"message {i}"
+        )
+        for i in range(count)
+    ]
+
+
+class TestRetentionJob:
+    async def test_global_max_count(
+        self, message_service, retention_job, message_repository
+    ):
+        source_id = uuid4()
+        sent = await fill(message_service, source_id, 8)
+        # Кэш ленты не должен отдавать удаленные сообщения
+        await message_service.get_list(source_id, entities.SourceType.GROUP)
+
+        stats = await retention_job.purge_all()
+        assert stats.messages == 3
+        assert stats.bytes == sum(len(m.text_content) for m in sent[:3])
+        assert await message_service.get_list(
+            source_id, entities.SourceType.GROUP
+        ) == list(reversed(sent[3:]))
+        assert retention_job.metrics.sources == 1
+
+    async def test_chat_policy_overrides_global(
+        self, chat_repository, message_service, retention_job, message_repository
+    ):
+        chat = await chat_repository.create(ChatType.GROUP, "chat")
+        await chat_repository.update(
+            chat.id, retention=RetentionPolicy(max_age=timedelta(hours=1))
+        )
+        sent = await fill(message_service, chat.id, 4)
+        for message in sent[:3]:
+            message.created_at = datetime.now() - timedelta(days=1)
+        other = await fill(message_service, uuid4(), 3)
+
+        stats = await retention_job.purge_all()
+        assert stats.messages == 3
+        assert list(message_repository.messages) == [sent[3].id, *(m.id for m in other)]
+
+    async def test_unlimited_policy_keeps_history(self, message_repository):
+        message_service = services.MessageService(message_repository)
+        source_id = uuid4()
+        await fill(message_service, source_id, 3)
+        stats = await message_service.purge(source_id, entities.SourceType.GROUP)
+        assert stats == entities.PurgeStats()
+        assert len(message_repository.messages) == 3
@@ -0,0 +1,159 @@
+import dataclasses
+from uuid import uuid4
+
+import pytest
+
+from src.common.exceptions import InvalidCredentialsExc
+from src.domain.auth import tokens
+from src.domain.users.services import UserService
+
+from .user_service_test import FakeUserRepository
+
+SECRET = b"s" * 32
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingUserRepository(FakeUserRepository):
+    def __init__(self):
+        super().__init__()
+        self.gets = 0
+
+    async def get(self, _id):
+        self.gets += 1
+        return await super().get(_id)
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def user_repository() -> CountingUserRepository:
+    return CountingUserRepository()
+
+
+@pytest.fixture
+def codec(clock) -> tokens.SessionTokenCodec:
+    return tokens.SessionTokenCodec(SECRET, ttl=3600, clock=clock)
+
+
+@pytest.fixture
+def session_service(user_repository, codec, clock) -> tokens.AbstractSessionService:
+    return tokens.SessionService(UserService(user_repository), codec, clock=clock)
+
+
+@pytest.fixture
+async def user(user_repository):
+    return await user_repository.create("Test", "test@example.com", "hash")
+
+
+class TestSessionTokenCodec:
+    def test_roundtrip(self, codec):
+        user_id = uuid4()
+        claims = codec.decode(codec.issue(user_id, 3))
+        assert claims.user_id == user_id
+        assert claims.token_version == 3
+
+    def test_tampered_token(self, codec):
+        token = codec.issue(uuid4(), 0)
+        other = tokens.SessionTokenCodec(b"x" * 32).issue(uuid4(), 0)
+        for bad in (token[:-2] + "AA", other, "garbage", token.split(".")[0] + "."):
+            with pytest.raises(InvalidCredentialsExc):
+                codec.decode(bad)
+
+    def test_expired_token(self, codec, clock):
+        token = codec.issue(uuid4(), 0)
+        clock.now += 3601
+        with pytest.raises(InvalidCredentialsExc):
+            codec.decode(token)
+
+    def test_short_secret(self):
+        with pytest.raises(ValueError):
+            tokens.SessionTokenCodec(b"short")
+
+
+class TestSessionService:
+    async def test_authenticate_without_repository_hits(
+        self, session_service, user_repository, user
+    ):
+        token = await session_service.issue(user)
+        gets = user_repository.gets
+        for _ in range(10):
+            claims = await session_service.authenticate(token)
+            assert claims.user_id == user.id
+        assert user_repository.gets == gets
+
+    async def test_version_loaded_once_for_foreign_token(
+        self, session_service, user_repository, codec, user
+    ):
+        token = codec.issue(user.id, user.token_version)
+        for _ in range(3):
+            await session_service.authenticate(token)
+        assert user_repository.gets == 1
+
+    async def test_revoke(self, session_service, user):
+        token = await session_service.issue(user)
+        await session_service.authenticate(token)
+
+        await session_service.revoke(user.id)
+        with pytest.raises(InvalidCredentialsExc):
+            await session_service.authenticate(token)
+
+        fresh = await session_service.issue(user)
+        assert (await session_service.authenticate(fresh)).token_version == 1
+
+    async def test_stale_user_does_not_undo_revoke(self, session_service, user):
+        stale = dataclasses.replace(user)
+        token = await session_service.issue(user)
+        await session_service.revoke(user.id)
+
+        fresh = await session_service.issue(stale)
+        assert (await session_service.authenticate(fresh)).token_version == 1
+        with pytest.raises(InvalidCredentialsExc):
+            await session_service.authenticate(token)
+
+    async def test_newer_user_refreshes_cache(
+        self, session_service, user_repository, user
+    ):
+        token = await session_service.issue(user)
+        await session_service.authenticate(token)
+        # Отзыв в другом процессе: кэш версий здесь еще не знает о нем
+        revoked = await user_repository.increment_token_version(user.id)
+
+        fresh = await session_service.issue(revoked)
+        assert (await session_service.authenticate(fresh)).token_version == 1
+        with pytest.raises(InvalidCredentialsExc):
+            await session_service.authenticate(token)
+
+    async def test_cached_token_expires(self, session_service, user, clock):
+        token = await session_service.issue(user)
+        await session_service.authenticate(token)
+        clock.now += 3601
+        with pytest.raises(InvalidCredentialsExc):
+            await session_service.authenticate(token)
+
+    async def test_unknown_user(self, session_service, codec):
+        with pytest.raises(InvalidCredentialsExc):
+            await session_service.authenticate(codec.issue(uuid4(), 0))
+
+    async def test_dump_restore_versions(
+        self, session_service, user_repository, codec, clock, user
+    ):
+        token = await session_service.issue(user)
+        records = list(session_service.dump())
+        gets = user_repository.gets
+
+        restored = tokens.SessionService(
+            UserService(user_repository), codec, clock=clock
+        )
+        assert restored.restore(memoryview(record) for record in records) == 1
+        await restored.authenticate(token)
+        assert user_repository.gets == gets
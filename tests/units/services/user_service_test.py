@@ -6,6 +6,7 @@ import pytest
 
 from src.common.exceptions import AlreadyExistsExc, ObjectNotFoundExc
 from src.domain.users import entities, repositories, services
+from src.infrastructure.memory import MemoryUserRepository
 
 
 class FakeUserRepository:
@@ -54,6 +55,11 @@ class FakeUserRepository:
         self.users.update({_id: user})
         return user
 
+    async def increment_token_version(self, _id: UUID) -> entities.User:
+        user = await self.get(_id)
+        user.token_version += 1
+        return user
+
     async def delete(self, _id: UUID) -> None:
         if _id in self.users.keys():
             del self.users[_id]
@@ -61,9 +67,9 @@ class FakeUserRepository:
             raise ObjectNotFoundExc()
 
 
-@pytest.fixture
-def user_repository() -> repositories.AbstractUserRepository:
-    return FakeUserRepository()
+@pytest.fixture(params=[FakeUserRepository, MemoryUserRepository])
+def user_repository(request) -> repositories.AbstractUserRepository:
+    return request.param()
 
 
 @pytest.fixture
@@ -130,3 +136,12 @@ class TestUserService:
 
         with pytest.raises(ObjectNotFoundExc):
             await user_service.get(user.id)
+
+    async def test_revoke_sessions(self, user_service):
+        user = await user_service.create(
+            name="Test User", email="test@example.com", hashed_password="password123"
+        )
+        assert user.token_version == 0
+
+        revoked = await user_service.revoke_sessions(user.id)
+        assert revoked.token_version == 1